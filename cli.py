@@ -10,19 +10,29 @@ import sys
 from pathlib import Path
 from typing import Dict, Any, Optional
 
-try:
-    import jsonschema
-    import yaml
-except ImportError as e:
-    print(f"Missing required packages: {e}")
-    print("Install with: pip install jsonschema pyyaml")
-    sys.exit(1)
+# Imported on first use, so commands delegated to the validation daemon
+# do not pay for them
+jsonschema = None
+yaml = None
+
+
+def _import_validation_packages():
+    """Import jsonschema and yaml, exiting with a hint if they are missing"""
+    global jsonschema, yaml
+    try:
+        import jsonschema
+        import yaml
+    except ImportError as e:
+        print(f"Missing required packages: {e}")
+        print("Install with: pip install jsonschema pyyaml")
+        sys.exit(1)
 
 
 class SubboxValidator:
     """Subbox schema validator"""
     
     def __init__(self, schemas_dir: str = "schemas"):
+        _import_validation_packages()
         self.schemas_dir = Path(schemas_dir)
         self.schemas = {}
         self._load_schemas()
@@ -98,6 +108,177 @@ class SubboxValidator:
             print(f"  - {name} (v{version}): {title}")
 
 
+def _import_module(name: str):
+    """Import an sbox_common module, falling back to the source tree."""
+    import importlib
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        sys.path.insert(0, str(Path(__file__).parent / "src"))
+        return importlib.import_module(name)
+
+
+def _import_socket_module():
+    """Import the socket protocol package."""
+    return _import_module("sbox_common.protocols.socket")
+
+
+def verify_with_daemon(config_file: str, schema_name: str, schemas_dir: str,
+                       socket_path: Optional[str] = None) -> Optional[bool]:
+    """Validate through a running validation daemon; None if it cannot be used"""
+    config_path = Path(config_file)
+    file_format = {'.yaml': 'yaml', '.yml': 'yaml', '.json': 'json'}.get(config_path.suffix.lower())
+    if file_format is None or not config_path.is_file():
+        return None  # Reported by in-process validation
+    try:
+        client_module = _import_module("sbox_common.validation.client")
+    except ImportError:
+        return None
+    
+    try:
+        content = config_path.read_text(encoding='utf-8')
+        with client_module.ValidationClient(socket_path) as client:
+            result = client.validate(content, file_format, schema_name, schemas_dir)
+    except (OSError, ValueError, UnicodeDecodeError):
+        return None  # No daemon, or the document is too large for one message
+    
+    if result.error_code in ('schema_not_found', 'unsupported_format'):
+        print(result.error_message)
+    elif result.error_code is not None:
+        print(f"❌ Validation error: {result.error_message}")
+    elif result.errors:
+        print(f"❌ Validation failed for {config_path.name}:")
+        for error in result.errors:
+            path = ' -> '.join(str(p) for p in error['path']) if error['path'] else 'root'
+            print(f"  - {error['message']} at {path}")
+    else:
+        print(f"✅ Validation passed for {config_path.name}")
+    return result.valid
+
+
+def serve_validation(socket_path: Optional[str], schemas_dir: str) -> int:
+    """Run the validation daemon in the foreground"""
+    import logging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server_module = _import_module("sbox_common.validation.server")
+    daemon = server_module.ValidationDaemon(socket_path, schemas_dir)
+    daemon.start()
+    print(f"Validation daemon listening on {daemon.socket_path}")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        daemon.close()
+    return 0
+
+
+def run_loadgen(agents: int, duration: float, socket_path: Optional[str], profile_args: Dict[str, Any],
+                command_every: int = 10, as_json: bool = False) -> int:
+    """Simulate agents against a server and print a report"""
+    import asyncio
+    import tempfile
+    import threading
+    socket_module = _import_socket_module()
+    loadgen = socket_module.loadgen
+    profile = loadgen.LoadProfile(**profile_args)
+
+    server = thread = temp_dir = None
+    try:
+        if socket_path is None:
+            # In-process stand-in server; it shares the GIL with the generator
+            protocol = socket_module.FramedJSONProtocol()
+            temp_dir = tempfile.TemporaryDirectory(prefix="sbox-loadgen-")
+            server = socket_module.SelectorServer(
+                str(Path(temp_dir.name) / "loadgen.sock"),
+                loadgen.ack_handler(protocol, command_every), protocol)
+            server.start()
+            thread = threading.Thread(target=server.serve_forever, args=(0.1,), daemon=True)
+            thread.start()
+            generator = loadgen.LoadGenerator(agents, profile, peer=server.adopt)
+        else:
+            generator = loadgen.LoadGenerator(agents, profile, socket_path=socket_path)
+        report = asyncio.run(generator.run(duration))
+    finally:
+        if thread is not None:
+            server.stop()
+            thread.join(5)
+        if server is not None:
+            server.close()
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    result = report.as_dict()
+    if as_json:
+        print(json.dumps(result, indent=2))
+        return 0 if report.connected else 1
+    sent = ", ".join(f"{kind} {count}" for kind, count in report.sent.items())
+    print(f"Agents: {report.connected}/{report.agents} connected, {report.duration:.1f}s, errors: {report.errors}")
+    print(f"  sent: {sent}; received: {report.received} (commands: {report.commands})")
+    print(f"  throughput: {report.messages_per_second:.0f} msg/s, "
+          f"CPU: {report.cpu_per_message * 1e6:.1f} us/msg")
+    for name, key in (("ack", "ack_latency_ms"), ("command", "command_latency_ms")):
+        latency = result[key]
+        if latency["count"]:
+            print(f"  {name} latency ms: p50 {latency['p50']:.2f}, p90 {latency['p90']:.2f}, "
+                  f"p99 {latency['p99']:.2f}, max {latency['max']:.2f} ({latency['count']} samples)")
+    return 0 if report.connected else 1
+
+
+def capture_traffic(listen: str, upstream: str, output: str, duration: Optional[float] = None) -> int:
+    """Proxy a socket connection and record its frames to a capture file"""
+    import asyncio
+    traffic = _import_socket_module().traffic
+
+    async def run(writer):
+        proxy = traffic.CaptureProxy(listen, upstream, writer)
+        await proxy.start()
+        print(f"Capturing {listen} -> {upstream} to {output}")
+        try:
+            if duration is not None:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.Event().wait()
+        finally:
+            await proxy.close()
+        return proxy.connections
+
+    with traffic.CaptureWriter(output) as writer:
+        try:
+            connections = asyncio.run(run(writer))
+        except KeyboardInterrupt:
+            connections = None
+        print(f"Captured {writer.frames} frames"
+              + (f" from {connections} connections" if connections is not None else ""))
+    return 0
+
+
+def replay_traffic(capture_file: str, socket_path: str, speed: Optional[float],
+                   timeout: float, as_json: bool = False) -> int:
+    """Replay a capture file against a server and print a report"""
+    traffic = _import_socket_module().traffic
+    try:
+        report = traffic.replay(capture_file, socket_path, speed, timeout)
+    except (OSError, ValueError) as e:
+        print(f"❌ Replay failed: {e}")
+        return 1
+
+    result = report.as_dict()
+    if as_json:
+        print(json.dumps(result, indent=2))
+        return 0
+    rate = f"{speed:g}x" if speed else "max"
+    print(f"Replayed {report.frames} frames ({report.bytes} bytes) over "
+          f"{report.connections} connections at {rate} speed in {report.elapsed:.3f}s")
+    print(f"  throughput: {report.frames_per_second:.0f} frames/s, "
+          f"{report.bytes_per_second / 1024:.1f} KiB/s")
+    latency = result["latency_ms"]
+    if latency is None:
+        print("  no responses received")
+    else:
+        print(f"  responses: {report.responses}, latency ms: p50 {latency['p50']:.2f}, "
+              f"p95 {latency['p95']:.2f}, p99 {latency['p99']:.2f}, max {latency['max']:.2f}")
+    return 0
+
+
 def main():
     """Main CLI function"""
     parser = argparse.ArgumentParser(
@@ -108,6 +289,10 @@ Examples:
   subbox-common verify agent_config.yaml
   subbox-common verify config.json --schema agent_config
   subbox-common list-schemas
+  subbox-common serve-validation --schemas-dir schemas &
+  subbox-common capture --listen /tmp/tap.sock --upstream /run/sboxagent.sock -o traffic.cap
+  subbox-common replay traffic.cap --socket /tmp/test.sock --speed 2
+  subbox-common loadgen --agents 5000 --duration 60 --socket /tmp/sboxmgr.sock
         """
     )
     
@@ -120,18 +305,102 @@ Examples:
                               help='Schema name to use (default: agent_config)')
     verify_parser.add_argument('--schemas-dir', default='schemas',
                               help='Directory containing schemas (default: schemas)')
+    verify_parser.add_argument('--socket', dest='socket_path',
+                              help='Validation daemon socket (default: $SBOX_VALIDATOR_SOCKET or runtime dir)')
+    verify_parser.add_argument('--no-daemon', action='store_true',
+                              help='Always validate in-process')
+    
+    # Validation daemon command
+    serve_parser = subparsers.add_parser('serve-validation',
+                                         help='Run a validation daemon that keeps schemas compiled')
+    serve_parser.add_argument('--socket', dest='socket_path',
+                              help='Socket path (default: $SBOX_VALIDATOR_SOCKET or runtime dir)')
+    serve_parser.add_argument('--schemas-dir', default='schemas',
+                              help='Directory of schemas compiled at start (default: schemas)')
     
     # List schemas command
     list_parser = subparsers.add_parser('list-schemas', help='List available schemas')
     list_parser.add_argument('--schemas-dir', default='schemas',
                             help='Directory containing schemas (default: schemas)')
     
+    # Capture command
+    capture_parser = subparsers.add_parser('capture', help='Record framed protocol traffic through a proxy socket')
+    capture_parser.add_argument('--listen', required=True,
+                                help='Socket path clients connect to')
+    capture_parser.add_argument('--upstream', required=True,
+                                help='Socket path of the server to forward to')
+    capture_parser.add_argument('-o', '--output', required=True,
+                                help='Capture file to write')
+    capture_parser.add_argument('--duration', type=float,
+                                help='Stop after this many seconds (default: until interrupted)')
+    
+    # Replay command
+    replay_parser = subparsers.add_parser('replay', help='Replay a capture file against a server')
+    replay_parser.add_argument('capture_file', help='Capture file to replay')
+    replay_parser.add_argument('--socket', required=True, dest='socket_path',
+                               help='Socket path of the server')
+    speed_group = replay_parser.add_mutually_exclusive_group()
+    speed_group.add_argument('--speed', type=float, default=1.0,
+                             help='Multiple of the original rate (default: 1.0)')
+    speed_group.add_argument('--max-speed', action='store_true',
+                             help='Send as fast as possible')
+    replay_parser.add_argument('--timeout', type=float, default=5.0,
+                               help='Seconds to wait for outstanding responses (default: 5)')
+    replay_parser.add_argument('--json', action='store_true',
+                               help='Print the report as JSON')
+    
+    # Load generator command
+    loadgen_parser = subparsers.add_parser('loadgen', help='Simulate many agents against a server')
+    loadgen_parser.add_argument('--agents', type=int, default=1000,
+                                help='Number of simulated agents (default: 1000)')
+    loadgen_parser.add_argument('--duration', type=float, default=30.0,
+                                help='Run time in seconds (default: 30)')
+    loadgen_parser.add_argument('--socket', dest='socket_path',
+                                help='Socket path of the server (default: in-process server over socketpairs)')
+    loadgen_parser.add_argument('--heartbeat-interval', type=float, default=5.0,
+                                help='Seconds between heartbeats per agent, 0 disables (default: 5)')
+    loadgen_parser.add_argument('--health-interval', type=float, default=30.0,
+                                help='Seconds between health.check_completed events, 0 disables (default: 30)')
+    loadgen_parser.add_argument('--health-components', type=int, default=4,
+                                help='Components per health check (default: 4)')
+    loadgen_parser.add_argument('--subscription-interval', type=float, default=60.0,
+                                help='Seconds between subscription updates, 0 disables (default: 60)')
+    loadgen_parser.add_argument('--command-every', type=int, default=10,
+                                help='In-process server sends a command every N heartbeats (default: 10)')
+    loadgen_parser.add_argument('--json', action='store_true',
+                                help='Print the report as JSON')
+    
     args = parser.parse_args()
     
     if not args.command:
         parser.print_help()
         sys.exit(1)
     
+    if args.command == 'capture':
+        sys.exit(capture_traffic(args.listen, args.upstream, args.output, args.duration))
+    
+    if args.command == 'loadgen':
+        profile_args = {
+            "heartbeat_interval": args.heartbeat_interval,
+            "health_interval": args.health_interval,
+            "health_components": args.health_components,
+            "subscription_interval": args.subscription_interval,
+        }
+        sys.exit(run_loadgen(args.agents, args.duration, args.socket_path, profile_args,
+                             args.command_every, args.json))
+    
+    if args.command == 'replay':
+        speed = None if args.max_speed else args.speed
+        sys.exit(replay_traffic(args.capture_file, args.socket_path, speed, args.timeout, args.json))
+    
+    if args.command == 'serve-validation':
+        sys.exit(serve_validation(args.socket_path, args.schemas_dir))
+    
+    if args.command == 'verify' and not args.no_daemon:
+        success = verify_with_daemon(args.config_file, args.schema, args.schemas_dir, args.socket_path)
+        if success is not None:
+            sys.exit(0 if success else 1)
+    
     # Initialize validator
     validator = SubboxValidator(args.schemas_dir)
     
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the HTTP API client polling many agents.
+
+Starts a number of ApiServer instances (simulated agents) in one event
+loop and polls get_status on all of them concurrently for several rounds,
+once with keep-alive connection pools and once with a new connection per
+call. Reports throughput, latency percentiles and connections opened.
+"""
+
+import argparse
+import asyncio
+import resource
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from sbox_common.protocols.http_api import ApiClient, ApiServer, ApiValidators  # noqa: E402
+
+
+def raise_fd_limit(needed: int) -> None:
+    """Raise the open file limit for client and server sockets if possible."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def status_handler(request):
+    return {"agent_status": "running", "uptime": "1h", "version": "0.1.2"}
+
+
+async def poll(ports, validators, rounds: int, keep_alive: bool):
+    clients = [ApiClient(port=port, validators=validators, pool_size=1, keep_alive=keep_alive)
+               for port in ports]
+    latencies = []
+
+    async def timed(client):
+        sent = time.perf_counter()
+        await client.get_status()
+        latencies.append(time.perf_counter() - sent)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(timed(client) for client in clients))
+    elapsed = time.perf_counter() - started
+
+    connections = sum(client.connections_opened for client in clients)
+    for client in clients:
+        await client.close()
+    return latencies, elapsed, connections
+
+
+async def run(args) -> None:
+    validators = ApiValidators()
+    servers = []
+    for _ in range(args.agents):
+        server = ApiServer({"get_status": status_handler}, validators,
+                           validate_responses=not args.no_validation)
+        await server.start(port=0)
+        servers.append(server)
+    ports = [server.port for server in servers]
+
+    try:
+        for keep_alive in (True, False):
+            latencies, elapsed, connections = await poll(ports, validators, args.rounds, keep_alive)
+            latencies.sort()
+            total = len(latencies)
+
+            def percentile(p: float) -> float:
+                return latencies[min(total - 1, int(p / 100 * total))] * 1000
+
+            mode = "keep-alive" if keep_alive else "connection per call"
+            print(f"{mode}: {total / elapsed:.0f} req/s, connections opened: {connections}")
+            print(f"  latency ms: p50 {percentile(50):.2f}, p95 {percentile(95):.2f}, "
+                  f"p99 {percentile(99):.2f}, max {latencies[-1] * 1000:.2f}")
+    finally:
+        for server in servers:
+            await server.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ApiClient polling many agents")
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--no-validation", action="store_true",
+                        help="Disable server-side response validation")
+    args = parser.parse_args()
+
+    raise_fd_limit(args.agents * 4 + 64)
+    print(f"agents: {args.agents}, rounds: {args.rounds}")
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the selectors-based socket server.
+
+Opens many concurrent Unix socket connections to a SelectorServer running
+in a background thread, sends heartbeats round-robin and waits for each
+response. Reports round-trip latency percentiles and throughput.
+"""
+
+import argparse
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from sbox_common.protocols.socket import FramedJSONProtocol  # noqa: E402
+from sbox_common.protocols.socket.server import SelectorServer  # noqa: E402
+
+
+def raise_fd_limit(needed: int) -> None:
+    """Raise the open file limit for client and server sockets if possible."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark SelectorServer")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--no-validation", action="store_true",
+                        help="Disable schema validation on both sides")
+    args = parser.parse_args()
+
+    raise_fd_limit(args.connections * 2 + 64)
+
+    server_protocol = FramedJSONProtocol()
+    client_protocol = FramedJSONProtocol()
+    if args.no_validation:
+        server_protocol.configure(validation_enabled=False)
+        client_protocol.configure(validation_enabled=False)
+
+    def handler(connection, message):
+        return server_protocol.create_response_message(message["id"], "success")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bench.sock")
+        server = SelectorServer(path, handler, server_protocol, workers=args.workers)
+        server.start()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        clients = []
+        for _ in range(args.connections):
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(path)
+            clients.append((client, client.makefile('rb')))
+
+        frame = client_protocol.encode_message(
+            client_protocol.create_heartbeat_message("bench-agent", "healthy", 1.0)
+        )
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            sent_at = []
+            # All connections have a request in flight at the same time
+            for client, _ in clients:
+                sent_at.append(time.perf_counter())
+                client.sendall(frame)
+            for (_, reader), sent in zip(clients, sent_at):
+                client_protocol.read_message(reader)
+                latencies.append(time.perf_counter() - sent)
+        elapsed = time.perf_counter() - started
+
+        server.stop()
+        thread.join(5)
+        for client, reader in clients:
+            reader.close()
+            client.close()
+
+    latencies.sort()
+    total = len(latencies)
+
+    def percentile(p: float) -> float:
+        return latencies[min(total - 1, int(p / 100 * total))] * 1000
+
+    print(f"connections: {args.connections}, requests: {total}, workers: {args.workers}")
+    print(f"throughput: {total / elapsed:.0f} req/s")
+    print(f"latency ms: p50 {percentile(50):.2f}, p95 {percentile(95):.2f}, "
+          f"p99 {percentile(99):.2f}, max {latencies[-1] * 1000:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
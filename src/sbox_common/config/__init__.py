@@ -0,0 +1,18 @@
+"""Configuration utilities for sbox-common."""
+
+from .agent_config import AgentConfig, AgentConfigLoader, load_agent_config, parse_duration
+from .schema import find_agent_config_schema, load_agent_config_schema
+from .store import ConfigChange, ConfigStore
+from .watcher import ConfigWatcher
+
+__all__ = [
+    "AgentConfig",
+    "AgentConfigLoader",
+    "ConfigChange",
+    "ConfigStore",
+    "ConfigWatcher",
+    "find_agent_config_schema",
+    "load_agent_config",
+    "load_agent_config_schema",
+    "parse_duration",
+]
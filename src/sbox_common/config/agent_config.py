@@ -0,0 +1,328 @@
+"""
+Typed, cached loader for the sboxagent daemon configuration.
+
+load_agent_config() parses agent_config.yaml (with the libyaml loader when
+available), validates it once against schemas/agent_config.json, fills in
+schema defaults and converts duration strings such as "30s" or "5m" to
+seconds. The result is an immutable AgentConfig of NamedTuples.
+
+The normalized form is cached in memory and as a marshal snapshot on disk,
+keyed by the hash of the config and schema contents, so repeated
+short-lived runs on an unchanged config skip YAML parsing and validation.
+"""
+
+import hashlib
+import json
+import logging
+import marshal
+import os
+import tempfile
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple, Union
+
+import jsonschema
+from jsonschema import ValidationError
+
+from .schema import find_agent_config_schema
+
+try:
+    import yaml
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+except ImportError:  # pragma: no cover - PyYAML is optional
+    yaml = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Bump when the normalized snapshot layout changes
+SNAPSHOT_VERSION = 1
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: str) -> float:
+    """Convert a duration like "30s", "5m" or "1h" to seconds."""
+    if not isinstance(value, str) or len(value) < 2 or value[-1] not in _DURATION_UNITS \
+            or not value[:-1].isdigit():
+        raise ValueError(f"Invalid duration: {value!r}")
+    return float(int(value[:-1]) * _DURATION_UNITS[value[-1]])
+
+
+class AgentSettings(NamedTuple):
+    name: str
+    version: str
+    log_level: str
+
+
+class ServerSettings(NamedTuple):
+    port: int
+    host: str
+    timeout: float
+
+
+class HealthCheckSettings(NamedTuple):
+    enabled: bool
+    interval: float
+    timeout: float
+
+
+class SboxmgrSettings(NamedTuple):
+    enabled: bool
+    command: Tuple[str, ...]
+    interval: float
+    timeout: float
+    stdout_capture: bool
+    health_check: HealthCheckSettings
+
+
+class ClientSettings(NamedTuple):
+    enabled: bool
+    binary_path: str
+    config_path: str
+
+
+class LoggingSettings(NamedTuple):
+    stdout_capture: bool
+    aggregation: bool
+    retention_days: int
+    max_entries: int
+
+
+class MonitoringSettings(NamedTuple):
+    metrics_enabled: bool
+    health_checks_enabled: bool
+    alerting_enabled: bool
+
+
+class SecuritySettings(NamedTuple):
+    allow_remote_api: bool
+    api_token: Optional[str]
+    allowed_hosts: Tuple[str, ...]
+    tls_enabled: bool
+    tls_cert_file: Optional[str]
+    tls_key_file: Optional[str]
+
+
+class AgentConfig(NamedTuple):
+    """Validated agent configuration; durations are in seconds."""
+
+    agent: AgentSettings
+    server: ServerSettings
+    sboxmgr: Optional[SboxmgrSettings]
+    clients: Mapping[str, ClientSettings]
+    logging: LoggingSettings
+    monitoring: MonitoringSettings
+    security: SecuritySettings
+    config_hash: str
+
+    @property
+    def enabled_clients(self) -> Tuple[str, ...]:
+        """Names of the enabled VPN clients."""
+        return tuple(name for name, client in self.clients.items() if client.enabled)
+
+
+def _defaults(schema: Dict[str, Any], data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return data with the defaults of the object schema's properties filled in."""
+    result = {name: prop["default"] for name, prop in schema.get("properties", {}).items()
+              if "default" in prop}
+    result.update(data or {})
+    return result
+
+
+def _normalize(schema: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the snapshot form: plain values, tuples, durations in seconds."""
+    properties = schema["properties"]
+
+    agent = _defaults(properties["agent"], data["agent"])
+    server = _defaults(properties["server"], data["server"])
+    normalized = {
+        "agent": (agent["name"], agent["version"], agent["log_level"]),
+        "server": (server["port"], server["host"], parse_duration(server["timeout"])),
+        "sboxmgr": None,
+        "clients": {},
+    }
+
+    services = properties["services"]["properties"]
+    sboxmgr = data.get("services", {}).get("sboxmgr")
+    if sboxmgr is not None:
+        sboxmgr = _defaults(services["sboxmgr"], sboxmgr)
+        health = _defaults(services["sboxmgr"]["properties"]["health_check"], sboxmgr.get("health_check"))
+        normalized["sboxmgr"] = (
+            sboxmgr["enabled"], tuple(sboxmgr["command"]),
+            parse_duration(sboxmgr["interval"]), parse_duration(sboxmgr["timeout"]),
+            sboxmgr["stdout_capture"],
+            (health["enabled"], parse_duration(health["interval"]), parse_duration(health["timeout"])),
+        )
+
+    clients = properties["clients"]["properties"]
+    for name, client in data.get("clients", {}).items():
+        client = _defaults(clients[name], client)
+        normalized["clients"][name] = (client["enabled"], client["binary_path"], client["config_path"])
+
+    logging_ = _defaults(properties["logging"], data.get("logging"))
+    normalized["logging"] = tuple(logging_[field] for field in LoggingSettings._fields)
+    monitoring = _defaults(properties["monitoring"], data.get("monitoring"))
+    normalized["monitoring"] = tuple(monitoring[field] for field in MonitoringSettings._fields)
+    security = _defaults(properties["security"], data.get("security"))
+    security["allowed_hosts"] = tuple(security["allowed_hosts"])
+    normalized["security"] = tuple(security.get(field) for field in SecuritySettings._fields)
+    return normalized
+
+
+def _build(normalized: Dict[str, Any], digest: str) -> AgentConfig:
+    """Build the typed config from its snapshot form."""
+    sboxmgr = normalized["sboxmgr"]
+    if sboxmgr is not None:
+        sboxmgr = SboxmgrSettings(*sboxmgr[:5], HealthCheckSettings(*sboxmgr[5]))
+    return AgentConfig(
+        agent=AgentSettings(*normalized["agent"]),
+        server=ServerSettings(*normalized["server"]),
+        sboxmgr=sboxmgr,
+        clients=MappingProxyType({name: ClientSettings(*client)
+                                  for name, client in normalized["clients"].items()}),
+        logging=LoggingSettings(*normalized["logging"]),
+        monitoring=MonitoringSettings(*normalized["monitoring"]),
+        security=SecuritySettings(*normalized["security"]),
+        config_hash=digest,
+    )
+
+
+def default_cache_dir() -> Path:
+    """Snapshot directory: $SBOX_CACHE_DIR or $XDG_CACHE_HOME/sbox-common."""
+    if os.environ.get("SBOX_CACHE_DIR"):
+        return Path(os.environ["SBOX_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "sbox-common"
+
+
+class AgentConfigLoader:
+    """Loads agent configs, caching validated results by content hash."""
+
+    def __init__(self,
+                 schemas_dir: Optional[Union[Path, str]] = None,
+                 cache_dir: Optional[Union[Path, str]] = None,
+                 use_snapshots: bool = True):
+        """Initialize loader.
+
+        Args:
+            schemas_dir: Directory containing agent_config.json
+            cache_dir: Snapshot directory (default_cache_dir() if not given)
+            use_snapshots: Read and write on-disk marshal snapshots
+        """
+        self.schema_path = find_agent_config_schema(schemas_dir)
+        if self.schema_path is None:
+            raise FileNotFoundError("Agent config schema agent_config.json not found")
+        self._schema_bytes = self.schema_path.read_bytes()
+        self._schema: Optional[Dict[str, Any]] = None
+        self._validator = None
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+        self.use_snapshots = use_snapshots
+        self._loaded: Dict[str, AgentConfig] = {}
+
+    def content_hash(self, content: bytes) -> str:
+        """Cache key of config content (also covers the schema and snapshot layout)."""
+        digest = hashlib.sha256(f"sbox-agent-config:{SNAPSHOT_VERSION}\0".encode('ascii'))
+        digest.update(hashlib.sha256(self._schema_bytes).digest())
+        digest.update(content)
+        return digest.hexdigest()
+
+    @property
+    def validator(self):
+        """Compiled validator for the agent config schema."""
+        if self._validator is None:
+            self._schema = json.loads(self._schema_bytes)
+            validator_class = jsonschema.validators.validator_for(self._schema)
+            validator_class.check_schema(self._schema)
+            self._validator = validator_class(self._schema)
+        return self._validator
+
+    def load(self, path: Union[Path, str]) -> AgentConfig:
+        """Load a YAML or JSON config file."""
+        path = Path(path)
+        return self.loads(path.read_bytes(), path.suffix.lower() == ".json")
+
+    def loads(self, content: bytes, is_json: bool = False) -> AgentConfig:
+        """Load config content. Raises ValidationError if it is invalid."""
+        digest = self.content_hash(content)
+        config = self._loaded.get(digest)
+        if config is not None:
+            return config
+
+        normalized = self._read_snapshot(digest)
+        if normalized is not None:
+            try:
+                config = _build(normalized, digest)
+            except (KeyError, TypeError, IndexError):
+                logger.debug("Ignoring malformed config snapshot")
+        if config is None:
+            normalized = self._parse(content, is_json)
+            config = _build(normalized, digest)
+            self._write_snapshot(digest, normalized)
+        self._loaded[digest] = config
+        return config
+
+    def _parse(self, content: bytes, is_json: bool) -> Dict[str, Any]:
+        """Parse, validate and normalize config content."""
+        if is_json:
+            data = json.loads(content)
+        else:
+            if yaml is None:
+                raise ImportError("PyYAML is required to load YAML configs: pip install pyyaml")
+            data = yaml.load(content, Loader=_YamlLoader)
+
+        validator = self.validator
+        error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+        if error is not None:
+            location = "/".join(str(part) for part in error.absolute_path)
+            raise ValidationError(f"Config validation failed at '{location}': {error.message}")
+        return _normalize(self._schema, data)
+
+    def _snapshot_path(self, digest: str) -> Path:
+        return self.cache_dir / f"agent_config-{digest}.marshal"
+
+    def _read_snapshot(self, digest: str) -> Optional[Dict[str, Any]]:
+        if not self.use_snapshots:
+            return None
+        try:
+            with open(self._snapshot_path(digest), 'rb') as f:
+                normalized = marshal.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.debug(f"Ignoring unreadable config snapshot: {e}")
+            return None
+        if not isinstance(normalized, dict):
+            return None
+        return normalized
+
+    def _write_snapshot(self, digest: str, normalized: Dict[str, Any]) -> None:
+        if not self.use_snapshots:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".agent_config-")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    marshal.dump(normalized, f)
+                os.replace(tmp_path, self._snapshot_path(digest))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.debug(f"Could not write config snapshot: {e}")
+
+
+_default_loader: Optional[AgentConfigLoader] = None
+
+
+def load_agent_config(path: Union[Path, str],
+                      schemas_dir: Optional[Union[Path, str]] = None,
+                      cache_dir: Optional[Union[Path, str]] = None) -> AgentConfig:
+    """Load an agent config with a shared loader (custom dirs get their own)."""
+    global _default_loader
+    if schemas_dir is not None or cache_dir is not None:
+        return AgentConfigLoader(schemas_dir, cache_dir).load(path)
+    if _default_loader is None:
+        _default_loader = AgentConfigLoader()
+    return _default_loader.load(path)
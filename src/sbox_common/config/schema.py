@@ -0,0 +1,46 @@
+"""
+Location and loading of the agent configuration schema.
+
+schemas/agent_config.json lives at the repository root. It is looked up
+in an explicit directory, $SBOX_SCHEMAS_DIR, the source tree and the
+current directory (the cli.py default), in this order.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+AGENT_CONFIG_SCHEMA_ID = "https://schemas.subbox.dev/agent_config.schema.json"
+AGENT_CONFIG_SCHEMA_FILE = "agent_config.json"
+
+
+def find_agent_config_schema(schemas_dir: Optional[Union[Path, str]] = None) -> Optional[Path]:
+    """Find agent_config.json; returns None if it is not available."""
+    candidates = []
+    if schemas_dir is not None:
+        candidates.append(Path(schemas_dir))
+    if os.environ.get("SBOX_SCHEMAS_DIR"):
+        candidates.append(Path(os.environ["SBOX_SCHEMAS_DIR"]))
+    candidates.append(Path(__file__).resolve().parents[3] / "schemas")
+    candidates.append(Path("schemas"))
+
+    for directory in candidates:
+        path = directory / AGENT_CONFIG_SCHEMA_FILE
+        if path.exists():
+            return path
+    return None
+
+
+def load_agent_config_schema(schemas_dir: Optional[Union[Path, str]] = None) -> Optional[Dict[str, Any]]:
+    """Load the agent configuration schema, or None if it is not available."""
+    path = find_agent_config_schema(schemas_dir)
+    if path is None:
+        logger.warning("Agent config schema not found")
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
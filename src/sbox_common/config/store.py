@@ -0,0 +1,116 @@
+"""
+Content-addressed configuration store.
+
+This module keeps recently seen configurations keyed by the SHA-256 hash of
+their canonical JSON form, and tracks which hash is the latest and which is
+currently applied for every config key, so callers can tell whether an
+update actually changed anything and skip no-op reloads.
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+from ..protocols.json_patch import config_hash
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class ConfigChange(NamedTuple):
+    """Result of recording a configuration in the store."""
+
+    key: str
+    config_hash: str
+    previous_hash: Optional[str]
+
+    @property
+    def changed(self) -> bool:
+        """Whether the recorded config differs from the previous one."""
+        return self.config_hash != self.previous_hash
+
+
+class ConfigStore:
+    """LRU cache of configurations addressed by canonical content hash."""
+
+    def __init__(self, max_entries: int = 8):
+        """Initialize store keeping at most max_entries configurations."""
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self._configs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._latest: Dict[str, str] = {}
+        self._applied: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._configs)
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._configs
+
+    def put(self, config: Dict[str, Any]) -> str:
+        """Store config and return its content hash."""
+        digest = config_hash(config)
+        self._insert(digest, config)
+        return digest
+
+    def _insert(self, digest: str, config: Dict[str, Any]) -> None:
+        """Insert config under digest, evicting least recently used entries."""
+        if digest in self._configs:
+            self._configs.move_to_end(digest)
+            return
+        self._configs[digest] = config
+        while len(self._configs) > self.max_entries:
+            evicted, _ = self._configs.popitem(last=False)
+            logger.debug(f"Evicted config {evicted} from store")
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Get config by content hash, or None if not cached."""
+        config = self._configs.get(digest)
+        if config is not None:
+            self._configs.move_to_end(digest)
+        return config
+
+    def record(self, key: str, config: Dict[str, Any]) -> ConfigChange:
+        """Record config as the latest version for key.
+
+        Returns a ConfigChange whose changed flag tells whether the content
+        differs from the previously recorded version for the same key.
+        """
+        digest = self.put(config)
+        previous = self._latest.get(key)
+        self._latest[key] = digest
+        return ConfigChange(key, digest, previous)
+
+    def latest_hash(self, key: str) -> Optional[str]:
+        """Get hash of the latest recorded config for key."""
+        return self._latest.get(key)
+
+    def latest(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get latest recorded config for key, if still cached."""
+        digest = self._latest.get(key)
+        return self.get(digest) if digest is not None else None
+
+    def applied_hash(self, key: str) -> Optional[str]:
+        """Get hash of the config currently applied for key."""
+        return self._applied.get(key)
+
+    def mark_applied(self, key: str, digest: Optional[str] = None) -> None:
+        """Mark config as applied for key (defaults to the latest recorded)."""
+        if digest is None:
+            digest = self._latest.get(key)
+            if digest is None:
+                raise ValueError(f"No config recorded for '{key}'")
+        self._applied[key] = digest
+
+    def needs_reload(self, key: str, force: bool = False) -> bool:
+        """Decide whether the latest config for key has to be (re)loaded."""
+        if force:
+            return True
+        latest = self._latest.get(key)
+        return latest is not None and latest != self._applied.get(key)
+
+    def forget(self, key: str) -> None:
+        """Drop latest/applied tracking for key."""
+        self._latest.pop(key, None)
+        self._applied.pop(key, None)
@@ -0,0 +1,423 @@
+"""
+Config file and schema directory watcher.
+
+ConfigWatcher watches client config files and schema directories through
+Linux inotify (falling back to periodic stat polling elsewhere). Bursts of
+writes are coalesced: a path is only re-read once it has been quiet for
+the debounce interval. Content is hashed and events are only emitted for
+real changes:
+
+- config files: config.updated (or config.deleted) events, unless the
+  canonical JSON hash is unchanged (e.g. reformatting or touch);
+- schema directories: the protocols and converters registered for the
+  directory reload their compiled validators in place, reported as a
+  config.reload_completed event with config_id "schema:<directory>".
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import json
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from ..protocols.converters import ConfigEventConverter
+from ..protocols.json_patch import config_hash
+from .agent_config import AgentConfig
+
+try:
+    import yaml
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+except ImportError:  # pragma: no cover - PyYAML is optional
+    yaml = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 0.2
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Config event type for each client in agent_config clients.*
+CLIENT_CONFIG_TYPES = {
+    "sing-box": "sing-box",
+    "clash": "clash",
+    "mihomo": "clash",
+    "xray": "v2ray",
+    "hysteria": "custom",
+}
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal ctypes binding of Linux inotify."""
+
+    def __init__(self):
+        """Create an inotify instance. Raises OSError if inotify is unavailable."""
+        libc_name = ctypes.util.find_library("c")
+        try:
+            self._libc = ctypes.CDLL(libc_name, use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, path: Union[Path, str], mask: int = _WATCH_MASK) -> int:
+        """Watch a directory; returns the watch descriptor."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), ctypes.c_uint32(mask))
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), str(path))
+        return wd
+
+    def read(self) -> List[Tuple[int, int, str]]:
+        """Read pending events as (wd, mask, name) tuples."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class _Target:
+    """A watched config file or schema directory."""
+
+    __slots__ = ("path", "is_dir", "on_change", "signature", "content_hash", "state", "deadline")
+
+    def __init__(self, path: Path, is_dir: bool, on_change: Callable[["_Target"], Optional[Dict[str, Any]]]):
+        self.path = path
+        self.is_dir = is_dir
+        self.on_change = on_change
+        self.signature = None
+        self.content_hash: Optional[str] = None
+        self.state: Any = None
+        self.deadline: Optional[float] = None
+
+    def matches(self, name: str) -> bool:
+        """Whether a directory entry name concerns this target."""
+        if self.is_dir:
+            return not name or name.endswith(".json")
+        return name == self.path.name
+
+    def stat_signature(self) -> Any:
+        """Cheap change signature used by polling."""
+        try:
+            if self.is_dir:
+                return tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                                    for entry in os.scandir(self.path) if entry.name.endswith(".json")))
+            st = os.stat(self.path)
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Cannot stat {self.path}: {e}")
+            return self.signature
+
+    def read_hash(self) -> Optional[str]:
+        """Hash of the current contents (None if missing)."""
+        try:
+            if self.is_dir:
+                digest = hashlib.sha256()
+                for path in sorted(self.path.glob("*.json")):
+                    digest.update(path.name.encode('utf-8') + b"\0")
+                    digest.update(hashlib.sha256(path.read_bytes()).digest())
+                return digest.hexdigest()
+            return hashlib.sha256(self.path.read_bytes()).hexdigest()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            # E.g. permissions, keep the last known contents
+            logger.warning(f"Cannot read {self.path}: {e}")
+            return self.content_hash
+
+
+class ConfigWatcher:
+    """Watches config files and schema directories for content changes."""
+
+    def __init__(self,
+                 debounce: float = DEFAULT_DEBOUNCE,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 use_inotify: bool = True,
+                 converter: Optional[ConfigEventConverter] = None,
+                 source: str = "sboxagent"):
+        """Initialize watcher.
+
+        Args:
+            debounce: Seconds a path must be quiet before it is re-read
+            poll_interval: Stat polling interval without inotify
+            use_inotify: Use inotify when available
+            converter: Converter used to build events
+            source: Event source
+        """
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.converter = converter or ConfigEventConverter()
+        self.source = source
+        self._targets: Dict[Path, _Target] = {}
+        self._watch_dirs: Dict[Path, int] = {}
+        self._wd_dirs: Dict[int, Path] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.RLock()
+        self._next_poll = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+        self._inotify: Optional[Inotify] = None
+        if use_inotify:
+            try:
+                self._inotify = Inotify()
+            except OSError as e:
+                logger.info(f"inotify unavailable, polling every {poll_interval}s: {e}")
+
+    @property
+    def using_inotify(self) -> bool:
+        return self._inotify is not None
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """Call listener with every emitted event."""
+        self._listeners.append(listener)
+
+    def _add_target(self, target: _Target) -> None:
+        with self._lock:
+            target.signature = target.stat_signature()
+            target.content_hash = target.read_hash()
+            self._targets[target.path] = target
+            if self._inotify is not None:
+                directory = target.path if target.is_dir else target.path.parent
+                if directory not in self._watch_dirs:
+                    wd = self._inotify.add_watch(directory)
+                    self._watch_dirs[directory] = wd
+                    self._wd_dirs[wd] = directory
+
+    def watch_config(self,
+                     path: Union[Path, str],
+                     config_id: str,
+                     config_type: str = "custom",
+                     name: Optional[str] = None) -> None:
+        """Watch a JSON or YAML config file, emitting config.updated on changes."""
+        path = Path(path).absolute()
+        target = _Target(path, False, lambda t: self._config_changed(t, config_id, config_type, name or config_id))
+        self._add_target(target)
+        if target.content_hash is not None:
+            target.state = self._canonical_hash(path)
+
+    def watch_agent_clients(self, config: AgentConfig) -> None:
+        """Watch clients.*.config_path of the enabled clients of an agent config."""
+        for name in config.enabled_clients:
+            self.watch_config(config.clients[name].config_path, name,
+                              CLIENT_CONFIG_TYPES.get(name, "custom"), name)
+
+    def watch_schemas(self, *targets: Any) -> None:
+        """Hot-reload the schemas of FramedJSONProtocol/EventConverter instances.
+
+        Each target's schema_dir is watched; on changes reload_schemas()
+        of all targets sharing the directory is called.
+        """
+        for reloadable in targets:
+            path = Path(reloadable.schema_dir).absolute()
+            with self._lock:
+                target = self._targets.get(path)
+                if target is None:
+                    target = _Target(path, True, self._schemas_changed)
+                    target.state = []
+                    self._add_target(target)
+                target.state.append(reloadable)
+
+    @staticmethod
+    def _parse(path: Path) -> Any:
+        content = path.read_bytes()
+        if path.suffix.lower() in (".yaml", ".yml"):
+            if yaml is None:
+                raise ValueError("PyYAML is required to parse YAML configs")
+            return yaml.load(content, Loader=_YamlLoader)
+        return json.loads(content)
+
+    def _canonical_hash(self, path: Path) -> Optional[str]:
+        try:
+            return config_hash(self._parse(path))
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Cannot parse config {path}: {e}")
+            return None
+
+    def _config_changed(self, target: _Target, config_id: str, config_type: str, name: str) -> Optional[Dict[str, Any]]:
+        if target.content_hash is None:
+            target.state = None
+            return self.converter.create_config_deleted(config_id, self.source)
+        try:
+            content = self._parse(target.path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unparsable config {target.path}: {e}")
+            return None
+        if not isinstance(content, dict):
+            logger.warning(f"Ignoring config {target.path}: not an object")
+            return None
+        try:
+            checksum = config_hash(content)
+        except TypeError as e:
+            # Values without a JSON form, e.g. YAML dates
+            logger.warning(f"Ignoring config {target.path}: {e}")
+            return None
+        if checksum == target.state:
+            return None  # Formatting-only change
+        target.state = checksum
+        return self.converter.create_config_updated({
+            "config_id": config_id,
+            "name": name,
+            "type": config_type,
+            "content": content,
+            "checksum": checksum,
+        }, self.source)
+
+    def _schemas_changed(self, target: _Target) -> Optional[Dict[str, Any]]:
+        started = time.perf_counter()
+        errors = []
+        for reloadable in target.state:
+            try:
+                reloadable.reload_schemas()
+            except Exception as e:
+                errors.append(f"{type(reloadable).__name__}: {e}")
+        elapsed_ms = int((time.perf_counter() - started) * 1000)
+        if errors:
+            logger.error(f"Schema reload from {target.path} failed, keeping previous schemas: {errors}")
+        else:
+            logger.info(f"Reloaded schemas from {target.path}")
+        return self.converter.create_config_reload_completed(
+            f"schema:{target.path.name}",
+            "failed" if errors else "success",
+            self.source,
+            error="; ".join(errors) or None,
+            reload_time_ms=elapsed_ms,
+        )
+
+    def _mark_dirty(self, target: _Target, now: float) -> None:
+        # Every new write pushes the deadline back, coalescing bursts
+        target.deadline = now + self.debounce
+
+    def _collect(self, timeout: float) -> None:
+        """Wait up to timeout for file system activity and mark dirty targets."""
+        now = time.monotonic()
+        if self._inotify is not None:
+            readable, _, _ = select.select([self._inotify], [], [], timeout)
+            if not readable:
+                return
+            now = time.monotonic()
+            for wd, mask, name in self._inotify.read():
+                if mask & IN_Q_OVERFLOW:
+                    for target in self._targets.values():
+                        self._mark_dirty(target, now)
+                    continue
+                directory = self._wd_dirs.get(wd)
+                for target in self._targets.values():
+                    parent = target.path if target.is_dir else target.path.parent
+                    if parent == directory and target.matches(name):
+                        self._mark_dirty(target, now)
+            return
+
+        if now < self._next_poll:
+            time.sleep(min(timeout, self._next_poll - now))
+            return
+        self._next_poll = now + self.poll_interval
+        for target in self._targets.values():
+            signature = target.stat_signature()
+            if signature != target.signature:
+                target.signature = signature
+                self._mark_dirty(target, now)
+
+    def poll(self, timeout: float = 0.0) -> List[Dict[str, Any]]:
+        """Process file system activity once; returns (and emits) change events."""
+        with self._lock:
+            pending = [t.deadline for t in self._targets.values() if t.deadline is not None]
+            if pending:
+                timeout = max(0.0, min(timeout, min(pending) - time.monotonic()))
+            self._collect(timeout)
+
+            events = []
+            now = time.monotonic()
+            for target in self._targets.values():
+                if target.deadline is None or target.deadline > now:
+                    continue
+                target.deadline = None
+                content_hash = target.read_hash()
+                if content_hash == target.content_hash:
+                    continue
+                target.content_hash = content_hash
+                event = target.on_change(target)
+                if event is not None:
+                    events.append(event)
+
+        for event in events:
+            for listener in self._listeners:
+                try:
+                    listener(event)
+                except Exception:
+                    logger.exception("Config watcher listener failed")
+        return events
+
+    def start(self) -> None:
+        """Watch in a background thread."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="sbox-config-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.poll(0.1)
+            except Exception:
+                logger.exception("Config watcher poll failed")
+                self._stopping.wait(self.poll_interval)
+
+    def stop(self) -> None:
+        """Stop the background thread."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def close(self) -> None:
+        """Stop watching and release inotify."""
+        self.stop()
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
@@ -0,0 +1,15 @@
+"""Health monitoring utilities for sbox-common."""
+
+from .alerts import AlertEngine, AlertRule
+from .liveness import LivenessTable, TimerWheel
+from .metrics import HealthMetricsAggregator, MetricRingBuffer, MetricSummary
+
+__all__ = [
+    "AlertEngine",
+    "AlertRule",
+    "HealthMetricsAggregator",
+    "LivenessTable",
+    "MetricRingBuffer",
+    "MetricSummary",
+    "TimerWheel",
+]
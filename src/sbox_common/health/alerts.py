@@ -0,0 +1,248 @@
+"""
+Incremental threshold alert engine.
+
+This module evaluates threshold rules against health metric samples as they
+arrive and produces debounced health.alert_triggered, health.alert_resolved
+and health.status_changed events. Rules are compiled once into a per-metric
+dispatch table and every rule keeps O(1) rolling state per component, so
+each sample costs constant work regardless of history length.
+"""
+
+import logging
+import math
+import operator
+import time
+import uuid
+from array import array
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from ..protocols.converters import HealthEventConverter
+from .metrics import STATUS_ORDER
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+COMPARATORS: Dict[str, Callable[[float, float], bool]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+# Component status implied by an active alert of a given severity
+SEVERITY_STATUS = {
+    "info": "healthy",
+    "warning": "degraded",
+    "error": "unhealthy",
+    "critical": "unhealthy",
+}
+
+
+class AlertRule(NamedTuple):
+    """Threshold alert rule.
+
+    The rule fires when the rolling mean of the last ``window`` samples of
+    ``metric`` compares true against ``threshold``. Once active it only
+    clears after the mean moves ``hysteresis`` past the threshold in the
+    other direction, and it is not re-triggered within ``cooldown_seconds``
+    of the previous trigger.
+    """
+
+    name: str
+    metric: str
+    comparator: str
+    threshold: float
+    severity: str = "warning"
+    window: int = 1
+    hysteresis: float = 0.0
+    cooldown_seconds: float = 0.0
+    component: Optional[str] = None
+    message: Optional[str] = None
+
+
+class _RuleState:
+    """Rolling per-component state of a compiled rule."""
+
+    __slots__ = ("samples", "position", "count", "total", "active", "alert_id", "last_triggered")
+
+    def __init__(self, window: int):
+        self.samples = array('d', bytes(8 * window))
+        self.position = 0
+        self.count = 0
+        self.total = 0.0
+        self.active = False
+        self.alert_id: Optional[str] = None
+        self.last_triggered: Optional[float] = None
+
+    def push(self, value: float) -> float:
+        """Add a sample and return the rolling mean in amortized O(1).
+
+        The running sum is recomputed exactly every time the ring wraps, so
+        rounding errors of the incremental updates cannot accumulate.
+        """
+        window = len(self.samples)
+        if self.count == window:
+            self.total -= self.samples[self.position]
+        else:
+            self.count += 1
+        self.samples[self.position] = value
+        self.total += value
+        self.position = (self.position + 1) % window
+        if self.position == 0:
+            self.total = math.fsum(self.samples)
+        return self.total / self.count
+
+
+class _CompiledRule:
+    """Rule with comparator functions resolved once."""
+
+    __slots__ = ("rule", "trigger", "clear", "states")
+
+    def __init__(self, rule: AlertRule):
+        if rule.comparator not in COMPARATORS:
+            raise ValueError(f"Unsupported comparator: {rule.comparator!r}")
+        if rule.severity not in SEVERITY_STATUS:
+            raise ValueError(f"Unsupported severity: {rule.severity!r}")
+        if rule.window < 1:
+            raise ValueError("window must be at least 1")
+        if rule.hysteresis < 0:
+            raise ValueError("hysteresis must not be negative")
+
+        self.rule = rule
+        compare = COMPARATORS[rule.comparator]
+        threshold = rule.threshold
+        # Clear level is shifted back across the threshold by the hysteresis
+        if rule.comparator in (">", ">="):
+            clear_level = threshold - rule.hysteresis
+        else:
+            clear_level = threshold + rule.hysteresis
+        self.trigger = lambda value: compare(value, threshold)
+        self.clear = lambda value: not compare(value, clear_level)
+        self.states: Dict[str, _RuleState] = {}
+
+
+class AlertEngine:
+    """Evaluates alert rules incrementally against incoming samples."""
+
+    def __init__(self,
+                 rules: Sequence[AlertRule],
+                 converter: Optional[HealthEventConverter] = None,
+                 clock: Callable[[], float] = time.time):
+        """Compile rules into a per-metric dispatch table."""
+        self.converter = converter or HealthEventConverter()
+        self.clock = clock
+        self._rules_by_metric: Dict[str, List[_CompiledRule]] = {}
+        for rule in rules:
+            self._rules_by_metric.setdefault(rule.metric, []).append(_CompiledRule(rule))
+        # component -> {alert_id: severity} of active alerts
+        self._active: Dict[str, Dict[str, str]] = {}
+        self._status: Dict[str, str] = {}
+
+    @property
+    def statuses(self) -> Dict[str, str]:
+        """Current derived status of every component seen so far."""
+        return dict(self._status)
+
+    def component_status(self, component: str) -> str:
+        """Get derived status of a component ("unknown" if never seen)."""
+        return self._status.get(component, "unknown")
+
+    def process(self,
+                component: str,
+                metrics: Dict[str, Any],
+                timestamp: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Evaluate a metrics sample and return any emitted events."""
+        if timestamp is None:
+            timestamp = self.clock()
+        events: List[Dict[str, Any]] = []
+        for metric, value in metrics.items():
+            rules = self._rules_by_metric.get(metric)
+            if rules and value is not None:
+                self._evaluate(rules, component, metric, float(value), timestamp, events)
+        # Status can only change when an alert fired or resolved
+        if events or component not in self._status:
+            self._update_status(component, events)
+        return events
+
+    def process_value(self,
+                      component: str,
+                      metric: str,
+                      value: float,
+                      timestamp: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Evaluate a single metric value and return any emitted events."""
+        return self.process(component, {metric: value}, timestamp)
+
+    def _evaluate(self,
+                  rules: List[_CompiledRule],
+                  component: str,
+                  metric: str,
+                  value: float,
+                  timestamp: float,
+                  events: List[Dict[str, Any]]) -> None:
+        """Run every rule for metric against one sample."""
+        for compiled in rules:
+            rule = compiled.rule
+            if rule.component is not None and rule.component != component:
+                continue
+
+            state = compiled.states.get(component)
+            if state is None:
+                state = compiled.states[component] = _RuleState(rule.window)
+            mean = state.push(value)
+
+            if not state.active:
+                if state.count < rule.window or not compiled.trigger(mean):
+                    continue
+                if (state.last_triggered is not None
+                        and timestamp - state.last_triggered < rule.cooldown_seconds):
+                    continue
+                state.active = True
+                state.last_triggered = timestamp
+                state.alert_id = str(uuid.uuid4())
+                self._active.setdefault(component, {})[state.alert_id] = rule.severity
+                events.append(self._alert_triggered(rule, state.alert_id, component, metric, mean))
+            elif compiled.clear(mean):
+                state.active = False
+                self._active.get(component, {}).pop(state.alert_id, None)
+                events.append(self.converter.create_health_alert_resolved(
+                    state.alert_id,
+                    resolution_message=f"{rule.name}: {metric} back to {mean:g}"
+                ))
+                state.alert_id = None
+
+    def _alert_triggered(self,
+                         rule: AlertRule,
+                         alert_id: str,
+                         component: str,
+                         metric: str,
+                         value: float) -> Dict[str, Any]:
+        """Build health.alert_triggered event for a rule."""
+        message = rule.message or (
+            f"{rule.name}: {metric} {rule.comparator} {rule.threshold:g} (current {value:g})"
+        )
+        return self.converter.create_health_alert_triggered(
+            alert_id,
+            rule.severity,
+            message,
+            component,
+            threshold={metric: rule.threshold, "comparator": rule.comparator, "window": rule.window},
+            current_value={metric: value}
+        )
+
+    def _update_status(self, component: str, events: List[Dict[str, Any]]) -> None:
+        """Recompute component status and emit health.status_changed on change."""
+        status = "healthy"
+        for severity in self._active.get(component, {}).values():
+            candidate = SEVERITY_STATUS[severity]
+            if STATUS_ORDER.index(candidate) > STATUS_ORDER.index(status):
+                status = candidate
+
+        previous = self._status.get(component, "unknown")
+        self._status[component] = status
+        if status != previous and not (previous == "unknown" and status == "healthy"):
+            events.append(self.converter.create_health_status_changed(
+                component,
+                previous,
+                status
+            ))
+
@@ -0,0 +1,221 @@
+"""
+Receiver-side agent liveness tracking.
+
+LivenessTable stores per-agent heartbeat state in parallel arrays indexed by
+a slot number, merges full and delta heartbeats, and expires agents that
+miss heartbeats through a hashed timer wheel, so a tick only touches the
+agents that are actually due instead of scanning the whole fleet.
+"""
+
+import logging
+import time
+from array import array
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from ..protocols.converters import HealthEventConverter
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+STATUSES = ("healthy", "degraded", "unhealthy", "unknown")
+_STATUS_CODE = {status: code for code, status in enumerate(STATUSES)}
+_UNHEALTHY = _STATUS_CODE["unhealthy"]
+_UNKNOWN = _STATUS_CODE["unknown"]
+
+
+class TimerWheel:
+    """Hashed timer wheel with a fixed number of buckets."""
+
+    def __init__(self, tick_seconds: float = 1.0, size: int = 512, start: float = 0.0):
+        """Initialize wheel with tick resolution and bucket count."""
+        if tick_seconds <= 0:
+            raise ValueError("tick_seconds must be positive")
+        self.tick_seconds = tick_seconds
+        self.size = size
+        self._buckets: List[List[Tuple[int, Hashable]]] = [[] for _ in range(size)]
+        self._tick = int(start // tick_seconds)
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """Schedule key to fire once deadline has passed."""
+        tick = max(int(deadline // self.tick_seconds) + 1, self._tick + 1)
+        self._buckets[tick % self.size].append((tick, key))
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Advance wheel to now and return keys whose deadline passed."""
+        target = int(now // self.tick_seconds)
+        if target - self._tick > self.size:
+            # Skip ahead one full revolution at most; every bucket is visited once
+            self._tick = target - self.size
+        fired: List[Hashable] = []
+        while self._tick < target:
+            self._tick += 1
+            bucket = self._buckets[self._tick % self.size]
+            if not bucket:
+                continue
+            pending = []
+            for entry in bucket:
+                if entry[0] <= self._tick:
+                    fired.append(entry[1])
+                else:
+                    pending.append(entry)
+            self._buckets[self._tick % self.size] = pending
+        return fired
+
+
+class LivenessTable:
+    """Array-backed liveness table keyed by agent_id."""
+
+    def __init__(self,
+                 timeout_seconds: float = 30.0,
+                 tick_seconds: float = 1.0,
+                 wheel_size: int = 512,
+                 converter: Optional[HealthEventConverter] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """Initialize table.
+
+        Args:
+            timeout_seconds: Agent is marked unhealthy after this long without heartbeats
+            tick_seconds: Timer wheel resolution
+            wheel_size: Number of timer wheel buckets
+            converter: Health event converter used to build events
+            clock: Monotonic time source
+        """
+        self.timeout_seconds = timeout_seconds
+        self.converter = converter or HealthEventConverter()
+        self.clock = clock
+        self._wheel = TimerWheel(tick_seconds, wheel_size, clock())
+        self._slots: Dict[str, int] = {}
+        self._agent_ids: List[str] = []
+        self._versions: List[Optional[str]] = []
+        self._last_seen = array('d')
+        self._status = array('b')
+        self._reported = array('b')
+        self._uptime = array('d')
+        self._uptime_at = array('d')
+        self._expired = array('b')
+        self._counts = [0] * len(STATUSES)
+
+    def __len__(self) -> int:
+        return len(self._agent_ids)
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self._slots
+
+    def _allocate(self, agent_id: str) -> int:
+        """Allocate a slot for a new agent."""
+        slot = len(self._agent_ids)
+        self._slots[agent_id] = slot
+        self._agent_ids.append(agent_id)
+        self._versions.append(None)
+        self._last_seen.append(0.0)
+        self._status.append(_UNKNOWN)
+        self._reported.append(_UNKNOWN)
+        self._uptime.append(-1.0)
+        self._uptime_at.append(0.0)
+        self._expired.append(0)
+        self._counts[_UNKNOWN] += 1
+        return slot
+
+    def _set_status(self, slot: int, code: int, message: Optional[str],
+                    events: List[Dict[str, Any]]) -> None:
+        """Change agent status, keeping fleet counters in sync."""
+        previous = self._status[slot]
+        if previous == code:
+            return
+        self._counts[previous] -= 1
+        self._counts[code] += 1
+        self._status[slot] = code
+        events.append(self.converter.create_health_status_changed(
+            self._agent_ids[slot],
+            STATUSES[previous],
+            STATUSES[code],
+            message=message
+        ))
+
+    def update(self, heartbeat: Dict[str, Any], now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Merge a full or delta heartbeat payload and return emitted events."""
+        if now is None:
+            now = self.clock()
+        events: List[Dict[str, Any]] = []
+        agent_id = heartbeat["agent_id"]
+        slot = self._slots.get(agent_id)
+        if slot is None:
+            slot = self._allocate(agent_id)
+            self._wheel.schedule(slot, now + self.timeout_seconds)
+
+        status = heartbeat.get("status")
+        if status is not None:
+            self._reported[slot] = _STATUS_CODE.get(status, _UNKNOWN)
+        if "uptime_seconds" in heartbeat:
+            self._uptime[slot] = heartbeat["uptime_seconds"]
+            self._uptime_at[slot] = now
+        if "version" in heartbeat:
+            self._versions[slot] = heartbeat["version"]
+        self._last_seen[slot] = now
+
+        if self._expired[slot]:
+            self._expired[slot] = 0
+            self._wheel.schedule(slot, now + self.timeout_seconds)
+            message = "Heartbeats resumed"
+        else:
+            message = None
+        self._set_status(slot, self._reported[slot], message, events)
+        return events
+
+    def update_message(self, message: Dict[str, Any], now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Merge a heartbeat protocol message."""
+        return self.update(message["heartbeat"], now)
+
+    def expire(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Advance timers and mark agents that missed heartbeats as unhealthy.
+
+        Only agents whose timer bucket is due are inspected. Agents that sent
+        a heartbeat since their timer was scheduled are rescheduled lazily.
+        """
+        if now is None:
+            now = self.clock()
+        events: List[Dict[str, Any]] = []
+        for slot in self._wheel.advance(now):
+            deadline = self._last_seen[slot] + self.timeout_seconds
+            if deadline > now:
+                self._wheel.schedule(slot, deadline)
+                continue
+            self._expired[slot] = 1
+            self._set_status(
+                slot,
+                _UNHEALTHY,
+                f"No heartbeat for {now - self._last_seen[slot]:.0f}s",
+                events
+            )
+        return events
+
+    def status(self, agent_id: str) -> str:
+        """Get current status of an agent."""
+        slot = self._slots.get(agent_id)
+        return STATUSES[self._status[slot]] if slot is not None else "unknown"
+
+    def agent(self, agent_id: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Get merged state of an agent, with uptime extrapolated to now."""
+        slot = self._slots.get(agent_id)
+        if slot is None:
+            return None
+        if now is None:
+            now = self.clock()
+        state = {
+            "agent_id": agent_id,
+            "status": STATUSES[self._status[slot]],
+            "last_seen_seconds_ago": now - self._last_seen[slot],
+        }
+        if self._uptime[slot] >= 0:
+            state["uptime_seconds"] = self._uptime[slot] + (now - self._uptime_at[slot])
+        if self._versions[slot] is not None:
+            state["version"] = self._versions[slot]
+        return state
+
+    def fleet_status(self) -> Dict[str, int]:
+        """Get number of agents per status."""
+        return dict(zip(STATUSES, self._counts))
+
+    def count(self, status: str) -> int:
+        """Get number of agents with status."""
+        return self._counts[_STATUS_CODE[status]]
@@ -0,0 +1,266 @@
+"""
+Rolling-window health metrics aggregation.
+
+This module stores SystemMetrics samples (see health-events.json) in
+fixed-size array-backed ring buffers per component and metric, computes
+rolling min/max/mean/percentile summaries over time windows and builds
+health.check_completed events from them. Memory use is bounded by the
+buffer capacity regardless of how long the agent runs.
+"""
+
+import bisect
+import logging
+import time
+import uuid
+from array import array
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from ..protocols.converters import HealthEventConverter
+
+try:
+    import numpy as _np
+except ImportError:  # pragma: no cover - numpy is optional
+    _np = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Metric names defined by SystemMetrics in health-events.json
+SYSTEM_METRICS = (
+    "cpu_usage_percent",
+    "memory_usage_mb",
+    "disk_usage_percent",
+    "network_rx_bytes",
+    "network_tx_bytes",
+    "uptime_seconds",
+)
+
+# Health statuses ordered from best to worst
+STATUS_ORDER = ("healthy", "unknown", "degraded", "unhealthy")
+
+
+class MetricSummary(NamedTuple):
+    """Summary statistics of a metric over a window."""
+
+    count: int
+    min: float
+    max: float
+    mean: float
+    last: float
+    percentiles: Dict[str, float]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Convert summary to a JSON-serializable dict."""
+        result = {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean,
+            "last": self.last,
+        }
+        result.update(self.percentiles)
+        return result
+
+
+class MetricRingBuffer:
+    """Fixed-capacity ring buffer of (timestamp, value) samples."""
+
+    __slots__ = ("capacity", "_values", "_times", "_next", "_count")
+
+    def __init__(self, capacity: int):
+        """Initialize buffer holding at most capacity samples."""
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._values = array('d', bytes(8 * capacity))
+        self._times = array('d', bytes(8 * capacity))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, value: float) -> None:
+        """Append a sample, overwriting the oldest one when full."""
+        index = self._next
+        self._values[index] = value
+        self._times[index] = timestamp
+        self._next = (index + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def last(self) -> Optional[float]:
+        """Get the most recent value."""
+        if not self._count:
+            return None
+        return self._values[self._next - 1]
+
+    def _ordered(self, data: array) -> array:
+        """Return buffer contents oldest-first."""
+        if self._count < self.capacity:
+            return data[:self._count]
+        return data[self._next:] + data[:self._next]
+
+    def window(self, since: Optional[float] = None) -> array:
+        """Get values (oldest first) with timestamp >= since."""
+        values = self._ordered(self._values)
+        if since is None:
+            return values
+        start = bisect.bisect_left(self._ordered(self._times), since)
+        return values[start:]
+
+
+def _percentiles(values: Sequence[float], points: Sequence[float]) -> List[float]:
+    """Compute linearly interpolated percentiles of values (pure Python)."""
+    ordered = sorted(values)
+    last_index = len(ordered) - 1
+    result = []
+    for point in points:
+        rank = point / 100.0 * last_index
+        lower = int(rank)
+        upper = min(lower + 1, last_index)
+        fraction = rank - lower
+        result.append(ordered[lower] + (ordered[upper] - ordered[lower]) * fraction)
+    return result
+
+
+def summarize_values(values: array, percentiles: Sequence[float] = (50, 95, 99)) -> Optional[MetricSummary]:
+    """Summarize an array of float64 values, or None if it is empty.
+
+    With NumPy available the whole summary is computed on a zero-copy view
+    of the array; otherwise it falls back to pure Python.
+    """
+    count = len(values)
+    if not count:
+        return None
+    if _np is not None:
+        view = _np.frombuffer(values, dtype=_np.float64)
+        minimum, maximum, mean = float(view.min()), float(view.max()), float(view.mean())
+        points = [float(v) for v in _np.percentile(view, percentiles)]
+    else:
+        minimum, maximum, mean = min(values), max(values), sum(values) / count
+        points = _percentiles(values, percentiles)
+    return MetricSummary(
+        count=count,
+        min=minimum,
+        max=maximum,
+        mean=mean,
+        last=values[-1],
+        percentiles={f"p{point:g}": value for point, value in zip(percentiles, points)},
+    )
+
+
+class HealthMetricsAggregator:
+    """Aggregates per-component metric samples in ring buffers."""
+
+    def __init__(self,
+                 capacity: int = 360,
+                 percentiles: Sequence[float] = (50, 95, 99),
+                 metrics: Optional[Iterable[str]] = None,
+                 converter: Optional[HealthEventConverter] = None,
+                 clock: Callable[[], float] = time.time):
+        """Initialize aggregator.
+
+        Args:
+            capacity: Samples kept per component and metric
+            percentiles: Percentiles reported in summaries
+            metrics: Metric names to track (defaults to SystemMetrics fields);
+                other keys in samples are ignored
+            converter: Health event converter used to build events
+            clock: Time source for sample timestamps and windows
+        """
+        self.capacity = capacity
+        self.percentiles = tuple(percentiles)
+        self.metrics = frozenset(metrics if metrics is not None else SYSTEM_METRICS)
+        self.converter = converter or HealthEventConverter()
+        self.clock = clock
+        self._buffers: Dict[str, Dict[str, MetricRingBuffer]] = {}
+        self._last_sample: Dict[str, float] = {}
+
+    @property
+    def components(self) -> List[str]:
+        """Components that have reported samples."""
+        return list(self._buffers)
+
+    def add_sample(self,
+                   component: str,
+                   metrics: Dict[str, Any],
+                   timestamp: Optional[float] = None) -> None:
+        """Add a SystemMetrics sample for component."""
+        if timestamp is None:
+            timestamp = self.clock()
+        buffers = self._buffers.get(component)
+        if buffers is None:
+            buffers = self._buffers[component] = {}
+
+        for name, value in metrics.items():
+            if name not in self.metrics or value is None:
+                continue
+            buffer = buffers.get(name)
+            if buffer is None:
+                buffer = buffers[name] = MetricRingBuffer(self.capacity)
+            buffer.append(timestamp, float(value))
+
+        self._last_sample[component] = timestamp
+
+    def summarize(self,
+                  component: str,
+                  metric: str,
+                  window_seconds: Optional[float] = None) -> Optional[MetricSummary]:
+        """Summarize one metric of a component over the last window_seconds."""
+        buffer = self._buffers.get(component, {}).get(metric)
+        if buffer is None:
+            return None
+        since = self.clock() - window_seconds if window_seconds is not None else None
+        return summarize_values(buffer.window(since), self.percentiles)
+
+    def summarize_component(self,
+                            component: str,
+                            window_seconds: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Summarize all metrics of a component over the last window_seconds."""
+        result = {}
+        for metric in self._buffers.get(component, {}):
+            summary = self.summarize(component, metric, window_seconds)
+            if summary is not None:
+                result[metric] = summary.as_dict()
+        return result
+
+    def create_check_completed(self,
+                               check_id: Optional[str] = None,
+                               window_seconds: Optional[float] = None,
+                               statuses: Optional[Dict[str, str]] = None,
+                               correlation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Build a health.check_completed event summarizing all components.
+
+        Components without samples in the window are reported as "unknown",
+        others as "healthy" unless overridden via statuses. The overall
+        status is the worst component status.
+        """
+        started = time.perf_counter()
+        statuses = statuses or {}
+        components = []
+        overall = "healthy"
+
+        for component in self._buffers:
+            details = self.summarize_component(component, window_seconds)
+            status = statuses.get(component, "healthy" if details else "unknown")
+            if STATUS_ORDER.index(status) > STATUS_ORDER.index(overall):
+                overall = status
+            entry = {
+                "component": component,
+                "status": status,
+                "details": details,
+            }
+            last_sample = self._last_sample.get(component)
+            if last_sample is not None:
+                entry["last_check"] = datetime.utcfromtimestamp(last_sample).isoformat() + "Z"
+            components.append(entry)
+
+        return self.converter.create_health_check_completed(
+            check_id or str(uuid.uuid4()),
+            overall,
+            components,
+            correlation_id=correlation_id,
+            check_duration_ms=int((time.perf_counter() - started) * 1000)
+        )
@@ -0,0 +1,15 @@
+"""Log capture utilities for sbox-common."""
+
+from .capture import LineSplitter, LogCapture, LogEntry, LogRingBuffer, detect_level, iter_lines
+from .segments import LogSegmentStore, SegmentIndex
+
+__all__ = [
+    "LineSplitter",
+    "LogCapture",
+    "LogEntry",
+    "LogRingBuffer",
+    "LogSegmentStore",
+    "SegmentIndex",
+    "detect_level",
+    "iter_lines",
+]
@@ -0,0 +1,340 @@
+"""
+Bounded log capture for managed service output.
+
+Backs the logging.* and services.*.stdout_capture settings of
+agent_config: raw stdout/stderr chunks are split into lines by a
+generator, tagged with service, stream and detected level, and kept in a
+fixed-size ring buffer holding at most max_entries entries. A per-service
+index makes "last N lines of service X since T" proportional to the
+result size, and memory stays constant however long the agent runs.
+With aggregation enabled, consecutive repeats of a line are counted on
+one entry instead of filling the buffer. Entries can also be written to
+an on-disk LogSegmentStore for retention beyond the ring.
+"""
+
+import asyncio
+import heapq
+import logging
+import re
+import time
+from collections import deque
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from .segments import LogSegmentStore
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+MAX_LINE_LENGTH = 64 * 1024
+
+# Detected level words, mapped to agent_config log_level values
+_LEVEL_PATTERN = re.compile(r"\b(TRACE|DEBUG|INFO|WARN|WARNING|ERROR|ERR|FATAL|CRITICAL|PANIC)\b", re.IGNORECASE)
+_LEVELS = {
+    "trace": "debug",
+    "debug": "debug",
+    "info": "info",
+    "warn": "warn",
+    "warning": "warn",
+    "err": "error",
+    "error": "error",
+    "fatal": "error",
+    "critical": "error",
+    "panic": "error",
+}
+_LEVEL_SCAN_LENGTH = 80
+
+
+class LogEntry(NamedTuple):
+    """A captured log line."""
+
+    seq: int
+    timestamp: float
+    service: str
+    stream: str
+    level: Optional[str]
+    message: str
+    repeat: int = 1
+    last_seen: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Convert entry to a JSON-serializable dict."""
+        return self._asdict()
+
+
+def detect_level(line: str) -> Optional[str]:
+    """Detect the log level of a line from a level word near its start."""
+    match = _LEVEL_PATTERN.search(line, 0, _LEVEL_SCAN_LENGTH)
+    if match is None:
+        return None
+    return _LEVELS[match.group(1).lower()]
+
+
+def iter_lines(chunks: Iterable[bytes], max_line_length: int = MAX_LINE_LENGTH) -> Iterator[str]:
+    """Split a stream of byte chunks into decoded lines.
+
+    Lines longer than max_line_length are cut, so a missing newline cannot
+    grow memory without bound. A trailing partial line is yielded at the
+    end of the stream.
+    """
+    splitter = LineSplitter(max_line_length)
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.flush()
+
+
+def _decode(line: bytes) -> str:
+    return line.rstrip(b"\r").decode('utf-8', errors='replace')
+
+
+class LineSplitter:
+    """Incremental line splitting for push-style chunk delivery."""
+
+    __slots__ = ("max_line_length", "_pending")
+
+    def __init__(self, max_line_length: int = MAX_LINE_LENGTH):
+        self.max_line_length = max_line_length
+        self._pending = bytearray()
+
+    def feed(self, data: bytes) -> List[str]:
+        """Add data; returns the lines completed by it."""
+        pending = self._pending
+        pending += data
+        lines = []
+        start = 0
+        while True:
+            end = pending.find(b"\n", start)
+            if end < 0:
+                break
+            lines.append(_decode(pending[start:end][:self.max_line_length]))
+            start = end + 1
+        del pending[:start]
+        if len(pending) > self.max_line_length:
+            lines.append(_decode(pending[:self.max_line_length]))
+            del pending[:]
+        return lines
+
+    def flush(self) -> List[str]:
+        """Return the pending partial line, if any."""
+        if not self._pending:
+            return []
+        line = _decode(self._pending)
+        del self._pending[:]
+        return [line]
+
+
+class LogRingBuffer:
+    """Fixed-capacity ring of log entries with a per-service index."""
+
+    def __init__(self, max_entries: int = 1000):
+        """Initialize buffer holding at most max_entries entries."""
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self._slots: List[Optional[LogEntry]] = [None] * max_entries
+        self._next = 0
+        self._count = 0
+        # Slot indexes per service, oldest first
+        self._by_service: Dict[str, Deque[int]] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def services(self) -> List[str]:
+        return list(self._by_service)
+
+    def append(self, entry: LogEntry) -> None:
+        """Append an entry, evicting the oldest one when full."""
+        index = self._next
+        evicted = self._slots[index]
+        if evicted is not None:
+            # The evicted entry is the oldest of its service as well
+            slots = self._by_service[evicted.service]
+            slots.popleft()
+            if not slots:
+                del self._by_service[evicted.service]
+        self._slots[index] = entry
+        self._by_service.setdefault(entry.service, deque()).append(index)
+        self._next = (index + 1) % self.max_entries
+        if self._count < self.max_entries:
+            self._count += 1
+
+    def last(self, service: str) -> Optional[LogEntry]:
+        """Get the most recent entry of service."""
+        slots = self._by_service.get(service)
+        return self._slots[slots[-1]] if slots else None
+
+    def replace_last(self, entry: LogEntry) -> None:
+        """Replace the most recent entry of entry.service (aggregation)."""
+        self._slots[self._by_service[entry.service][-1]] = entry
+
+    def _service_entries(self, service: str, since: Optional[float]) -> Iterator[LogEntry]:
+        """Entries of service newest first, stopping before since."""
+        slots = self._slots
+        for index in reversed(self._by_service.get(service, ())):
+            entry = slots[index]
+            if since is not None and entry.last_seen < since:
+                return
+            yield entry
+
+    def tail(self,
+             limit: Optional[int] = None,
+             service: Optional[str] = None,
+             since: Optional[float] = None) -> List[LogEntry]:
+        """Get the last limit entries (oldest first), optionally of one service since a time."""
+        services = [service] if service is not None else list(self._by_service)
+        newest_first = heapq.merge(*(self._service_entries(name, since) for name in services),
+                                   key=lambda entry: entry.seq, reverse=True)
+        result = []
+        for entry in newest_first:
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(entry)
+        result.reverse()
+        return result
+
+    def clear(self) -> None:
+        self._slots = [None] * self.max_entries
+        self._next = 0
+        self._count = 0
+        self._by_service.clear()
+
+
+class LogCapture:
+    """Captures service output into a bounded ring and optional segment store."""
+
+    def __init__(self,
+                 max_entries: int = 1000,
+                 aggregation: bool = True,
+                 store: Optional[LogSegmentStore] = None,
+                 services: Optional[Iterable[str]] = None,
+                 clock: Callable[[], float] = time.time):
+        """Initialize capture.
+
+        Args:
+            max_entries: Entries kept in memory (logging.max_entries)
+            aggregation: Count consecutive repeats of a line on one entry
+                (logging.aggregation)
+            store: On-disk segment store receiving every line
+            services: Services whose output is captured (all if None)
+            clock: Time source for entry timestamps
+        """
+        self.buffer = LogRingBuffer(max_entries)
+        self.aggregation = aggregation
+        self.store = store
+        self.services = frozenset(services) if services is not None else None
+        self.clock = clock
+        # Continue numbering after entries already in the store
+        self._seq = store.last_seq if store is not None else 0
+        self._splitters: Dict[tuple, LineSplitter] = {}
+
+    @classmethod
+    def from_config(cls, config: Any, directory: Optional[str] = None) -> "LogCapture":
+        """Create a capture from an AgentConfig.
+
+        Capture covers services with stdout_capture enabled; a segment
+        store with logging.retention_days is used if directory is given.
+        """
+        services = []
+        if config.sboxmgr is not None and config.sboxmgr.stdout_capture:
+            services.append("sboxmgr")
+        if not config.logging.stdout_capture:
+            services = []
+        store = LogSegmentStore(directory, retention_days=config.logging.retention_days) if directory else None
+        return cls(config.logging.max_entries, config.logging.aggregation, store, services)
+
+    def captures(self, service: str) -> bool:
+        """Whether output of service is captured."""
+        return self.services is None or service in self.services
+
+    def append(self,
+               service: str,
+               message: str,
+               stream: str = "stdout",
+               level: Optional[str] = None,
+               timestamp: Optional[float] = None) -> Optional[LogEntry]:
+        """Capture one line; returns its entry (None if not captured)."""
+        if not self.captures(service):
+            return None
+        if timestamp is None:
+            timestamp = self.clock()
+        if level is None:
+            level = detect_level(message)
+        self._seq += 1
+
+        if self.store is not None:
+            self.store.append(LogEntry(self._seq, timestamp, service, stream, level, message, 1, timestamp))
+
+        if self.aggregation:
+            last = self.buffer.last(service)
+            if last is not None and last.message == message and last.stream == stream:
+                entry = last._replace(repeat=last.repeat + 1, last_seen=timestamp, seq=self._seq)
+                self.buffer.replace_last(entry)
+                return entry
+
+        entry = LogEntry(self._seq, timestamp, service, stream, level, message, 1, timestamp)
+        self.buffer.append(entry)
+        return entry
+
+    def feed(self, service: str, data: bytes, stream: str = "stdout") -> List[LogEntry]:
+        """Capture a chunk of raw output; partial lines wait for more data."""
+        if not self.captures(service):
+            return []
+        key = (service, stream)
+        splitter = self._splitters.get(key)
+        if splitter is None:
+            splitter = self._splitters[key] = LineSplitter()
+        return [self.append(service, line, stream) for line in splitter.feed(data)]
+
+    def end_of_stream(self, service: str, stream: str = "stdout") -> List[LogEntry]:
+        """Capture the trailing partial line of a finished stream."""
+        splitter = self._splitters.pop((service, stream), None)
+        if splitter is None:
+            return []
+        return [self.append(service, line, stream) for line in splitter.flush()]
+
+    def capture_file(self, service: str, stream: BinaryIO, name: str = "stdout", chunk_size: int = 65536) -> int:
+        """Capture a binary stream (e.g. a subprocess pipe) until EOF; returns line count."""
+        count = 0
+        for line in iter_lines(iter(lambda: stream.read(chunk_size), b"")):
+            self.append(service, line, name)
+            count += 1
+        return count
+
+    async def capture_stream(self, service: str, reader: asyncio.StreamReader,
+                             name: str = "stdout", chunk_size: int = 65536) -> int:
+        """Capture an asyncio stream until EOF; returns line count."""
+        count = 0
+        while True:
+            data = await reader.read(chunk_size)
+            if not data:
+                break
+            count += len(self.feed(service, data, name))
+        return count + len(self.end_of_stream(service, name))
+
+    def tail(self,
+             limit: Optional[int] = None,
+             service: Optional[str] = None,
+             since: Optional[float] = None) -> List[LogEntry]:
+        """Get the most recent in-memory entries (oldest first)."""
+        return self.buffer.tail(limit, service, since)
+
+    def query(self,
+              limit: Optional[int] = None,
+              service: Optional[str] = None,
+              since: Optional[float] = None,
+              until: Optional[float] = None) -> List[LogEntry]:
+        """Query the segment store (the in-memory ring without one)."""
+        if self.store is None:
+            entries = self.buffer.tail(None, service, since)
+            if until is not None:
+                entries = [entry for entry in entries if entry.timestamp <= until]
+            return entries[max(len(entries) - limit, 0):] if limit is not None else entries
+        return self.store.query(limit, service, since, until)
+
+    def close(self) -> None:
+        """Flush partial lines and close the segment store."""
+        for service, stream in list(self._splitters):
+            self.end_of_stream(service, stream)
+        if self.store is not None:
+            self.store.close()
@@ -0,0 +1,280 @@
+"""
+On-disk log segments with time and service indexes.
+
+LogSegmentStore appends captured log entries as JSON lines to segment
+files of bounded size. For every segment it keeps a small index: the time
+range, per-service counts and time ranges, and a sparse (timestamp, offset)
+table. Indexes of closed segments are written next to them, so a query
+only opens segments that overlap the requested time range and contain the
+requested service, and seeks close to the start time within them.
+Segments older than retention_days are deleted.
+"""
+
+import bisect
+import json
+import logging
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:  # capture imports this module
+    from .capture import LogEntry
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+INDEX_INTERVAL = 256  # Entries between sparse index offsets
+
+_SEGMENT_SUFFIX = ".jsonl"
+_INDEX_SUFFIX = ".idx"
+
+
+class SegmentIndex:
+    """Time and service index of one segment."""
+
+    __slots__ = ("path", "first_seq", "last_seq", "start", "end", "count", "services", "offsets")
+
+    def __init__(self, path: Path, first_seq: int):
+        self.path = path
+        self.first_seq = first_seq
+        self.last_seq = first_seq - 1
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+        self.count = 0
+        # service -> [count, first timestamp, last timestamp]
+        self.services: Dict[str, List[Any]] = {}
+        # Sparse (timestamp, byte offset) pairs, every INDEX_INTERVAL entries
+        self.offsets: List[Tuple[float, int]] = []
+
+    def add(self, seq: int, service: str, timestamp: float, offset: int) -> None:
+        self.last_seq = max(self.last_seq, seq)
+        if self.count % INDEX_INTERVAL == 0:
+            self.offsets.append((timestamp, offset))
+        if self.start is None:
+            self.start = timestamp
+        self.end = timestamp
+        self.count += 1
+        stats = self.services.get(service)
+        if stats is None:
+            self.services[service] = [1, timestamp, timestamp]
+        else:
+            stats[0] += 1
+            stats[2] = timestamp
+
+    def overlaps(self, service: Optional[str], since: Optional[float], until: Optional[float]) -> bool:
+        """Whether the segment may contain matching entries."""
+        if service is not None:
+            stats = self.services.get(service)
+            if stats is None:
+                return False
+            start, end = stats[1], stats[2]
+        else:
+            start, end = self.start, self.end
+        if start is None:
+            return False
+        return (since is None or end >= since) and (until is None or start <= until)
+
+    def seek_offset(self, since: Optional[float]) -> int:
+        """Byte offset to start reading from for entries at or after since."""
+        if since is None or not self.offsets:
+            return 0
+        position = bisect.bisect_left(self.offsets, (since,)) - 1
+        return self.offsets[max(position, 0)][1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "first_seq": self.first_seq,
+            "last_seq": self.last_seq,
+            "start": self.start,
+            "end": self.end,
+            "count": self.count,
+            "services": self.services,
+            "offsets": self.offsets,
+        }
+
+    @classmethod
+    def from_dict(cls, path: Path, data: Dict[str, Any]) -> "SegmentIndex":
+        index = cls(path, data["first_seq"])
+        index.last_seq = data["last_seq"]
+        index.start = data["start"]
+        index.end = data["end"]
+        index.count = data["count"]
+        index.services = data["services"]
+        index.offsets = [tuple(pair) for pair in data["offsets"]]
+        return index
+
+
+class LogSegmentStore:
+    """Size-bounded JSON lines segments with indexes and retention."""
+
+    def __init__(self,
+                 directory: Union[Path, str],
+                 segment_size: int = DEFAULT_SEGMENT_SIZE,
+                 retention_days: Optional[int] = 30,
+                 clock: Callable[[], float] = time.time):
+        """Open store, loading or rebuilding the indexes of existing segments.
+
+        Args:
+            directory: Segment directory (created if missing)
+            segment_size: Segment size in bytes after which a new one is started
+            retention_days: Delete segments whose last entry is older (logging.retention_days)
+            clock: Time source for retention
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.retention_days = retention_days
+        self.clock = clock
+        self.segments: List[SegmentIndex] = []
+        self._file = None
+        self._active: Optional[SegmentIndex] = None
+        self._size = 0
+
+        for path in sorted(self.directory.glob(f"segment-*{_SEGMENT_SUFFIX}")):
+            self.segments.append(self._load_index(path))
+        self.purge()
+
+    @staticmethod
+    def _segment_path(directory: Path, first_seq: int) -> Path:
+        return directory / f"segment-{first_seq:016d}{_SEGMENT_SUFFIX}"
+
+    def _load_index(self, path: Path) -> SegmentIndex:
+        """Load a segment's index file, rebuilding it if missing or stale."""
+        index_path = path.with_suffix(_INDEX_SUFFIX)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                return SegmentIndex.from_dict(path, json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        first_seq = int(path.stem.split("-")[1])
+        index = SegmentIndex(path, first_seq)
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    index.add(record["seq"], record["service"], record["timestamp"], offset)
+                except (ValueError, KeyError):
+                    logger.warning(f"Skipping corrupt log record in {path}")
+                offset += len(line)
+        self._write_index(index)
+        return index
+
+    @staticmethod
+    def _write_index(index: SegmentIndex) -> None:
+        index_path = index.path.with_suffix(_INDEX_SUFFIX)
+        tmp_path = index_path.with_name(index_path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index.to_dict(), f, separators=(',', ':'))
+        os.replace(tmp_path, index_path)
+
+    @property
+    def last_seq(self) -> int:
+        """Highest entry sequence number stored (0 if empty)."""
+        return max((index.last_seq for index in self.segments), default=0)
+
+    def _open_segment(self, first_seq: int) -> None:
+        if self.segments:
+            # Keep segment names unique and ordered even if seq restarted
+            first_seq = max(first_seq, self.segments[-1].last_seq + 1, self.segments[-1].first_seq + 1)
+        path = self._segment_path(self.directory, first_seq)
+        self._active = SegmentIndex(path, first_seq)
+        self._file = open(path, 'ab')
+        self._size = 0
+        self.segments.append(self._active)
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._write_index(self._active)
+            self._active = None
+
+    def append(self, entry: "LogEntry") -> None:
+        """Append an entry, starting a new segment when the current one is full."""
+        if self._file is None or self._size >= self.segment_size:
+            self._close_segment()
+            self.purge()
+            self._open_segment(entry.seq)
+        record = {
+            "seq": entry.seq,
+            "timestamp": entry.timestamp,
+            "service": entry.service,
+            "stream": entry.stream,
+            "level": entry.level,
+            "message": entry.message,
+        }
+        line = json.dumps(record, separators=(',', ':')).encode('utf-8') + b"\n"
+        self._active.add(entry.seq, entry.service, entry.timestamp, self._size)
+        self._file.write(line)
+        self._size += len(line)
+
+    def flush(self) -> None:
+        """Flush buffered writes of the active segment."""
+        if self._file is not None:
+            self._file.flush()
+
+    def purge(self) -> int:
+        """Delete closed segments older than the retention period; returns the count."""
+        if self.retention_days is None:
+            return 0
+        cutoff = self.clock() - self.retention_days * 86400
+        kept = []
+        removed = 0
+        for index in self.segments:
+            if index is not self._active and index.end is not None and index.end < cutoff:
+                for path in (index.path, index.path.with_suffix(_INDEX_SUFFIX)):
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+                removed += 1
+            else:
+                kept.append(index)
+        self.segments = kept
+        return removed
+
+    def query(self,
+              limit: Optional[int] = None,
+              service: Optional[str] = None,
+              since: Optional[float] = None,
+              until: Optional[float] = None) -> List["LogEntry"]:
+        """Get the last limit matching entries, oldest first."""
+        from .capture import LogEntry
+
+        self.flush()
+        result: deque = deque()
+        # Newest segments first, so old segments are only read when needed
+        for index in reversed(self.segments):
+            if limit is not None and len(result) >= limit:
+                break
+            if not index.overlaps(service, since, until):
+                continue
+            matches = deque(maxlen=limit)
+            with open(index.path, 'rb') as f:
+                f.seek(index.seek_offset(since))
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn write after a crash
+                    timestamp = record["timestamp"]
+                    if since is not None and timestamp < since:
+                        continue
+                    if until is not None and timestamp > until:
+                        break
+                    if service is not None and record["service"] != service:
+                        continue
+                    matches.append(LogEntry(record["seq"], timestamp, record["service"], record["stream"],
+                                            record["level"], record["message"], 1, timestamp))
+            result.extendleft(reversed(matches))
+        entries = list(result)
+        return entries[max(len(entries) - limit, 0):] if limit is not None else entries
+
+    def close(self) -> None:
+        """Close the active segment and write its index."""
+        self._close_segment()
@@ -9,12 +9,17 @@ import json
 import logging
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 from pathlib import Path
 
 import jsonschema
 from jsonschema import ValidationError
 
+from .json_patch import JsonPatchError, apply_patch, config_hash, make_patch
+
+if TYPE_CHECKING:  # config.store imports this package
+    from ..config.store import ConfigStore
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
@@ -32,6 +37,7 @@ class EventConverter:
             schema_dir = Path(schema_dir)
         self.schema_dir = schema_dir
         self._schemas = {}
+        self._validators = {}
         self._load_schemas()
     
     def _load_schemas(self) -> None:
@@ -51,16 +57,41 @@ class EventConverter:
         if not self._schemas:
             logger.warning(f"No schemas found in directory: {self.schema_dir}")
     
+    def reload_schemas(self) -> None:
+        """Reload all event schemas and swap them in at once.
+        
+        The previous schemas stay in use if any schema fails to load or
+        compile (the error is raised).
+        """
+        schemas = {}
+        validators = {}
+        for schema_path in sorted(self.schema_dir.glob("*.json")):
+            with open(schema_path, 'r') as f:
+                schema = json.load(f)
+            validator_class = jsonschema.validators.validator_for(schema)
+            validator_class.check_schema(schema)
+            schemas[schema_path.stem] = schema
+            validators[schema_path.stem] = validator_class(schema)
+        self._schemas, self._validators = schemas, validators
+    
+    def _validator(self, schema_name: str):
+        """Get the compiled validator of a schema, compiling it on first use."""
+        validator = self._validators.get(schema_name)
+        if validator is None:
+            schema = self._schemas[schema_name]
+            validator = jsonschema.validators.validator_for(schema)(schema)
+            self._validators[schema_name] = validator
+        return validator
+    
     def validate_event(self, event: Dict[str, Any], schema_name: str) -> bool:
         """Validate event against schema."""
         if schema_name not in self._schemas:
             raise ValueError(f"Schema '{schema_name}' not found")
         
-        try:
-            jsonschema.validate(event, self._schemas[schema_name])
-            return True
-        except ValidationError as e:
-            raise ValidationError(f"Event validation failed: {e.message}")
+        error = jsonschema.exceptions.best_match(self._validator(schema_name).iter_errors(event))
+        if error is not None:
+            raise ValidationError(f"Event validation failed: {error.message}")
+        return True
     
     def create_event_base(self, 
                          event_type: str, 
@@ -87,6 +118,13 @@ class EventConverter:
 class SubscriptionEventConverter(EventConverter):
     """Converter for subscription events."""
     
+    def __init__(self,
+                 schema_dir: Optional[Union[Path, str]] = None,
+                 config_store: Optional["ConfigStore"] = None):
+        """Initialize converter with optional config store for change detection."""
+        super().__init__(schema_dir)
+        self.config_store = config_store
+    
     def create_subscription_created(self,
                                   subscription_data: Dict[str, Any],
                                   source: str = "sboxmgr",
@@ -148,8 +186,18 @@ class SubscriptionEventConverter(EventConverter):
                                            correlation_id: Optional[str] = None,
                                            error: Optional[str] = None,
                                            nodes_count: Optional[int] = None,
-                                           config_changed: Optional[bool] = None) -> Dict[str, Any]:
-        """Create subscription.update_completed event."""
+                                           config_changed: Optional[bool] = None,
+                                           config_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Create subscription.update_completed event.
+        
+        If config_changed is not given but config_data is and a config store
+        is attached, config_changed is computed by recording config_data in
+        the store under its config_id (or the subscription_id).
+        """
+        if config_changed is None and config_data is not None and self.config_store is not None:
+            key = config_data.get("config_id", subscription_id)
+            config_changed = self.config_store.record(key, config_data).changed
+        
         event = self.create_event_base("subscription.update_completed", source, correlation_id)
         event["data"] = {
             "subscription_id": subscription_id,
@@ -187,6 +235,101 @@ class ConfigEventConverter(EventConverter):
         event["data"] = config_data
         return event
     
+    def create_config_by_reference(self,
+                                   config_data: Dict[str, Any],
+                                   attachment: int = 0,
+                                   updated: bool = True,
+                                   source: str = "sboxmgr",
+                                   correlation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Create config.updated (or config.created) event without inline content.
+        
+        The content is replaced by a reference to a file descriptor attached
+        to the carrying socket message (see socket.fd_passing).
+        """
+        data = {key: value for key, value in config_data.items() if key != "content"}
+        data["content_ref"] = {"attachment": attachment}
+        event_type = "config.updated" if updated else "config.created"
+        event = self.create_event_base(event_type, source, correlation_id)
+        event["data"] = data
+        return event
+    
+    def create_config_patched(self,
+                            config_id: str,
+                            base_hash: str,
+                            result_hash: str,
+                            patch: List[Dict[str, Any]],
+                            source: str = "sboxmgr",
+                            correlation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Create config.patched event."""
+        event = self.create_event_base("config.patched", source, correlation_id)
+        event["data"] = {
+            "config_id": config_id,
+            "base_hash": base_hash,
+            "result_hash": result_hash,
+            "patch": patch
+        }
+        return event
+    
+    def create_config_delta(self,
+                          config_data: Dict[str, Any],
+                          base_config_data: Optional[Dict[str, Any]] = None,
+                          source: str = "sboxmgr",
+                          correlation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Create config.patched event against base_config_data.
+        
+        Falls back to a full config.updated event when the base is unknown,
+        belongs to another config_id, or the diff replaces the whole document.
+        """
+        if (base_config_data is None
+                or base_config_data.get("config_id") != config_data.get("config_id")):
+            return self.create_config_updated(config_data, source, correlation_id)
+        
+        patch = make_patch(base_config_data, config_data)
+        if any(operation["path"] == "" for operation in patch):
+            return self.create_config_updated(config_data, source, correlation_id)
+        
+        return self.create_config_patched(
+            config_data["config_id"],
+            config_hash(base_config_data),
+            config_hash(config_data),
+            patch,
+            source,
+            correlation_id
+        )
+    
+    def apply_config_event(self,
+                         event: Dict[str, Any],
+                         base_config_data: Optional[Dict[str, Any]] = None,
+                         base_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Resolve full config data from config.created/updated/patched event.
+        
+        For config.patched the base must match the event's base_hash (pass a
+        cached base_hash to skip rehashing the base) and the patched result
+        must match result_hash. Raises JsonPatchError otherwise, in which case
+        the consumer should request a full config.updated.
+        """
+        event_type = event.get("event_type")
+        if event_type in ("config.created", "config.updated"):
+            return event["data"]
+        if event_type != "config.patched":
+            raise ValueError(f"Event does not carry config data: {event_type}")
+        
+        data = event["data"]
+        if base_config_data is None:
+            raise JsonPatchError(f"Unknown base config for {data['config_id']}")
+        if base_hash is None:
+            base_hash = config_hash(base_config_data)
+        if base_hash != data["base_hash"]:
+            raise JsonPatchError(
+                f"Base config hash mismatch for {data['config_id']}: "
+                f"have {base_hash}, patch expects {data['base_hash']}"
+            )
+        
+        result = apply_patch(base_config_data, data["patch"])
+        if config_hash(result) != data["result_hash"]:
+            raise JsonPatchError(f"Patched config hash mismatch for {data['config_id']}")
+        return result
+    
     def create_config_deleted(self,
                             config_id: str,
                             source: str = "sboxmgr",
@@ -315,6 +458,23 @@ class HealthEventConverter(EventConverter):
             event["data"]["current_value"] = current_value
         
         return event
+    
+    def create_health_alert_resolved(self,
+                                   alert_id: str,
+                                   source: str = "sboxagent",
+                                   correlation_id: Optional[str] = None,
+                                   resolution_message: Optional[str] = None) -> Dict[str, Any]:
+        """Create health.alert_resolved event."""
+        event = self.create_event_base("health.alert_resolved", source, correlation_id)
+        event["data"] = {
+            "alert_id": alert_id,
+            "resolved_at": datetime.utcnow().isoformat() + "Z"
+        }
+        
+        if resolution_message:
+            event["data"]["resolution_message"] = resolution_message
+        
+        return event
 
 
 # Convenience function to get all converters
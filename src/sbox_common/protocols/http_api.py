@@ -0,0 +1,453 @@
+"""
+Asyncio HTTP API server and keep-alive client for api.schema.json.
+
+Requests are JSON bodies POSTed over HTTP/1.1 and dispatched by their
+"action" (update_config, get_status, health_check) through a handler
+table. Request and response schemas are compiled into one validator per
+action up front. ApiClient keeps a small pool of persistent connections
+per agent, so polling many agents does not open a connection per call.
+"""
+
+import asyncio
+import copy
+import hmac
+import json
+import logging
+import re
+import uuid
+from datetime import datetime
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import jsonschema
+from jsonschema import ValidationError
+
+from ..config.schema import AGENT_CONFIG_SCHEMA_ID, load_agent_config_schema
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+API_PROTOCOL_VERSION = "1.0.0"
+DEFAULT_PORT = 8080
+MAX_BODY_SIZE = 1024 * 1024
+
+_TRACE_ID = re.compile(r"^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$")
+
+# HTTP status for each error_code of base_response
+ERROR_STATUS = {
+    "OK": 200,
+    "INVALID_REQUEST": 400,
+    "PERMISSION_DENIED": 403,
+    "NOT_FOUND": 404,
+    "INTERNAL_ERROR": 500,
+    "SERVICE_UNAVAILABLE": 503,
+    "TIMEOUT": 504,
+}
+
+ApiHandler = Callable[[Dict[str, Any]], Union[Dict[str, Any], None, Awaitable[Optional[Dict[str, Any]]]]]
+
+
+class ApiError(Exception):
+    """API call failed with an error_code from api.schema.json."""
+
+    def __init__(self, error_code: str, message: str):
+        super().__init__(message)
+        self.error_code = error_code
+        self.message = message
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _replace_ref(node: Any, ref: str, replacement: Dict[str, Any]) -> Any:
+    """Replace {"$ref": ref} nodes (keeping sibling keywords) with replacement."""
+    if isinstance(node, dict):
+        if node.get("$ref") == ref:
+            merged = dict(replacement)
+            merged.update({k: v for k, v in node.items() if k != "$ref"})
+            merged.pop("$id", None)
+            merged.pop("$schema", None)
+            return merged
+        return {k: _replace_ref(v, ref, replacement) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_replace_ref(item, ref, replacement) for item in node]
+    return node
+
+
+class ApiValidators:
+    """Precompiled request and response validators per API action."""
+
+    def __init__(self,
+                 schema_path: Optional[Union[Path, str]] = None,
+                 config_schema: Optional[Dict[str, Any]] = None):
+        """Load api.schema.json and compile validators.
+
+        Args:
+            schema_path: Path to api.schema.json (packaged copy by default)
+            config_schema: Agent config schema used for update_config; looked
+                up with load_agent_config_schema() if not given
+        """
+        schema_path = Path(schema_path) if schema_path else Path(__file__).parent / "api.schema.json"
+        with open(schema_path, 'r', encoding='utf-8') as f:
+            self.schema = json.load(f)
+        if config_schema is None:
+            config_schema = load_agent_config_schema() or {"type": "object"}
+        self._config_schema = config_schema
+        self._validator_class = jsonschema.validators.validator_for(self.schema)
+
+        properties = self.schema["properties"]
+        self.requests = {
+            action: self._compile(schema)
+            for action, schema in properties["requests"]["properties"].items()
+        }
+        self.responses = {
+            action: self._compile(schema)
+            for action, schema in properties["responses"]["properties"].items()
+        }
+
+    @property
+    def actions(self) -> List[str]:
+        return list(self.requests)
+
+    def _compile(self, action_schema: Dict[str, Any]):
+        """Build a standalone schema for one action and compile it."""
+        schema = _replace_ref(copy.deepcopy(action_schema), AGENT_CONFIG_SCHEMA_ID, self._config_schema)
+        schema["$schema"] = self.schema.get("$schema")
+        schema["definitions"] = self.schema["definitions"]
+        self._validator_class.check_schema(schema)
+        return self._validator_class(schema)
+
+    def validate_request(self, request: Any) -> str:
+        """Validate a request; returns its action. Raises ApiError."""
+        if not isinstance(request, dict):
+            raise ApiError("INVALID_REQUEST", "Request must be a JSON object")
+        action = request.get("action")
+        validator = self.requests.get(action)
+        if validator is None:
+            raise ApiError("NOT_FOUND", f"Unknown action: {action!r}")
+        error = jsonschema.exceptions.best_match(validator.iter_errors(request))
+        if error is not None:
+            raise ApiError("INVALID_REQUEST", f"Request validation failed: {error.message}")
+        return action
+
+    def validate_response(self, action: str, response: Dict[str, Any]) -> None:
+        """Validate a response of action. Raises ValidationError."""
+        error = jsonschema.exceptions.best_match(self.responses[action].iter_errors(response))
+        if error is not None:
+            raise ValidationError(f"Response validation failed: {error.message}")
+
+
+def create_request(action: str, trace_id: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+    """Create an API request."""
+    request = {
+        "trace_id": trace_id or str(uuid.uuid4()),
+        "timestamp": _now(),
+        "action": action,
+        "protocol_version": API_PROTOCOL_VERSION,
+    }
+    request.update(fields)
+    return request
+
+
+def create_response(trace_id: str,
+                    data: Optional[Dict[str, Any]] = None,
+                    error_code: str = "OK",
+                    error_message: Optional[str] = None) -> Dict[str, Any]:
+    """Create an API response."""
+    response = {
+        "trace_id": trace_id,
+        "timestamp": _now(),
+        "success": error_code == "OK",
+        "error_code": error_code,
+    }
+    if error_message:
+        response["error_message"] = error_message
+    if data is not None:
+        response["data"] = data
+    return response
+
+
+async def _read_http_message(reader: asyncio.StreamReader,
+                             max_body_size: int) -> Optional[Tuple[str, Dict[str, str], bytes]]:
+    """Read an HTTP/1.1 message. Returns (start line, headers, body), None on EOF."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ValueError("Incomplete HTTP header")
+    except asyncio.LimitOverrunError:
+        raise ValueError("HTTP header too large")
+
+    lines = head.decode('latin-1').split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise ValueError("Chunked transfer encoding is not supported")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise ValueError("Invalid Content-Length")
+    if length < 0 or length > max_body_size:
+        raise ValueError(f"Body too large: {length} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return lines[0], headers, body
+
+
+def _keep_alive(version: str, headers: Dict[str, str]) -> bool:
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+
+class ApiServer:
+    """Asyncio HTTP server dispatching API requests to action handlers."""
+
+    def __init__(self,
+                 handlers: Dict[str, ApiHandler],
+                 validators: Optional[ApiValidators] = None,
+                 token: Optional[str] = None,
+                 validate_responses: bool = True,
+                 max_body_size: int = MAX_BODY_SIZE):
+        """Initialize server.
+
+        Args:
+            handlers: Maps action to a (sync or async) handler; the handler
+                gets the validated request and returns the response data,
+                or raises ApiError
+            validators: Precompiled API validators
+            token: Required bearer token (security.api_token), if any
+            validate_responses: Validate responses before sending them
+            max_body_size: Maximum accepted request body size
+        """
+        self.validators = validators or ApiValidators()
+        unknown = set(handlers) - set(self.validators.actions)
+        if unknown:
+            raise ValueError(f"Handlers for unknown actions: {sorted(unknown)}")
+        self.handlers = dict(handlers)
+        self.token = token
+        self.validate_responses = validate_responses
+        self.max_body_size = max_body_size
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.requests_served = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> None:
+        """Start listening."""
+        self.server = await asyncio.start_server(self._serve, host, port)
+
+    @property
+    def port(self) -> int:
+        """Port the server listens on."""
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        """Stop listening."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def dispatch(self, request: Any, authorization: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+        """Validate and dispatch a decoded request. Returns (HTTP status, response)."""
+        trace_id = request.get("trace_id") if isinstance(request, dict) else None
+        if not isinstance(trace_id, str) or not _TRACE_ID.match(trace_id):
+            trace_id = str(uuid.uuid4())
+
+        action = None
+        try:
+            if self.token is not None and not hmac.compare_digest(
+                    (authorization or "").encode('utf-8'), f"Bearer {self.token}".encode('utf-8')):
+                raise ApiError("PERMISSION_DENIED", "Invalid or missing API token")
+            action = self.validators.validate_request(request)
+            handler = self.handlers.get(action)
+            if handler is None:
+                raise ApiError("SERVICE_UNAVAILABLE", f"Action not supported: {action}")
+            data = handler(request)
+            if asyncio.iscoroutine(data):
+                data = await data
+            response = create_response(request["trace_id"], data)
+        except ApiError as e:
+            response = create_response(trace_id, error_code=e.error_code, error_message=e.message)
+        except Exception:
+            logger.exception(f"API handler for {action} failed")
+            response = create_response(trace_id, error_code="INTERNAL_ERROR", error_message="Internal error")
+
+        if self.validate_responses and action is not None:
+            try:
+                self.validators.validate_response(action, response)
+            except ValidationError as e:
+                logger.error(f"Invalid {action} response: {e.message}")
+                response = create_response(trace_id, error_code="INTERNAL_ERROR",
+                                           error_message="Invalid response")
+        return ERROR_STATUS.get(response["error_code"], 500), response
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve requests on one keep-alive connection."""
+        try:
+            while True:
+                try:
+                    message = await _read_http_message(reader, self.max_body_size)
+                except ValueError as e:
+                    await self._write(writer, 400, create_response(
+                        str(uuid.uuid4()), error_code="INVALID_REQUEST", error_message=str(e)), False)
+                    break
+                if message is None:
+                    break
+                start_line, headers, body = message
+                method, _, rest = start_line.partition(" ")
+                version = rest.rpartition(" ")[2]
+                keep_alive = _keep_alive(version, headers)
+
+                if method != "POST":
+                    status, response = 405, create_response(
+                        str(uuid.uuid4()), error_code="INVALID_REQUEST", error_message="Use POST")
+                else:
+                    try:
+                        request = json.loads(body)
+                    except ValueError:
+                        request = None
+                    status, response = await self.dispatch(request, headers.get("authorization"))
+                self.requests_served += 1
+                await self._write(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, status: int, response: Dict[str, Any], keep_alive: bool) -> None:
+        body = json.dumps(response, separators=(',', ':')).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n")
+        if not keep_alive:
+            head += "Connection: close\r\n"
+        writer.write(head.encode('latin-1') + b"\r\n" + body)
+        await writer.drain()
+
+
+class ApiClient:
+    """HTTP API client with a pool of keep-alive connections to one agent."""
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = DEFAULT_PORT,
+                 pool_size: int = 4,
+                 token: Optional[str] = None,
+                 timeout: float = 30.0,
+                 keep_alive: bool = True,
+                 validators: Optional[ApiValidators] = None,
+                 validate: bool = True):
+        """Initialize client.
+
+        Args:
+            host: Agent API host
+            port: Agent API port
+            pool_size: Maximum concurrent connections (and requests)
+            token: Bearer token sent with each request
+            timeout: Per-request timeout in seconds
+            keep_alive: Reuse connections between requests
+            validators: Precompiled API validators (shared between clients)
+            validate: Validate requests and responses
+        """
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.token = token
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.validators = validators or ApiValidators()
+        self.validate = validate
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    async def call(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a request and return the decoded response."""
+        action = request["action"]
+        if self.validate:
+            self.validators.validate_request(request)
+        body = json.dumps(request, separators=(',', ':')).encode('utf-8')
+        head = (f"POST /api HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n")
+        if self.token:
+            head += f"Authorization: Bearer {self.token}\r\n"
+        if not self.keep_alive:
+            head += "Connection: close\r\n"
+        data = head.encode('latin-1') + b"\r\n" + body
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            response = await asyncio.wait_for(self._roundtrip(data), self.timeout)
+        self.requests_sent += 1
+
+        if self.validate:
+            self.validators.validate_response(action, response)
+        return response
+
+    async def _roundtrip(self, data: bytes) -> Dict[str, Any]:
+        """Send data on an idle or new connection and read the response."""
+        while True:
+            reused = bool(self._idle)
+            if reused:
+                reader, writer = self._idle.pop()
+            else:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                self.connections_opened += 1
+            try:
+                writer.write(data)
+                await writer.drain()
+                message = await _read_http_message(reader, MAX_BODY_SIZE)
+                if message is None:
+                    raise ConnectionError("Connection closed by server")
+            except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue  # Stale keep-alive connection, retry on a new one
+                raise
+            except BaseException:
+                writer.close()
+                raise
+
+            start_line, headers, body = message
+            if self.keep_alive and _keep_alive(start_line.partition(" ")[0], headers):
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+            return json.loads(body)
+
+    async def request(self, action: str, **fields: Any) -> Dict[str, Any]:
+        """Call action and return the response data. Raises ApiError on failure."""
+        response = await self.call(create_request(action, **fields))
+        if not response["success"]:
+            raise ApiError(response.get("error_code", "INTERNAL_ERROR"),
+                           response.get("error_message", "Request failed"))
+        return response.get("data", {})
+
+    async def get_status(self) -> Dict[str, Any]:
+        return await self.request("get_status")
+
+    async def health_check(self) -> Dict[str, Any]:
+        return await self.request("health_check")
+
+    async def update_config(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.request("update_config", config=config)
+
+    async def close(self) -> None:
+        """Close idle connections."""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
@@ -0,0 +1,272 @@
+"""
+JSON Patch (RFC 6902) utilities for sbox-common.
+
+This module provides canonical hashing of JSON documents and helpers for
+computing and applying JSON patches, used to ship configuration deltas
+instead of full configuration payloads.
+"""
+
+import copy
+import hashlib
+import json
+from typing import Any, Dict, List
+
+
+class JsonPatchError(ValueError):
+    """Raised when a JSON patch cannot be applied."""
+
+
+def canonical_json(document: Any) -> bytes:
+    """Serialize document to canonical JSON bytes (sorted keys, no whitespace)."""
+    return json.dumps(document, sort_keys=True, separators=(',', ':'),
+                      ensure_ascii=False).encode('utf-8')
+
+
+def config_hash(document: Any) -> str:
+    """Compute SHA-256 hex digest of the canonical JSON form of document."""
+    return hashlib.sha256(canonical_json(document)).hexdigest()
+
+
+def _escape(token: Any) -> str:
+    """Escape a JSON pointer reference token."""
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token: str) -> str:
+    """Unescape a JSON pointer reference token."""
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def _split_pointer(pointer: str) -> List[str]:
+    """Split JSON pointer into unescaped reference tokens."""
+    if pointer == "":
+        return []
+    if not pointer.startswith('/'):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [_unescape(token) for token in pointer[1:].split('/')]
+
+
+def make_patch(source: Any, target: Any) -> List[Dict[str, Any]]:
+    """Compute a JSON patch transforming source into target.
+
+    Dicts are diffed key by key. Lists are diffed by trimming the common
+    prefix and suffix first, so appending, inserting or removing a single
+    element (e.g. one outbound) yields a single operation. Unchanged
+    subtrees are skipped via equality checks; values that compare equal
+    but serialize differently (1, 1.0 and True) count as changed.
+    """
+    operations: List[Dict[str, Any]] = []
+    _diff(source, target, "", operations)
+    return operations
+
+
+def _same_types(source: Any, target: Any) -> bool:
+    """Whether equal values also have the same types throughout."""
+    if type(source) is not type(target):
+        return False
+    if isinstance(source, dict):
+        return all(_same_types(value, target[key]) for key, value in source.items())
+    if isinstance(source, list):
+        return all(_same_types(a, b) for a, b in zip(source, target))
+    return True
+
+
+def _identical(source: Any, target: Any) -> bool:
+    """Whether source and target have the same canonical JSON form."""
+    return source == target and _same_types(source, target)
+
+
+def _member(operation: Dict[str, Any], name: str, kind: type = object) -> Any:
+    """Get a required member of a patch operation."""
+    if name not in operation or not isinstance(operation[name], kind):
+        raise JsonPatchError(f"Operation missing {name}: {operation}")
+    return operation[name]
+
+
+def _diff(source: Any, target: Any, path: str, operations: List[Dict[str, Any]]) -> None:
+    """Append operations transforming source into target at path."""
+    if _identical(source, target):
+        return
+
+    if isinstance(source, dict) and isinstance(target, dict):
+        for key in source:
+            if key not in target:
+                operations.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in target.items():
+            child_path = f"{path}/{_escape(key)}"
+            if key not in source:
+                operations.append({"op": "add", "path": child_path, "value": value})
+            else:
+                _diff(source[key], value, child_path, operations)
+        return
+
+    if isinstance(source, list) and isinstance(target, list):
+        _diff_list(source, target, path, operations)
+        return
+
+    operations.append({"op": "replace", "path": path, "value": target})
+
+
+def _diff_list(source: List[Any], target: List[Any], path: str,
+               operations: List[Dict[str, Any]]) -> None:
+    """Append operations transforming source list into target list at path."""
+    source_len = len(source)
+    target_len = len(target)
+
+    # Trim common prefix and suffix
+    start = 0
+    limit = min(source_len, target_len)
+    while start < limit and _identical(source[start], target[start]):
+        start += 1
+    end = 0
+    while (end < limit - start
+           and _identical(source[source_len - 1 - end], target[target_len - 1 - end])):
+        end += 1
+
+    source_mid = source_len - start - end
+    target_mid = target_len - start - end
+    common = min(source_mid, target_mid)
+
+    # Diff the overlapping middle section element-wise
+    for offset in range(common):
+        index = start + offset
+        _diff(source[index], target[index], f"{path}/{index}", operations)
+
+    # Remove surplus elements from the end backwards so indices stay valid
+    for index in range(start + source_mid - 1, start + common - 1, -1):
+        operations.append({"op": "remove", "path": f"{path}/{index}"})
+
+    # Insert missing elements in order
+    for index in range(start + common, start + target_mid):
+        operations.append({"op": "add", "path": f"{path}/{index}", "value": target[index]})
+
+
+def apply_patch(document: Any, patch: List[Dict[str, Any]], in_place: bool = False) -> Any:
+    """Apply a JSON patch to document and return the result.
+
+    Unless in_place is set, only the containers along modified paths are
+    copied; untouched subtrees are shared with the original document.
+    """
+    applier = _PatchApplier(document, in_place)
+    for operation in patch:
+        applier.apply(operation)
+    return applier.root[0]
+
+
+class _PatchApplier:
+    """Applies patch operations with copy-on-write of touched containers."""
+
+    def __init__(self, document: Any, in_place: bool):
+        self.root = [document]
+        self._in_place = in_place
+        self._owned = set()
+
+    def _own(self, parent: Any, key: Any) -> Any:
+        """Return parent[key], shallow-copying it first if not yet owned."""
+        child = parent[key]
+        if self._in_place or id(child) in self._owned:
+            return child
+        if isinstance(child, dict):
+            child = dict(child)
+        elif isinstance(child, list):
+            child = list(child)
+        else:
+            return child
+        parent[key] = child
+        self._owned.add(id(child))
+        return child
+
+    def _resolve_parent(self, tokens: List[str], pointer: str) -> Any:
+        """Walk to the (owned) container holding the last token."""
+        container = self._own(self.root, 0)
+        for token in tokens[:-1]:
+            key = self._key(container, token, pointer)
+            try:
+                container = self._own(container, key)
+            except (KeyError, IndexError):
+                raise JsonPatchError(f"Path not found: {pointer}")
+        return container
+
+    @staticmethod
+    def _key(container: Any, token: str, pointer: str, allow_end: bool = False) -> Any:
+        """Convert a reference token to a dict key or list index."""
+        if isinstance(container, dict):
+            return token
+        if isinstance(container, list):
+            if allow_end and token == '-':
+                return len(container)
+            if not token.isdigit() or (token.startswith('0') and token != '0'):
+                raise JsonPatchError(f"Invalid list index in path: {pointer}")
+            index = int(token)
+            upper = len(container) if allow_end else len(container) - 1
+            if index > upper:
+                raise JsonPatchError(f"List index out of range: {pointer}")
+            return index
+        raise JsonPatchError(f"Path does not reference a container: {pointer}")
+
+    def _get(self, pointer: str) -> Any:
+        """Read value at pointer without copying."""
+        value = self.root[0]
+        for token in _split_pointer(pointer):
+            key = self._key(value, token, pointer)
+            try:
+                value = value[key]
+            except (KeyError, IndexError):
+                raise JsonPatchError(f"Path not found: {pointer}")
+        return value
+
+    def _add(self, pointer: str, value: Any) -> None:
+        """Add value at pointer (insert for lists, set for dicts)."""
+        tokens = _split_pointer(pointer)
+        if not tokens:
+            self.root[0] = value
+            return
+        parent = self._resolve_parent(tokens, pointer)
+        key = self._key(parent, tokens[-1], pointer, allow_end=True)
+        if isinstance(parent, list):
+            parent.insert(key, value)
+        else:
+            parent[key] = value
+
+    def _remove(self, pointer: str) -> Any:
+        """Remove and return value at pointer."""
+        tokens = _split_pointer(pointer)
+        if not tokens:
+            raise JsonPatchError("Cannot remove document root")
+        parent = self._resolve_parent(tokens, pointer)
+        key = self._key(parent, tokens[-1], pointer)
+        try:
+            return parent.pop(key)
+        except KeyError:
+            raise JsonPatchError(f"Path not found: {pointer}")
+
+    def apply(self, operation: Dict[str, Any]) -> None:
+        """Apply a single patch operation."""
+        op = operation.get("op")
+        pointer = operation.get("path")
+        if not isinstance(pointer, str):
+            raise JsonPatchError(f"Operation missing path: {operation}")
+
+        if op == "add":
+            self._add(pointer, _member(operation, "value"))
+        elif op == "remove":
+            self._remove(pointer)
+        elif op == "replace":
+            value = _member(operation, "value")
+            if _split_pointer(pointer):
+                self._remove(pointer)
+            self._add(pointer, value)
+        elif op == "move":
+            from_pointer = _member(operation, "from", str)
+            if pointer.startswith(from_pointer + "/"):
+                raise JsonPatchError(f"Cannot move {from_pointer} into its own child")
+            self._add(pointer, self._remove(from_pointer))
+        elif op == "copy":
+            self._add(pointer, copy.deepcopy(self._get(_member(operation, "from", str))))
+        elif op == "test":
+            # Type-sensitive, so that true does not pass as 1
+            if not _identical(self._get(pointer), _member(operation, "value")):
+                raise JsonPatchError(f"Test failed at {pointer}")
+        else:
+            raise JsonPatchError(f"Unsupported patch operation: {op!r}")
+
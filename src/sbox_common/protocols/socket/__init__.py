@@ -1,5 +1,46 @@
 """Socket protocol utilities for sbox-common."""
 
-from .framed_json import FramedJSONProtocol
+from .broadcast import BroadcastHub, Subscriber
+from .fd_passing import FdPassingConnection
+from .flow_control import AsyncFlowControlledConnection, FlowControlledConnection
+from .framed_json import DeadlineExceeded, FramedJSONProtocol
+from .handshake import Handshake, SessionParameters
+from .heartbeat import CompactHeartbeatSender
+from .loadgen import LoadGenerator, LoadProfile
+from .offload import AsyncOffloader
+from .scheduler import PrioritySendScheduler
+from .server import SelectorServer
+from .shm_ring import SharedMemoryTransport
+from .spool import FrameSpool, SpoolingSender
+from .templates import TemplateEncoder
+from .tracing import TraceCollector, Tracer
+from .traffic import CaptureProxy, CaptureWriter, TappedStream, read_capture, replay_capture
 
-__all__ = ["FramedJSONProtocol"] 
\ No newline at end of file
+__all__ = [
+    "AsyncFlowControlledConnection",
+    "AsyncOffloader",
+    "BroadcastHub",
+    "CaptureProxy",
+    "CaptureWriter",
+    "CompactHeartbeatSender",
+    "DeadlineExceeded",
+    "FdPassingConnection",
+    "FlowControlledConnection",
+    "FrameSpool",
+    "FramedJSONProtocol",
+    "Handshake",
+    "LoadGenerator",
+    "LoadProfile",
+    "PrioritySendScheduler",
+    "SelectorServer",
+    "SessionParameters",
+    "SharedMemoryTransport",
+    "SpoolingSender",
+    "Subscriber",
+    "TappedStream",
+    "TemplateEncoder",
+    "TraceCollector",
+    "Tracer",
+    "read_capture",
+    "replay_capture",
+] 
\ No newline at end of file
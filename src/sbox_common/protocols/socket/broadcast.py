@@ -0,0 +1,222 @@
+"""
+Encode-once broadcast fan-out for framed JSON messages.
+
+A message published through BroadcastHub is validated and encoded exactly
+once; the resulting immutable bytes frame is queued to every subscriber.
+Each subscriber has its own bounded queue and overflow policy, so a slow
+peer drops messages or gets disconnected instead of stalling the others.
+Subscribers may carry an event filter (see filters.py) that is evaluated
+before encoding; a message no subscriber wants is never encoded.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .filters import MessageFilter, filter_from_command
+from .framed_json import FramedJSONProtocol
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Overflow policies for slow subscribers
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+
+
+class Subscriber:
+    """Bounded outbound frame queue of a single broadcast subscriber."""
+
+    def __init__(self,
+                 name: Optional[str] = None,
+                 max_messages: int = 1000,
+                 max_bytes: Optional[int] = None,
+                 policy: str = DROP_OLDEST,
+                 notify: Optional[Callable[[], None]] = None,
+                 filter: Optional[MessageFilter] = None):
+        """Initialize subscriber queue.
+
+        Args:
+            name: Subscriber name used in logs
+            max_messages: Maximum number of queued frames
+            max_bytes: Maximum number of queued bytes (unlimited if None)
+            policy: Overflow policy (drop_oldest, drop_newest or disconnect)
+            notify: Callback invoked when a frame is queued
+            filter: Predicate selecting the messages this subscriber receives
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unsupported overflow policy: {policy!r}")
+        self.name = name
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.notify = notify
+        self.filter = filter
+        self.filtered = 0
+        self.queue: Deque[bytes] = deque()
+        self.queued_bytes = 0
+        self.dropped = 0
+        self.closed = False
+
+    def _over_limit(self, incoming: int) -> bool:
+        """Check whether queuing incoming bytes would exceed the limits."""
+        if len(self.queue) >= self.max_messages:
+            return True
+        return self.max_bytes is not None and self.queued_bytes + incoming > self.max_bytes
+
+    def offer(self, frame: bytes) -> bool:
+        """Queue frame, applying the overflow policy. Returns True if queued."""
+        if self.closed:
+            return False
+
+        size = len(frame)
+        if self._over_limit(size):
+            if self.policy == DISCONNECT:
+                logger.warning(f"Disconnecting slow subscriber {self.name}")
+                self.close()
+                return False
+            if self.policy == DROP_NEWEST:
+                self.dropped += 1
+                return False
+            while self.queue and self._over_limit(size):
+                self.queued_bytes -= len(self.queue.popleft())
+                self.dropped += 1
+            if self._over_limit(size):
+                # Frame alone exceeds max_bytes
+                self.dropped += 1
+                return False
+
+        self.queue.append(frame)
+        self.queued_bytes += size
+        if self.notify is not None:
+            self.notify()
+        return True
+
+    def pop_all(self) -> List[bytes]:
+        """Remove and return all queued frames."""
+        frames = list(self.queue)
+        self.queue.clear()
+        self.queued_bytes = 0
+        return frames
+
+    def flush(self, writer) -> int:
+        """Write all queued frames to a blocking writer. Returns frames written."""
+        frames = self.pop_all()
+        for frame in frames:
+            writer.write(frame)
+        if frames:
+            writer.flush()
+        return len(frames)
+
+    def close(self) -> None:
+        """Close subscriber and discard queued frames."""
+        self.closed = True
+        self.pop_all()
+        if self.notify is not None:
+            self.notify()
+
+
+class BroadcastHub:
+    """Publishes encode-once frames to many subscribers."""
+
+    def __init__(self, protocol: Optional[FramedJSONProtocol] = None):
+        """Initialize hub with protocol used for encoding."""
+        self.protocol = protocol or FramedJSONProtocol()
+        self.subscribers: List[Subscriber] = []
+        self._tasks: Dict[Subscriber, "asyncio.Task"] = {}
+
+    def subscribe(self, **kwargs: Any) -> Subscriber:
+        """Register a new subscriber (see Subscriber for options)."""
+        subscriber = Subscriber(**kwargs)
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """Remove a subscriber and close it."""
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+        subscriber.close()
+        task = self._tasks.pop(subscriber, None)
+        if task is not None:
+            task.cancel()
+
+    def publish(self, message: Dict[str, Any]) -> int:
+        """Validate and encode message once and queue it to matching subscribers."""
+        recipients = []
+        for subscriber in self.subscribers:
+            if subscriber.filter is None or subscriber.filter(message):
+                recipients.append(subscriber)
+            else:
+                subscriber.filtered += 1
+        if not recipients:
+            return 0
+        return self._offer(self.protocol.encode_message(message), recipients)
+
+    def publish_frame(self, frame: bytes) -> int:
+        """Queue an already encoded frame to all subscribers.
+
+        Filters are not applied to pre-encoded frames. Returns the number of
+        subscribers the frame was queued to. Subscribers closed by the
+        disconnect policy are removed.
+        """
+        return self._offer(frame, list(self.subscribers))
+
+    def _offer(self, frame: bytes, subscribers: List[Subscriber]) -> int:
+        delivered = 0
+        closed = []
+        for subscriber in subscribers:
+            if subscriber.offer(frame):
+                delivered += 1
+            elif subscriber.closed:
+                closed.append(subscriber)
+        for subscriber in closed:
+            self.unsubscribe(subscriber)
+        return delivered
+
+    def apply_subscribe(self, subscriber: Subscriber, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Install the filter of a subscribe command; returns the response message."""
+        try:
+            subscriber.filter = filter_from_command(message)
+        except ValueError as e:
+            return self.protocol.create_response_message(
+                message["id"], "error", error={"code": "invalid_filter", "message": str(e)}
+            )
+        return self.protocol.create_response_message(message["id"], "success")
+
+    def subscribe_stream(self, stream_writer: asyncio.StreamWriter, **kwargs: Any) -> Subscriber:
+        """Register a subscriber drained into an asyncio stream writer.
+
+        A background task writes queued frames and awaits drain(), so a peer
+        that stops reading only fills its own queue.
+        """
+        wakeup = asyncio.Event()
+        subscriber = self.subscribe(notify=wakeup.set, **kwargs)
+        self._tasks[subscriber] = asyncio.ensure_future(
+            self._pump(subscriber, stream_writer, wakeup)
+        )
+        return subscriber
+
+    async def _pump(self,
+                    subscriber: Subscriber,
+                    stream_writer: asyncio.StreamWriter,
+                    wakeup: asyncio.Event) -> None:
+        """Write subscriber frames to stream_writer until closed."""
+        try:
+            while not subscriber.closed:
+                await wakeup.wait()
+                wakeup.clear()
+                frames = subscriber.pop_all()
+                if frames:
+                    stream_writer.writelines(frames)
+                    await stream_writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+                subscriber.close()
+            self._tasks.pop(subscriber, None)
+            stream_writer.close()
@@ -0,0 +1,284 @@
+"""
+File descriptor passing for large payloads on Unix sockets.
+
+Large contents such as full sing-box configs can be sent as a sealed memfd
+attached (SCM_RIGHTS) to a small framed message instead of being embedded
+in the JSON. The message lists its descriptors in "attachments" (size,
+sha256, media type) and config events refer to them with "content_ref".
+The receiver can mmap the content or copy it to disk in the kernel without
+parsing it.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import socket
+import tempfile
+from array import array
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from jsonschema import ValidationError
+
+from ..converters import ConfigEventConverter
+from .framed_json import FramedJSONProtocol
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+MAX_FDS_PER_MESSAGE = 16
+_FD_SIZE = array('i').itemsize
+
+
+def create_sealed_memfd(data: bytes, name: str = "sbox-attachment") -> int:
+    """Write data to a new memfd and seal it against modification.
+
+    Falls back to an unlinked temporary file where memfd is not available.
+    The caller owns the returned descriptor.
+    """
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create(name, os.MFD_CLOEXEC | os.MFD_ALLOW_SEALING)
+    else:
+        with tempfile.TemporaryFile() as f:
+            fd = os.dup(f.fileno())
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        os.lseek(fd, 0, os.SEEK_SET)
+        if hasattr(fcntl, "F_ADD_SEALS"):
+            try:
+                fcntl.fcntl(fd, fcntl.F_ADD_SEALS,
+                            fcntl.F_SEAL_SHRINK | fcntl.F_SEAL_GROW
+                            | fcntl.F_SEAL_WRITE | fcntl.F_SEAL_SEAL)
+            except OSError:
+                pass  # Temporary files cannot be sealed
+    except OSError:
+        os.close(fd)
+        raise
+    return fd
+
+
+def describe_attachment(data: bytes, media_type: Optional[str] = None) -> Dict[str, Any]:
+    """Create the attachments entry for data."""
+    attachment = {
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+    if media_type:
+        attachment["media_type"] = media_type
+    return attachment
+
+
+def check_sealed(fd: int) -> None:
+    """Check that an attachment cannot be modified, where sealing is supported.
+
+    Raises ValueError for unsealed descriptors: the sender could change the
+    content after its checksum was verified.
+    """
+    if not hasattr(fcntl, "F_GET_SEALS"):
+        return
+    required = fcntl.F_SEAL_SHRINK | fcntl.F_SEAL_GROW | fcntl.F_SEAL_WRITE
+    try:
+        seals = fcntl.fcntl(fd, fcntl.F_GET_SEALS)
+    except OSError:
+        seals = 0  # Not a memfd
+    if seals & required != required:
+        raise ValueError("Attachment is not sealed against modification")
+
+
+def map_attachment(fd: int, size: int) -> mmap.mmap:
+    """Map a sealed attachment read-only. size must be positive."""
+    check_sealed(fd)
+    return mmap.mmap(fd, size, prot=mmap.PROT_READ)
+
+
+def write_attachment(fd: int, path: str, size: int, sha256: Optional[str] = None) -> None:
+    """Copy an attachment to path atomically without reading it into Python.
+
+    The content is checked against sha256 (if given) before the file is
+    moved into place. Raises ValueError on size or checksum mismatch.
+    """
+    if sha256 is not None and size:
+        with map_attachment(fd, size) as mapped:
+            if hashlib.sha256(mapped).hexdigest() != sha256:
+                raise ValueError(f"Attachment checksum mismatch for {path}")
+
+    tmp_path = f"{path}.tmp"
+    out = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        copied = _copy_fd(fd, out, size)
+    finally:
+        os.close(out)
+    if copied != size:
+        os.unlink(tmp_path)
+        raise ValueError(f"Attachment size mismatch: expected {size}, got {copied}")
+    os.replace(tmp_path, path)
+
+
+def _copy_fd(src: int, dst: int, size: int) -> int:
+    """Copy size bytes from the start of src to dst, in the kernel if possible."""
+    copied = 0
+    copy_file_range = getattr(os, "copy_file_range", None)
+    try:
+        while copied < size:
+            if copy_file_range is not None:
+                count = copy_file_range(src, dst, size - copied, copied)
+            else:
+                count = os.sendfile(dst, src, copied, size - copied)
+            if not count:
+                break
+            copied += count
+        return copied
+    except OSError:
+        # Not supported between these files, copy in user space
+        pass
+    while copied < size:
+        data = os.pread(src, min(size - copied, 1 << 20), copied)
+        if not data:
+            break
+        view = memoryview(data)
+        while view:
+            view = view[os.write(dst, view):]
+        copied += len(data)
+    return copied
+
+
+class FdPassingConnection:
+    """Framed message connection over a Unix socket with descriptor passing.
+
+    Descriptors travel with the first byte of their message frame, so
+    messages must not be split into interleaved chunk frames.
+    """
+
+    def __init__(self,
+                 sock: socket.socket,
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 max_fds: int = MAX_FDS_PER_MESSAGE):
+        """Initialize connection over a connected AF_UNIX socket."""
+        self.sock = sock
+        self.protocol = protocol or FramedJSONProtocol()
+        self.max_fds = max_fds
+        self._buffer = bytearray()
+        self._fds: Deque[int] = deque()
+        self._eof = False
+
+    def send_message(self, message: Dict[str, Any], fds: Sequence[int] = ()) -> None:
+        """Send message with descriptors attached to its frame."""
+        if len(fds) > self.max_fds:
+            raise ValueError(f"Too many descriptors: {len(fds)} > {self.max_fds}")
+        frame = self.protocol.encode_message(message)
+        ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array('i', fds))] if fds else []
+        sent = self.sock.sendmsg([frame], ancillary)
+        if sent < len(frame):
+            self.sock.sendall(frame[sent:])
+
+    def write_message(self, message: Dict[str, Any]) -> None:
+        """Send message without descriptors."""
+        self.send_message(message)
+
+    def send_with_attachments(self,
+                              message: Dict[str, Any],
+                              contents: Sequence[bytes],
+                              media_type: Optional[str] = None) -> None:
+        """Send contents as sealed memfd attachments of message."""
+        message["attachments"] = [describe_attachment(data, media_type) for data in contents]
+        fds = []
+        try:
+            for data in contents:
+                fds.append(create_sealed_memfd(data))
+            self.send_message(message, fds)
+        finally:
+            # The peer holds its own references once sent
+            for fd in fds:
+                os.close(fd)
+
+    def read(self, size: int) -> bytes:
+        """File-like read used by the protocol frame reader."""
+        while len(self._buffer) < size and not self._eof:
+            self._recv()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _recv(self) -> None:
+        """Receive data and any descriptors sent with it."""
+        data, ancdata, flags, _ = self.sock.recvmsg(
+            65536, socket.CMSG_SPACE(self.max_fds * _FD_SIZE)
+        )
+        for level, kind, payload in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                fds = array('i')
+                fds.frombytes(payload[:len(payload) - len(payload) % _FD_SIZE])
+                self._fds.extend(fds)
+        if flags & socket.MSG_CTRUNC:
+            logger.warning("Descriptor ancillary data truncated")
+        if not data:
+            self._eof = True
+        self._buffer += data
+
+    def receive(self) -> Tuple[Optional[Dict[str, Any]], List[int]]:
+        """Receive the next message and its descriptors.
+
+        The caller owns the returned descriptors. Returns (None, []) on EOF.
+        """
+        payload = self.protocol.read_payload(self)
+        if payload is None:
+            return None, []
+        try:
+            message = self.protocol.decode_payload(payload)
+        except (ValueError, ValidationError):
+            self._discard_fds(payload)
+            raise
+        count = len(message.get("attachments", ()))
+        if count > len(self._fds):
+            received = len(self._fds)
+            # Those that did arrive belong to this message, close them
+            while self._fds:
+                os.close(self._fds.popleft())
+            raise ValueError(f"Message expects {count} descriptors, received {received}")
+        return message, [self._fds.popleft() for _ in range(count)]
+
+    def _discard_fds(self, payload: bytes) -> None:
+        """Close the descriptors of a message that was not decoded."""
+        try:
+            count = len(json.loads(payload).get("attachments", ()))
+        except (ValueError, AttributeError, TypeError):
+            count = len(self._fds)  # Unreadable, the pending descriptors are not trusted
+        for _ in range(min(count, len(self._fds))):
+            os.close(self._fds.popleft())
+
+    def read_message(self) -> Optional[Dict[str, Any]]:
+        """Receive the next message, closing any attached descriptors."""
+        message, fds = self.receive()
+        for fd in fds:
+            os.close(fd)
+        return message
+
+    def close(self) -> None:
+        """Close unclaimed descriptors and the socket."""
+        while self._fds:
+            os.close(self._fds.popleft())
+        self.sock.close()
+
+
+def send_config_by_reference(connection: FdPassingConnection,
+                             config_data: Dict[str, Any],
+                             converter: Optional[ConfigEventConverter] = None,
+                             updated: bool = True,
+                             correlation_id: Optional[str] = None) -> Dict[str, Any]:
+    """Send a config event with its content attached as a sealed memfd.
+
+    Returns the sent socket message.
+    """
+    converter = converter or ConfigEventConverter()
+    event = converter.create_config_by_reference(
+        config_data, attachment=0, updated=updated, correlation_id=correlation_id
+    )
+    content = json.dumps(config_data["content"], separators=(',', ':')).encode('utf-8')
+    message = connection.protocol.create_event_message(event, correlation_id)
+    connection.send_with_attachments(message, [content], "application/json")
+    return message
@@ -0,0 +1,116 @@
+"""
+Producer-side event filters.
+
+A consumer sends a "subscribe" command carrying an EventFilter: event_type
+patterns plus equality predicates on event data fields, e.g.
+
+    {"event_types": ["health.alert_*"], "where": {"severity": ["critical", "high"]}}
+
+The producer compiles the filter once into a predicate and evaluates it
+before encoding, so each connection only receives (and costs) the events
+it asked for. Filters apply to event messages only; other message types
+are always delivered.
+"""
+
+import fnmatch
+import re
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from .framed_json import FramedJSONProtocol
+
+SUBSCRIBE_COMMAND = "subscribe"
+
+MessageFilter = Callable[[Dict[str, Any]], bool]
+
+_MISSING = object()
+
+
+def _compile_event_types(patterns: Sequence[str]) -> Callable[[str], bool]:
+    """Compile event type patterns into a matcher."""
+    exact = frozenset(p for p in patterns if not any(c in p for c in "*?["))
+    wildcards = [p for p in patterns if p not in exact]
+    if not wildcards:
+        return exact.__contains__
+    regex = re.compile("|".join(fnmatch.translate(p) for p in wildcards))
+    return lambda event_type: event_type in exact or regex.match(event_type) is not None
+
+
+def _compile_predicate(path: str, expected: Any) -> Tuple[Tuple[str, ...], FrozenSet[Any]]:
+    values = expected if isinstance(expected, list) else [expected]
+    if not all(v is None or isinstance(v, (str, int, float)) for v in values):
+        # Also reached with validation disabled, where a list value would
+        # otherwise fail hashing with a TypeError
+        raise ValueError(f"where values for {path!r} must be strings, numbers, booleans or null")
+    # Keep True/1 and False/0 apart, as JSON does
+    return tuple(path.split(".")), frozenset((type(v) is bool, v) for v in values)
+
+
+def _lookup(data: Any, path: Tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(data, dict):
+            return _MISSING
+        data = data.get(key, _MISSING)
+        if data is _MISSING:
+            return _MISSING
+    return data
+
+
+def compile_filter(spec: Optional[Dict[str, Any]]) -> MessageFilter:
+    """Compile an EventFilter into a predicate over protocol messages.
+
+    Raises ValueError for malformed filters.
+    """
+    spec = spec or {}
+    unknown = set(spec) - {"event_types", "where"}
+    if unknown:
+        raise ValueError(f"Unknown filter fields: {sorted(unknown)}")
+
+    patterns = spec.get("event_types")
+    if patterns is not None and (not isinstance(patterns, list)
+                                 or not all(isinstance(p, str) and p for p in patterns)):
+        raise ValueError("event_types must be a list of non-empty strings")
+    where = spec.get("where") or {}
+    if not isinstance(where, dict):
+        raise ValueError("where must be an object")
+
+    type_matches = _compile_event_types(patterns) if patterns is not None else None
+    predicates = [_compile_predicate(path, expected) for path, expected in where.items()]
+
+    def accepts(message: Dict[str, Any]) -> bool:
+        if message.get("type") != "event":
+            return True
+        event = message.get("event", {})
+        if type_matches is not None and not type_matches(event.get("event_type", "")):
+            return False
+        data = event.get("data")
+        for path, allowed in predicates:
+            value = _lookup(data, path)
+            try:
+                if value is _MISSING or (type(value) is bool, value) not in allowed:
+                    return False
+            except TypeError:
+                return False  # Unhashable value, e.g. an object
+        return True
+
+    return accepts
+
+
+def create_subscribe_command(protocol: FramedJSONProtocol,
+                             event_types: Optional[List[str]] = None,
+                             where: Optional[Dict[str, Any]] = None,
+                             correlation_id: Optional[str] = None) -> Dict[str, Any]:
+    """Create a subscribe command message carrying an event filter."""
+    event_filter: Dict[str, Any] = {}
+    if event_types is not None:
+        event_filter["event_types"] = event_types
+    if where:
+        event_filter["where"] = where
+    return protocol.create_command_message(SUBSCRIBE_COMMAND, {"filter": event_filter}, correlation_id)
+
+
+def filter_from_command(message: Dict[str, Any]) -> MessageFilter:
+    """Compile the filter of a subscribe command message."""
+    command = message.get("command", {})
+    if command.get("command") != SUBSCRIBE_COMMAND:
+        raise ValueError(f"Not a subscribe command: {command.get('command')!r}")
+    return compile_filter(command.get("params", {}).get("filter"))
@@ -0,0 +1,317 @@
+"""
+Credit-based flow control for the framed JSON protocol.
+
+Each side grants its peer a window of message and byte credits with
+"credit" control messages. A sender spends one message credit and the
+payload size in byte credits per message and pauses once it runs out;
+the receiver returns credits as the application consumes messages. The
+amount of unread data a peer can push is therefore bounded by the window:
+a message arriving after the peer spent all granted credits is a protocol
+error and closes the connection.
+
+A message may overdraw the byte credit as long as some byte credit is
+left, so messages larger than the byte window still make progress.
+Without a negotiated credit_flow feature (see handshake.py) connections
+send and receive without credits.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from jsonschema import ValidationError
+
+from .framed_json import DeadlineExceeded, FramedJSONProtocol
+from .handshake import FEATURE_CREDIT_FLOW
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_MESSAGES = 64
+DEFAULT_WINDOW_BYTES = 4 * 1024 * 1024
+
+
+class CreditWindow:
+    """Sender-side credit balance."""
+
+    __slots__ = ("messages", "bytes")
+
+    def __init__(self, messages: int = 0, bytes_: int = 0):
+        self.messages = messages
+        self.bytes = bytes_
+
+    def grant(self, messages: int, bytes_: int) -> None:
+        """Add credits granted by the peer."""
+        self.messages += messages
+        self.bytes += bytes_
+
+    def can_send(self) -> bool:
+        """Check whether another message may be sent."""
+        return self.messages > 0 and self.bytes > 0
+
+    def consume(self, size: int) -> None:
+        """Spend credits for a message of size payload bytes."""
+        self.messages -= 1
+        self.bytes -= size
+
+
+class CreditGranter:
+    """Receiver-side credit accounting.
+
+    Credits are returned in batches once half of the window has been
+    consumed, to avoid one credit message per received message.
+    """
+
+    def __init__(self,
+                 window_messages: int = DEFAULT_WINDOW_MESSAGES,
+                 window_bytes: int = DEFAULT_WINDOW_BYTES):
+        if window_messages < 1 or window_bytes < 1:
+            raise ValueError("Window sizes must be positive")
+        self.window_messages = window_messages
+        self.window_bytes = window_bytes
+        self._messages = 0
+        self._bytes = 0
+        # Credits granted to the peer and not yet spent by it
+        self.outstanding = CreditWindow()
+
+    def initial(self) -> Tuple[int, int]:
+        """Credits granted when the connection starts."""
+        self.outstanding.grant(self.window_messages, self.window_bytes)
+        return self.window_messages, self.window_bytes
+
+    def received(self, size: int) -> None:
+        """Record a message sent by the peer, checking it had credits for it.
+
+        Raises ValueError if the peer exceeded the granted window.
+        """
+        if not self.outstanding.can_send():
+            raise ValueError("Peer exceeded its credit window")
+        self.outstanding.consume(size)
+
+    def consumed(self, size: int) -> Optional[Tuple[int, int]]:
+        """Record a consumed message; return credits to grant, if due."""
+        self._messages += 1
+        self._bytes += size
+        if self._messages * 2 >= self.window_messages or self._bytes * 2 >= self.window_bytes:
+            grant = (self._messages, self._bytes)
+            self._messages = 0
+            self._bytes = 0
+            self.outstanding.grant(*grant)
+            return grant
+        return None
+
+
+class FlowControlledConnection:
+    """Blocking framed connection with credit-based flow control."""
+
+    def __init__(self,
+                 reader,
+                 writer,
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 window_messages: int = DEFAULT_WINDOW_MESSAGES,
+                 window_bytes: int = DEFAULT_WINDOW_BYTES):
+        """Initialize connection over file-like reader and writer.
+
+        Args:
+            reader: Object with read() method (e.g. socket.makefile('rb'))
+            writer: Object with write() and flush() methods
+            protocol: Protocol used to encode and decode messages
+            window_messages: Receive window in messages granted to the peer
+            window_bytes: Receive window in payload bytes granted to the peer
+        """
+        self.reader = reader
+        self.writer = writer
+        self.protocol = protocol or FramedJSONProtocol()
+        self.credits = CreditWindow()
+        self.granter = CreditGranter(window_messages, window_bytes)
+        self._inbox: Deque[Tuple[Dict[str, Any], int]] = deque()
+        self._eof = False
+
+    @property
+    def flow_controlled(self) -> bool:
+        """Whether the peer negotiated credit flow control."""
+        return self.protocol.has_feature(FEATURE_CREDIT_FLOW)
+
+    def start(self) -> None:
+        """Grant the initial receive window to the peer."""
+        if self.flow_controlled:
+            self._send_credit(*self.granter.initial())
+
+    def _send_credit(self, messages: int, bytes_: int) -> None:
+        self.protocol.write_message(self.writer, self.protocol.create_credit_message(messages, bytes_))
+
+    def _consumed(self, size: int) -> None:
+        """Return credits for a consumed message when due (not after EOF)."""
+        if self.flow_controlled and not self._eof:
+            grant = self.granter.consumed(size)
+            if grant is not None:
+                self._send_credit(*grant)
+
+    def _received(self, size: int) -> None:
+        """Check that the peer had credits for a message."""
+        if self.flow_controlled:
+            try:
+                self.granter.received(size)
+            except ValueError:
+                self._eof = True  # Nothing more is read from a misbehaving peer
+                raise
+
+    def _read_one(self) -> Optional[Tuple[Dict[str, Any], int]]:
+        """Read one message, applying it if it is a credit message.
+
+        Returns (message, payload size) for application messages, None for
+        credit messages, expired commands and on EOF. Raises ValueError if
+        the peer sent beyond its credit window.
+        """
+        payload = self.protocol.read_payload(self.reader)
+        if payload is None:
+            self._eof = True
+            return None
+        try:
+            message = self.protocol.decode_payload(payload)
+        except DeadlineExceeded:
+            # Dropped unread, but its credits are returned like a consumed message
+            self._received(len(payload))
+            self._consumed(len(payload))
+            return None
+        if message.get("type") == "credit":
+            self.credits.grant(message["credit"]["messages"], message["credit"]["bytes"])
+            return None
+        self._received(len(payload))
+        return message, len(payload)
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """Send message, blocking until the peer has granted credits.
+
+        Messages that arrive while waiting for credits are buffered and
+        returned by later receive() calls.
+        """
+        payload = self.protocol.encode_payload(message)
+        while self.flow_controlled and not self.credits.can_send():
+            if self._eof:
+                raise ConnectionError("Connection closed while waiting for credits")
+            item = self._read_one()
+            if item is not None:
+                self._inbox.append(item)
+        self.credits.consume(len(payload))
+        self.writer.write(self.protocol.frame_payload(payload))
+        self.writer.flush()
+
+    def receive(self) -> Optional[Dict[str, Any]]:
+        """Receive the next message and return credits for it. None on EOF."""
+        while not self._inbox:
+            if self._eof:
+                return None
+            item = self._read_one()
+            if item is not None:
+                self._inbox.append(item)
+        message, size = self._inbox.popleft()
+        self._consumed(size)
+        return message
+
+
+class AsyncFlowControlledConnection:
+    """Asyncio framed connection with credit-based flow control."""
+
+    def __init__(self,
+                 reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter,
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 window_messages: int = DEFAULT_WINDOW_MESSAGES,
+                 window_bytes: int = DEFAULT_WINDOW_BYTES):
+        """Initialize connection over asyncio streams (see FlowControlledConnection)."""
+        self.reader = reader
+        self.writer = writer
+        self.protocol = protocol or FramedJSONProtocol()
+        self.credits = CreditWindow()
+        self.granter = CreditGranter(window_messages, window_bytes)
+        self._inbox: "asyncio.Queue[Optional[Tuple[Dict[str, Any], int]]]" = asyncio.Queue()
+        self._credit_available = asyncio.Event()
+        self._reader_task: Optional["asyncio.Task"] = None
+        self._eof = False
+
+    @property
+    def flow_controlled(self) -> bool:
+        """Whether the peer negotiated credit flow control."""
+        return self.protocol.has_feature(FEATURE_CREDIT_FLOW)
+
+    async def start(self) -> None:
+        """Grant the initial receive window and start the reader task."""
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+        if self.flow_controlled:
+            await self._send_credit(*self.granter.initial())
+
+    async def _send_credit(self, messages: int, bytes_: int) -> None:
+        await self.protocol.write_message_async(
+            self.writer, self.protocol.create_credit_message(messages, bytes_)
+        )
+
+    async def _consumed(self, size: int) -> None:
+        """Return credits for a consumed message when due (not after EOF)."""
+        if self.flow_controlled and not self._eof:
+            grant = self.granter.consumed(size)
+            if grant is not None:
+                await self._send_credit(*grant)
+
+    def _received(self, size: int) -> None:
+        """Check that the peer had credits for a message."""
+        if self.flow_controlled:
+            self.granter.received(size)
+
+    async def _read_loop(self) -> None:
+        """Read frames, applying credits and queueing application messages."""
+        try:
+            while True:
+                payload = await self.protocol.read_payload_async(self.reader)
+                if payload is None:
+                    break
+                try:
+                    message = self.protocol.decode_payload(payload)
+                except DeadlineExceeded:
+                    # Dropped unread, but its credits are returned like a consumed message
+                    self._received(len(payload))
+                    await self._consumed(len(payload))
+                    continue
+                if message.get("type") == "credit":
+                    self.credits.grant(message["credit"]["messages"], message["credit"]["bytes"])
+                    self._credit_available.set()
+                else:
+                    # Bounded by the credits we granted to the peer
+                    self._received(len(payload))
+                    self._inbox.put_nowait((message, len(payload)))
+        except (ConnectionError, ValueError, ValidationError) as e:
+            logger.warning(f"Flow controlled connection read failed: {e}")
+            self.writer.close()
+        finally:
+            self._eof = True
+            self._credit_available.set()
+            self._inbox.put_nowait(None)
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        """Send message, waiting until the peer has granted credits."""
+        payload = self.protocol.encode_payload(message)
+        while self.flow_controlled and not self.credits.can_send():
+            if self._eof:
+                raise ConnectionError("Connection closed while waiting for credits")
+            self._credit_available.clear()
+            await self._credit_available.wait()
+        self.credits.consume(len(payload))
+        self.writer.write(self.protocol.frame_payload(payload))
+        await self.writer.drain()
+
+    async def receive(self) -> Optional[Dict[str, Any]]:
+        """Receive the next message and return credits for it. None on EOF."""
+        item = await self._inbox.get()
+        if item is None:
+            self._inbox.put_nowait(None)
+            return None
+        message, size = item
+        await self._consumed(size)
+        return message
+
+    async def close(self) -> None:
+        """Stop the reader task and close the stream."""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        self.writer.close()
@@ -5,12 +5,17 @@ This module provides utilities for sending and receiving framed JSON messages
 over Unix sockets with proper framing and validation.
 """
 
+import asyncio
+import copy
 import json
 import struct
+import threading
+import time
 import uuid
+import zlib
 import logging
 from datetime import datetime
-from typing import Any, Dict, Optional, Tuple, Union
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
 from pathlib import Path
 
 import jsonschema
@@ -19,6 +24,50 @@ from jsonschema import ValidationError
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Partially received chunked messages allowed per connection
+DEFAULT_MAX_CHUNK_STREAMS = 16
+
+
+class _Counter:
+    """Thread-safe counter, shared by copies of a protocol."""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def increment(self) -> None:
+        with self._lock:
+            self._value += 1
+
+
+class _CompiledSchema:
+    """Protocol schema and its validator, shared by the sessions of a protocol."""
+
+    def __init__(self, schema: Optional[Dict[str, Any]], validator: Any):
+        self.schema = schema
+        self.validator = validator
+        self.generation = 0
+
+    def swap(self, schema: Dict[str, Any], validator: Any) -> None:
+        self.schema, self.validator = schema, validator
+        self.generation += 1
+
+
+class DeadlineExceeded(ValueError):
+    """A received command expired before it was validated and handled."""
+
+    def __init__(self, message_id: Optional[str], deadline: float):
+        super().__init__(message_id, deadline)
+        self.message_id = message_id
+        self.deadline = deadline
+
+    def __str__(self) -> str:
+        return f"Command {self.message_id} expired at {self.deadline:.3f}"
+
 
 class FramedJSONProtocol:
     """Framed JSON protocol for Unix socket communication."""
@@ -26,6 +75,14 @@ class FramedJSONProtocol:
     # Protocol constants
     FRAME_HEADER_SIZE = 8  # 4 bytes for length + 4 bytes for version
     PROTOCOL_VERSION = 1
+    SUPPORTED_VERSIONS = (1,)
+    MAX_MESSAGE_SIZE = 1024 * 1024  # 1MB limit
+    
+    # Frame flags carried in the upper 16 bits of the version word
+    FRAME_FLAGS_MASK = 0xFFFF0000
+    FRAME_FLAG_CHUNK = 0x00010000  # Payload is a chunk of a larger message
+    FRAME_FLAG_FINAL = 0x00020000  # Last chunk of a message
+    FRAME_FLAG_ZLIB = 0x00040000  # Payload is zlib-compressed
     
     def __init__(self, schema_dir: Optional[Union[Path, str]] = None):
         """Initialize protocol with schema directory."""
@@ -36,28 +93,112 @@ class FramedJSONProtocol:
         elif isinstance(schema_dir, str):
             schema_dir = Path(schema_dir)
         self.schema_dir = schema_dir
+        self.chunks = ChunkReassembler(self)
+        # Session parameters, adjusted by configure() after a handshake
+        self.version = self.PROTOCOL_VERSION
+        self.max_message_size = self.MAX_MESSAGE_SIZE
+        self.validation_enabled = True
+        self.compression_threshold: Optional[int] = None
+        # Negotiated optional features; none until a handshake (or configure())
+        # enables them, so legacy peers only ever see plain frames
+        self.features: FrozenSet[str] = frozenset()
+        # Drop received commands whose deadline has passed
+        self.enforce_deadlines = True
+        self._expired = _Counter()
         self._load_schemas()
     
     def _load_schemas(self) -> None:
         """Load protocol schemas."""
         schema_path = self.schema_dir / "protocol_v1.schema.json"
         if schema_path.exists():
-            with open(schema_path, 'r') as f:
-                self._protocol_schema = json.load(f)
+            self._schemas = _CompiledSchema(*self._compile_schema(schema_path))
         else:
             logger.warning(f"Schema file not found: {schema_path}")
-            self._protocol_schema = None
+            self._schemas = _CompiledSchema(None, None)
+    
+    @property
+    def _protocol_schema(self) -> Optional[Dict[str, Any]]:
+        return self._schemas.schema
+    
+    @property
+    def _validator(self) -> Any:
+        return self._schemas.validator
+    
+    @property
+    def schema_generation(self) -> int:
+        """Number of times the protocol schema was reloaded."""
+        return self._schemas.generation
+    
+    @staticmethod
+    def _compile_schema(schema_path: Path) -> Tuple[Dict[str, Any], Any]:
+        """Load a schema, check it and compile it once instead of on every message."""
+        with open(schema_path, 'r') as f:
+            schema = json.load(f)
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        return schema, validator_class(schema)
+    
+    def reload_schemas(self) -> None:
+        """Recompile the protocol schema and swap it in.
+        
+        The previous validator stays in use if the new schema cannot be
+        loaded (the error is raised).
+        """
+        self._schemas.swap(*self._compile_schema(self.schema_dir / "protocol_v1.schema.json"))
+    
+    def configure(self,
+                  version: Optional[int] = None,
+                  max_message_size: Optional[int] = None,
+                  validation_enabled: Optional[bool] = None,
+                  compression_threshold: Optional[int] = None,
+                  features: Optional[Iterable[str]] = None) -> None:
+        """Apply negotiated session parameters.
+        
+        Args:
+            version: Protocol version written in frame headers
+            max_message_size: Maximum accepted payload size
+            validation_enabled: Whether messages are validated against the schema
+            compression_threshold: Payloads larger than this are zlib-compressed
+                (negative disables compression)
+            features: Optional features agreed with the peer
+        """
+        if version is not None:
+            if version not in self.SUPPORTED_VERSIONS:
+                raise ValueError(f"Unsupported protocol version: {version}")
+            self.version = version
+        if max_message_size is not None:
+            self.max_message_size = max_message_size
+        if validation_enabled is not None:
+            self.validation_enabled = validation_enabled
+        if compression_threshold is not None:
+            self.compression_threshold = compression_threshold if compression_threshold >= 0 else None
+        if features is not None:
+            self.features = frozenset(features)
+    
+    def has_feature(self, feature: str) -> bool:
+        """Whether an optional feature may be used with the peer."""
+        return feature in self.features
+    
+    def session(self) -> "FramedJSONProtocol":
+        """Copy for one connection, sharing the (reloadable) schema and counters.
+        
+        Session parameters configured on the copy and its chunk reassembly
+        state do not affect the original.
+        """
+        session = copy.copy(self)
+        session.chunks = ChunkReassembler(session, self.chunks.max_streams)
+        return session
     
     def validate_message(self, message: Dict[str, Any]) -> bool:
         """Validate message against protocol schema."""
-        if not self._protocol_schema:
+        validator = self._validator
+        if not self.validation_enabled or validator is None:
             return True  # Skip validation if schema not available
         
-        try:
-            jsonschema.validate(message, self._protocol_schema)
-            return True
-        except ValidationError as e:
-            raise ValidationError(f"Message validation failed: {e.message}")
+        error = jsonschema.exceptions.best_match(validator.iter_errors(message))
+        if error is not None:
+            raise ValidationError(f"Message validation failed: {error.message}")
+        return True
     
     def create_message_base(self, 
                            message_type: str,
@@ -89,15 +230,47 @@ class FramedJSONProtocol:
     def create_command_message(self,
                              command: str,
                              params: Dict[str, Any],
-                             correlation_id: Optional[str] = None) -> Dict[str, Any]:
-        """Create command message."""
+                             correlation_id: Optional[str] = None,
+                             timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Create command message.
+        
+        A timeout (the seconds the client waits for the response) sets the
+        command deadline, after which receivers drop the command unhandled.
+        """
         message = self.create_message_base("command", correlation_id)
         message["command"] = {
             "command": command,
             "params": params
         }
+        if timeout is not None:
+            message["command"]["deadline"] = time.time() + timeout
         return message
     
+    def is_expired(self, message: Dict[str, Any], now: Optional[float] = None) -> bool:
+        """Whether message is a command whose deadline has passed."""
+        command = message.get("command")
+        if message.get("type") != "command" or not isinstance(command, dict):
+            return False
+        deadline = command.get("deadline")
+        if isinstance(deadline, bool) or not isinstance(deadline, (int, float)):
+            return False  # Left to schema validation
+        return (time.time() if now is None else now) >= deadline
+    
+    @property
+    def expired_commands(self) -> int:
+        """Number of received commands dropped after their deadline."""
+        return self._expired.value
+    
+    def count_expired(self) -> None:
+        """Count an expired command dropped elsewhere (e.g. in a worker process)."""
+        self._expired.increment()
+    
+    def check_deadline(self, message: Dict[str, Any]) -> None:
+        """Count and raise DeadlineExceeded for an expired command."""
+        if self.enforce_deadlines and self.is_expired(message):
+            self._expired.increment()
+            raise DeadlineExceeded(message.get("id"), message["command"]["deadline"])
+    
     def create_response_message(self,
                               request_id: str,
                               status: str,
@@ -120,15 +293,23 @@ class FramedJSONProtocol:
     
     def create_heartbeat_message(self,
                                agent_id: str,
-                               status: str,
+                               status: Optional[str],
                                uptime_seconds: Optional[float] = None,
-                               version: Optional[str] = None) -> Dict[str, Any]:
-        """Create heartbeat message."""
+                               version: Optional[str] = None,
+                               delta: bool = False,
+                               seq: Optional[int] = None) -> Dict[str, Any]:
+        """Create heartbeat message.
+        
+        Compact (delta) heartbeats may omit status and carry only the
+        fields that changed since the last full heartbeat.
+        """
         message = self.create_message_base("heartbeat")
-        message["heartbeat"] = {
-            "agent_id": agent_id,
-            "status": status
-        }
+        message["heartbeat"] = {"agent_id": agent_id}
+        
+        if status is not None:
+            message["heartbeat"]["status"] = status
+        elif not delta:
+            raise ValueError("status is required for full heartbeats")
         
         if uptime_seconds is not None:
             message["heartbeat"]["uptime_seconds"] = uptime_seconds
@@ -136,48 +317,102 @@ class FramedJSONProtocol:
         if version:
             message["heartbeat"]["version"] = version
         
+        if delta:
+            message["heartbeat"]["delta"] = True
+        
+        if seq is not None:
+            message["heartbeat"]["seq"] = seq
+        
         return message
     
-    def encode_message(self, message: Dict[str, Any]) -> bytes:
-        """Encode message to framed JSON bytes."""
+    def create_credit_message(self, messages: int, bytes_: int) -> Dict[str, Any]:
+        """Create flow control credit message granting the peer more sends."""
+        message = self.create_message_base("credit")
+        message["credit"] = {
+            "messages": messages,
+            "bytes": bytes_
+        }
+        return message
+    
+    def encode_payload(self, message: Dict[str, Any]) -> bytes:
+        """Validate message and encode it to JSON bytes without frame header."""
         # Validate message
         self.validate_message(message)
         
         # Convert to JSON string
         json_str = json.dumps(message, separators=(',', ':'))
-        json_bytes = json_str.encode('utf-8')
+        return json_str.encode('utf-8')
+    
+    def _compress(self, json_bytes: bytes) -> Tuple[bytes, int]:
+        """Compress payload if enabled and worthwhile. Returns (data, flags)."""
+        if self.compression_threshold is None or len(json_bytes) <= self.compression_threshold:
+            return json_bytes, 0
+        compressed = zlib.compress(json_bytes, 1)
+        if len(compressed) >= len(json_bytes):
+            return json_bytes, 0
+        return compressed, self.FRAME_FLAG_ZLIB
+    
+    def _decompress(self, data: bytes) -> bytes:
+        """Decompress a zlib payload, enforcing the message size limit."""
+        decompressor = zlib.decompressobj()
+        try:
+            payload = decompressor.decompress(data, self.max_message_size + 1)
+        except zlib.error as e:
+            raise ValueError(f"Invalid compressed payload: {e}")
+        if len(payload) > self.max_message_size or decompressor.unconsumed_tail:
+            raise ValueError(f"Message too large: more than {self.max_message_size} bytes")
+        return payload
+    
+    def frame_payload(self, json_bytes: bytes) -> bytes:
+        """Prepend frame header to an encoded JSON payload."""
+        data, flags = self._compress(json_bytes)
         
         # Create frame header: 4 bytes length + 4 bytes version
-        frame_header = struct.pack('>II', len(json_bytes), self.PROTOCOL_VERSION)
+        frame_header = struct.pack('>II', len(data), self.version | flags)
         
         # Combine header and data
-        return frame_header + json_bytes
+        return frame_header + data
     
-    def decode_message(self, data: bytes) -> Tuple[Dict[str, Any], int]:
-        """Decode framed JSON message from bytes.
+    def encode_message(self, message: Dict[str, Any]) -> bytes:
+        """Encode message to framed JSON bytes."""
+        return self.frame_payload(self.encode_payload(message))
+    
+    def encode_chunks(self, payload: bytes, stream_id: int, chunk_size: int) -> List[bytes]:
+        """Split an encoded JSON payload into chunk frames.
         
-        Returns:
-            Tuple of (message, bytes_consumed)
+        Each chunk frame carries the chunk flag in the version word and starts
+        with a 4-byte stream id, so chunks of several large messages can be
+        interleaved with regular frames on one connection.
         """
-        if len(data) < self.FRAME_HEADER_SIZE:
-            raise ValueError("Insufficient data for frame header")
-        
-        # Extract frame header
-        length, version = struct.unpack('>II', data[:self.FRAME_HEADER_SIZE])
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        payload, compressed = self._compress(payload)
+        frames = []
+        stream_header = struct.pack('>I', stream_id)
+        last = max(len(payload) - 1, 0) // chunk_size
+        for index in range(last + 1):
+            data = payload[index * chunk_size:(index + 1) * chunk_size]
+            flags = self.FRAME_FLAG_CHUNK | compressed | (self.FRAME_FLAG_FINAL if index == last else 0)
+            header = struct.pack('>II', len(data) + 4, self.version | flags)
+            frames.append(header + stream_header + data)
+        return frames
+    
+    def parse_header(self, header: bytes) -> Tuple[int, int]:
+        """Parse and check frame header. Returns (length, flags)."""
+        length, version = struct.unpack('>II', header)
+        flags = version & self.FRAME_FLAGS_MASK
+        version &= ~self.FRAME_FLAGS_MASK
         
-        if version != self.PROTOCOL_VERSION:
+        if version not in self.SUPPORTED_VERSIONS:
             raise ValueError(f"Unsupported protocol version: {version}")
         
-        if length > 1024 * 1024:  # 1MB limit
+        if length > self.max_message_size:
             raise ValueError(f"Message too large: {length} bytes")
         
-        # Check if we have enough data
-        total_size = self.FRAME_HEADER_SIZE + length
-        if len(data) < total_size:
-            raise ValueError(f"Insufficient data: need {total_size}, have {len(data)}")
-        
-        # Extract JSON data
-        json_bytes = data[self.FRAME_HEADER_SIZE:self.FRAME_HEADER_SIZE + length]
+        return length, flags
+    
+    def decode_payload(self, json_bytes: bytes) -> Dict[str, Any]:
+        """Parse and validate a JSON payload."""
         json_str = json_bytes.decode('utf-8')
         
         # Parse JSON
@@ -186,53 +421,135 @@ class FramedJSONProtocol:
         except json.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON: {e}")
         
+        # Shed expired commands before paying for validation
+        if isinstance(message, dict):
+            self.check_deadline(message)
+        
         # Validate message
         self.validate_message(message)
         
-        return message, total_size
+        return message
     
-    def read_message(self, reader) -> Optional[Dict[str, Any]]:
-        """Read a complete message from a reader object.
-        
-        Args:
-            reader: Object with read() method (file, socket, etc.)
+    def unpack_payload(self, flags: int, data: bytes) -> bytes:
+        """Undo payload encodings signalled by frame flags."""
+        if flags & self.FRAME_FLAG_ZLIB:
+            return self._decompress(data)
+        return data
+    
+    def decode_message(self, data: bytes) -> Tuple[Optional[Dict[str, Any]], int]:
+        """Decode framed JSON message from bytes.
         
         Returns:
-            Message dict or None if no data available
+            Tuple of (message, bytes_consumed). The message is None for a
+            chunk frame that does not complete its message yet.
         """
-        # Read frame header
-        header_data = reader.read(self.FRAME_HEADER_SIZE)
-        if not header_data:
-            return None  # No data available
+        if len(data) < self.FRAME_HEADER_SIZE:
+            raise ValueError("Insufficient data for frame header")
         
-        if len(header_data) < self.FRAME_HEADER_SIZE:
-            raise ValueError("Incomplete frame header")
+        # Extract frame header
+        length, flags = self.parse_header(data[:self.FRAME_HEADER_SIZE])
         
-        # Extract length and version
-        length, version = struct.unpack('>II', header_data)
+        # Check if we have enough data
+        total_size = self.FRAME_HEADER_SIZE + length
+        if len(data) < total_size:
+            raise ValueError(f"Insufficient data: need {total_size}, have {len(data)}")
         
-        if version != self.PROTOCOL_VERSION:
-            raise ValueError(f"Unsupported protocol version: {version}")
+        # Extract JSON data
+        json_bytes = data[self.FRAME_HEADER_SIZE:total_size]
         
-        if length > 1024 * 1024:  # 1MB limit
-            raise ValueError(f"Message too large: {length} bytes")
+        json_bytes = self.chunks.payload(flags, json_bytes)
+        if json_bytes is None:
+            return None, total_size
         
-        # Read message data
-        message_data = reader.read(length)
-        if len(message_data) < length:
-            raise ValueError(f"Incomplete message: need {length}, got {len(message_data)}")
+        return self.decode_payload(json_bytes), total_size
+    
+    def read_payload(self, reader) -> Optional[bytes]:
+        """Read the JSON payload of the next complete message from a reader.
         
-        # Decode message
-        json_str = message_data.decode('utf-8')
-        try:
-            message = json.loads(json_str)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Invalid JSON: {e}")
+        Chunk frames are reassembled transparently; frames of other messages
+        interleaved between chunks are returned as soon as they arrive.
         
-        # Validate message
-        self.validate_message(message)
+        Args:
+            reader: Object with read() method (file, socket, etc.)
         
-        return message
+        Returns:
+            JSON payload bytes or None if no data available
+        """
+        while True:
+            # Read frame header
+            header_data = reader.read(self.FRAME_HEADER_SIZE)
+            if not header_data:
+                return None  # No data available
+            
+            if len(header_data) < self.FRAME_HEADER_SIZE:
+                raise ValueError("Incomplete frame header")
+            
+            # Extract length and flags
+            length, flags = self.parse_header(header_data)
+            
+            # Read message data
+            message_data = reader.read(length)
+            if len(message_data) < length:
+                raise ValueError(f"Incomplete message: need {length}, got {len(message_data)}")
+            
+            payload = self.chunks.payload(flags, message_data)
+            if payload is not None:
+                return payload
+    
+    def read_message(self, reader) -> Optional[Dict[str, Any]]:
+        """Read a complete message from a reader object.
+        
+        Args:
+            reader: Object with read() method (file, socket, etc.)
+        
+        Returns:
+            Message dict or None if no data available
+        """
+        payload = self.read_payload(reader)
+        if payload is None:
+            return None
+        return self.decode_payload(payload)
+    
+    async def read_payload_async(self, reader: asyncio.StreamReader) -> Optional[bytes]:
+        """Read the JSON payload of the next complete message from an asyncio stream.
+        
+        Returns:
+            JSON payload bytes or None on EOF
+        """
+        while True:
+            try:
+                header_data = await reader.readexactly(self.FRAME_HEADER_SIZE)
+            except asyncio.IncompleteReadError as e:
+                if not e.partial:
+                    return None
+                raise ValueError("Incomplete frame header")
+            
+            length, flags = self.parse_header(header_data)
+            
+            try:
+                message_data = await reader.readexactly(length)
+            except asyncio.IncompleteReadError as e:
+                raise ValueError(f"Incomplete message: need {length}, got {len(e.partial)}")
+            
+            payload = self.chunks.payload(flags, message_data)
+            if payload is not None:
+                return payload
+    
+    async def read_message_async(self, reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+        """Read a complete message from an asyncio stream reader.
+        
+        Returns:
+            Message dict or None on EOF
+        """
+        payload = await self.read_payload_async(reader)
+        if payload is None:
+            return None
+        return self.decode_payload(payload)
+    
+    async def write_message_async(self, writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+        """Write a complete message to an asyncio stream writer and drain it."""
+        writer.write(self.encode_message(message))
+        await writer.drain()
     
     def write_message(self, writer, message: Dict[str, Any]) -> None:
         """Write a complete message to a writer object.
@@ -246,6 +563,46 @@ class FramedJSONProtocol:
         writer.flush()  # Ensure data is sent immediately
 
 
+class ChunkReassembler:
+    """Reassembles the interleaved chunk frames of one connection."""
+    
+    def __init__(self, protocol: FramedJSONProtocol, max_streams: int = DEFAULT_MAX_CHUNK_STREAMS):
+        """Initialize reassembler.
+        
+        Args:
+            protocol: Protocol whose size limit and payload encodings apply
+            max_streams: Maximum number of partially received messages
+        """
+        self.protocol = protocol
+        self.max_streams = max_streams
+        self._streams: Dict[int, bytearray] = {}
+    
+    def __len__(self) -> int:
+        """Number of partially received messages."""
+        return len(self._streams)
+    
+    def payload(self, flags: int, data: bytes) -> Optional[bytes]:
+        """Payload of a received frame, None while a chunked message is incomplete."""
+        if not flags & self.protocol.FRAME_FLAG_CHUNK:
+            return self.protocol.unpack_payload(flags, data)
+        if len(data) < 4:
+            raise ValueError("Chunk frame missing stream id")
+        stream_id, = struct.unpack('>I', data[:4])
+        buffer = self._streams.get(stream_id)
+        if buffer is None:
+            if len(self._streams) >= self.max_streams:
+                raise ValueError(f"Too many interleaved chunked messages: more than {self.max_streams}")
+            buffer = self._streams[stream_id] = bytearray()
+        buffer += data[4:]
+        if len(buffer) > self.protocol.max_message_size:
+            del self._streams[stream_id]
+            raise ValueError(f"Message too large: {len(buffer)} bytes")
+        if not flags & self.protocol.FRAME_FLAG_FINAL:
+            return None
+        del self._streams[stream_id]
+        return self.protocol.unpack_payload(flags, bytes(buffer))
+
+
 class SocketMessageBuilder:
     """Helper class for building socket messages."""
     
@@ -258,9 +615,10 @@ class SocketMessageBuilder:
         message = self.protocol.create_event_message(event, correlation_id)
         return self.protocol.encode_message(message)
     
-    def command(self, command: str, params: Dict[str, Any], correlation_id: Optional[str] = None) -> bytes:
+    def command(self, command: str, params: Dict[str, Any], correlation_id: Optional[str] = None,
+                timeout: Optional[float] = None) -> bytes:
         """Build command message."""
-        message = self.protocol.create_command_message(command, params, correlation_id)
+        message = self.protocol.create_command_message(command, params, correlation_id, timeout)
         return self.protocol.encode_message(message)
     
     def response(self, request_id: str, status: str, data: Optional[Dict[str, Any]] = None, error: Optional[Dict[str, Any]] = None) -> bytes:
@@ -0,0 +1,185 @@
+"""
+Connection handshake with version and feature negotiation.
+
+Both peers send a "hello" message advertising the protocol versions and
+optional features they support. Each side then independently computes the
+same session parameters: the highest common version, the intersection of
+features and the smaller of the two message size limits, and configures
+its FramedJSONProtocol accordingly for the rest of the connection.
+Chunking, credit flow control and delta heartbeats are only used when
+negotiated (FramedJSONProtocol.has_feature). Use a protocol per
+connection, e.g. FramedJSONProtocol.session().
+
+A responder that receives a regular message instead of a hello treats the
+peer as a legacy client and keeps the protocol defaults.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, FrozenSet, Iterable, NamedTuple, Optional, Tuple
+
+from .framed_json import FramedJSONProtocol
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# zlib-compress payloads above the compression threshold
+FEATURE_ZLIB = "zlib"
+# Large payloads may be split into interleaved chunk frames
+FEATURE_CHUNKING = "chunking"
+# Credit-based flow control (see flow_control.py)
+FEATURE_CREDIT_FLOW = "credit_flow"
+# Compact delta heartbeats (see heartbeat.py)
+FEATURE_DELTA_HEARTBEAT = "delta_heartbeat"
+# Skip schema validation; only enabled when both trusted peers opt in
+FEATURE_SKIP_VALIDATION = "skip_validation"
+
+DEFAULT_FEATURES = frozenset({
+    FEATURE_ZLIB,
+    FEATURE_CHUNKING,
+    FEATURE_CREDIT_FLOW,
+    FEATURE_DELTA_HEARTBEAT,
+})
+
+DEFAULT_COMPRESSION_THRESHOLD = 16 * 1024
+
+
+class SessionParameters(NamedTuple):
+    """Parameters agreed for a connection."""
+
+    version: int
+    features: FrozenSet[str]
+    max_message_size: int
+
+    def has(self, feature: str) -> bool:
+        """Check whether a feature was negotiated."""
+        return feature in self.features
+
+
+def legacy_parameters(protocol: FramedJSONProtocol) -> SessionParameters:
+    """Session parameters used with peers that do not handshake."""
+    return SessionParameters(protocol.PROTOCOL_VERSION, frozenset(), protocol.MAX_MESSAGE_SIZE)
+
+
+class Handshake:
+    """Negotiates session parameters for one connection."""
+
+    def __init__(self,
+                 protocol: FramedJSONProtocol,
+                 features: Iterable[str] = DEFAULT_FEATURES,
+                 max_message_size: Optional[int] = None,
+                 compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+                 agent_id: Optional[str] = None):
+        """Initialize handshake.
+
+        Args:
+            protocol: Protocol instance configured with the agreed parameters
+            features: Features this side supports
+            max_message_size: Largest payload this side accepts
+            compression_threshold: Payload size above which zlib is used
+                when the zlib feature is agreed
+            agent_id: Optional identifier advertised to the peer
+        """
+        self.protocol = protocol
+        self.features = frozenset(features)
+        self.max_message_size = max_message_size or protocol.MAX_MESSAGE_SIZE
+        self.compression_threshold = compression_threshold
+        self.agent_id = agent_id
+        self.parameters: Optional[SessionParameters] = None
+        self.peer_agent_id: Optional[str] = None
+
+    def hello(self) -> Dict[str, Any]:
+        """Create this side's hello message."""
+        message = self.protocol.create_message_base("hello")
+        message["hello"] = {
+            "versions": sorted(self.protocol.SUPPORTED_VERSIONS),
+            "features": sorted(self.features),
+            "max_message_size": self.max_message_size,
+        }
+        if self.agent_id:
+            message["hello"]["agent_id"] = self.agent_id
+        return message
+
+    def accept(self, remote: Dict[str, Any]) -> SessionParameters:
+        """Negotiate parameters from the peer's hello and apply them."""
+        hello = remote["hello"]
+        common = set(self.protocol.SUPPORTED_VERSIONS) & set(hello["versions"])
+        if not common:
+            raise ValueError(
+                f"No common protocol version: local {sorted(self.protocol.SUPPORTED_VERSIONS)}, "
+                f"remote {sorted(hello['versions'])}"
+            )
+
+        parameters = SessionParameters(
+            version=max(common),
+            features=self.features & frozenset(hello["features"]),
+            max_message_size=min(self.max_message_size,
+                                 hello.get("max_message_size", self.protocol.MAX_MESSAGE_SIZE)),
+        )
+        self.peer_agent_id = hello.get("agent_id")
+        self.apply(parameters)
+        return parameters
+
+    def apply(self, parameters: SessionParameters) -> None:
+        """Configure the protocol for the agreed parameters."""
+        self.parameters = parameters
+        self.protocol.configure(
+            version=parameters.version,
+            max_message_size=parameters.max_message_size,
+            validation_enabled=not parameters.has(FEATURE_SKIP_VALIDATION),
+            compression_threshold=(self.compression_threshold
+                                   if parameters.has(FEATURE_ZLIB) else -1),
+            features=parameters.features,
+        )
+        logger.debug(f"Negotiated protocol session: {parameters}")
+
+    def initiate(self, reader, writer) -> SessionParameters:
+        """Client side: send hello, wait for the peer's hello (blocking)."""
+        self.protocol.write_message(writer, self.hello())
+        remote = self.protocol.read_message(reader)
+        if remote is None or remote.get("type") != "hello":
+            raise ValueError("Peer did not answer the protocol handshake")
+        return self.accept(remote)
+
+    def respond(self, reader, writer) -> Tuple[SessionParameters, Optional[Dict[str, Any]]]:
+        """Server side: wait for the client's hello and answer it (blocking).
+
+        Returns the agreed parameters and, for legacy clients that start
+        with a regular message, that message so it can still be handled.
+        """
+        remote = self.protocol.read_message(reader)
+        if remote is None:
+            raise ConnectionError("Connection closed during handshake")
+        if remote.get("type") != "hello":
+            return self._legacy(), remote
+        # Answer before applying, the peer still expects default framing
+        self.protocol.write_message(writer, self.hello())
+        return self.accept(remote), None
+
+    def _legacy(self) -> SessionParameters:
+        """Apply and return legacy session parameters."""
+        parameters = legacy_parameters(self.protocol)
+        self.apply(parameters)
+        return parameters
+
+    async def initiate_async(self,
+                             reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter) -> SessionParameters:
+        """Client side handshake over asyncio streams."""
+        await self.protocol.write_message_async(writer, self.hello())
+        remote = await self.protocol.read_message_async(reader)
+        if remote is None or remote.get("type") != "hello":
+            raise ValueError("Peer did not answer the protocol handshake")
+        return self.accept(remote)
+
+    async def respond_async(self,
+                            reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> Tuple[SessionParameters, Optional[Dict[str, Any]]]:
+        """Server side handshake over asyncio streams (see respond())."""
+        remote = await self.protocol.read_message_async(reader)
+        if remote is None:
+            raise ConnectionError("Connection closed during handshake")
+        if remote.get("type") != "hello":
+            return self._legacy(), remote
+        await self.protocol.write_message_async(writer, self.hello())
+        return self.accept(remote), None
@@ -0,0 +1,86 @@
+"""
+Compact heartbeat sender.
+
+The first heartbeat on a connection (and every ``full_interval``-th one
+after it) is sent in full. In between, delta heartbeats carry only the
+agent_id, a sequence number and the fields that changed. Uptime is only
+resent when it drifts from what the receiver can extrapolate from the
+previous value, e.g. after a restart. Peers that did not negotiate delta
+heartbeats always get full ones.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .framed_json import FramedJSONProtocol
+from .handshake import FEATURE_DELTA_HEARTBEAT
+
+
+class CompactHeartbeatSender:
+    """Builds full and delta heartbeat messages for one agent."""
+
+    def __init__(self,
+                 protocol: FramedJSONProtocol,
+                 agent_id: str,
+                 full_interval: int = 60,
+                 uptime_tolerance: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """Initialize sender.
+
+        Args:
+            protocol: Protocol used to build messages
+            agent_id: Agent identifier
+            full_interval: Send a full heartbeat every N heartbeats
+            uptime_tolerance: Allowed uptime drift (seconds) before resending it
+            clock: Monotonic time source
+        """
+        self.protocol = protocol
+        self.agent_id = agent_id
+        self.full_interval = max(1, full_interval)
+        self.uptime_tolerance = uptime_tolerance
+        self.clock = clock
+        self._seq = 0
+        self._status: Optional[str] = None
+        self._version: Optional[str] = None
+        self._uptime: Optional[float] = None
+        self._uptime_at = 0.0
+
+    def reset(self) -> None:
+        """Force the next heartbeat to be sent in full (e.g. after reconnect)."""
+        self._seq = 0
+
+    def build(self,
+              status: str,
+              uptime_seconds: Optional[float] = None,
+              version: Optional[str] = None) -> Dict[str, Any]:
+        """Build the next heartbeat message."""
+        now = self.clock()
+        seq = self._seq
+        self._seq += 1
+
+        if seq % self.full_interval == 0 or not self.protocol.has_feature(FEATURE_DELTA_HEARTBEAT):
+            message = self.protocol.create_heartbeat_message(
+                self.agent_id, status, uptime_seconds, version, seq=seq
+            )
+        else:
+            send_uptime = None
+            if uptime_seconds is not None:
+                expected = (self._uptime + now - self._uptime_at) if self._uptime is not None else None
+                if expected is None or abs(uptime_seconds - expected) > self.uptime_tolerance:
+                    send_uptime = uptime_seconds
+            message = self.protocol.create_heartbeat_message(
+                self.agent_id,
+                status if status != self._status else None,
+                send_uptime,
+                version if version != self._version else None,
+                delta=True,
+                seq=seq
+            )
+
+        self._status = status
+        if version is not None:
+            self._version = version
+        if "uptime_seconds" in message["heartbeat"]:
+            self._uptime = uptime_seconds
+            self._uptime_at = now
+        return message
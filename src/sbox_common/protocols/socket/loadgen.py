@@ -0,0 +1,432 @@
+"""
+Synthetic load generator simulating many agents.
+
+LoadGenerator runs N simulated agents in one asyncio event loop, each
+with its own connection to a server: a Unix socket path, or one end of a
+socketpair whose other end is handed to the server (e.g. via
+SelectorServer.adopt). A single timer heap schedules every agent's
+heartbeats, health.check_completed events and subscription.update_*
+events at the rates of a LoadProfile, with start times spread over the
+interval so agents do not fire in lockstep. Messages are built with the
+existing converters.
+
+Agents answer commands with create_response_message. Round-trip latency
+of acknowledged messages and delivery latency of commands are recorded
+in log-scale histograms of constant size, and CPU time of the generator
+thread is reported per message.
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import random
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from ..converters import HealthEventConverter, SubscriptionEventConverter
+from .framed_json import FramedJSONProtocol
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+AGENT_VERSION = "loadgen"
+MAX_PENDING_ACKS = 1024  # Per agent; older unacknowledged sends are forgotten
+_YIELD_EVERY = 64  # Sends between yields to the readers
+
+HEARTBEAT = "heartbeat"
+HEALTH = "health"
+SUBSCRIPTION = "subscription"
+
+
+class LoadProfile(NamedTuple):
+    """Per-agent message rates. An interval of 0 disables the message kind."""
+
+    heartbeat_interval: float = 5.0
+    health_interval: float = 30.0
+    health_components: int = 4
+    subscription_interval: float = 60.0
+
+
+class LatencyHistogram:
+    """Log-scale latency histogram with constant memory.
+
+    Buckets grow by 2**(1/8) (about 9%) from 1 microsecond to about
+    100 seconds; percentiles are reported as bucket upper bounds.
+    """
+
+    MIN_LATENCY = 1e-6
+    SUB_BUCKETS = 8
+    BUCKETS = 27 * SUB_BUCKETS
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        if seconds <= self.MIN_LATENCY:
+            index = 0
+        else:
+            index = min(int(math.log2(seconds / self.MIN_LATENCY) * self.SUB_BUCKETS), self.BUCKETS - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def upper_bound(self, index: int) -> float:
+        return self.MIN_LATENCY * 2 ** ((index + 1) / self.SUB_BUCKETS)
+
+    def percentile(self, point: float) -> Optional[float]:
+        """Latency at or below which point percent of samples fall."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(point / 100.0 * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.upper_bound(index), self.max)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Summary and non-empty buckets, in milliseconds."""
+        if not self.count:
+            return {"count": 0}
+        result = {
+            "count": self.count,
+            "mean": self.total / self.count * 1000,
+            "max": self.max * 1000,
+        }
+        for point in (50, 90, 99, 99.9):
+            result[f"p{point:g}"] = self.percentile(point) * 1000
+        result["buckets"] = [[self.upper_bound(index) * 1000, count]
+                             for index, count in enumerate(self.counts) if count]
+        return result
+
+
+class LoadReport(NamedTuple):
+    """Result of a load generator run."""
+
+    agents: int
+    connected: int
+    duration: float
+    sent: Dict[str, int]  # Messages sent by kind
+    received: int
+    commands: int
+    errors: int
+    ack_latency: LatencyHistogram  # Send to response with matching request_id
+    command_latency: LatencyHistogram  # Command timestamp to its receipt
+    cpu_seconds: float  # CPU time of the generator thread
+
+    @property
+    def messages(self) -> int:
+        """Messages sent and received."""
+        return sum(self.sent.values()) + self.received
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def cpu_per_message(self) -> float:
+        return self.cpu_seconds / self.messages if self.messages else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Convert report to a JSON-serializable dict."""
+        return {
+            "agents": self.agents,
+            "connected": self.connected,
+            "duration": self.duration,
+            "sent": dict(self.sent),
+            "received": self.received,
+            "commands": self.commands,
+            "errors": self.errors,
+            "messages_per_second": self.messages_per_second,
+            "cpu_seconds": self.cpu_seconds,
+            "cpu_us_per_message": self.cpu_per_message * 1e6,
+            "ack_latency_ms": self.ack_latency.as_dict(),
+            "command_latency_ms": self.command_latency.as_dict(),
+        }
+
+
+class SimulatedAgent:
+    """Connection and state of one simulated agent."""
+
+    __slots__ = ("agent_id", "subscription_id", "protocol", "reader", "writer", "pending", "started", "closed")
+
+    def __init__(self, index: int, protocol: FramedJSONProtocol):
+        self.agent_id = f"loadgen-{index:05d}"
+        self.subscription_id = f"subscription-{index:05d}"
+        self.protocol = protocol
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        # Message id -> loop time sent, for messages awaiting a response
+        self.pending: Dict[str, float] = {}
+        self.started = time.monotonic()
+        self.closed = False
+
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    """Seconds since the epoch of a protocol timestamp (UTC, "Z" suffix)."""
+    try:
+        parsed = datetime.fromisoformat(value.rstrip("Z"))
+    except (AttributeError, ValueError):
+        return None
+    return (parsed - datetime(1970, 1, 1)).total_seconds()
+
+
+class LoadGenerator:
+    """Simulates many agents against a server."""
+
+    def __init__(self,
+                 agents: int,
+                 profile: Optional[LoadProfile] = None,
+                 socket_path: Optional[str] = None,
+                 peer: Optional[Callable[[socket.socket], None]] = None,
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 validate: bool = False,
+                 seed: Optional[int] = None,
+                 connect_batch: int = 256):
+        """Initialize generator.
+
+        Args:
+            agents: Number of simulated agents
+            profile: Message rates (LoadProfile defaults if None)
+            socket_path: Unix socket path of the server
+            peer: Instead of socket_path, called with the server end of a
+                socketpair per agent (e.g. SelectorServer.adopt)
+            protocol: Protocol used to encode and decode messages
+            validate: Validate messages against the protocol schema
+            seed: Seed for start offsets and generated values
+            connect_batch: Connections opened concurrently
+        """
+        if (socket_path is None) == (peer is None):
+            raise ValueError("Exactly one of socket_path and peer is required")
+        self.agents = agents
+        self.profile = profile or LoadProfile()
+        self.socket_path = socket_path
+        self.peer = peer
+        self.protocol = protocol.session() if protocol is not None else FramedJSONProtocol()
+        self.protocol.configure(validation_enabled=validate)
+        self.random = random.Random(seed)
+        self.connect_batch = connect_batch
+        self.health = HealthEventConverter()
+        self.subscriptions = SubscriptionEventConverter()
+
+    def _intervals(self) -> Dict[str, float]:
+        profile = self.profile
+        intervals = {
+            HEARTBEAT: profile.heartbeat_interval,
+            HEALTH: profile.health_interval,
+            SUBSCRIPTION: profile.subscription_interval,
+        }
+        return {kind: interval for kind, interval in intervals.items() if interval > 0}
+
+    async def _connect(self, agent: SimulatedAgent) -> None:
+        if self.peer is not None:
+            local, remote = socket.socketpair()
+            self.peer(remote)
+            agent.reader, agent.writer = await asyncio.open_unix_connection(sock=local)
+        else:
+            agent.reader, agent.writer = await asyncio.open_unix_connection(self.socket_path)
+
+    def _messages(self, agent: SimulatedAgent, kind: str) -> List[Dict[str, Any]]:
+        """Build the messages an agent sends for one scheduled emission."""
+        protocol = self.protocol
+        if kind == HEARTBEAT:
+            uptime = time.monotonic() - agent.started
+            return [protocol.create_heartbeat_message(agent.agent_id, "healthy", uptime, AGENT_VERSION)]
+
+        if kind == HEALTH:
+            components = [
+                {
+                    "component": f"component-{i}",
+                    "status": "healthy",
+                    "details": {
+                        "cpu_usage_percent": round(self.random.uniform(0, 100), 1),
+                        "memory_usage_mb": round(self.random.uniform(10, 500), 1),
+                    },
+                }
+                for i in range(self.profile.health_components)
+            ]
+            event = self.health.create_health_check_completed(
+                str(uuid.uuid4()), "healthy", components,
+                check_duration_ms=self.random.randint(1, 50)
+            )
+            return [protocol.create_event_message(event)]
+
+        correlation_id = str(uuid.uuid4())
+        started = self.subscriptions.create_subscription_update_started(
+            agent.subscription_id, correlation_id=correlation_id)
+        completed = self.subscriptions.create_subscription_update_completed(
+            agent.subscription_id, "success", correlation_id=correlation_id,
+            nodes_count=self.random.randint(1, 200), config_changed=self.random.random() < 0.2)
+        return [protocol.create_event_message(started, correlation_id),
+                protocol.create_event_message(completed, correlation_id)]
+
+    def _send(self, agent: SimulatedAgent, message: Dict[str, Any], now: float) -> None:
+        agent.writer.write(self.protocol.encode_message(message))
+        pending = agent.pending
+        pending[message["id"]] = now
+        if len(pending) > MAX_PENDING_ACKS:
+            del pending[next(iter(pending))]
+
+    async def _read(self, agent: SimulatedAgent, stats: Dict[str, Any]) -> None:
+        """Handle messages from the server until the connection closes."""
+        loop = asyncio.get_running_loop()
+        protocol = agent.protocol
+        try:
+            while True:
+                message = await protocol.read_message_async(agent.reader)
+                if message is None:
+                    break
+                stats["received"] += 1
+                message_type = message.get("type")
+                if message_type == "response":
+                    sent = agent.pending.pop(message["response"].get("request_id"), None)
+                    if sent is not None:
+                        stats["ack_latency"].record(loop.time() - sent)
+                elif message_type == "command":
+                    issued = _parse_timestamp(message.get("timestamp"))
+                    if issued is not None:
+                        stats["command_latency"].record(max(time.time() - issued, 0.0))
+                    stats["commands"] += 1
+                    command = message["command"].get("command")
+                    response = protocol.create_response_message(
+                        message["id"], "success", {"agent_id": agent.agent_id, "command": command})
+                    agent.writer.write(protocol.encode_message(response))
+        except (ConnectionError, ValueError, KeyError, AttributeError) as e:
+            stats["errors"] += 1
+            logger.debug(f"Agent {agent.agent_id} connection failed: {e}")
+        agent.closed = True
+
+    async def run(self, duration: float, drain_timeout: float = 1.0) -> LoadReport:
+        """Run all agents for duration seconds and report.
+
+        After the last scheduled send, responses still in flight are
+        awaited for up to drain_timeout seconds.
+        """
+        loop = asyncio.get_running_loop()
+        cpu_started = time.thread_time()
+        stats: Dict[str, Any] = {
+            "received": 0,
+            "commands": 0,
+            "errors": 0,
+            "ack_latency": LatencyHistogram(),
+            "command_latency": LatencyHistogram(),
+        }
+        sent = {HEARTBEAT: 0, HEALTH: 0, SUBSCRIPTION: 0}
+
+        agents = []
+        for index in range(self.agents):
+            agents.append(SimulatedAgent(index, self.protocol.session()))
+        for start in range(0, len(agents), self.connect_batch):
+            batch = agents[start:start + self.connect_batch]
+            results = await asyncio.gather(*(self._connect(agent) for agent in batch), return_exceptions=True)
+            for agent, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    agent.closed = True
+                    stats["errors"] += 1
+                    logger.warning(f"Agent {agent.agent_id} could not connect: {result}")
+        connected = [agent for agent in agents if not agent.closed]
+        readers = [asyncio.ensure_future(self._read(agent, stats)) for agent in connected]
+
+        started = loop.time()
+        deadline = started + duration
+        intervals = self._intervals()
+        # (due time, agent index, kind), first emission spread over the interval
+        schedule = [(started + self.random.uniform(0, interval), index, kind)
+                    for index in range(len(connected)) for kind, interval in intervals.items()]
+        heapq.heapify(schedule)
+
+        sends = 0
+        try:
+            while schedule:
+                due, index, kind = schedule[0]
+                if due >= deadline:
+                    break
+                now = loop.time()
+                if due > now:
+                    await asyncio.sleep(due - now)
+                    continue
+                agent = connected[index]
+                if agent.closed:
+                    heapq.heappop(schedule)
+                    continue
+                heapq.heapreplace(schedule, (due + intervals[kind], index, kind))
+                try:
+                    for message in self._messages(agent, kind):
+                        self._send(agent, message, now)
+                        sent[kind] += 1
+                    if agent.writer.transport.get_write_buffer_size() > 64 * 1024:
+                        await agent.writer.drain()
+                except (ConnectionError, RuntimeError) as e:
+                    agent.closed = True
+                    stats["errors"] += 1
+                    logger.debug(f"Agent {agent.agent_id} send failed: {e}")
+                sends += 1
+                if sends % _YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+
+            elapsed = loop.time() - started
+            drain_until = loop.time() + drain_timeout
+            while any(agent.pending and not agent.closed for agent in connected) and loop.time() < drain_until:
+                await asyncio.sleep(0.01)
+        finally:
+            for agent in connected:
+                agent.writer.close()
+            for task in readers:
+                task.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+
+        return LoadReport(
+            agents=self.agents,
+            connected=len(connected),
+            duration=elapsed,
+            sent=sent,
+            received=stats["received"],
+            commands=stats["commands"],
+            errors=stats["errors"],
+            ack_latency=stats["ack_latency"],
+            command_latency=stats["command_latency"],
+            cpu_seconds=time.thread_time() - cpu_started,
+        )
+
+
+def ack_handler(protocol: FramedJSONProtocol, command_every: int = 0) -> Callable:
+    """SelectorServer handler standing in for sboxmgr in load tests.
+
+    Acknowledges every message with a response; with command_every > 0,
+    also sends a get_status command after every command_every heartbeats
+    of a connection. That command is sent with ServerConnection.send(),
+    which must run on the loop thread, so it requires a server with
+    workers=0 (RuntimeError otherwise).
+    """
+    def handler(connection, message):
+        if command_every and connection.server.workers:
+            raise RuntimeError("ack_handler with command_every needs SelectorServer(workers=0)")
+        message_type = message.get("type")
+        if message_type == "response":
+            return None
+        if command_every and message_type == "heartbeat":
+            count = connection.state.get("heartbeats", 0) + 1
+            connection.state["heartbeats"] = count
+            if count % command_every == 0:
+                connection.send(protocol.create_command_message("get_status", {}))
+        return protocol.create_response_message(message["id"], "success")
+    return handler
@@ -0,0 +1,206 @@
+"""
+Worker pool offloading of large payloads for asyncio servers.
+
+Decoding, validating and encoding a several-hundred-KB message blocks the
+event loop long enough to stall heartbeats on other connections.
+AsyncOffloader keeps small frames inline and runs frames above a size
+threshold on a thread or process pool, recording how often offloading
+happens and how much event loop time it saved.
+
+Only process pools take that work off the interpreter: json and jsonschema
+hold the GIL, so with the default thread pool the event loop still waits
+for the worker's bytecode and only gains scheduling points between frames.
+Pass a ProcessPoolExecutor for CPU-bound decode/validate offloading.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from .framed_json import DeadlineExceeded, FramedJSONProtocol
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_OFFLOAD_THRESHOLD = 64 * 1024
+
+# Protocol settings passed to process pool workers
+_Settings = Tuple[str, int, int, bool, Optional[int], int]
+_worker_protocols: Dict[_Settings, FramedJSONProtocol] = {}
+
+
+def _worker_protocol(settings: _Settings) -> FramedJSONProtocol:
+    """Get a cached protocol configured like the parent's (worker process)."""
+    protocol = _worker_protocols.get(settings)
+    if protocol is None:
+        # Forget protocols compiled from schemas the parent has since reloaded
+        for stale in [key for key in _worker_protocols if key[:-1] == settings[:-1]]:
+            del _worker_protocols[stale]
+        schema_dir, version, max_message_size, validation_enabled, threshold, _ = settings
+        protocol = FramedJSONProtocol(schema_dir)
+        protocol.configure(version, max_message_size, validation_enabled,
+                           -1 if threshold is None else threshold)
+        _worker_protocols[settings] = protocol
+    return protocol
+
+
+def _timed(function, *args) -> Tuple[Any, float]:
+    """Call function, returning its result and CPU-side duration."""
+    started = time.perf_counter()
+    return function(*args), time.perf_counter() - started
+
+
+def _encode_in_process(settings: _Settings, message: Dict[str, Any]) -> Tuple[bytes, float]:
+    return _timed(_worker_protocol(settings).encode_message, message)
+
+
+def _decode_in_process(settings: _Settings, payload: bytes) -> Tuple[Dict[str, Any], float]:
+    return _timed(_worker_protocol(settings).decode_payload, payload)
+
+
+def estimate_size(value: Any, limit: int) -> int:
+    """Estimate the encoded JSON size of value, stopping once above limit."""
+    size = 0
+    stack = [value]
+    while stack and size <= limit:
+        item = stack.pop()
+        if isinstance(item, str):
+            size += len(item) + 2
+        elif isinstance(item, dict):
+            size += 2 + len(item)
+            for key, child in item.items():
+                size += len(key) + 3
+                stack.append(child)
+        elif isinstance(item, (list, tuple)):
+            size += 2 + len(item)
+            stack.extend(item)
+        else:
+            size += 8
+    return size
+
+
+class _OffloadStats:
+    """Inline versus offloaded processing counters."""
+
+    __slots__ = ("inline", "inline_seconds", "offloaded", "offloaded_seconds", "offload_wall_seconds")
+
+    def __init__(self):
+        self.inline = 0
+        self.inline_seconds = 0.0
+        self.offloaded = 0
+        self.offloaded_seconds = 0.0
+        self.offload_wall_seconds = 0.0
+
+
+class AsyncOffloader:
+    """Runs decode/validation/encode of large frames on a worker pool."""
+
+    def __init__(self,
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 threshold: int = DEFAULT_OFFLOAD_THRESHOLD,
+                 executor: Optional[Executor] = None,
+                 max_workers: int = 2):
+        """Initialize offloader.
+
+        Args:
+            protocol: Protocol used to encode and decode messages
+            threshold: Payloads larger than this many bytes are offloaded
+            executor: Thread or process pool to use (a thread pool with
+                max_workers threads is created if not given; only a
+                process pool runs decoding outside the GIL)
+            max_workers: Size of the default thread pool
+        """
+        self.protocol = protocol or FramedJSONProtocol()
+        self.threshold = threshold
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers, thread_name_prefix="sbox-offload")
+        self._processes = isinstance(self.executor, ProcessPoolExecutor)
+        self._stats = {"decode": _OffloadStats(), "encode": _OffloadStats()}
+
+    def _settings(self) -> _Settings:
+        protocol = self.protocol
+        return (str(protocol.schema_dir), protocol.version, protocol.max_message_size,
+                protocol.validation_enabled, protocol.compression_threshold,
+                protocol.schema_generation)
+
+    async def _offload(self, kind: str, local, remote, argument) -> Any:
+        """Run local(argument) in the pool (remote in process pools)."""
+        stats = self._stats[kind]
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        if self._processes:
+            future = loop.run_in_executor(self.executor, remote, self._settings(), argument)
+        else:
+            future = loop.run_in_executor(self.executor, _timed, local, argument)
+        result, busy = await future
+        stats.offloaded += 1
+        stats.offloaded_seconds += busy
+        stats.offload_wall_seconds += time.perf_counter() - started
+        return result
+
+    def _inline(self, kind: str, function, argument) -> Any:
+        stats = self._stats[kind]
+        result, busy = _timed(function, argument)
+        stats.inline += 1
+        stats.inline_seconds += busy
+        return result
+
+    async def decode_payload(self, payload: bytes) -> Dict[str, Any]:
+        """Parse and validate a payload, off the loop if it is large."""
+        if len(payload) > self.threshold:
+            try:
+                return await self._offload("decode", self.protocol.decode_payload, _decode_in_process, payload)
+            except DeadlineExceeded:
+                if self._processes:
+                    self.protocol.count_expired()  # Counted by the worker's protocol
+                raise
+        return self._inline("decode", self.protocol.decode_payload, payload)
+
+    async def encode_message(self, message: Dict[str, Any]) -> bytes:
+        """Validate and frame a message, off the loop if it is large."""
+        if estimate_size(message, self.threshold) > self.threshold:
+            return await self._offload("encode", self.protocol.encode_message, _encode_in_process, message)
+        return self._inline("encode", self.protocol.encode_message, message)
+
+    async def read_message(self, reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+        """Read a complete message from an asyncio stream. None on EOF."""
+        payload = await self.protocol.read_payload_async(reader)
+        if payload is None:
+            return None
+        return await self.decode_payload(payload)
+
+    async def write_message(self, writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+        """Write a complete message to an asyncio stream and drain it."""
+        writer.write(await self.encode_message(message))
+        await writer.drain()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get offloading statistics per operation (times in milliseconds).
+
+        worker_ms is the time offloaded operations spent in the pool.
+        saved_loop_ms is the part of it that no longer blocked the event
+        loop, which is all of it for process pools and none of it for thread
+        pools (whose workers hold the GIL). offload_overhead_ms is the extra
+        wall time offloaded operations took for their caller (queueing and
+        handoff).
+        """
+        result = {}
+        for kind, stats in self._stats.items():
+            total = stats.inline + stats.offloaded
+            result[kind] = {
+                "inline": stats.inline,
+                "offloaded": stats.offloaded,
+                "offload_ratio": stats.offloaded / total if total else 0.0,
+                "inline_ms": stats.inline_seconds * 1000,
+                "worker_ms": stats.offloaded_seconds * 1000,
+                "saved_loop_ms": stats.offloaded_seconds * 1000 if self._processes else 0.0,
+                "offload_overhead_ms": max(0.0, stats.offload_wall_seconds - stats.offloaded_seconds) * 1000,
+            }
+        return result
+
+    def close(self) -> None:
+        """Shut down the pool if it was created by the offloader."""
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,204 @@
+"""
+Priority-aware outbound scheduler for the framed JSON protocol.
+
+Outbound messages are classified into priority classes (control, alert,
+normal, bulk), each with its own queue. Frames are dequeued with deficit
+round robin weighted per class, and payloads larger than the chunk size
+are split into chunk frames (when the peer negotiated chunking) so
+heartbeats and alerts can interleave with a large config frame instead of
+waiting behind it. Queueing delay is tracked
+per class.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, NamedTuple, Optional
+
+from .framed_json import FramedJSONProtocol
+from .handshake import FEATURE_CHUNKING
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CONTROL = "control"
+ALERT = "alert"
+NORMAL = "normal"
+BULK = "bulk"
+
+DEFAULT_WEIGHTS = {
+    CONTROL: 8,
+    ALERT: 4,
+    NORMAL: 2,
+    BULK: 1,
+}
+
+
+def classify_message(message: Dict[str, Any]) -> str:
+    """Map a protocol message to its default priority class."""
+    message_type = message.get("type")
+    if message_type in ("heartbeat", "response"):
+        return CONTROL
+    if message_type == "event":
+        event_type = message.get("event", {}).get("event_type", "")
+        if event_type.startswith("health."):
+            return ALERT
+        if event_type.startswith("config."):
+            return BULK
+    return NORMAL
+
+
+class _Pending(NamedTuple):
+    """Queued message: its frames and enqueue time."""
+
+    frames: Deque[bytes]
+    enqueued_at: float
+
+
+class _ClassStats:
+    """Queueing delay statistics of a priority class."""
+
+    __slots__ = ("messages", "frames", "bytes", "total_delay", "max_delay")
+
+    def __init__(self):
+        self.messages = 0
+        self.frames = 0
+        self.bytes = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+
+
+class PrioritySendScheduler:
+    """Weighted fair scheduler of outbound frames across priority classes."""
+
+    def __init__(self,
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 weights: Optional[Dict[str, int]] = None,
+                 chunk_size: int = 64 * 1024,
+                 classifier: Callable[[Dict[str, Any]], str] = classify_message,
+                 clock: Callable[[], float] = time.monotonic):
+        """Initialize scheduler.
+
+        Args:
+            protocol: Protocol used to encode messages
+            weights: Relative share of bandwidth per class, highest first
+            chunk_size: Payloads above this size are sent as chunk frames
+            classifier: Maps a message to a priority class
+            clock: Monotonic time source for queueing delay
+        """
+        self.protocol = protocol or FramedJSONProtocol()
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        if any(weight < 1 for weight in self.weights.values()):
+            raise ValueError("Weights must be positive integers")
+        self.chunk_size = chunk_size
+        # A full chunk frame also carries the frame header and stream id
+        self._quantum = chunk_size + self.protocol.FRAME_HEADER_SIZE + 4
+        self.classifier = classifier
+        self.clock = clock
+        self._classes = list(self.weights)
+        self._queues: Dict[str, Deque[_Pending]] = {name: deque() for name in self._classes}
+        self._deficits: Dict[str, int] = {name: 0 for name in self._classes}
+        self._stats: Dict[str, _ClassStats] = {name: _ClassStats() for name in self._classes}
+        self._cursor = 0
+        self._granted = False
+        self._next_stream_id = 1
+
+    def __len__(self) -> int:
+        """Number of queued messages across all classes."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def enqueue(self, message: Dict[str, Any], priority: Optional[str] = None) -> str:
+        """Encode message and queue it. Returns the priority class used."""
+        priority = priority or self.classifier(message)
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class: {priority!r}")
+
+        payload = self.protocol.encode_payload(message)
+        if len(payload) > self.chunk_size and self.protocol.has_feature(FEATURE_CHUNKING):
+            stream_id = self._next_stream_id
+            self._next_stream_id = (stream_id % 0xFFFFFFFF) + 1
+            frames = deque(self.protocol.encode_chunks(payload, stream_id, self.chunk_size))
+        else:
+            frames = deque([self.protocol.frame_payload(payload)])
+
+        self._queues[priority].append(_Pending(frames, self.clock()))
+        return priority
+
+    def next_frame(self) -> Optional[bytes]:
+        """Dequeue the next frame by deficit round robin, or None if idle."""
+        if not any(self._queues.values()):
+            return None
+
+        while True:
+            name = self._classes[self._cursor]
+            queue = self._queues[name]
+            if not queue:
+                self._deficits[name] = 0
+                self._advance()
+                continue
+
+            pending = queue[0]
+            size = len(pending.frames[0])
+            if self._deficits[name] < size:
+                # Grant the class its quantum once per round robin visit
+                if not self._granted:
+                    self._deficits[name] += self.weights[name] * self._quantum
+                    self._granted = True
+                if self._deficits[name] < size:
+                    self._advance()
+                    continue
+
+            self._deficits[name] -= size
+            return self._pop(name, queue, pending)
+
+    def _advance(self) -> None:
+        """Move round robin cursor to the next class."""
+        self._cursor = (self._cursor + 1) % len(self._classes)
+        self._granted = False
+
+    def _pop(self, name: str, queue: Deque[_Pending], pending: _Pending) -> bytes:
+        """Pop the head frame of a class, updating statistics."""
+        stats = self._stats[name]
+        frame = pending.frames.popleft()
+        stats.frames += 1
+        stats.bytes += len(frame)
+        if not pending.frames:
+            queue.popleft()
+            delay = self.clock() - pending.enqueued_at
+            stats.messages += 1
+            stats.total_delay += delay
+            if delay > stats.max_delay:
+                stats.max_delay = delay
+        return frame
+
+    def write_pending(self, writer, max_frames: Optional[int] = None) -> int:
+        """Write queued frames to a blocking writer. Returns frames written."""
+        written = 0
+        while max_frames is None or written < max_frames:
+            frame = self.next_frame()
+            if frame is None:
+                break
+            writer.write(frame)
+            written += 1
+        if written:
+            writer.flush()
+        return written
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get per-class queueing statistics (delays in milliseconds).
+
+        Delay is measured from enqueue until the last frame of a message
+        is dequeued.
+        """
+        result = {}
+        for name in self._classes:
+            stats = self._stats[name]
+            result[name] = {
+                "queued": len(self._queues[name]),
+                "messages": stats.messages,
+                "frames": stats.frames,
+                "bytes": stats.bytes,
+                "mean_delay_ms": (stats.total_delay / stats.messages * 1000) if stats.messages else 0.0,
+                "max_delay_ms": stats.max_delay * 1000,
+            }
+        return result
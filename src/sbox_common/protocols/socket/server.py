@@ -0,0 +1,357 @@
+"""
+Selectors-based multi-connection server for the framed JSON protocol.
+
+SelectorServer multiplexes many non-blocking Unix socket connections in a
+single thread using the platform's best selector (epoll on Linux). Each
+connection has its own incremental frame buffer and outbound buffer.
+Messages are passed to a handler callback; slow handlers can run on a
+worker thread pool, their replies are handed back to the event loop.
+"""
+
+import logging
+import os
+import selectors
+import socket
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from jsonschema import ValidationError
+
+from .framed_json import DeadlineExceeded, FramedJSONProtocol
+from .handshake import Handshake, SessionParameters, legacy_parameters
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+RECV_SIZE = 64 * 1024
+
+
+class FrameBuffer:
+    """Incremental frame parser for one connection."""
+
+    def __init__(self, protocol: FramedJSONProtocol):
+        self.protocol = protocol
+        self._data = bytearray()
+        # Partial chunked messages, shared with decode_message() of the session
+        self.chunks = protocol.chunks
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Add received bytes; return payloads of all completed messages."""
+        self._data += data
+        payloads = []
+        header_size = self.protocol.FRAME_HEADER_SIZE
+        offset = 0
+        while len(self._data) - offset >= header_size:
+            length, flags = self.protocol.parse_header(bytes(self._data[offset:offset + header_size]))
+            end = offset + header_size + length
+            if len(self._data) < end:
+                break
+            data = bytes(self._data[offset + header_size:end])
+            offset = end
+            payload = self.chunks.payload(flags, data)
+            if payload is not None:
+                payloads.append(payload)
+        if offset:
+            del self._data[:offset]
+        return payloads
+
+
+class ServerConnection:
+    """A client connection of SelectorServer."""
+
+    def __init__(self, server: "SelectorServer", sock: socket.socket):
+        self.server = server
+        self.sock = sock
+        # Per-connection session parameters, negotiated by a handshake
+        self.protocol = server.protocol.session()
+        self.session: Optional[SessionParameters] = None
+        self.frames = FrameBuffer(self.protocol)
+        self.outbox = bytearray()
+        self.writing = False
+        self.closed = False
+        # Application state, e.g. the agent_id of the peer
+        self.state: Dict[str, Any] = {}
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """Queue a message to the client. Must be called on the loop thread."""
+        self.send_frame(self.protocol.encode_message(message))
+
+    def send_frame(self, frame: bytes) -> None:
+        """Queue an encoded frame to the client."""
+        if self.closed:
+            return
+        self.outbox += frame
+        self.server._write(self)
+
+    def close(self) -> None:
+        """Close the connection."""
+        self.server._close(self)
+
+
+Handler = Callable[[ServerConnection, Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+class SelectorServer:
+    """Single-threaded framed JSON server over a Unix socket."""
+
+    def __init__(self,
+                 path: str,
+                 handler: Handler,
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 workers: int = 0,
+                 backlog: int = 1024,
+                 on_connect: Optional[Callable[[ServerConnection], None]] = None,
+                 on_disconnect: Optional[Callable[[ServerConnection], None]] = None,
+                 reject_expired: bool = False,
+                 features: Optional[Iterable[str]] = None):
+        """Initialize server.
+
+        Args:
+            path: Unix socket path to listen on
+            handler: Called with (connection, message); a returned message is
+                sent back to the client
+            protocol: Protocol used to encode and decode messages
+            workers: Run handlers on a thread pool of this size (0 runs them
+                inline on the event loop)
+            backlog: Listen backlog
+            on_connect: Called for each accepted connection
+            on_disconnect: Called when a connection is closed
+            reject_expired: Answer commands received after their deadline
+                with a deadline_exceeded error instead of dropping them
+            features: Answer protocol handshakes, negotiating these features
+                per connection (None passes hello messages to the handler)
+        """
+        self.path = path
+        self.handler = handler
+        self.protocol = protocol or FramedJSONProtocol()
+        self.backlog = backlog
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.reject_expired = reject_expired
+        self.workers = workers
+        self.features = frozenset(features) if features is not None else None
+        self.connections: Dict[int, ServerConnection] = {}
+        self._selector = selectors.DefaultSelector()
+        self._listener: Optional[socket.socket] = None
+        self._pool = ThreadPoolExecutor(workers) if workers > 0 else None
+        self._completed: Deque[Tuple[ServerConnection, Optional[Dict[str, Any]]]] = deque()
+        self._adopted: Deque[socket.socket] = deque()
+        self._wake_recv, self._wake_send = socket.socketpair()
+        self._wake_recv.setblocking(False)
+        self._wake_send.setblocking(False)
+        self._running = False
+
+    def start(self) -> None:
+        """Bind and listen on the socket path."""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen(self.backlog)
+        self._listener.setblocking(False)
+        self._selector.register(self._listener, selectors.EVENT_READ, self._accept)
+        self._selector.register(self._wake_recv, selectors.EVENT_READ, self._drain_wakeups)
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        """Run the event loop until stop() is called."""
+        if self._listener is None:
+            self.start()
+        self._running = True
+        try:
+            while self._running:
+                self.run_once(poll_interval)
+        finally:
+            self.close()
+
+    def run_once(self, timeout: Optional[float] = None) -> None:
+        """Process ready events once."""
+        for key, events in self._selector.select(timeout):
+            callback = key.data
+            if isinstance(callback, ServerConnection):
+                if events & selectors.EVENT_READ:
+                    self._read(callback)
+                if events & selectors.EVENT_WRITE and not callback.closed:
+                    self._write(callback)
+            else:
+                callback()
+
+    def stop(self) -> None:
+        """Stop serve_forever(); safe to call from other threads."""
+        self._running = False
+        self._wake()
+
+    def close(self) -> None:
+        """Close all connections and the listening socket."""
+        for connection in list(self.connections.values()):
+            self._close(connection)
+        if self._listener is not None:
+            self._selector.unregister(self._listener)
+            self._listener.close()
+            self._listener = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        self._selector.close()
+        self._wake_recv.close()
+        self._wake_send.close()
+
+    def adopt(self, sock: socket.socket) -> None:
+        """Serve an already connected socket, e.g. one end of a socketpair.
+
+        Safe to call from other threads; the socket is registered by the
+        event loop.
+        """
+        self._adopted.append(sock)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_send.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # Already woken or closed
+
+    def _accept(self) -> None:
+        """Accept all pending connections."""
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            self._register(sock)
+
+    def _register(self, sock: socket.socket) -> None:
+        sock.setblocking(False)
+        connection = ServerConnection(self, sock)
+        self.connections[sock.fileno()] = connection
+        self._selector.register(sock, selectors.EVENT_READ, connection)
+        if self.on_connect is not None:
+            self.on_connect(connection)
+
+    def _read(self, connection: ServerConnection) -> None:
+        """Read available data and dispatch complete messages."""
+        try:
+            data = connection.sock.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except ConnectionError:
+            data = b""
+        if not data:
+            self._close(connection)
+            return
+
+        try:
+            for payload in connection.frames.feed(data):
+                try:
+                    message = connection.protocol.decode_payload(payload)
+                except DeadlineExceeded as e:
+                    reply = self._expired(e)
+                    if reply is not None:
+                        connection.send(reply)
+                    continue
+                if self.features is not None and connection.session is None:
+                    if self._negotiate(connection, message):
+                        continue
+                self._dispatch(connection, message)
+        except (ValueError, ValidationError) as e:
+            logger.warning(f"Closing connection after protocol error: {e}")
+            self._close(connection)
+
+    def _negotiate(self, connection: ServerConnection, message: Dict[str, Any]) -> bool:
+        """Set up the session from a connection's first message; True if it was a hello."""
+        handshake = Handshake(connection.protocol, self.features)
+        if message.get("type") != "hello":
+            # Legacy client, its first message is handled as usual
+            connection.session = legacy_parameters(connection.protocol)
+            handshake.apply(connection.session)
+            return False
+        # Answer before applying, the peer still expects default framing
+        connection.send(handshake.hello())
+        connection.session = handshake.accept(message)
+        return True
+
+    def _dispatch(self, connection: ServerConnection, message: Dict[str, Any]) -> None:
+        """Run the handler inline or on the worker pool."""
+        if self._pool is None:
+            reply = self._handle(connection, message)
+            if reply is not None:
+                connection.send(reply)
+            return
+        future = self._pool.submit(self._handle, connection, message)
+        future.add_done_callback(lambda f: self._complete(connection, f.result()))
+
+    def _expired(self, error: DeadlineExceeded) -> Optional[Dict[str, Any]]:
+        """Reply for a command that expired before it was handled, if rejecting."""
+        logger.debug(f"Dropping expired command: {error}")
+        if not self.reject_expired or error.message_id is None:
+            return None
+        return self.protocol.create_response_message(
+            error.message_id, "error", error={"code": "deadline_exceeded", "message": str(error)})
+
+    def _handle(self, connection: ServerConnection, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if self._pool is not None:
+            # The command may have expired while queued for a worker
+            try:
+                self.protocol.check_deadline(message)
+            except DeadlineExceeded as e:
+                return self._expired(e)
+        try:
+            return self.handler(connection, message)
+        except Exception:
+            logger.exception("Message handler failed")
+            return None
+
+    def _complete(self, connection: ServerConnection, reply: Optional[Dict[str, Any]]) -> None:
+        """Hand a worker result back to the event loop (worker thread)."""
+        if reply is None:
+            return
+        self._completed.append((connection, reply))
+        self._wake()
+
+    def _drain_wakeups(self) -> None:
+        """Register adopted sockets and send replies of completed worker handlers."""
+        try:
+            while self._wake_recv.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while self._adopted:
+            self._register(self._adopted.popleft())
+        while self._completed:
+            connection, reply = self._completed.popleft()
+            try:
+                connection.send(reply)
+            except (ValueError, ValidationError) as e:
+                logger.warning(f"Closing connection after invalid handler reply: {e}")
+                self._close(connection)
+
+    def _write(self, connection: ServerConnection) -> None:
+        """Send as much buffered output as the socket accepts."""
+        try:
+            sent = connection.sock.send(connection.outbox)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except ConnectionError:
+            self._close(connection)
+            return
+        del connection.outbox[:sent]
+        # Only watch for writability while output is pending
+        writing = bool(connection.outbox)
+        if writing != connection.writing:
+            connection.writing = writing
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self._selector.modify(connection.sock, events, connection)
+
+    def _close(self, connection: ServerConnection) -> None:
+        if connection.closed:
+            return
+        connection.closed = True
+        self.connections.pop(connection.sock.fileno(), None)
+        self._selector.unregister(connection.sock)
+        connection.sock.close()
+        if self.on_disconnect is not None:
+            self.on_disconnect(connection)
@@ -0,0 +1,463 @@
+"""
+Shared-memory ring buffer transport for same-host peers.
+
+Framed messages (with the regular 8-byte frame header) are written into a
+single-producer/single-consumer byte ring in shared memory, one ring per
+direction. Readers and writers block on doorbell file descriptors (eventfd
+where available, a pipe otherwise) when the ring is empty or full, and the
+Unix socket used for setup stays open to detect a dead peer.
+
+ShmReader and ShmWriter are file-like, so FramedJSONProtocol.read_message()
+and write_message() work on them unchanged. SharedMemoryTransport.offer()
+and accept() set up the rings over a connected Unix socket and fall back
+to plain socket I/O when shared memory or descriptor passing is unavailable.
+"""
+
+import json
+import logging
+import os
+import select
+import socket
+import struct
+from typing import Any, Dict, List, Optional
+
+from .framed_json import FramedJSONProtocol
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover - platforms without shared memory
+    shared_memory = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_RING_CAPACITY = 1024 * 1024
+
+# Setup record: magic + body length, body is JSON
+_SETUP_HEADER = struct.Struct('>4sI')
+_SETUP_MAGIC_SHM = b"SHM1"
+_SETUP_MAGIC_SOCKET = b"SOCK"
+_SETUP_ACK = b"OK"
+_SETUP_NACK = b"NO"
+
+
+class Doorbell:
+    """Cross-process wakeup signal backed by an eventfd or a pipe."""
+
+    def __init__(self, read_fd: int, write_fd: int):
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+
+    @classmethod
+    def create(cls) -> "Doorbell":
+        """Create a doorbell, preferring eventfd."""
+        if hasattr(os, "eventfd"):
+            fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            return cls(fd, fd)
+        read_fd, write_fd = os.pipe()
+        return cls(read_fd, write_fd)
+
+    @property
+    def is_eventfd(self) -> bool:
+        return self.read_fd == self.write_fd
+
+    def fds(self) -> List[int]:
+        """Descriptors to pass to the peer."""
+        if self.is_eventfd:
+            return [self.read_fd]
+        return [self.read_fd, self.write_fd]
+
+    def ring(self) -> None:
+        """Wake up the waiting side."""
+        try:
+            if self.is_eventfd:
+                os.eventfd_write(self.write_fd, 1)
+            else:
+                os.write(self.write_fd, b"\0")
+        except BlockingIOError:
+            pass  # Already signalled
+
+    def clear(self) -> None:
+        """Consume pending wakeups."""
+        try:
+            if self.is_eventfd:
+                os.eventfd_read(self.read_fd)
+            else:
+                while os.read(self.read_fd, 4096):
+                    pass
+        except BlockingIOError:
+            pass
+
+    def close(self) -> None:
+        """Close the descriptors."""
+        os.close(self.read_fd)
+        if not self.is_eventfd:
+            os.close(self.write_fd)
+
+
+class ShmRing:
+    """Single-producer/single-consumer byte ring in shared memory.
+
+    The control block holds monotonically increasing head (bytes written)
+    and tail (bytes read) counters; only the producer advances head and
+    only the consumer advances tail, so no lock is needed.
+    """
+
+    HEADER_SIZE = 64
+    _CAPACITY = 0
+    _HEAD = 8
+    _TAIL = 16
+    _CLOSED = 24
+    _READER_WAITING = 32
+    _WRITER_WAITING = 40
+
+    def __init__(self, shm: Any, owner: bool):
+        self._shm = shm
+        self._buf = shm.buf
+        self.owner = owner
+        self.capacity = self._get(self._CAPACITY)
+
+    @classmethod
+    def create(cls, capacity: int = DEFAULT_RING_CAPACITY, name: Optional[str] = None) -> "ShmRing":
+        """Create a new ring with capacity data bytes."""
+        if shared_memory is None:
+            raise OSError("Shared memory is not supported on this platform")
+        if capacity < FramedJSONProtocol.FRAME_HEADER_SIZE:
+            raise ValueError("Ring capacity too small")
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.HEADER_SIZE + capacity)
+        shm.buf[:cls.HEADER_SIZE] = bytes(cls.HEADER_SIZE)
+        struct.pack_into('<Q', shm.buf, cls._CAPACITY, capacity)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "ShmRing":
+        """Attach to a ring created by the peer."""
+        if shared_memory is None:
+            raise OSError("Shared memory is not supported on this platform")
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            # The creator owns the segment; keep the resource tracker of
+            # this process from unlinking it at exit.
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return cls(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        """Shared memory segment name."""
+        return self._shm.name
+
+    def _get(self, offset: int) -> int:
+        return struct.unpack_from('<Q', self._buf, offset)[0]
+
+    def _set(self, offset: int, value: int) -> None:
+        struct.pack_into('<Q', self._buf, offset, value)
+
+    @property
+    def closed(self) -> bool:
+        """Whether the producer closed the ring."""
+        return self._get(self._CLOSED) != 0
+
+    def mark_closed(self) -> None:
+        self._set(self._CLOSED, 1)
+
+    def readable(self) -> int:
+        """Number of bytes available to the consumer."""
+        return self._get(self._HEAD) - self._get(self._TAIL)
+
+    def writable(self) -> int:
+        """Number of bytes the producer can write without blocking."""
+        return self.capacity - self.readable()
+
+    def put(self, data: memoryview) -> int:
+        """Copy as much of data as fits into the ring. Returns bytes written."""
+        head = self._get(self._HEAD)
+        count = min(len(data), self.capacity - (head - self._get(self._TAIL)))
+        if count <= 0:
+            return 0
+        start = head % self.capacity
+        first = min(count, self.capacity - start)
+        base = self.HEADER_SIZE
+        self._buf[base + start:base + start + first] = data[:first]
+        if count > first:
+            self._buf[base:base + count - first] = data[first:count]
+        # Publish only after the data is in place
+        self._set(self._HEAD, head + count)
+        return count
+
+    def take(self, size: int) -> bytes:
+        """Remove and return up to size bytes from the ring."""
+        tail = self._get(self._TAIL)
+        count = min(size, self._get(self._HEAD) - tail)
+        if count <= 0:
+            return b""
+        start = tail % self.capacity
+        first = min(count, self.capacity - start)
+        base = self.HEADER_SIZE
+        data = bytes(self._buf[base + start:base + start + first])
+        if count > first:
+            data += bytes(self._buf[base:base + count - first])
+        self._set(self._TAIL, tail + count)
+        return data
+
+    def close(self) -> None:
+        """Detach from the ring, unlinking it if this side created it."""
+        self._shm.close()
+        if self.owner:
+            self.unlink()
+
+    def unlink(self) -> None:
+        """Remove the segment name; attached peers keep their mapping."""
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        self.owner = False
+
+
+class _RingEndpoint:
+    """Common waiting logic of ring readers and writers."""
+
+    # Upper bound on a single wait, covers missed wakeups
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, ring: ShmRing, data_bell: Doorbell, space_bell: Doorbell,
+                 peer: Optional[socket.socket] = None):
+        self.ring = ring
+        self.data_bell = data_bell
+        self.space_bell = space_bell
+        self.peer = peer
+        self.peer_closed = False
+
+    def _wait(self, bell: Doorbell) -> None:
+        """Block until bell rings, the poll interval passes or the peer closes."""
+        watched = [bell.read_fd]
+        if self.peer is not None:
+            watched.append(self.peer.fileno())
+        ready, _, _ = select.select(watched, [], [], self.POLL_INTERVAL)
+        if self.peer is not None and self.peer.fileno() in ready:
+            # Nothing but EOF is sent on the socket after setup
+            if not self.peer.recv(1, socket.MSG_PEEK):
+                self.peer_closed = True
+        bell.clear()
+
+
+class ShmReader(_RingEndpoint):
+    """File-like consumer end of a ring."""
+
+    def read(self, size: int) -> bytes:
+        """Read exactly size bytes; short only when the producer has closed."""
+        chunks = []
+        remaining = size
+        while remaining:
+            data = self.ring.take(remaining)
+            if data:
+                chunks.append(data)
+                remaining -= len(data)
+                if self.ring._get(ShmRing._WRITER_WAITING):
+                    self.space_bell.ring()
+                continue
+            # Data may have been put right before the close, after take() came up empty
+            if (self.ring.closed or self.peer_closed) and not self.ring.readable():
+                break
+            self.ring._set(ShmRing._READER_WAITING, 1)
+            if not self.ring.readable() and not self.ring.closed:
+                self._wait(self.data_bell)
+            self.ring._set(ShmRing._READER_WAITING, 0)
+        return b"".join(chunks)
+
+
+class ShmWriter(_RingEndpoint):
+    """File-like producer end of a ring."""
+
+    def write(self, data: bytes) -> int:
+        """Write all of data, blocking while the ring is full."""
+        view = memoryview(data)
+        sent = 0
+        while sent < len(view):
+            written = self.ring.put(view[sent:])
+            if written:
+                sent += written
+                if self.ring._get(ShmRing._READER_WAITING):
+                    self.data_bell.ring()
+                continue
+            if self.peer_closed:
+                raise BrokenPipeError("Shared memory peer closed")
+            self.ring._set(ShmRing._WRITER_WAITING, 1)
+            if not self.ring.writable():
+                self._wait(self.space_bell)
+            self.ring._set(ShmRing._WRITER_WAITING, 0)
+        return sent
+
+    def flush(self) -> None:
+        """Make sure a waiting reader is woken up."""
+        self.data_bell.ring()
+
+    def close(self) -> None:
+        """Signal end of stream to the reader."""
+        self.ring.mark_closed()
+        self.data_bell.ring()
+
+
+class SharedMemoryTransport:
+    """Framed message transport over shared-memory rings or a socket."""
+
+    def __init__(self,
+                 reader,
+                 writer,
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 sock: Optional[socket.socket] = None,
+                 resources: Optional[List[Any]] = None):
+        """Initialize transport.
+
+        Args:
+            reader: File-like object messages are read from
+            writer: File-like object messages are written to
+            protocol: Protocol used to encode and decode messages
+            sock: Underlying Unix socket
+            resources: Rings and doorbells to close with the transport
+        """
+        self.reader = reader
+        self.writer = writer
+        self.protocol = protocol or FramedJSONProtocol()
+        self.sock = sock
+        self._resources = resources or []
+
+    @property
+    def shared_memory(self) -> bool:
+        """Whether messages travel through shared memory."""
+        return isinstance(self.writer, ShmWriter)
+
+    def read_message(self) -> Optional[Dict[str, Any]]:
+        """Read the next message, None once the peer has closed."""
+        return self.protocol.read_message(self.reader)
+
+    def write_message(self, message: Dict[str, Any]) -> None:
+        """Encode and write a message."""
+        self.protocol.write_message(self.writer, message)
+
+    def close(self) -> None:
+        """Close the transport and release shared memory."""
+        if isinstance(self.writer, ShmWriter):
+            self.writer.close()
+        for resource in self._resources:
+            resource.close()
+        self._resources = []
+        if self.sock is not None:
+            self.sock.close()
+
+    @classmethod
+    def _socket_fallback(cls, sock: socket.socket,
+                         protocol: Optional[FramedJSONProtocol]) -> "SharedMemoryTransport":
+        return cls(sock.makefile('rb'), sock.makefile('wb'), protocol, sock)
+
+    @classmethod
+    def offer(cls,
+              sock: socket.socket,
+              protocol: Optional[FramedJSONProtocol] = None,
+              capacity: int = DEFAULT_RING_CAPACITY) -> "SharedMemoryTransport":
+        """Create rings and offer them to the peer over a Unix socket.
+
+        The peer must call accept() on its end. Falls back to the socket
+        when shared memory or descriptor passing is not available.
+        """
+        resources: List[Any] = []
+        try:
+            if not hasattr(socket, "send_fds") or sock.family != socket.AF_UNIX:
+                raise OSError("Descriptor passing is not available")
+            outbound = ShmRing.create(capacity)
+            resources.append(outbound)
+            inbound = ShmRing.create(capacity)
+            resources.append(inbound)
+            bells = []
+            for _ in range(4):
+                bells.append(Doorbell.create())
+                resources.append(bells[-1])
+        except (OSError, ValueError) as e:
+            logger.info(f"Shared memory transport unavailable, using socket: {e}")
+            for resource in resources:
+                resource.close()
+            sock.sendall(_SETUP_HEADER.pack(_SETUP_MAGIC_SOCKET, 0))
+            return cls._socket_fallback(sock, protocol)
+
+        body = json.dumps({
+            "rings": [outbound.name, inbound.name],
+            "eventfd": bells[0].is_eventfd,
+        }).encode('utf-8')
+        fds = [fd for bell in bells for fd in bell.fds()]
+        socket.send_fds(sock, [_SETUP_HEADER.pack(_SETUP_MAGIC_SHM, len(body)) + body], fds)
+
+        if _recv_exactly(sock, len(_SETUP_ACK)) != _SETUP_ACK:
+            logger.info("Peer declined shared memory transport, using socket")
+            for resource in resources:
+                resource.close()
+            return cls._socket_fallback(sock, protocol)
+
+        # Both sides are attached, the names are no longer needed
+        outbound.unlink()
+        inbound.unlink()
+        reader = ShmReader(inbound, bells[2], bells[3], sock)
+        writer = ShmWriter(outbound, bells[0], bells[1], sock)
+        return cls(reader, writer, protocol, sock, resources)
+
+    @classmethod
+    def accept(cls,
+               sock: socket.socket,
+               protocol: Optional[FramedJSONProtocol] = None) -> "SharedMemoryTransport":
+        """Accept the rings offered by the peer (see offer())."""
+        # Read no further than the setup record: the peer may already have
+        # written its first framed messages behind it
+        if hasattr(socket, "recv_fds"):
+            data, fds, _, _ = socket.recv_fds(sock, _SETUP_HEADER.size, 8)
+        else:
+            data, fds = sock.recv(_SETUP_HEADER.size), []
+        if not data:
+            raise ConnectionError("Connection closed during shared memory setup")
+        data += _recv_exactly(sock, _SETUP_HEADER.size - len(data))
+        magic, length = _SETUP_HEADER.unpack(data)
+        body = _recv_exactly(sock, length)
+
+        if magic == _SETUP_MAGIC_SOCKET:
+            return cls._socket_fallback(sock, protocol)
+        if magic != _SETUP_MAGIC_SHM:
+            raise ValueError(f"Invalid shared memory setup record: {magic!r}")
+
+        rings: List[ShmRing] = []
+        try:
+            setup = json.loads(body.decode('utf-8'))
+            step = 1 if setup["eventfd"] else 2
+            if len(fds) != 4 * step:
+                raise OSError(f"Expected {4 * step} descriptors, got {len(fds)}")
+            rings.append(ShmRing.attach(setup["rings"][0]))
+            rings.append(ShmRing.attach(setup["rings"][1]))
+        except (OSError, ValueError, KeyError) as e:
+            logger.info(f"Cannot attach shared memory transport, using socket: {e}")
+            for ring in rings:
+                ring.close()
+            for fd in fds:
+                os.close(fd)
+            sock.sendall(_SETUP_NACK)
+            return cls._socket_fallback(sock, protocol)
+
+        inbound, outbound = rings
+        bells = [Doorbell(fds[i], fds[i + step - 1]) for i in range(0, 4 * step, step)]
+        resources: List[Any] = [inbound, outbound] + bells
+        sock.sendall(_SETUP_ACK)
+        reader = ShmReader(inbound, bells[0], bells[1], sock)
+        writer = ShmWriter(outbound, bells[2], bells[3], sock)
+        return cls(reader, writer, protocol, sock, resources)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    """Receive exactly size bytes from a socket."""
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed during shared memory setup")
+        data += chunk
+    return data
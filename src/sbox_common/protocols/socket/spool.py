@@ -0,0 +1,491 @@
+"""
+Durable on-disk spool for outbound frames.
+
+While the agent socket is unavailable, FrameSpool stores already-encoded
+frames in preallocated segment files and drains them in bulk with
+vectored writes (sendmsg/writev) once the connection is back. Writes are
+made durable in batches: fdatasync runs after fsync_batch records, or
+once fsync_interval seconds have passed since the last sync. The spool
+has no timer thread, so the interval is checked on enqueue() and
+sync_if_due(); callers that may go quiet with records unsynced (such as
+SpoolingSender.flush(), meant to be called periodically) call
+sync_if_due() to bound the loss window. drain() and close() always sync.
+
+Every record can carry an expiry time and a coalescing group. A record
+written as full state for its group (config.created/updated/deleted for
+a config_id) supersedes all earlier records of the group, which are
+skipped by the drain, so a long outage does not replay every
+intermediate config. Heartbeats expire instead of piling up.
+
+Record layout inside a segment (a zero length ends the used part):
+
+    >IIdBH  frame length, CRC32 of frame, expires_at (0 = never),
+            flags (1 = full state), group length
+    group   UTF-8 coalescing group
+    frame   framed JSON message as sent on the socket
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .framed_json import FramedJSONProtocol
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_HEARTBEAT_TTL = 60.0
+IOV_MAX = 1024
+
+_RECORD = struct.Struct(">IIdBH")
+_FLAG_FULL = 0x01
+_CURSOR = struct.Struct(">QQ")
+
+# Config event types carrying the complete state of a config_id
+FULL_STATE_EVENTS = frozenset({"config.created", "config.updated", "config.deleted"})
+
+Position = Tuple[int, int]
+
+
+def spool_group(message: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+    """Coalescing group of a message and whether it carries full state."""
+    if message.get("type") != "event":
+        return None, False
+    event = message.get("event", {})
+    event_type = event.get("event_type", "")
+    config_id = event.get("data", {}).get("config_id") if isinstance(event.get("data"), dict) else None
+    if not event_type.startswith("config.") or not isinstance(config_id, str):
+        return None, False
+    return f"config:{config_id}", event_type in FULL_STATE_EVENTS
+
+
+class _Segment:
+    """A preallocated spool segment file."""
+
+    __slots__ = ("seq", "path", "fd", "size", "end")
+
+    def __init__(self, seq: int, path: Path, fd: int, size: int):
+        self.seq = seq
+        self.path = path
+        self.fd = fd
+        self.size = size
+        self.end = 0
+
+
+def _preallocate(fd: int, size: int) -> None:
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        os.ftruncate(fd, size)
+
+
+def _send_vectored(target: Any, buffers: List[memoryview]) -> None:
+    """Write all buffers to a socket (sendmsg) or file descriptor (writev)."""
+    if isinstance(target, socket.socket):
+        send = target.sendmsg
+    else:
+        fd = target if isinstance(target, int) else target.fileno()
+
+        def send(chunk):
+            return os.writev(fd, chunk)
+
+    index = 0
+    while index < len(buffers):
+        sent = send(buffers[index:index + IOV_MAX])
+        while sent:
+            length = len(buffers[index])
+            if sent >= length:
+                sent -= length
+                index += 1
+            else:
+                buffers[index] = buffers[index][sent:]
+                sent = 0
+
+
+class FrameSpool:
+    """Bounded, durable FIFO of encoded frames with coalescing and expiry."""
+
+    def __init__(self,
+                 directory: Union[Path, str],
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 segment_size: int = DEFAULT_SEGMENT_SIZE,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 fsync_batch: int = 64,
+                 fsync_interval: float = 0.05,
+                 heartbeat_ttl: Optional[float] = DEFAULT_HEARTBEAT_TTL):
+        """Open spool, recovering records left by a previous run.
+
+        Args:
+            directory: Spool directory (created if missing)
+            protocol: Protocol used by enqueue_message()
+            segment_size: Preallocated size of each segment file
+            max_bytes: Disk budget; the oldest segments are dropped beyond it
+            fsync_batch: Records written between fdatasync calls at most
+            fsync_interval: Age in seconds of the last fdatasync after
+                which enqueue() and sync_if_due() sync again
+            heartbeat_ttl: Expiry of spooled heartbeat messages (None keeps them)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.protocol = protocol or FramedJSONProtocol()
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.heartbeat_ttl = heartbeat_ttl
+        self._segments: List[_Segment] = []
+        self._cursor: Position = (0, 0)
+        # Position of the latest full-state record per coalescing group
+        self._latest_full: Dict[str, Position] = {}
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.pending = 0
+        self.dropped = 0
+        self.expired = 0
+        self.coalesced = 0
+        self._recover()
+
+    # Recovery
+
+    def _recover(self) -> None:
+        try:
+            with open(self.directory / "cursor", 'rb') as f:
+                self._cursor = _CURSOR.unpack(f.read(_CURSOR.size))
+        except (OSError, struct.error):
+            self._cursor = (0, 0)
+
+        for path in sorted(self.directory.glob("spool-*.seg")):
+            seq = int(path.stem.split("-")[1])
+            if seq < self._cursor[0]:
+                path.unlink()
+                continue
+            fd = os.open(path, os.O_RDWR | getattr(os, "O_CLOEXEC", 0))
+            segment = _Segment(seq, path, fd, os.fstat(fd).st_size)
+            self._segments.append(segment)
+            start = self._cursor[1] if seq == self._cursor[0] else 0
+            for position, _, _, group, full, _ in self._scan(segment, 0, recovering=True):
+                if position[1] >= start:
+                    self.pending += 1
+                if full:
+                    self._latest_full[group] = position
+        if self.pending:
+            logger.info(f"Recovered {self.pending} spooled frames from {self.directory}")
+
+    def _scan(self, segment: _Segment, start: int,
+              recovering: bool = False) -> Iterator[Tuple[Position, int, float, str, bool, memoryview]]:
+        """Parse records of a segment: (position, end offset, expires_at, group, full, frame).
+
+        Stops at the first empty or torn record. When recovering, the whole
+        preallocated file is scanned and the used size is recorded.
+        """
+        stop = segment.size if recovering else segment.end
+        data = memoryview(os.pread(segment.fd, max(stop - start, 0), start))
+        offset = 0
+        while offset + _RECORD.size <= len(data):
+            length, crc, expires_at, flags, group_length = _RECORD.unpack_from(data, offset)
+            body = offset + _RECORD.size
+            end = body + group_length + length
+            if length == 0 or end > len(data):
+                break
+            frame = data[body + group_length:end]
+            if zlib.crc32(frame) != crc:
+                logger.warning(f"Torn record in {segment.path} at {start + offset}, truncating")
+                break
+            group = bytes(data[body:body + group_length]).decode('utf-8')
+            yield (segment.seq, start + offset), start + end, expires_at, group, bool(flags & _FLAG_FULL), frame
+            offset = end
+        if start + offset > segment.end:
+            segment.end = start + offset
+
+    # Writing
+
+    def _new_segment(self, minimum: int) -> _Segment:
+        seq = (self._segments[-1].seq if self._segments else self._cursor[0]) + 1
+        path = self.directory / f"spool-{seq:012d}.seg"
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_CLOEXEC", 0), 0o600)
+        size = max(self.segment_size, minimum)
+        _preallocate(fd, size)
+        segment = _Segment(seq, path, fd, size)
+        self._segments.append(segment)
+        if len(self._segments) == 1:
+            self._cursor = (seq, 0)
+            self._write_cursor()
+        self._enforce_budget()
+        return segment
+
+    def _enforce_budget(self) -> None:
+        """Drop the oldest segments while over the disk budget."""
+        while len(self._segments) > 1 and sum(s.size for s in self._segments) > self.max_bytes:
+            oldest = self._segments.pop(0)
+            lost = sum(1 for position, *_ in self._scan(oldest, 0) if position >= self._cursor)
+            self.dropped += lost
+            self.pending -= lost
+            logger.warning(f"Spool over {self.max_bytes} bytes, dropped {lost} frames")
+            self._remove(oldest)
+            self._cursor = (self._segments[0].seq, 0)
+
+    def _remove(self, segment: _Segment) -> None:
+        os.close(segment.fd)
+        try:
+            segment.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def enqueue(self,
+                frame: bytes,
+                group: Optional[str] = None,
+                full: bool = False,
+                ttl: Optional[float] = None) -> None:
+        """Spool an encoded frame.
+
+        Args:
+            frame: Framed message bytes
+            group: Coalescing group
+            full: The frame carries the full state of its group and
+                supersedes earlier frames of it
+            ttl: Seconds after which the frame is no longer sent
+        """
+        group_bytes = (group or "").encode('utf-8')
+        expires_at = time.time() + ttl if ttl is not None else 0.0
+        record = _RECORD.pack(len(frame), zlib.crc32(frame), expires_at,
+                              _FLAG_FULL if full else 0, len(group_bytes)) + group_bytes + frame
+
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or segment.end + len(record) + _RECORD.size > segment.size:
+            if segment is not None:
+                os.fdatasync(segment.fd)
+            # Room for the record plus a zero terminator
+            segment = self._new_segment(len(record) + _RECORD.size)
+        os.pwrite(segment.fd, record, segment.end)
+        position = (segment.seq, segment.end)
+        segment.end += len(record)
+        self.pending += 1
+        if full and group:
+            self._latest_full[group] = position
+
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_batch:
+            self.sync()
+        else:
+            self.sync_if_due()
+
+    def enqueue_message(self, message: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        """Encode and spool a message, deriving its coalescing group and expiry."""
+        group, full = spool_group(message)
+        if ttl is None and message.get("type") == "heartbeat":
+            ttl = self.heartbeat_ttl
+        elif ttl is None and message.get("type") == "command" and "deadline" in message["command"]:
+            # No point delivering a command its sender stopped waiting for
+            ttl = message["command"]["deadline"] - time.time()
+        self.enqueue(self.protocol.encode_message(message), group, full, ttl)
+
+    def sync(self) -> None:
+        """Make spooled frames durable."""
+        if self._unsynced and self._segments:
+            os.fdatasync(self._segments[-1].fd)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync_if_due(self) -> bool:
+        """Sync if unsynced frames are older than fsync_interval; True if synced."""
+        if self._unsynced and time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+            return True
+        return False
+
+    # Draining
+
+    def __len__(self) -> int:
+        return self.pending
+
+    def _batches(self, max_frames: int) -> Iterator[Tuple[List[memoryview], Position, int]]:
+        """Yield (live frames, cursor after them, records consumed) batches."""
+        now = time.time()
+        for segment in list(self._segments):
+            if segment.seq < self._cursor[0]:
+                continue
+            start = self._cursor[1] if segment.seq == self._cursor[0] else 0
+            frames: List[memoryview] = []
+            consumed = 0
+            cursor = (segment.seq, start)
+            for position, end, expires_at, group, _, frame in self._scan(segment, start):
+                consumed += 1
+                cursor = (segment.seq, end)
+                if expires_at and expires_at < now:
+                    self.expired += 1
+                elif group and self._latest_full.get(group, position) > position:
+                    self.coalesced += 1  # Superseded by a later full-state frame
+                else:
+                    frames.append(frame)
+                if len(frames) >= max_frames:
+                    yield frames, cursor, consumed
+                    frames, consumed = [], 0
+            if frames or consumed or cursor[1] == segment.end:
+                yield frames, cursor, consumed
+
+    def _advance(self, cursor: Position, consumed: int) -> None:
+        """Move the drain cursor, releasing fully drained segments."""
+        self._cursor = cursor
+        self.pending -= consumed
+        while self._segments and self._cursor[0] == self._segments[0].seq \
+                and self._cursor[1] >= self._segments[0].end \
+                and (len(self._segments) > 1 or self.pending == 0):
+            drained = self._segments.pop(0)
+            self._remove(drained)
+            if self._segments:
+                self._cursor = (self._segments[0].seq, 0)
+        if not self._segments:
+            self._latest_full.clear()
+        self._write_cursor()
+
+    def _write_cursor(self) -> None:
+        path = self.directory / "cursor"
+        tmp_path = self.directory / "cursor.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_CURSOR.pack(*self._cursor))
+        os.replace(tmp_path, path)
+
+    def drain(self, target: Any, max_frames: int = 256) -> int:
+        """Send spooled frames to a blocking socket or file descriptor.
+
+        Frames go out in vectored writes of up to max_frames frames; the
+        cursor only moves after a batch was written, so an error leaves
+        the unsent frames spooled (delivery is at least once). Returns the
+        number of frames sent.
+        """
+        self.sync()
+        sent = 0
+        for frames, cursor, consumed in self._batches(max_frames):
+            if frames:
+                _send_vectored(target, frames)
+                sent += len(frames)
+            self._advance(cursor, consumed)
+        return sent
+
+    async def drain_async(self, writer: asyncio.StreamWriter, max_frames: int = 256) -> int:
+        """Send spooled frames to an asyncio stream (see drain())."""
+        self.sync()
+        sent = 0
+        for frames, cursor, consumed in self._batches(max_frames):
+            if frames:
+                writer.writelines(frames)
+                await writer.drain()
+                sent += len(frames)
+            self._advance(cursor, consumed)
+        return sent
+
+    def stats(self) -> Dict[str, int]:
+        """Get spool counters."""
+        return {
+            "pending": self.pending,
+            "segments": len(self._segments),
+            "bytes": sum(segment.end for segment in self._segments),
+            "dropped": self.dropped,
+            "expired": self.expired,
+            "coalesced": self.coalesced,
+        }
+
+    def close(self) -> None:
+        """Sync and close segment files."""
+        self.sync()
+        for segment in self._segments:
+            os.close(segment.fd)
+        self._segments = []
+
+
+class SpoolingSender:
+    """Sends messages to the agent socket, spooling them while it is down."""
+
+    def __init__(self,
+                 socket_path: str,
+                 spool: FrameSpool,
+                 retry_interval: float = 1.0,
+                 timeout: float = 5.0):
+        """Initialize sender.
+
+        Args:
+            socket_path: Agent Unix socket path
+            spool: Spool used while the socket is unavailable
+            retry_interval: Minimum seconds between reconnection attempts
+            timeout: Socket send timeout
+        """
+        self.socket_path = socket_path
+        self.spool = spool
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._next_attempt = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def _connect(self) -> bool:
+        if self._sock is not None:
+            return True
+        now = time.monotonic()
+        if now < self._next_attempt:
+            return False
+        self._next_attempt = now + self.retry_interval
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            return False
+        self._sock = sock
+        return True
+
+    def _disconnect(self, error: OSError) -> None:
+        logger.warning(f"Agent socket {self.socket_path} unavailable, spooling: {error}")
+        self._sock.close()
+        self._sock = None
+
+    def flush(self) -> int:
+        """Try to deliver spooled frames; returns the number sent.
+
+        Call periodically while the agent is down: it also syncs frames
+        spooled longer than the spool's fsync_interval ago.
+        """
+        if not len(self.spool) or not self._connect():
+            self.spool.sync_if_due()
+            return 0
+        try:
+            return self.spool.drain(self._sock)
+        except OSError as e:
+            self._disconnect(e)
+            return 0
+
+    def send(self, message: Dict[str, Any]) -> bool:
+        """Send a message, or spool it if the socket is unavailable.
+
+        Returns True if the message was sent right away.
+        """
+        if len(self.spool) or not self._connect():
+            self.spool.enqueue_message(message)
+            self.flush()
+            return False
+        frame = self.spool.protocol.encode_message(message)
+        try:
+            self._sock.sendall(frame)
+            return True
+        except OSError as e:
+            self._disconnect(e)
+            group, full = spool_group(message)
+            self.spool.enqueue(frame, group, full)
+            return False
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self.spool.close()
@@ -0,0 +1,262 @@
+"""
+Precompiled template encoding for fixed-shape messages.
+
+Heartbeats and simple subscription events always have the same shape.
+TemplateEncoder builds such a message once with placeholder values through
+the regular create_* helpers, encodes it and splits the JSON at the
+placeholders into static fragments. Encoding a message then only formats
+the varying fields (ids, timestamps, agent_id, status, ...) and joins them
+with the fragments. Varying fields are checked against their property
+schemas from protocol_v1.schema.json and the event schemas, the static
+parts were validated when the template was compiled. The output is
+byte-identical to FramedJSONProtocol.encode_message().
+"""
+
+import json
+import math
+import struct
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from jsonschema import ValidationError
+
+from ..converters import SubscriptionEventConverter
+from .framed_json import FramedJSONProtocol
+
+_encode_string = json.encoder.encode_basestring_ascii
+
+_JSON_TYPES = {
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+}
+
+
+def _slot_marker(name: str) -> str:
+    return f"\x00slot:{name}\x00"
+
+
+def _field_checker(name: str, schema: Dict[str, Any]) -> Callable[[Any], None]:
+    """Compile a check for a scalar property schema (type, enum, minimum)."""
+    types = _JSON_TYPES.get(schema.get("type"))
+    enum = frozenset(schema["enum"]) if "enum" in schema else None
+    minimum = schema.get("minimum")
+
+    def check(value: Any) -> None:
+        if types is not None and (not isinstance(value, types)
+                                  or (bool not in types and isinstance(value, bool))):
+            raise ValidationError(f"Message validation failed: {value!r} is not of type {schema['type']!r} ({name})")
+        if enum is not None and value not in enum:
+            raise ValidationError(f"Message validation failed: {value!r} is not one of {sorted(enum)} ({name})")
+        if minimum is not None and value < minimum:
+            raise ValidationError(f"Message validation failed: {value!r} is less than the minimum of {minimum} ({name})")
+
+    return check
+
+
+class MessageTemplate:
+    """Static JSON fragments of a message shape with slots for varying fields."""
+
+    def __init__(self,
+                 protocol: FramedJSONProtocol,
+                 prototype: Dict[str, Any],
+                 slots: List[str],
+                 checks: Optional[Dict[str, Callable[[Any], None]]] = None):
+        """Compile template.
+
+        Args:
+            protocol: Protocol whose encoding is reproduced
+            prototype: Message built with _slot_marker(name) for each slot
+            slots: Names of the varying fields
+            checks: Per-slot value checks applied when validation is enabled
+        """
+        self.protocol = protocol
+        self.checks = checks or {}
+        text = json.dumps(prototype, separators=(',', ':'))
+
+        positions = []
+        for name in slots:
+            marker = json.dumps(_slot_marker(name))
+            index = text.find(marker)
+            if index < 0 or text.find(marker, index + 1) >= 0:
+                raise ValueError(f"Template slot {name!r} must appear exactly once")
+            positions.append((index, len(marker), name))
+        positions.sort()
+
+        self.fragments: List[str] = []
+        self.order: List[str] = []
+        offset = 0
+        for index, length, name in positions:
+            self.fragments.append(text[offset:index])
+            self.order.append(name)
+            offset = index + length
+        self.fragments.append(text[offset:])
+
+    def encode_payload(self, values: Dict[str, Any]) -> bytes:
+        """Encode the JSON payload for the given slot values."""
+        if self.protocol.validation_enabled:
+            for name, check in self.checks.items():
+                check(values[name])
+        fragments = self.fragments
+        parts = [fragments[0]]
+        for index, name in enumerate(self.order, 1):
+            value = values[name]
+            value_type = type(value)
+            if value_type is str:
+                parts.append(_encode_string(value))
+            elif value_type is int or (value_type is float and math.isfinite(value)):
+                # What json.dumps() emits for plain ints and finite floats
+                parts.append(value_type.__repr__(value))
+            else:
+                parts.append(json.dumps(value))
+            parts.append(fragments[index])
+        return "".join(parts).encode('utf-8')
+
+    def encode(self, values: Dict[str, Any]) -> bytes:
+        """Encode a framed message for the given slot values."""
+        payload = self.encode_payload(values)
+        if self.protocol.compression_threshold is not None:
+            return self.protocol.frame_payload(payload)
+        return struct.pack('>II', len(payload), self.protocol.version) + payload
+
+
+class TemplateEncoder:
+    """Fast encoder for heartbeats and subscription.enabled/disabled events."""
+
+    def __init__(self,
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 converter: Optional[SubscriptionEventConverter] = None):
+        """Initialize encoder; templates are compiled on first use per shape."""
+        self.protocol = protocol or FramedJSONProtocol()
+        self.converter = converter or SubscriptionEventConverter()
+        self._templates: Dict[Tuple[Any, ...], MessageTemplate] = {}
+        self._heartbeat_checks = self._property_checks(
+            self._protocol_definition("HeartbeatMessage"),
+            ("agent_id", "status", "uptime_seconds", "version")
+        )
+        self._subscription_checks = self._subscription_event_checks()
+
+    def _protocol_definition(self, name: str) -> Dict[str, Any]:
+        schema = self.protocol._protocol_schema or {}
+        return schema.get("definitions", {}).get(name, {})
+
+    @staticmethod
+    def _property_checks(schema: Dict[str, Any], names) -> Dict[str, Callable[[Any], None]]:
+        properties = schema.get("properties", {})
+        return {name: _field_checker(name, properties[name]) for name in names if name in properties}
+
+    def _subscription_event_checks(self) -> Dict[str, Callable[[Any], None]]:
+        """Checks for source and data.subscription_id of subscription events."""
+        schema = self.converter._schemas.get("subscription-events", {})
+        checks = self._property_checks(schema.get("definitions", {}).get("EventBase", {}), ("source",))
+        for variant in schema.get("oneOf", []):
+            for part in variant.get("allOf", []):
+                properties = part.get("properties", {})
+                if properties.get("event_type", {}).get("const") == "subscription.enabled":
+                    checks.update(self._property_checks(properties["data"], ("subscription_id",)))
+        return checks
+
+    @staticmethod
+    def _now() -> str:
+        # Same format as FramedJSONProtocol.create_message_base()
+        return datetime.utcnow().isoformat() + "Z"
+
+    def _heartbeat_template(self, has_uptime: bool, has_version: bool) -> MessageTemplate:
+        key = ("heartbeat", has_uptime, has_version)
+        template = self._templates.get(key)
+        if template is None:
+            slots = ["id", "timestamp", "agent_id", "status"]
+            if has_uptime:
+                slots.append("uptime_seconds")
+            if has_version:
+                slots.append("version")
+            prototype = self.protocol.create_heartbeat_message(
+                _slot_marker("agent_id"),
+                _slot_marker("status"),
+                _slot_marker("uptime_seconds") if has_uptime else None,
+                _slot_marker("version") if has_version else None
+            )
+            prototype["id"] = _slot_marker("id")
+            prototype["timestamp"] = _slot_marker("timestamp")
+            checks = {name: check for name, check in self._heartbeat_checks.items() if name in slots}
+            template = self._compile(key, prototype, slots, checks)
+        return template
+
+    def _subscription_template(self, event_type: str, has_correlation: bool) -> MessageTemplate:
+        key = (event_type, has_correlation)
+        template = self._templates.get(key)
+        if template is None:
+            slots = ["id", "timestamp", "event_id", "event_timestamp", "source", "subscription_id"]
+            correlation_id = None
+            if has_correlation:
+                slots.append("correlation_id")
+                correlation_id = _slot_marker("correlation_id")
+            event = self.converter.create_event_base(event_type, _slot_marker("source"), correlation_id)
+            event["event_id"] = _slot_marker("event_id")
+            event["timestamp"] = _slot_marker("event_timestamp")
+            event["data"] = {"subscription_id": _slot_marker("subscription_id")}
+            prototype = self.protocol.create_event_message(event)
+            prototype["id"] = _slot_marker("id")
+            prototype["timestamp"] = _slot_marker("timestamp")
+            template = self._compile(key, prototype, slots, self._subscription_checks)
+        return template
+
+    def _compile(self, key, prototype, slots, checks) -> MessageTemplate:
+        """Compile a template and validate its static parts once."""
+        template = MessageTemplate(self.protocol, prototype, slots, checks)
+        sample = {name: "sample" for name in slots}
+        sample.update(id=str(uuid.uuid4()), timestamp=self._now(),
+                      event_id=str(uuid.uuid4()), event_timestamp=self._now(),
+                      status="healthy", uptime_seconds=0, source="sboxmgr")
+        self.protocol.decode_payload(template.encode_payload(sample))
+        self._templates[key] = template
+        return template
+
+    def heartbeat(self,
+                  agent_id: str,
+                  status: str,
+                  uptime_seconds: Optional[float] = None,
+                  version: Optional[str] = None) -> bytes:
+        """Encode a full heartbeat (see create_heartbeat_message())."""
+        template = self._heartbeat_template(uptime_seconds is not None, bool(version))
+        return template.encode({
+            "id": str(uuid.uuid4()),
+            "timestamp": self._now(),
+            "agent_id": agent_id,
+            "status": status,
+            "uptime_seconds": uptime_seconds,
+            "version": version,
+        })
+
+    def _subscription_event(self,
+                            event_type: str,
+                            subscription_id: str,
+                            source: str,
+                            correlation_id: Optional[str]) -> bytes:
+        template = self._subscription_template(event_type, bool(correlation_id))
+        now = self._now()
+        return template.encode({
+            "id": str(uuid.uuid4()),
+            "timestamp": now,
+            "event_id": str(uuid.uuid4()),
+            "event_timestamp": now,
+            "source": source,
+            "subscription_id": subscription_id,
+            "correlation_id": correlation_id,
+        })
+
+    def subscription_enabled(self,
+                             subscription_id: str,
+                             source: str = "sboxmgr",
+                             correlation_id: Optional[str] = None) -> bytes:
+        """Encode a subscription.enabled event message."""
+        return self._subscription_event("subscription.enabled", subscription_id, source, correlation_id)
+
+    def subscription_disabled(self,
+                              subscription_id: str,
+                              source: str = "sboxmgr",
+                              correlation_id: Optional[str] = None) -> bytes:
+        """Encode a subscription.disabled event message."""
+        return self._subscription_event("subscription.disabled", subscription_id, source, correlation_id)
@@ -0,0 +1,350 @@
+"""
+End-to-end latency tracing via correlation_id and per-hop timestamps.
+
+A Tracer wraps message encoding and decoding of one service and stamps
+host monotonic clock readings (CLOCK_MONOTONIC is shared by all
+processes of a host) into metadata["trace"] of messages that carry a
+correlation_id. Along a command and its reply (e.g. a reload command and
+the config.reload_completed event) the following hops are recorded:
+
+    encode    sender: validating and serializing the message
+    send      framing, writing, kernel and reading until the frame is in
+    receive   receiver: parsing the JSON payload
+    validate  receiver: schema validation
+    handle    receiver: the handler (Tracer.handle context)
+    respond   handler end until the reply is serialized
+
+The sender cannot know the end of its own encode hop before encoding, so
+the end is written as a fixed-width placeholder and patched into the
+serialized payload. Spans received so far travel with the reply, so the
+service receiving the final message has the whole trace; a
+TraceCollector assembles spans by correlation_id, reports per-hop
+percentiles and exports OTLP/JSON for OpenTelemetry collectors.
+"""
+
+import hashlib
+import json
+import logging
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from ...health.metrics import MetricSummary, summarize_values
+from .framed_json import FramedJSONProtocol
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+TRACE_KEY = "trace"
+HOPS = ("encode", "send", "receive", "validate", "handle", "respond")
+
+# Patched with the zero-padded end time after serialization
+_PENDING_END = "~" * 20
+_PENDING_NEEDLE = f'"end":"{_PENDING_END}"'.encode('ascii')
+
+
+class Span(NamedTuple):
+    """Timing of one hop of a trace, in host monotonic nanoseconds."""
+
+    hop: str
+    service: str
+    start_ns: int
+    end_ns: int
+
+    @property
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+
+def trace_id_of(message: Dict[str, Any]) -> Optional[str]:
+    """Trace id of a message: its correlation_id, or that of its event."""
+    correlation_id = message.get("correlation_id")
+    if correlation_id is None and isinstance(message.get("event"), dict):
+        correlation_id = message["event"].get("correlation_id")
+    return correlation_id
+
+
+class Tracer:
+    """Stamps per-hop timings of one service into traced messages."""
+
+    def __init__(self,
+                 service: str,
+                 protocol: Optional[FramedJSONProtocol] = None,
+                 collector: Optional["TraceCollector"] = None,
+                 clock: Callable[[], int] = time.monotonic_ns,
+                 max_active: int = 10000):
+        """Initialize tracer.
+
+        Args:
+            service: Service name recorded on spans (e.g. "sboxmgr")
+            protocol: Protocol used to encode and decode messages
+            collector: Receives the spans known after each received message
+            clock: Monotonic nanosecond clock shared by the traced services
+            max_active: Traces whose spans are kept for forwarding in a reply
+        """
+        self.service = service
+        self.protocol = protocol or FramedJSONProtocol()
+        self.collector = collector
+        self.clock = clock
+        self.max_active = max_active
+        # trace id -> spans to forward with the next message of the trace
+        self._active: "OrderedDict[str, List[Span]]" = OrderedDict()
+
+    def _remember(self, trace_id: str, spans: List[Span]) -> None:
+        self._active[trace_id] = spans
+        self._active.move_to_end(trace_id)
+        while len(self._active) > self.max_active:
+            self._active.popitem(last=False)
+
+    def encode_payload(self, message: Dict[str, Any]) -> bytes:
+        """Encode a message to JSON, stamping the trace of its correlation_id.
+
+        Messages without a correlation_id are encoded untraced.
+        """
+        trace_id = trace_id_of(message)
+        if trace_id is None:
+            return self.protocol.encode_payload(message)
+
+        start = self.clock()
+        spans = self._active.pop(trace_id, [])
+        hop = "encode"
+        if spans and spans[-1].hop == "handle" and spans[-1].service == self.service:
+            # A reply: the hop covers building it after the handler finished
+            hop, start = "respond", spans[-1].end_ns
+        metadata = dict(message.get("metadata") or {})
+        metadata[TRACE_KEY] = {
+            "spans": [list(span) for span in spans],
+            "pending": {"hop": hop, "service": self.service, "start": start, "end": _PENDING_END},
+        }
+        payload = self.protocol.encode_payload(dict(message, metadata=metadata))
+        end = self.clock()
+        position = payload.rfind(_PENDING_NEEDLE)
+        if position < 0:  # pragma: no cover - encode_payload always keeps it
+            return payload
+        return (payload[:position] + f'"end":"{end:020d}"'.encode('ascii')
+                + payload[position + len(_PENDING_NEEDLE):])
+
+    def encode_message(self, message: Dict[str, Any]) -> bytes:
+        """Encode a message to a frame, stamping its trace."""
+        return self.protocol.frame_payload(self.encode_payload(message))
+
+    def write_message(self, writer, message: Dict[str, Any]) -> None:
+        writer.write(self.encode_message(message))
+        writer.flush()
+
+    async def write_message_async(self, writer, message: Dict[str, Any]) -> None:
+        writer.write(self.encode_message(message))
+        await writer.drain()
+
+    def decode_payload(self, payload: bytes, received_ns: Optional[int] = None) -> Dict[str, Any]:
+        """Parse and validate a payload, recording receive-side hops.
+
+        Args:
+            payload: JSON payload of a complete message
+            received_ns: Clock reading when the frame was fully read
+        """
+        received = self.clock() if received_ns is None else received_ns
+        try:
+            message = json.loads(payload)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        parsed = self.clock()
+        if isinstance(message, dict):
+            self.protocol.check_deadline(message)
+        self.protocol.validate_message(message)
+        validated = self.clock()
+
+        trace_id = trace_id_of(message) if isinstance(message, dict) else None
+        if trace_id is None:
+            return message
+        spans = []
+        trace = (message.get("metadata") or {}).get(TRACE_KEY)
+        if isinstance(trace, dict):
+            try:
+                spans = [Span(*span) for span in trace.get("spans", [])]
+                pending = trace.get("pending")
+                if pending is not None:
+                    sent = int(pending["end"])
+                    spans.append(Span(pending["hop"], pending["service"], pending["start"], sent))
+                    spans.append(Span("send", pending["service"], sent, received))
+            except (TypeError, ValueError, KeyError):
+                logger.debug(f"Ignoring malformed trace metadata of {trace_id}")
+                spans = []
+        spans.append(Span("receive", self.service, received, parsed))
+        spans.append(Span("validate", self.service, parsed, validated))
+        self._remember(trace_id, spans)
+        if self.collector is not None:
+            self.collector.add(trace_id, spans, _attributes(message))
+        return message
+
+    def read_message(self, reader) -> Optional[Dict[str, Any]]:
+        """Read and decode a complete message from a reader object."""
+        payload = self.protocol.read_payload(reader)
+        if payload is None:
+            return None
+        return self.decode_payload(payload, self.clock())
+
+    async def read_message_async(self, reader) -> Optional[Dict[str, Any]]:
+        """Read and decode a complete message from an asyncio stream reader."""
+        payload = await self.protocol.read_payload_async(reader)
+        if payload is None:
+            return None
+        return self.decode_payload(payload, self.clock())
+
+    @contextmanager
+    def handle(self, message: Dict[str, Any]) -> Iterator[None]:
+        """Record the handle hop of a received message."""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            trace_id = trace_id_of(message)
+            if trace_id is not None:
+                span = Span("handle", self.service, start, self.clock())
+                self._remember(trace_id, self._active.get(trace_id, []) + [span])
+                if self.collector is not None:
+                    self.collector.add(trace_id, [span])
+
+
+def _attributes(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Trace attributes taken from a received message."""
+    event = message.get("event")
+    if not isinstance(event, dict):
+        return {}
+    attributes = {"event_type": event.get("event_type")}
+    data = event.get("data")
+    if isinstance(data, dict) and isinstance(data.get("reload_time_ms"), (int, float)):
+        attributes["reload_time_ms"] = data["reload_time_ms"]
+    return attributes
+
+
+def _hex_id(value: str, length: int) -> str:
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:length]
+
+
+class TraceCollector:
+    """Assembles spans into traces by correlation_id."""
+
+    def __init__(self, max_traces: int = 10000):
+        """Initialize collector keeping the most recent max_traces traces."""
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, Dict[Span, None]]" = OrderedDict()
+        self._attributes: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._traces)
+
+    @property
+    def trace_ids(self) -> List[str]:
+        return list(self._traces)
+
+    def add(self, trace_id: str, spans: Sequence[Span], attributes: Optional[Dict[str, Any]] = None) -> None:
+        """Merge spans (and attributes) into a trace."""
+        trace = self._traces.get(trace_id)
+        if trace is None:
+            trace = self._traces[trace_id] = {}
+            while len(self._traces) > self.max_traces:
+                evicted, _ = self._traces.popitem(last=False)
+                self._attributes.pop(evicted, None)
+        for span in spans:
+            trace[span] = None  # Ordered set; forwarded spans arrive repeatedly
+        if attributes:
+            self._attributes.setdefault(trace_id, {}).update(attributes)
+
+    def spans(self, trace_id: str) -> List[Span]:
+        """Spans of a trace ordered by start time."""
+        return sorted(self._traces.get(trace_id, ()), key=lambda span: (span.start_ns, span.end_ns))
+
+    def attributes(self, trace_id: str) -> Dict[str, Any]:
+        return dict(self._attributes.get(trace_id, {}))
+
+    def breakdown(self,
+                  percentiles: Sequence[float] = (50, 95, 99),
+                  by_service: bool = False) -> Dict[str, MetricSummary]:
+        """Per-hop duration summaries in milliseconds across all traces.
+
+        Keys are hop names ("service/hop" with by_service), plus "total"
+        for first span start to last span end and "reload_time_ms" when
+        traces carry it.
+        """
+        values: Dict[str, array] = {}
+        for trace_id, trace in self._traces.items():
+            if not trace:
+                continue
+            for span in trace:
+                key = f"{span.service}/{span.hop}" if by_service else span.hop
+                values.setdefault(key, array('d')).append(span.duration_ns / 1e6)
+            total = max(span.end_ns for span in trace) - min(span.start_ns for span in trace)
+            values.setdefault("total", array('d')).append(total / 1e6)
+            reload_time = self._attributes.get(trace_id, {}).get("reload_time_ms")
+            if reload_time is not None:
+                values.setdefault("reload_time_ms", array('d')).append(float(reload_time))
+
+        def order(key: str):
+            hop = key.rsplit("/", 1)[-1]
+            return (HOPS.index(hop) if hop in HOPS else len(HOPS), key)
+
+        return {key: summarize_values(values[key], percentiles) for key in sorted(values, key=order)}
+
+    def export_otlp(self, clock_offset_ns: Optional[int] = None, scope: str = "sbox_common") -> Dict[str, Any]:
+        """Export traces as an OTLP/JSON ExportTraceServiceRequest.
+
+        Each trace gets a root span covering all hops; hop spans are its
+        children, grouped into one resource per service.
+
+        Args:
+            clock_offset_ns: Added to monotonic readings to get Unix time
+                (measured now if None, valid for spans of this host)
+            scope: Instrumentation scope name
+        """
+        if clock_offset_ns is None:
+            clock_offset_ns = time.time_ns() - time.monotonic_ns()
+        by_service: Dict[str, List[Dict[str, Any]]] = {}
+
+        for trace_id, trace in self._traces.items():
+            if not trace:
+                continue
+            try:
+                otel_trace_id = uuid.UUID(trace_id).hex
+            except ValueError:
+                otel_trace_id = _hex_id(trace_id, 32)
+            root_id = _hex_id(f"{trace_id}/root", 16)
+            spans = self.spans(trace_id)
+            attributes = [{"key": "correlation_id", "value": {"stringValue": trace_id}}]
+            for key, value in self._attributes.get(trace_id, {}).items():
+                if isinstance(value, str):
+                    attributes.append({"key": key, "value": {"stringValue": value}})
+                elif isinstance(value, (int, float)):
+                    attributes.append({"key": key, "value": {"doubleValue": float(value)}})
+            by_service.setdefault(spans[0].service, []).append({
+                "traceId": otel_trace_id,
+                "spanId": root_id,
+                "name": "trace",
+                "kind": 1,
+                "startTimeUnixNano": str(spans[0].start_ns + clock_offset_ns),
+                "endTimeUnixNano": str(max(span.end_ns for span in spans) + clock_offset_ns),
+                "attributes": attributes,
+            })
+            for span in spans:
+                by_service.setdefault(span.service, []).append({
+                    "traceId": otel_trace_id,
+                    "spanId": _hex_id(f"{trace_id}/{span.service}/{span.hop}/{span.start_ns}", 16),
+                    "parentSpanId": root_id,
+                    "name": span.hop,
+                    "kind": 1,
+                    "startTimeUnixNano": str(span.start_ns + clock_offset_ns),
+                    "endTimeUnixNano": str(span.end_ns + clock_offset_ns),
+                })
+
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+                    "scopeSpans": [{"scope": {"name": scope}, "spans": spans}],
+                }
+                for service, spans in by_service.items()
+            ]
+        }
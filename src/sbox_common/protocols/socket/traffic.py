@@ -0,0 +1,449 @@
+"""
+Traffic capture and replay for the framed JSON protocol.
+
+Frames are recorded as they went over the wire: the raw frame bytes
+(header included, so chunked and compressed frames are kept as is) with
+their time offset, connection number and direction. Capture files are
+written by a CaptureWriter fed either from TappedStream, a file-like
+wrapper for code using read_message/write_message, or from CaptureProxy,
+a Unix socket proxy placed between a client and the agent socket.
+
+replay_capture sends the client-to-server frames of a capture to a server
+at the original rate, a multiple of it, or as fast as possible, one
+connection per captured connection, and reports throughput and response
+latency percentiles. Command deadlines are moved forward on replay so
+commands keep the time budget they were sent with.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Union
+
+from ...health.metrics import MetricSummary, summarize_values
+from .framed_json import FramedJSONProtocol
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CAPTURE_MAGIC = b"SBXCAP01"
+_FILE_HEADER = struct.Struct('>d')  # Wall clock time the capture started
+_RECORD = struct.Struct('>dIBI')  # offset, connection, direction, frame length
+
+# Frame directions
+CLIENT_TO_SERVER = 0
+SERVER_TO_CLIENT = 1
+
+_FRAME_HEADER = struct.Struct('>II')
+RECV_SIZE = 64 * 1024
+
+
+class CapturedFrame(NamedTuple):
+    """A frame read from a capture file."""
+
+    offset: float  # Seconds since the capture started
+    connection: int
+    direction: int
+    frame: bytes
+
+
+class CaptureWriter:
+    """Appends timestamped frames to a capture file."""
+
+    def __init__(self, path: Union[Path, str], clock=time.monotonic):
+        """Create capture file at path, replacing an existing one."""
+        self.path = Path(path)
+        self.clock = clock
+        self.frames = 0
+        self._file = open(self.path, 'wb')
+        self._file.write(CAPTURE_MAGIC + _FILE_HEADER.pack(time.time()))
+        self._start = clock()
+        self._lock = threading.Lock()
+        self._next_connection = 0
+
+    def __enter__(self) -> "CaptureWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def new_connection(self) -> int:
+        """Allocate a connection number for a tapped connection."""
+        with self._lock:
+            self._next_connection += 1
+            return self._next_connection
+
+    def record(self, frame: bytes, direction: int = CLIENT_TO_SERVER, connection: int = 0) -> None:
+        """Record one complete frame."""
+        with self._lock:
+            if self._file is None:
+                return
+            offset = self.clock() - self._start
+            self._file.write(_RECORD.pack(offset, connection, direction, len(frame)))
+            self._file.write(frame)
+            self.frames += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_capture(path: Union[Path, str]) -> Iterator[CapturedFrame]:
+    """Iterate over the frames of a capture file.
+
+    A record cut short (capture killed mid-write) ends the iteration.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(len(CAPTURE_MAGIC) + _FILE_HEADER.size)
+        if not header.startswith(CAPTURE_MAGIC) or len(header) < len(CAPTURE_MAGIC) + _FILE_HEADER.size:
+            raise ValueError(f"Not a capture file: {path}")
+        while True:
+            record = f.read(_RECORD.size)
+            if not record:
+                return
+            if len(record) < _RECORD.size:
+                logger.warning(f"Truncated record at end of {path}")
+                return
+            offset, connection, direction, length = _RECORD.unpack(record)
+            frame = f.read(length)
+            if len(frame) < length:
+                logger.warning(f"Truncated record at end of {path}")
+                return
+            yield CapturedFrame(offset, connection, direction, frame)
+
+
+class FrameSplitter:
+    """Splits a raw byte stream into complete frames without decoding them."""
+
+    __slots__ = ("max_message_size", "_buffer")
+
+    def __init__(self, max_message_size: int = FramedJSONProtocol.MAX_MESSAGE_SIZE):
+        self.max_message_size = max_message_size
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Add data; returns the frames completed by it."""
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        start = 0
+        while len(buffer) - start >= _FRAME_HEADER.size:
+            length, _ = _FRAME_HEADER.unpack_from(buffer, start)
+            if length > self.max_message_size:
+                raise ValueError(f"Message too large: {length} bytes")
+            end = start + _FRAME_HEADER.size + length
+            if end > len(buffer):
+                break
+            frames.append(bytes(buffer[start:end]))
+            start = end
+        del buffer[:start]
+        return frames
+
+
+class TappedStream:
+    """File-like wrapper recording the frames read from and written to a stream.
+
+    Pass it to read_message/write_message in place of the wrapped stream.
+    """
+
+    def __init__(self,
+                 stream: BinaryIO,
+                 writer: CaptureWriter,
+                 read_direction: int = SERVER_TO_CLIENT,
+                 write_direction: int = CLIENT_TO_SERVER):
+        self.stream = stream
+        self.writer = writer
+        self.read_direction = read_direction
+        self.write_direction = write_direction
+        self.connection = writer.new_connection()
+        self._read_splitter = FrameSplitter()
+        self._write_splitter = FrameSplitter()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        for frame in self._read_splitter.feed(data):
+            self.writer.record(frame, self.read_direction, self.connection)
+        return data
+
+    def write(self, data: bytes) -> int:
+        for frame in self._write_splitter.feed(data):
+            self.writer.record(frame, self.write_direction, self.connection)
+        return self.stream.write(data)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+class CaptureProxy:
+    """Unix socket proxy recording the frames exchanged with an upstream server."""
+
+    def __init__(self, listen_path: str, upstream_path: str, writer: CaptureWriter):
+        """Initialize proxy.
+
+        Args:
+            listen_path: Unix socket path clients connect to
+            upstream_path: Unix socket path of the real server
+            writer: Capture file receiving frames of all connections
+        """
+        self.listen_path = listen_path
+        self.upstream_path = upstream_path
+        self.writer = writer
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Start listening on listen_path."""
+        if os.path.exists(self.listen_path):
+            os.unlink(self.listen_path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.listen_path)
+
+    async def close(self) -> None:
+        """Stop accepting connections and flush the capture."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self.writer.flush()
+
+    async def _handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_unix_connection(self.upstream_path)
+        except OSError as e:
+            logger.warning(f"Cannot connect to upstream {self.upstream_path}: {e}")
+            client_writer.close()
+            return
+        self.connections += 1
+        connection = self.writer.new_connection()
+        await asyncio.gather(
+            self._pipe(client_reader, upstream_writer, CLIENT_TO_SERVER, connection),
+            self._pipe(upstream_reader, client_writer, SERVER_TO_CLIENT, connection),
+        )
+
+    async def _pipe(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                    direction: int, connection: int) -> None:
+        splitter = FrameSplitter()
+        try:
+            while True:
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    break
+                for frame in splitter.feed(data):
+                    self.writer.record(frame, direction, connection)
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logger.debug(f"Proxied connection {connection} closed: {e}")
+        finally:
+            writer.close()
+
+
+class ReplayReport(NamedTuple):
+    """Result of replaying a capture."""
+
+    frames: int
+    bytes: int
+    connections: int
+    elapsed: float  # Seconds spent sending
+    responses: int
+    latency: Optional[MetricSummary]  # Seconds from request to its response
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Convert report to a JSON-serializable dict (latency in milliseconds)."""
+        latency = None
+        if self.latency is not None:
+            latency = {key: value * 1000 if key != "count" else value
+                       for key, value in self.latency.as_dict().items()}
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "connections": self.connections,
+            "elapsed": self.elapsed,
+            "frames_per_second": self.frames_per_second,
+            "bytes_per_second": self.bytes_per_second,
+            "responses": self.responses,
+            "latency_ms": latency,
+        }
+
+
+class _ReplayConnection:
+    """Client connection replaying the frames of one captured connection."""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        # Decoders with validation off, used only to find message ids
+        self.decoder = FramedJSONProtocol()
+        self.decoder.configure(validation_enabled=False)
+        self.decoder.enforce_deadlines = False
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.read_task: Optional[asyncio.Task] = None
+
+    def decode(self, frame: bytes) -> Optional[Dict[str, Any]]:
+        """Message completed by frame, if any."""
+        try:
+            message, _ = self.decoder.decode_message(frame)
+        except (ValueError, UnicodeDecodeError):
+            return None
+        return message if isinstance(message, dict) else None
+
+    def restamp(self, frame: bytes, message: Dict[str, Any]) -> bytes:
+        """Frame of a command re-sent now with the deadline budget it was sent with."""
+        command = message.get("command")
+        if (message.get("type") != "command" or not isinstance(command, dict)
+                or not isinstance(command.get("deadline"), (int, float))
+                or _FRAME_HEADER.unpack_from(frame)[1] & FramedJSONProtocol.FRAME_FLAG_CHUNK):
+            return frame
+        try:
+            sent = datetime.fromisoformat(message["timestamp"].rstrip("Z"))
+        except (KeyError, TypeError, ValueError):
+            return frame
+        budget = command["deadline"] - sent.replace(tzinfo=timezone.utc).timestamp()
+        command["deadline"] = time.time() + budget
+        return self.decoder.encode_message(message)
+
+
+def _response_to(message: Any) -> Optional[str]:
+    if isinstance(message, dict) and message.get("type") == "response":
+        response = message.get("response")
+        if isinstance(response, dict):
+            return response.get("request_id")
+    return None
+
+
+async def replay_capture(frames: Iterable[CapturedFrame],
+                         socket_path: str,
+                         speed: Optional[float] = 1.0,
+                         timeout: float = 5.0) -> ReplayReport:
+    """Replay the client-to-server frames of a capture against a server.
+
+    Args:
+        frames: Captured frames (e.g. from read_capture)
+        socket_path: Unix socket path of the server
+        speed: Rate multiplier relative to the capture (1.0 is the
+            original rate, 2.0 twice as fast); None or 0 sends as fast
+            as possible
+        timeout: Seconds to wait for outstanding responses after the
+            last frame was sent
+
+    Responses are matched to requests by request_id. Responses to
+    commands, and to any other request answered in the capture, are
+    awaited (up to timeout) before the report is made.
+    """
+    outbound: List[CapturedFrame] = []
+    expected = set()
+    for frame in frames:
+        if frame.direction == CLIENT_TO_SERVER:
+            outbound.append(frame)
+        else:
+            try:
+                request_id = _response_to(json.loads(frame.frame[_FRAME_HEADER.size:]))
+            except ValueError:
+                request_id = None  # Compressed or chunked, not awaited
+            if request_id is not None:
+                expected.add(request_id)
+
+    loop = asyncio.get_running_loop()
+    connections: Dict[int, _ReplayConnection] = {}
+    sent_at: Dict[str, float] = {}
+    latencies = array('d')
+    done = asyncio.Event()
+
+    def check_done() -> None:
+        if not expected.intersection(sent_at):
+            done.set()
+
+    async def read_responses(connection: _ReplayConnection) -> None:
+        protocol = FramedJSONProtocol()
+        protocol.configure(validation_enabled=False)
+        try:
+            while True:
+                message = await protocol.read_message_async(connection.reader)
+                if message is None:
+                    return
+                request_id = _response_to(message)
+                sent = sent_at.pop(request_id, None)
+                if sent is not None:
+                    latencies.append(loop.time() - sent)
+                    expected.discard(request_id)
+                    check_done()
+        except (ConnectionError, ValueError) as e:
+            logger.debug(f"Replay connection closed: {e}")
+
+    total_bytes = 0
+    base = outbound[0].offset if outbound else 0.0
+    started = loop.time()
+    try:
+        for captured in outbound:
+            if speed:
+                delay = started + (captured.offset - base) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            connection = connections.get(captured.connection)
+            if connection is None:
+                connection = connections[captured.connection] = _ReplayConnection(socket_path)
+                connection.reader, connection.writer = await asyncio.open_unix_connection(socket_path)
+                connection.read_task = asyncio.ensure_future(read_responses(connection))
+            message = connection.decode(captured.frame)
+            frame = captured.frame if message is None else connection.restamp(captured.frame, message)
+            connection.writer.write(frame)
+            if message is not None and "id" in message:
+                sent_at[message["id"]] = loop.time()
+                if message.get("type") == "command":
+                    expected.add(message["id"])
+            await connection.writer.drain()
+            total_bytes += len(frame)
+        sent_elapsed = loop.time() - started
+
+        # Responses may have been matched before all requests were sent
+        done.clear()
+        check_done()
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{len(expected.intersection(sent_at))} responses not received within {timeout}s")
+    finally:
+        for connection in connections.values():
+            connection.writer.close()
+            if connection.read_task is not None:
+                connection.read_task.cancel()
+        await asyncio.gather(*(c.read_task for c in connections.values() if c.read_task), return_exceptions=True)
+
+    return ReplayReport(
+        frames=len(outbound),
+        bytes=total_bytes,
+        connections=len(connections),
+        elapsed=sent_elapsed,
+        responses=len(latencies),
+        latency=summarize_values(latencies),
+    )
+
+
+def replay(path: Union[Path, str], socket_path: str, speed: Optional[float] = 1.0,
+           timeout: float = 5.0) -> ReplayReport:
+    """Replay a capture file against the server at socket_path."""
+    return asyncio.run(replay_capture(read_capture(path), socket_path, speed, timeout))
@@ -0,0 +1,13 @@
+"""Warm validation daemon for sbox-common.
+
+Only the client is imported here, which needs nothing beyond the standard
+library; import ValidationDaemon from .server where the daemon runs.
+"""
+
+from .client import ValidationClient, ValidationResult, default_socket_path
+
+__all__ = [
+    "ValidationClient",
+    "ValidationResult",
+    "default_socket_path",
+]
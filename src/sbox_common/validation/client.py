@@ -0,0 +1,166 @@
+"""
+Client of the warm validation daemon.
+
+Only the standard library is imported here, so a short-lived process
+(such as the CLI) can delegate a validation to a running daemon without
+paying for importing jsonschema and YAML or compiling schemas. Messages
+use the framed JSON protocol: an 8-byte header (payload length, protocol
+version and flags) followed by the JSON payload.
+"""
+
+import json
+import os
+import socket
+import struct
+import tempfile
+import time
+import uuid
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+SOCKET_ENV = "SBOX_VALIDATOR_SOCKET"
+VALIDATE_COMMAND = "validate"
+PING_COMMAND = "ping"
+
+# Framing, see FramedJSONProtocol
+_HEADER = struct.Struct('>II')
+_PROTOCOL_VERSION = 1
+_FLAGS_MASK = 0xFFFF0000
+_FLAG_CHUNK = 0x00010000
+_FLAG_ZLIB = 0x00040000
+MAX_MESSAGE_SIZE = 1024 * 1024
+
+
+def default_socket_path() -> str:
+    """Daemon socket: $SBOX_VALIDATOR_SOCKET, else under $XDG_RUNTIME_DIR or the temp dir."""
+    if os.environ.get(SOCKET_ENV):
+        return os.environ[SOCKET_ENV]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return str(Path(runtime_dir) / "sbox-common-validator.sock")
+    return str(Path(tempfile.gettempdir()) / f"sbox-common-validator-{os.getuid()}.sock")
+
+
+class ValidationResult(NamedTuple):
+    """Outcome of a delegated validation."""
+
+    valid: bool
+    # Schema violations: {"message": ..., "path": [...]}
+    errors: List[Dict[str, Any]]
+    # Set when the document could not be validated at all
+    error_code: Optional[str] = None
+    error_message: Optional[str] = None
+
+
+class ValidationClient:
+    """Sends validation requests to the daemon over its Unix socket."""
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 30.0):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+
+    def __enter__(self) -> "ValidationClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def available(self) -> bool:
+        """Whether a daemon answers on the socket."""
+        try:
+            self.call(PING_COMMAND, {})
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._sock = sock
+        return self._sock
+
+    def _recv_exactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Validation daemon closed the connection")
+            data += chunk
+        return bytes(data)
+
+    def call(self, command: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a command and return the response body.
+
+        Raises:
+            OSError: Daemon not reachable or connection lost
+            ValueError: Malformed response
+        """
+        request_id = str(uuid.uuid4())
+        message = {
+            "id": request_id,
+            "type": "command",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            # The daemon drops the request once the client has given up on it
+            "command": {"command": command, "params": params, "deadline": time.time() + self.timeout},
+        }
+        payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+        if len(payload) > MAX_MESSAGE_SIZE:
+            raise ValueError(f"Message too large: {len(payload)} bytes")
+        sock = self._connect()
+        try:
+            sock.sendall(_HEADER.pack(len(payload), _PROTOCOL_VERSION) + payload)
+            length, version = _HEADER.unpack(self._recv_exactly(_HEADER.size))
+            if length > MAX_MESSAGE_SIZE:
+                raise ValueError(f"Message too large: {length} bytes")
+            data = self._recv_exactly(length)
+        except OSError:
+            self.close()
+            raise
+        flags = version & _FLAGS_MASK
+        if flags & _FLAG_CHUNK:
+            raise ValueError("Chunked responses are not supported")
+        if flags & _FLAG_ZLIB:
+            data = zlib.decompress(data)
+        response = json.loads(data).get("response")
+        if not isinstance(response, dict) or response.get("request_id") != request_id:
+            raise ValueError("Unexpected response from validation daemon")
+        return response
+
+    def validate(self,
+                 content: str,
+                 file_format: str,
+                 schema: str = "agent_config",
+                 schemas_dir: Union[Path, str] = "schemas") -> ValidationResult:
+        """Validate a document against a schema of schemas_dir.
+
+        Args:
+            content: Document text
+            file_format: "yaml" or "json"
+            schema: Schema name (file stem in schemas_dir)
+            schemas_dir: Schema directory, resolved on the client side
+        """
+        response = self.call(VALIDATE_COMMAND, {
+            "content": content,
+            "format": file_format,
+            "schema": schema,
+            "schemas_dir": str(Path(schemas_dir).resolve()),
+        })
+        if response.get("status") != "success":
+            error = response.get("error") or {}
+            return ValidationResult(False, [], error.get("code", "error"), error.get("message", ""))
+        data = response.get("data") or {}
+        return ValidationResult(bool(data.get("valid")), data.get("errors", []))
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
@@ -0,0 +1,169 @@
+"""
+Warm validation daemon.
+
+ValidationDaemon serves validate commands of the framed JSON protocol on
+a Unix socket. Validators are compiled once per schema file and kept in
+memory; a schema file is recompiled only when its size or mtime changes.
+Results match the in-process `verify` CLI command: Draft 2020-12
+validation reporting every error with its path.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import jsonschema
+
+from ..protocols.socket import FramedJSONProtocol, SelectorServer
+from .client import PING_COMMAND, VALIDATE_COMMAND, default_socket_path
+
+try:
+    import yaml
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+except ImportError:  # pragma: no cover - PyYAML is optional
+    yaml = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class DocumentError(Exception):
+    """A document could not be validated (as opposed to being invalid)."""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class SchemaCache:
+    """Compiled Draft 2020-12 validators keyed by schema file."""
+
+    def __init__(self):
+        # path -> ((mtime_ns, size), validator)
+        self._validators: Dict[Path, Tuple[Tuple[int, int], Any]] = {}
+        self.compiled = 0
+
+    def validator(self, schemas_dir: Union[Path, str], schema: str) -> Any:
+        """Get the validator of schemas_dir/<schema>.json, compiling it if changed."""
+        if not schema or "/" in schema or schema.startswith("."):
+            raise DocumentError("schema_not_found", f"Schema '{schema}' not found")
+        path = Path(schemas_dir) / f"{schema}.json"
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._validators.pop(path, None)
+            raise DocumentError("schema_not_found", f"Schema '{schema}' not found")
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._validators.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                validator = jsonschema.Draft202012Validator(json.load(f))
+        except (OSError, ValueError) as e:
+            raise DocumentError("schema_error", f"Error loading schema {path}: {e}")
+        self._validators[path] = (key, validator)
+        self.compiled += 1
+        return validator
+
+    def warm(self, schemas_dir: Union[Path, str]) -> int:
+        """Compile every schema of schemas_dir; returns the count."""
+        count = 0
+        for path in sorted(Path(schemas_dir).glob("*.json")):
+            try:
+                self.validator(schemas_dir, path.stem)
+                count += 1
+            except DocumentError as e:
+                logger.warning(e.message)
+        return count
+
+
+def parse_document(content: str, file_format: str) -> Any:
+    """Parse YAML or JSON document text."""
+    if file_format == "json":
+        try:
+            return json.loads(content)
+        except ValueError as e:
+            raise DocumentError("parse_error", str(e))
+    if file_format == "yaml":
+        if yaml is None:
+            raise DocumentError("unsupported_format", "PyYAML is not installed")
+        try:
+            return yaml.load(content, Loader=_YamlLoader)
+        except yaml.YAMLError as e:
+            raise DocumentError("parse_error", str(e))
+    raise DocumentError("unsupported_format", f"Unsupported file format: {file_format}")
+
+
+class ValidationDaemon:
+    """Long-lived validation server keeping schemas compiled."""
+
+    def __init__(self,
+                 socket_path: Optional[str] = None,
+                 schemas_dir: Optional[Union[Path, str]] = None,
+                 protocol: Optional[FramedJSONProtocol] = None):
+        """Initialize daemon.
+
+        Args:
+            socket_path: Unix socket path (default_socket_path() if None)
+            schemas_dir: Schema directory compiled at start; requests may
+                name other directories, which are compiled on first use
+            protocol: Protocol used to encode and decode messages
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self.schemas_dir = schemas_dir
+        self.protocol = protocol or FramedJSONProtocol()
+        self.schemas = SchemaCache()
+        self.requests = 0
+        self.server = SelectorServer(self.socket_path, self.handle, self.protocol)
+
+    def start(self) -> None:
+        """Compile the default schemas and listen on the socket."""
+        if self.schemas_dir is not None:
+            count = self.schemas.warm(self.schemas_dir)
+            logger.info(f"Compiled {count} schemas from {self.schemas_dir}")
+        Path(self.socket_path).parent.mkdir(parents=True, exist_ok=True)
+        self.server.start()
+        os.chmod(self.socket_path, 0o600)
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        """Serve until stop() is called."""
+        self.server.serve_forever(poll_interval)
+
+    def stop(self) -> None:
+        self.server.stop()
+
+    def close(self) -> None:
+        self.server.close()
+
+    def validate(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate a document; returns {"valid": ..., "errors": [...]}."""
+        schemas_dir = params.get("schemas_dir") or self.schemas_dir
+        if schemas_dir is None or not isinstance(params.get("content"), str):
+            raise DocumentError("invalid_request", "content and schemas_dir are required")
+        validator = self.schemas.validator(schemas_dir, params.get("schema", "agent_config"))
+        document = parse_document(params["content"], params.get("format", "yaml"))
+        errors = [{"message": error.message, "path": list(error.path)}
+                  for error in validator.iter_errors(document)]
+        return {"valid": not errors, "errors": errors}
+
+    def handle(self, connection, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """SelectorServer handler for validate and ping commands."""
+        if message.get("type") != "command":
+            return None
+        self.requests += 1
+        command = message["command"]["command"]
+        try:
+            if command == VALIDATE_COMMAND:
+                data = self.validate(message["command"]["params"])
+            elif command == PING_COMMAND:
+                data = {"requests": self.requests, "schemas_compiled": self.schemas.compiled}
+            else:
+                raise DocumentError("unknown_command", f"Unknown command: {command}")
+        except DocumentError as e:
+            return self.protocol.create_response_message(
+                message["id"], "error", error={"code": e.code, "message": e.message})
+        return self.protocol.create_response_message(message["id"], "success", data)
@@ -0,0 +1,30 @@
+"""
+Shared fixtures for the test suite.
+"""
+
+import threading
+import pytest
+
+
+@pytest.fixture
+def serve():
+    """Start servers with serve_forever() on daemon threads.
+
+    Returns a function taking an unstarted server (SelectorServer or
+    anything with the same start/serve_forever/stop/close methods); all
+    servers it started are stopped and closed on teardown.
+    """
+    running = []
+
+    def start(server, poll_interval=0.05):
+        server.start()
+        thread = threading.Thread(target=server.serve_forever, args=(poll_interval,), daemon=True)
+        thread.start()
+        running.append((server, thread))
+        return server
+
+    yield start
+    for server, thread in reversed(running):
+        server.stop()
+        thread.join(5)
+        server.close()
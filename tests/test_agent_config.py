@@ -0,0 +1,121 @@
+"""
+Tests for the typed, cached agent config loader.
+"""
+
+import pytest
+from pathlib import Path
+
+from jsonschema import ValidationError
+
+from sbox_common.config import AgentConfigLoader, parse_duration
+
+EXAMPLE_CONFIG = Path(__file__).resolve().parents[1] / "examples" / "agent_config.yaml"
+
+MINIMAL_CONFIG = b"""
+agent: {name: test, version: 1.0.0}
+server: {port: 9000, host: 0.0.0.0}
+services:
+  sboxmgr: {enabled: true}
+"""
+
+
+class TestParseDuration:
+    """Test duration conversion."""
+
+    def test_units(self):
+        """Test seconds, minutes and hours."""
+        assert parse_duration("30s") == 30.0
+        assert parse_duration("5m") == 300.0
+        assert parse_duration("2h") == 7200.0
+
+    def test_invalid(self):
+        """Test malformed durations."""
+        for value in ("30", "m", "1.5m", "-1s", 30):
+            with pytest.raises(ValueError):
+                parse_duration(value)
+
+
+class TestAgentConfigLoader:
+    """Test AgentConfigLoader class."""
+
+    def test_example_config(self, tmp_path):
+        """Test typed values of the example config."""
+        config = AgentConfigLoader(cache_dir=tmp_path).load(EXAMPLE_CONFIG)
+
+        assert config.agent.name == "home-rpi"
+        assert config.server.timeout == 30.0
+        assert config.sboxmgr.interval == 1800.0
+        assert config.sboxmgr.command == ("sboxmgr", "update")
+        assert config.sboxmgr.health_check.timeout == 10.0
+        assert config.enabled_clients == ("sing-box",)
+        assert config.security.allowed_hosts == ("127.0.0.1", "::1")
+        assert config.security.tls_cert_file is None
+
+    def test_defaults_filled_in(self, tmp_path):
+        """Test that schema defaults are applied to missing fields and sections."""
+        config = AgentConfigLoader(cache_dir=tmp_path).loads(MINIMAL_CONFIG)
+
+        assert config.agent.log_level == "info"
+        assert config.server.timeout == 30.0
+        assert config.sboxmgr.timeout == 300.0
+        assert config.sboxmgr.health_check.interval == 60.0
+        assert config.logging.max_entries == 1000
+        assert config.monitoring.health_checks_enabled is True
+        assert dict(config.clients) == {}
+
+    def test_immutable(self, tmp_path):
+        """Test that the config cannot be modified."""
+        config = AgentConfigLoader(cache_dir=tmp_path).load(EXAMPLE_CONFIG)
+        with pytest.raises(AttributeError):
+            config.server.port = 1
+        with pytest.raises(TypeError):
+            config.clients["xray"] = None
+
+    def test_invalid_config(self, tmp_path):
+        """Test that invalid configs are rejected and not cached."""
+        loader = AgentConfigLoader(cache_dir=tmp_path)
+        with pytest.raises(ValidationError) as exc_info:
+            loader.loads(MINIMAL_CONFIG.replace(b"port: 9000", b"port: 0"))
+        assert "server/port" in str(exc_info.value)
+        assert list(tmp_path.iterdir()) == []
+
+    def test_snapshot_skips_parsing(self, tmp_path, monkeypatch):
+        """Test that a second loader reuses the on-disk snapshot."""
+        first = AgentConfigLoader(cache_dir=tmp_path).load(EXAMPLE_CONFIG)
+        assert len(list(tmp_path.glob("agent_config-*.marshal"))) == 1
+
+        loader = AgentConfigLoader(cache_dir=tmp_path)
+        monkeypatch.setattr(loader, "_parse", lambda content, is_json: pytest.fail("parsed again"))
+        second = loader.load(EXAMPLE_CONFIG)
+        assert second == first
+        assert loader.load(EXAMPLE_CONFIG) is second
+
+    def test_changed_content_reparsed(self, tmp_path):
+        """Test that the cache is keyed by content."""
+        loader = AgentConfigLoader(cache_dir=tmp_path)
+        first = loader.loads(MINIMAL_CONFIG)
+        second = loader.loads(MINIMAL_CONFIG.replace(b"9000", b"9001"))
+        assert (first.server.port, second.server.port) == (9000, 9001)
+        assert first.config_hash != second.config_hash
+
+    def test_corrupt_snapshot_ignored(self, tmp_path):
+        """Test that unreadable snapshots fall back to parsing."""
+        loader = AgentConfigLoader(cache_dir=tmp_path)
+        loader.loads(MINIMAL_CONFIG)
+        for snapshot in tmp_path.glob("agent_config-*.marshal"):
+            snapshot.write_bytes(b"garbage")
+
+        config = AgentConfigLoader(cache_dir=tmp_path).loads(MINIMAL_CONFIG)
+        assert config.server.port == 9000
+
+    def test_json_config(self, tmp_path):
+        """Test loading JSON configs."""
+        path = tmp_path / "agent.json"
+        path.write_text('{"agent": {"name": "a", "version": "1.0.0"}, "server": {"port": 1, "host": "h"}}')
+        config = AgentConfigLoader(use_snapshots=False).load(path)
+        assert config.sboxmgr is None
+        assert config.server.host == "h"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,133 @@
+"""
+Tests for encode-once broadcast fan-out.
+"""
+
+import asyncio
+import pytest
+from io import BytesIO
+from unittest.mock import patch
+
+from sbox_common.protocols.socket import FramedJSONProtocol
+from sbox_common.protocols.socket.broadcast import BroadcastHub, Subscriber
+
+
+class TestSubscriber:
+    """Test Subscriber queue policies."""
+
+    def test_drop_oldest(self):
+        """Test that drop_oldest keeps the newest frames."""
+        subscriber = Subscriber(max_messages=2)
+        for frame in (b"a", b"b", b"c"):
+            assert subscriber.offer(frame) is True
+
+        assert list(subscriber.queue) == [b"b", b"c"]
+        assert subscriber.dropped == 1
+
+    def test_drop_newest(self):
+        """Test that drop_newest rejects incoming frames when full."""
+        subscriber = Subscriber(max_messages=2, policy="drop_newest")
+        results = [subscriber.offer(frame) for frame in (b"a", b"b", b"c")]
+
+        assert results == [True, True, False]
+        assert list(subscriber.queue) == [b"a", b"b"]
+
+    def test_max_bytes(self):
+        """Test byte-based queue limit."""
+        subscriber = Subscriber(max_bytes=5)
+        subscriber.offer(b"abc")
+        subscriber.offer(b"de")
+        subscriber.offer(b"fg")
+
+        assert list(subscriber.queue) == [b"de", b"fg"]
+        assert subscriber.queued_bytes == 4
+        assert subscriber.offer(b"x" * 10) is False
+
+    def test_disconnect(self):
+        """Test that disconnect policy closes the subscriber."""
+        subscriber = Subscriber(max_messages=1, policy="disconnect")
+        subscriber.offer(b"a")
+
+        assert subscriber.offer(b"b") is False
+        assert subscriber.closed is True
+        assert len(subscriber.queue) == 0
+
+    def test_invalid_policy(self):
+        """Test that unknown policies are rejected."""
+        with pytest.raises(ValueError, match="Unsupported overflow policy"):
+            Subscriber(policy="block")
+
+
+class TestBroadcastHub:
+    """Test BroadcastHub class."""
+
+    def test_encode_once(self):
+        """Test that a published message is encoded once for all subscribers."""
+        hub = BroadcastHub()
+        subscribers = [hub.subscribe(name=f"s{i}") for i in range(5)]
+        message = hub.protocol.create_event_message({"event_type": "config.updated"})
+
+        with patch.object(hub.protocol, "encode_message", wraps=hub.protocol.encode_message) as encode:
+            assert hub.publish(message) == 5
+            assert encode.call_count == 1
+
+        frames = [s.queue[0] for s in subscribers]
+        assert all(frame is frames[0] for frame in frames)
+
+        writer = BytesIO()
+        assert subscribers[0].flush(writer) == 1
+        decoded, _ = hub.protocol.decode_message(writer.getvalue())
+        assert decoded == message
+
+    def test_slow_subscriber_removed(self):
+        """Test that disconnected subscribers do not affect others."""
+        hub = BroadcastHub()
+        slow = hub.subscribe(max_messages=1, policy="disconnect")
+        fast = hub.subscribe()
+
+        hub.publish_frame(b"one")
+        assert hub.publish_frame(b"two") == 1
+
+        assert slow not in hub.subscribers
+        assert list(fast.queue) == [b"one", b"two"]
+
+    def test_subscribe_stream(self):
+        """Test draining a subscriber into an asyncio stream."""
+        protocol = FramedJSONProtocol()
+
+        async def scenario():
+            received = []
+
+            async def handle(reader, writer):
+                while True:
+                    chunk = await reader.read(1 << 16)
+                    if not chunk:
+                        break
+                    received.append(chunk)
+
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+
+            hub = BroadcastHub(protocol)
+            subscriber = hub.subscribe_stream(writer)
+            for i in range(3):
+                hub.publish(protocol.create_event_message({"n": i}))
+            await asyncio.sleep(0.05)
+            hub.unsubscribe(subscriber)
+            await asyncio.sleep(0.05)
+            server.close()
+            await server.wait_closed()
+            return b"".join(received)
+
+        data = asyncio.run(scenario())
+        offset = 0
+        numbers = []
+        while offset < len(data):
+            message, consumed = protocol.decode_message(data[offset:])
+            numbers.append(message["event"]["n"])
+            offset += consumed
+        assert numbers == [0, 1, 2]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
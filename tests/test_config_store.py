@@ -0,0 +1,111 @@
+"""
+Tests for content-addressed config store.
+"""
+
+import pytest
+
+from sbox_common.config import ConfigStore
+from sbox_common.protocols.converters import SubscriptionEventConverter
+from sbox_common.protocols.json_patch import config_hash
+
+
+class TestConfigStore:
+    """Test ConfigStore class."""
+
+    def test_put_and_get(self):
+        """Test storing and retrieving configs by hash."""
+        store = ConfigStore()
+        config = {"outbounds": [{"tag": "a"}]}
+
+        digest = store.put(config)
+
+        assert digest == config_hash(config)
+        assert digest in store
+        assert store.get(digest) is config
+        assert store.get("missing") is None
+
+    def test_lru_eviction(self):
+        """Test that least recently used configs are evicted."""
+        store = ConfigStore(max_entries=2)
+        first = store.put({"v": 1})
+        second = store.put({"v": 2})
+        store.get(first)
+        store.put({"v": 3})
+
+        assert len(store) == 2
+        assert first in store
+        assert second not in store
+
+    def test_invalid_max_entries(self):
+        """Test that max_entries must be positive."""
+        with pytest.raises(ValueError):
+            ConfigStore(max_entries=0)
+
+    def test_record_detects_changes(self):
+        """Test that recording identical content reports no change."""
+        store = ConfigStore()
+
+        first = store.record("main", {"a": 1, "b": 2})
+        same = store.record("main", {"b": 2, "a": 1})
+        different = store.record("main", {"a": 1, "b": 3})
+
+        assert first.changed is True
+        assert first.previous_hash is None
+        assert same.changed is False
+        assert different.changed is True
+        assert different.previous_hash == first.config_hash
+
+    def test_needs_reload(self):
+        """Test reload decisions against the applied config."""
+        store = ConfigStore()
+        assert store.needs_reload("main") is False
+
+        store.record("main", {"a": 1})
+        assert store.needs_reload("main") is True
+
+        store.mark_applied("main")
+        assert store.needs_reload("main") is False
+        assert store.needs_reload("main", force=True) is True
+
+        store.record("main", {"a": 1})
+        assert store.needs_reload("main") is False
+
+        store.record("main", {"a": 2})
+        assert store.needs_reload("main") is True
+
+    def test_mark_applied_without_record(self):
+        """Test that marking an unknown key as applied raises."""
+        store = ConfigStore()
+        with pytest.raises(ValueError, match="No config recorded"):
+            store.mark_applied("main")
+
+
+class TestSubscriptionConfigChanged:
+    """Test automatic config_changed population."""
+
+    def test_config_changed_populated_from_store(self):
+        """Test that update_completed events compute config_changed."""
+        converter = SubscriptionEventConverter(config_store=ConfigStore())
+        config = {"config_id": "main", "content": {"outbounds": []}}
+
+        first = converter.create_subscription_update_completed(
+            "test-sub", "success", config_data=config
+        )
+        second = converter.create_subscription_update_completed(
+            "test-sub", "success", config_data=dict(config)
+        )
+
+        assert first["data"]["config_changed"] is True
+        assert second["data"]["config_changed"] is False
+
+    def test_explicit_config_changed_wins(self):
+        """Test that an explicit config_changed is not overridden."""
+        converter = SubscriptionEventConverter(config_store=ConfigStore())
+        event = converter.create_subscription_update_completed(
+            "test-sub", "success", config_changed=False, config_data={"a": 1}
+        )
+        assert event["data"]["config_changed"] is False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
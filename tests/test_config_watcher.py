@@ -0,0 +1,205 @@
+"""
+Tests for the config file and schema directory watcher.
+"""
+
+import json
+import shutil
+import time
+import pytest
+from pathlib import Path
+
+from jsonschema import ValidationError
+
+from sbox_common.config.watcher import ConfigWatcher
+from sbox_common.protocols.converters import ConfigEventConverter
+from sbox_common.protocols.socket import FramedJSONProtocol
+
+PROTOCOL_SCHEMA = Path(FramedJSONProtocol().schema_dir) / "protocol_v1.schema.json"
+
+
+def wait_events(watcher, duration=1.0):
+    """Poll until events arrive (plus one debounce) or duration passes."""
+    events = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        new = watcher.poll(0.02)
+        events.extend(new)
+        if new:
+            deadline = min(deadline, time.monotonic() + watcher.debounce * 2)
+    return events
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "polling"])
+def watcher(request):
+    watcher = ConfigWatcher(debounce=0.05, poll_interval=0.02, use_inotify=request.param)
+    if request.param and not watcher.using_inotify:
+        pytest.skip("inotify not available")
+    yield watcher
+    watcher.close()
+
+
+class TestConfigWatcher:
+    """Test ConfigWatcher class."""
+
+    def test_burst_coalesced(self, watcher, tmp_path):
+        """Test that a burst of writes produces one config.updated event."""
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps({"log": {"level": "info"}}))
+        watcher.watch_config(path, "sing-box", "sing-box")
+        received = []
+        watcher.add_listener(received.append)
+
+        for level in ("debug", "warn", "error"):
+            path.write_text(json.dumps({"log": {"level": level}}))
+        events = wait_events(watcher)
+
+        assert len(events) == 1
+        assert received == events
+        data = events[0]["data"]
+        assert events[0]["event_type"] == "config.updated"
+        assert data["content"] == {"log": {"level": "error"}}
+        assert data["type"] == "sing-box"
+        ConfigEventConverter().validate_event(events[0], "config-events")
+
+    def test_no_event_without_real_change(self, watcher, tmp_path):
+        """Test that touching or reformatting a config emits nothing."""
+        path = tmp_path / "config.json"
+        path.write_text('{"a": 1, "b": 2}')
+        watcher.watch_config(path, "cfg")
+
+        path.write_text('{"a": 1, "b": 2}')
+        time.sleep(0.03)
+        path.write_text('{\n  "b": 2,\n  "a": 1\n}\n')
+        assert wait_events(watcher, 0.4) == []
+
+    def test_atomic_replace_and_delete(self, watcher, tmp_path):
+        """Test rename-over writes and deletion."""
+        path = tmp_path / "config.yaml"
+        path.write_text("a: 1\n")
+        watcher.watch_config(path, "clash", "clash")
+
+        tmp = tmp_path / ".config.yaml.tmp"
+        tmp.write_text("a: 2\n")
+        tmp.replace(path)
+        events = wait_events(watcher)
+        assert [e["data"]["content"] for e in events] == [{"a": 2}]
+
+        path.unlink()
+        events = wait_events(watcher)
+        assert [e["event_type"] for e in events] == ["config.deleted"]
+
+    def test_schema_hot_reload(self, watcher, tmp_path):
+        """Test that protocol validators are swapped on schema changes."""
+        shutil.copy(PROTOCOL_SCHEMA, tmp_path / PROTOCOL_SCHEMA.name)
+        protocol = FramedJSONProtocol(tmp_path)
+        watcher.watch_schemas(protocol)
+        message = protocol.create_heartbeat_message("agent-1", "healthy")
+        message["type"] = "bogus"
+        with pytest.raises(ValidationError):
+            protocol.validate_message(message)
+
+        (tmp_path / PROTOCOL_SCHEMA.name).write_text(json.dumps({"type": "object"}))
+        events = wait_events(watcher)
+        assert [(e["event_type"], e["data"]["status"]) for e in events] == [("config.reload_completed", "success")]
+        assert protocol.validate_message(message)
+
+    def test_broken_schema_keeps_validators(self, watcher, tmp_path):
+        """Test that a broken schema is reported and the old one kept."""
+        shutil.copy(PROTOCOL_SCHEMA, tmp_path / PROTOCOL_SCHEMA.name)
+        protocol = FramedJSONProtocol(tmp_path)
+        watcher.watch_schemas(protocol)
+        validator = protocol._validator
+
+        (tmp_path / PROTOCOL_SCHEMA.name).write_text("{not json")
+        events = wait_events(watcher)
+        assert events[0]["data"]["status"] == "failed"
+        assert protocol._validator is validator
+
+    def test_sessions_see_reload(self, tmp_path):
+        """Test that per-connection sessions validate against reloaded schemas."""
+        shutil.copy(PROTOCOL_SCHEMA, tmp_path / PROTOCOL_SCHEMA.name)
+        protocol = FramedJSONProtocol(tmp_path)
+        session = protocol.session()
+        message = protocol.create_heartbeat_message("agent-1", "healthy")
+        message["type"] = "bogus"
+
+        (tmp_path / PROTOCOL_SCHEMA.name).write_text(json.dumps({"type": "object"}))
+        protocol.reload_schemas()
+        assert session.validate_message(message)
+        assert session.schema_generation == protocol.schema_generation == 1
+
+    def test_unreadable_and_unhashable(self, watcher, tmp_path, monkeypatch):
+        """Test that unreadable files and YAML dates are skipped without failing."""
+        pytest.importorskip("yaml")
+        path = tmp_path / "config.yaml"
+        path.write_text("a: 1\n")
+        watcher.watch_config(path, "clash", "clash")
+
+        path.write_text("a: 2024-01-01\n")
+        assert wait_events(watcher, 0.3) == []
+
+        read_bytes = Path.read_bytes
+
+        def denied(self):
+            if self == path:
+                raise PermissionError(13, "Permission denied")
+            return read_bytes(self)
+        monkeypatch.setattr(Path, "read_bytes", denied)
+        path.write_text("a: 3\n")
+        assert wait_events(watcher, 0.3) == []
+
+        monkeypatch.setattr(Path, "read_bytes", read_bytes)
+        path.write_text("a: 4\n")
+        assert [e["data"]["content"] for e in wait_events(watcher)] == [{"a": 4}]
+
+class TestBackgroundThread:
+    """Test watching in a background thread."""
+
+    def test_start_stop(self, tmp_path):
+        """Test that listeners are called from the watcher thread."""
+        path = tmp_path / "config.json"
+        path.write_text("{}")
+        watcher = ConfigWatcher(debounce=0.02)
+        watcher.watch_config(path, "cfg")
+        received = []
+        watcher.add_listener(received.append)
+        watcher.start()
+        try:
+            path.write_text('{"changed": true}')
+            deadline = time.monotonic() + 2
+            while not received and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            watcher.close()
+        assert received[0]["data"]["content"] == {"changed": True}
+
+
+    def test_survives_poll_errors(self, tmp_path, monkeypatch):
+        """Test that an unexpected error does not stop the watcher thread."""
+        path = tmp_path / "config.json"
+        path.write_text("{}")
+        watcher = ConfigWatcher(debounce=0.02, poll_interval=0.02)
+        watcher.watch_config(path, "cfg")
+        received = []
+        watcher.add_listener(received.append)
+        poll = watcher.poll
+        failures = []
+
+        def flaky(timeout=0.0):
+            if not failures:
+                failures.append(True)
+                raise RuntimeError("boom")
+            return poll(timeout)
+        monkeypatch.setattr(watcher, "poll", flaky)
+        watcher.start()
+        try:
+            path.write_text('{"changed": true}')
+            deadline = time.monotonic() + 2
+            while not received and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            watcher.close()
+        assert failures and received[0]["data"]["content"] == {"changed": True}
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,238 @@
+"""
+Tests for command deadlines and early drop of expired commands.
+"""
+
+import io
+import json
+import pickle
+import socket
+import threading
+import time
+import pytest
+from jsonschema import ValidationError
+
+from sbox_common.protocols.socket import (
+    DeadlineExceeded, FlowControlledConnection, FramedJSONProtocol, SelectorServer
+)
+from sbox_common.protocols.socket.spool import FrameSpool
+from sbox_common.protocols.socket.tracing import Tracer
+from sbox_common.protocols.socket.traffic import _ReplayConnection
+
+
+def expired_command(protocol, command="reload_config"):
+    """Command whose deadline passed a second ago."""
+    return protocol.create_command_message(command, {}, timeout=-1.0)
+
+
+class TestDeadlines:
+    """Test deadlines of FramedJSONProtocol."""
+
+    def test_deadline_from_timeout(self):
+        """Test that the client's timeout sets an absolute deadline."""
+        protocol = FramedJSONProtocol()
+        before = time.time()
+        message = protocol.create_command_message("ping", {}, timeout=5.0)
+        assert before + 5.0 <= message["command"]["deadline"] <= time.time() + 5.0
+        assert protocol.validate_message(message)
+        assert "deadline" not in protocol.create_command_message("ping", {})["command"]
+
+    def test_expired_dropped_before_validation(self):
+        """Test that an expired command is counted and rejected without being validated."""
+        protocol = FramedJSONProtocol()
+        frame = protocol.encode_message(expired_command(protocol))
+
+        def fail(message):
+            raise AssertionError("validated")
+        protocol.validate_message = fail
+
+        with pytest.raises(DeadlineExceeded) as info:
+            protocol.read_message(io.BytesIO(frame))
+        assert info.value.deadline < time.time()
+        assert protocol.expired_commands == 1
+
+    def test_live_and_unenforced(self):
+        """Test that live commands pass and enforcement can be turned off."""
+        protocol = FramedJSONProtocol()
+        live = protocol.create_command_message("ping", {}, timeout=60.0)
+        assert protocol.decode_payload(protocol.encode_payload(live)) == live
+        assert not protocol.is_expired(live)
+        assert protocol.is_expired(live, now=live["command"]["deadline"])
+
+        protocol.enforce_deadlines = False
+        expired = expired_command(protocol)
+        assert protocol.decode_payload(protocol.encode_payload(expired)) == expired
+        assert protocol.expired_commands == 0
+
+    def test_boolean_deadline_invalid(self):
+        """Test that a boolean deadline is rejected by validation, not dropped as expired."""
+        protocol = FramedJSONProtocol()
+        command = protocol.create_command_message("ping", {})
+        command["command"]["deadline"] = True
+        assert not protocol.is_expired(command)
+        with pytest.raises(ValidationError):
+            protocol.decode_payload(json.dumps(command).encode('utf-8'))
+        assert protocol.expired_commands == 0
+
+    def test_error_pickles(self):
+        """Test that DeadlineExceeded survives process pool workers."""
+        error = pickle.loads(pickle.dumps(DeadlineExceeded("abc", 12.5)))
+        assert (error.message_id, error.deadline) == ("abc", 12.5)
+        assert isinstance(error, ValueError)
+        assert str(error) == "Command abc expired at 12.500"
+
+
+class TestSelectorServerDeadlines:
+    """Test expired commands at the SelectorServer."""
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_drop_keeps_connection(self, tmp_path, serve, workers):
+        """Test that expired commands are dropped and later messages still handled."""
+        handled = []
+
+        def handler(connection, message):
+            handled.append(message["id"])
+            return server.protocol.create_response_message(message["id"], "success")
+
+        server = serve(SelectorServer(str(tmp_path / "server.sock"), handler, FramedJSONProtocol(),
+                                      workers=workers))
+        protocol = FramedJSONProtocol()
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(5)
+        client.connect(server.path)
+        stream = client.makefile('rwb')
+        try:
+            live = protocol.create_command_message("ping", {}, timeout=30.0)
+            protocol.write_message(stream, expired_command(protocol))
+            protocol.write_message(stream, live)
+            reply = protocol.read_message(stream)
+        finally:
+            stream.close()
+            client.close()
+        assert reply["response"]["request_id"] == live["id"]
+        assert handled == [live["id"]]
+        assert server.protocol.expired_commands == 1
+
+    def test_reject(self, tmp_path, serve):
+        """Test that rejecting servers answer expired commands with deadline_exceeded."""
+        server = serve(SelectorServer(str(tmp_path / "server.sock"), lambda connection, message: None,
+                                      FramedJSONProtocol(), reject_expired=True))
+        protocol = FramedJSONProtocol()
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(5)
+        client.connect(server.path)
+        stream = client.makefile('rwb')
+        try:
+            command = expired_command(protocol)
+            protocol.write_message(stream, command)
+            reply = protocol.read_message(stream)
+        finally:
+            stream.close()
+            client.close()
+        assert reply["response"]["request_id"] == command["id"]
+        assert reply["response"]["error"]["code"] == "deadline_exceeded"
+
+    def test_expired_in_worker_queue(self, tmp_path, serve):
+        """Test that a command expiring while queued for a worker is not handled."""
+        handled = []
+        release = threading.Event()
+
+        def handler(connection, message):
+            handled.append(message["command"]["command"])
+            if message["command"]["command"] == "block":
+                release.wait(5)
+            return None
+
+        server = serve(SelectorServer(str(tmp_path / "server.sock"), handler, FramedJSONProtocol(),
+                                      workers=1))
+        protocol = FramedJSONProtocol()
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(server.path)
+        stream = client.makefile('rwb')
+        try:
+            protocol.write_message(stream, protocol.create_command_message("block", {}))
+            protocol.write_message(stream, protocol.create_command_message("late", {}, timeout=0.1))
+            deadline = time.time() + 5
+            while not handled and time.time() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.2)
+            release.set()
+            deadline = time.time() + 5
+            while server.protocol.expired_commands == 0 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            stream.close()
+            client.close()
+        assert handled == ["block"]
+        assert server.protocol.expired_commands == 1
+
+
+class TestDeadlinePaths:
+    """Test deadlines on the other receive and send paths."""
+
+    def test_flow_control_returns_credits(self):
+        """Test that a dropped command still returns its credits."""
+        left, right = socket.socketpair()
+        sender_file, receiver_file = left.makefile('rwb'), right.makefile('rwb')
+        sender = FlowControlledConnection(sender_file, sender_file, window_messages=2)
+        receiver = FlowControlledConnection(receiver_file, receiver_file, window_messages=2)
+        try:
+            sender.start()
+            receiver.start()
+            protocol = sender.protocol
+            sender.send(expired_command(protocol))
+            sender.send(protocol.create_command_message("ping", {}))
+            assert receiver.receive()["command"]["command"] == "ping"
+            assert receiver.protocol.expired_commands == 1
+            # Both credits came back, so two more sends do not block
+            sender.send(protocol.create_command_message("ping", {}))
+            sender.send(protocol.create_command_message("ping", {}))
+            assert receiver.receive()["command"]["command"] == "ping"
+        finally:
+            for f in (sender_file, receiver_file, left, right):
+                f.close()
+
+    def test_tracer_checks_deadline(self):
+        """Test that traced receives shed expired commands too."""
+        sender, receiver = Tracer("sboxmgr"), Tracer("sboxagent")
+        frame = sender.encode_message(expired_command(sender.protocol))
+        with pytest.raises(DeadlineExceeded):
+            receiver.read_message(io.BytesIO(frame))
+        assert receiver.protocol.expired_commands == 1
+
+    def test_spool_expires_with_deadline(self, tmp_path):
+        """Test that spooled commands are not sent after their deadline."""
+        protocol = FramedJSONProtocol()
+        spool = FrameSpool(tmp_path, protocol)
+        spool.enqueue_message(expired_command(protocol))
+        live = protocol.create_command_message("ping", {}, timeout=60.0)
+        spool.enqueue_message(live)
+        left, right = socket.socketpair()
+        try:
+            assert spool.drain(left) == 1
+            assert spool.expired == 1
+            right.settimeout(5)
+            assert protocol.read_message(right.makefile('rb'))["id"] == live["id"]
+        finally:
+            spool.close()
+            left.close()
+            right.close()
+
+    def test_replay_restamps_deadline(self):
+        """Test that replayed commands keep the time budget they were sent with."""
+        protocol = FramedJSONProtocol()
+        command = protocol.create_command_message("ping", {}, timeout=10.0)
+        command["timestamp"] = "2020-01-01T00:00:00Z"
+        command["command"]["deadline"] = 1577836810.0  # Ten seconds later
+        connection = _ReplayConnection("/unused.sock")
+        frame = protocol.encode_message(command)
+        message = connection.decode(frame)
+        assert message is not None
+
+        replayed = protocol.read_message(io.BytesIO(connection.restamp(frame, message)))
+        assert replayed["command"]["deadline"] == pytest.approx(time.time() + 10.0, abs=1.0)
+        heartbeat = protocol.encode_message(protocol.create_heartbeat_message("agent", "healthy"))
+        assert connection.restamp(heartbeat, connection.decode(heartbeat)) == heartbeat
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
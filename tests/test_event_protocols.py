@@ -14,6 +14,7 @@ from sbox_common.protocols.converters import (
     HealthEventConverter,
     get_event_converters
 )
+from sbox_common.protocols.json_patch import JsonPatchError
 
 
 class TestEventConverter:
@@ -156,6 +157,66 @@ class TestConfigEventConverter:
         assert event["data"]["force"] is True
 
 
+class TestConfigDeltaEvents:
+    """Test config.patched delta events."""
+    
+    def _config(self, port=443):
+        return {
+            "config_id": "test-config",
+            "name": "Test Config",
+            "type": "sing-box",
+            "content": {
+                "outbounds": [{"tag": f"node-{i}", "server_port": 443} for i in range(50)]
+                + [{"tag": "last", "server_port": port}]
+            }
+        }
+    
+    def test_create_config_delta_patch(self):
+        """Test that a known base produces a validated config.patched event."""
+        converter = ConfigEventConverter()
+        base = self._config()
+        updated = self._config(port=8443)
+        
+        event = converter.create_config_delta(updated, base)
+        
+        assert event["event_type"] == "config.patched"
+        assert event["data"]["patch"] == [
+            {"op": "replace", "path": "/content/outbounds/50/server_port", "value": 8443}
+        ]
+        assert converter.validate_event(event, "config-events") is True
+        assert converter.apply_config_event(event, base) == updated
+    
+    def test_create_config_delta_unknown_base(self):
+        """Test fallback to config.updated when base is unknown."""
+        converter = ConfigEventConverter()
+        updated = self._config()
+        
+        event = converter.create_config_delta(updated)
+        
+        assert event["event_type"] == "config.updated"
+        assert converter.apply_config_event(event) == updated
+    
+    def test_apply_config_event_base_mismatch(self):
+        """Test that applying a patch to the wrong base raises."""
+        converter = ConfigEventConverter()
+        event = converter.create_config_delta(self._config(port=1), self._config())
+        
+        with pytest.raises(JsonPatchError, match="Base config hash mismatch"):
+            converter.apply_config_event(event, self._config(port=2))
+        with pytest.raises(JsonPatchError, match="Unknown base config"):
+            converter.apply_config_event(event)
+    
+    def test_apply_config_event_result_mismatch(self):
+        """Test that a corrupted patch fails result hash verification."""
+        converter = ConfigEventConverter()
+        base = self._config()
+        event = converter.create_config_delta(self._config(port=1), base)
+        event["data"]["patch"][0]["value"] = 2
+        
+        with pytest.raises(JsonPatchError, match="Patched config hash mismatch"):
+            converter.apply_config_event(event, base)
+
+
 class TestHealthEventConverter:
     """Test HealthEventConverter class."""
     
@@ -0,0 +1,174 @@
+"""
+Tests for file descriptor passing of large payloads.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import pytest
+
+from sbox_common.protocols.converters import ConfigEventConverter
+from sbox_common.protocols.socket import DeadlineExceeded
+from sbox_common.protocols.socket.fd_passing import (
+    FdPassingConnection,
+    create_sealed_memfd,
+    describe_attachment,
+    map_attachment,
+    send_config_by_reference,
+    write_attachment
+)
+
+
+@pytest.fixture
+def connections():
+    left, right = socket.socketpair(socket.AF_UNIX)
+    sender, receiver = FdPassingConnection(left), FdPassingConnection(right)
+    yield sender, receiver
+    sender.close()
+    receiver.close()
+
+
+class TestMemfd:
+    """Test sealed memfd helpers."""
+
+    def test_sealed_content(self):
+        """Test that content is readable and can not be modified."""
+        fd = create_sealed_memfd(b"payload")
+        try:
+            assert os.pread(fd, 100, 0) == b"payload"
+            if hasattr(os, "memfd_create"):
+                with pytest.raises(OSError):
+                    os.pwrite(fd, b"x", 0)
+            with map_attachment(fd, 7) as mapped:
+                assert mapped[:] == b"payload"
+        finally:
+            os.close(fd)
+
+    def test_write_attachment(self, tmp_path):
+        """Test copying an attachment to disk with checksum verification."""
+        data = b"x" * 100_000
+        fd = create_sealed_memfd(data)
+        target = tmp_path / "config.json"
+        try:
+            write_attachment(fd, str(target), len(data), hashlib.sha256(data).hexdigest())
+            assert target.read_bytes() == data
+
+            with pytest.raises(ValueError, match="checksum mismatch"):
+                write_attachment(fd, str(tmp_path / "bad.json"), len(data), "0" * 64)
+            assert not (tmp_path / "bad.json").exists()
+        finally:
+            os.close(fd)
+
+
+    @pytest.mark.skipif(not hasattr(os, "memfd_create"), reason="Sealing requires memfd")
+    def test_unsealed_rejected(self, tmp_path):
+        """Test that a modifiable descriptor is not trusted."""
+        with tempfile.TemporaryFile() as f:
+            f.write(b"payload")
+            f.flush()
+            with pytest.raises(ValueError, match="not sealed"):
+                map_attachment(f.fileno(), 7)
+            with pytest.raises(ValueError, match="not sealed"):
+                write_attachment(f.fileno(), str(tmp_path / "out"), 7, hashlib.sha256(b"payload").hexdigest())
+
+class TestFdPassingConnection:
+    """Test FdPassingConnection class."""
+
+    def test_plain_messages(self, connections):
+        """Test messages without descriptors."""
+        sender, receiver = connections
+        message = sender.protocol.create_event_message({"event_type": "test"})
+        sender.write_message(message)
+
+        assert receiver.receive() == (message, [])
+
+    def test_attachments(self, connections):
+        """Test that attachments arrive with their message."""
+        sender, receiver = connections
+        first = sender.protocol.create_event_message({"event_type": "first"})
+        second = sender.protocol.create_event_message({"event_type": "second"})
+        sender.send_with_attachments(first, [b"one", b"two"])
+        sender.send_with_attachments(second, [b"three"])
+
+        message, fds = receiver.receive()
+        assert message["event"]["event_type"] == "first"
+        assert [os.pread(fd, 10, 0) for fd in fds] == [b"one", b"two"]
+        assert message["attachments"][1]["size"] == 3
+
+        message, fds2 = receiver.receive()
+        assert [os.pread(fd, 10, 0) for fd in fds2] == [b"three"]
+        for fd in fds + fds2:
+            os.close(fd)
+
+    def test_config_by_reference(self, connections, tmp_path):
+        """Test sending a config event with out-of-band content."""
+        sender, receiver = connections
+        converter = ConfigEventConverter()
+        config_data = {
+            "config_id": "cfg-1",
+            "name": "main",
+            "type": "sing-box",
+            "content": {"outbounds": [{"type": "direct", "tag": f"o{i}"} for i in range(1000)]}
+        }
+        send_config_by_reference(sender, config_data, converter)
+
+        message, (fd,) = receiver.receive()
+        event = message["event"]
+        assert converter.validate_event(event, "config-events") is True
+        assert "content" not in event["data"]
+        attachment = message["attachments"][event["data"]["content_ref"]["attachment"]]
+
+        target = tmp_path / "config.json"
+        write_attachment(fd, str(target), attachment["size"], attachment["sha256"])
+        os.close(fd)
+        assert json.loads(target.read_text()) == config_data["content"]
+
+    def test_missing_descriptors(self, connections):
+        """Test that a message announcing attachments needs descriptors."""
+        sender, receiver = connections
+        message = sender.protocol.create_event_message({"event_type": "test"})
+        message["attachments"] = [{"size": 1}]
+        sender.send_message(message)
+
+        with pytest.raises(ValueError, match="expects 1 descriptors"):
+            receiver.receive()
+
+
+    def test_undecodable_message_descriptors_closed(self, connections):
+        """Test that descriptors of a dropped message are not handed to the next one."""
+        sender, receiver = connections
+        expired = sender.protocol.create_command_message("reload_config", {}, timeout=-1.0)
+        sender.send_with_attachments(expired, [b"stale"])
+        sender.send_with_attachments(sender.protocol.create_event_message({"event_type": "next"}), [b"fresh"])
+
+        with pytest.raises(DeadlineExceeded):
+            receiver.receive()
+        message, fds = receiver.receive()
+        assert message["event"]["event_type"] == "next"
+        assert [os.pread(fd, 10, 0) for fd in fds] == [b"fresh"]
+        os.close(fds[0])
+
+    def test_missing_descriptors_closed(self, connections):
+        """Test that descriptors of a message missing some of them are closed, not left pending."""
+        sender, receiver = connections
+        message = sender.protocol.create_event_message({"event_type": "short"})
+        message["attachments"] = [describe_attachment(data) for data in (b"one", b"two")]
+        fd = create_sealed_memfd(b"one")
+        try:
+            sender.send_message(message, [fd])
+        finally:
+            os.close(fd)
+        sender.send_with_attachments(sender.protocol.create_event_message({"event_type": "next"}), [b"fresh"])
+
+        with pytest.raises(ValueError, match="expects 2 descriptors, received 1"):
+            receiver.receive()
+        assert len(receiver._fds) == 0
+        message, fds = receiver.receive()
+        assert [os.pread(fd, 10, 0) for fd in fds] == [b"fresh"]
+        os.close(fds[0])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,140 @@
+"""
+Tests for producer-side event filters.
+"""
+
+import pytest
+from jsonschema import ValidationError
+from unittest.mock import patch
+
+from sbox_common.protocols.socket import FramedJSONProtocol
+from sbox_common.protocols.socket.broadcast import BroadcastHub
+from sbox_common.protocols.socket.filters import (
+    compile_filter,
+    create_subscribe_command,
+    filter_from_command
+)
+
+
+@pytest.fixture
+def protocol():
+    return FramedJSONProtocol()
+
+
+def event(protocol, event_type, **data):
+    return protocol.create_event_message({"event_type": event_type, "data": data})
+
+
+class TestCompileFilter:
+    """Test filter compilation."""
+
+    def test_event_type_patterns(self, protocol):
+        """Test exact and wildcard event type patterns."""
+        accepts = compile_filter({"event_types": ["health.alert_*", "config.updated"]})
+
+        assert accepts(event(protocol, "health.alert_triggered"))
+        assert accepts(event(protocol, "config.updated"))
+        assert not accepts(event(protocol, "config.created"))
+        assert not accepts(event(protocol, "health.status_changed"))
+
+    def test_where_predicates(self, protocol):
+        """Test equality predicates on data fields."""
+        accepts = compile_filter({
+            "where": {"severity": ["critical", "high"], "component": "proxy", "details.retry": True}
+        })
+
+        assert accepts(event(protocol, "x", severity="high", component="proxy", details={"retry": True}))
+        assert not accepts(event(protocol, "x", severity="low", component="proxy", details={"retry": True}))
+        assert not accepts(event(protocol, "x", severity="high", component="proxy", details={"retry": 1}))
+        assert not accepts(event(protocol, "x", severity="high", component="proxy"))
+        assert not accepts(event(protocol, "x", severity=["high"], component="proxy", details={"retry": True}))
+
+    def test_non_events_pass(self, protocol):
+        """Test that filters do not apply to non-event messages."""
+        accepts = compile_filter({"event_types": ["health.*"]})
+        assert accepts(protocol.create_heartbeat_message("agent", "healthy"))
+
+    def test_invalid_filter(self):
+        """Test that malformed filters are rejected."""
+        with pytest.raises(ValueError, match="Unknown filter fields"):
+            compile_filter({"types": []})
+        with pytest.raises(ValueError, match="event_types"):
+            compile_filter({"event_types": "health.*"})
+        with pytest.raises(ValueError, match="where values"):
+            compile_filter({"where": {"severity": [["critical"]]}})
+        with pytest.raises(ValueError, match="where values"):
+            compile_filter({"where": {"labels": {"env": "prod"}}})
+
+
+class TestSubscribeCommand:
+    """Test subscribe command messages."""
+
+    def test_command_roundtrip(self, protocol):
+        """Test building, encoding and compiling a subscribe command."""
+        command = create_subscribe_command(protocol, ["subscription.*"], {"subscription_id": "s1"})
+        decoded, _ = protocol.decode_message(protocol.encode_message(command))
+        accepts = filter_from_command(decoded)
+
+        assert accepts(event(protocol, "subscription.enabled", subscription_id="s1"))
+        assert not accepts(event(protocol, "subscription.enabled", subscription_id="s2"))
+
+    def test_schema_rejects_bad_filter(self, protocol):
+        """Test that the protocol schema validates subscribe filters."""
+        command = protocol.create_command_message("subscribe", {"filter": {"event_types": [1]}})
+        with pytest.raises(ValidationError):
+            protocol.validate_message(command)
+
+
+class TestFilteredBroadcast:
+    """Test filters applied by BroadcastHub."""
+
+    def test_filtered_publish(self, protocol):
+        """Test that subscribers only receive matching events."""
+        hub = BroadcastHub(protocol)
+        alerts = hub.subscribe()
+        everything = hub.subscribe()
+        response = hub.apply_subscribe(alerts, create_subscribe_command(protocol, ["health.alert_*"]))
+        assert response["response"]["status"] == "success"
+
+        hub.publish(event(protocol, "health.alert_triggered", alert_id="a1"))
+        hub.publish(event(protocol, "config.updated"))
+
+        assert len(alerts.queue) == 1
+        assert alerts.filtered == 1
+        assert len(everything.queue) == 2
+
+    def test_no_encoding_without_recipients(self, protocol):
+        """Test that unwanted messages are not encoded at all."""
+        hub = BroadcastHub(protocol)
+        subscriber = hub.subscribe(filter=compile_filter({"event_types": ["health.*"]}))
+
+        with patch.object(protocol, "encode_message", wraps=protocol.encode_message) as encode:
+            assert hub.publish(event(protocol, "config.updated")) == 0
+            assert encode.call_count == 0
+        assert len(subscriber.queue) == 0
+
+    def test_invalid_subscribe(self, protocol):
+        """Test error response for an invalid filter."""
+        hub = BroadcastHub(protocol)
+        subscriber = hub.subscribe()
+        command = protocol.create_command_message("subscribe", {"filter": {"bogus": True}})
+
+        response = hub.apply_subscribe(subscriber, command)
+
+        assert response["response"]["status"] == "error"
+        assert subscriber.filter is None
+
+    def test_unhashable_where_without_validation(self, protocol):
+        """Test that unhashable where values are an invalid_filter error, not a crash."""
+        protocol.configure(validation_enabled=False)
+        hub = BroadcastHub(protocol)
+        subscriber = hub.subscribe()
+        command = create_subscribe_command(protocol, where={"severity": [["critical"]]})
+
+        response = hub.apply_subscribe(subscriber, command)
+
+        assert response["response"]["error"]["code"] == "invalid_filter"
+        assert subscriber.filter is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,192 @@
+"""
+Tests for credit-based flow control.
+"""
+
+import asyncio
+import io
+import socket
+import threading
+import pytest
+
+from sbox_common.protocols.socket import FramedJSONProtocol
+from sbox_common.protocols.socket.handshake import FEATURE_CREDIT_FLOW
+from sbox_common.protocols.socket.flow_control import (
+    AsyncFlowControlledConnection,
+    CreditGranter,
+    CreditWindow,
+    FlowControlledConnection
+)
+
+
+def credit_protocol():
+    """Protocol that negotiated credit flow control."""
+    protocol = FramedJSONProtocol()
+    protocol.configure(features={FEATURE_CREDIT_FLOW})
+    return protocol
+
+
+class TestCredits:
+    """Test credit accounting."""
+
+    def test_window(self):
+        """Test spending and granting credits."""
+        window = CreditWindow()
+        assert window.can_send() is False
+
+        window.grant(1, 10)
+        assert window.can_send() is True
+        window.consume(50)  # Overdraft allowed for one message
+        assert window.can_send() is False
+        assert window.bytes == -40
+
+    def test_granter_batches(self):
+        """Test that credits are returned once half the window is consumed."""
+        granter = CreditGranter(window_messages=4, window_bytes=1000)
+
+        assert granter.initial() == (4, 1000)
+        assert granter.consumed(10) is None
+        assert granter.consumed(10) == (2, 20)
+        assert granter.consumed(600) == (1, 600)
+
+    def test_granter_rejects_overrun(self):
+        """Test that messages beyond the granted window are rejected."""
+        granter = CreditGranter(window_messages=2, window_bytes=1000)
+        granter.initial()
+        granter.received(10)
+        granter.received(10)
+        with pytest.raises(ValueError, match="credit window"):
+            granter.received(10)
+        granter.consumed(10)  # Returns credits for both messages
+        granter.received(10)
+
+    def test_invalid_window(self):
+        """Test that windows must be positive."""
+        with pytest.raises(ValueError):
+            CreditGranter(window_messages=0)
+
+    def test_credit_message_validates(self):
+        """Test that credit messages match the protocol schema."""
+        protocol = FramedJSONProtocol()
+        assert protocol.validate_message(protocol.create_credit_message(8, 1024)) is True
+
+
+class TestFlowControlledConnection:
+    """Test blocking flow controlled connection."""
+
+    def test_sender_pauses_without_credits(self):
+        """Test that the sender never exceeds the receiver window."""
+        left, right = socket.socketpair()
+        protocol = FramedJSONProtocol()
+        sender = FlowControlledConnection(left.makefile('rb'), left.makefile('wb'), credit_protocol())
+        receiver = FlowControlledConnection(right.makefile('rb'), right.makefile('wb'), credit_protocol(),
+                                            window_messages=4)
+
+        receiver.start()
+        sent = []
+
+        def produce():
+            for i in range(20):
+                sender.send(protocol.create_event_message({"n": i}))
+                sent.append(i)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        thread.join(0.2)
+
+        # Only the initial window could be sent before the receiver consumed anything
+        assert len(sent) == 4
+
+        received = [receiver.receive()["event"]["n"] for _ in range(20)]
+        thread.join(2)
+
+        assert received == list(range(20))
+        assert not thread.is_alive()
+        left.close()
+        right.close()
+
+
+    def test_peer_beyond_window(self):
+        """Test that a peer ignoring the window is a protocol error, not an unbounded inbox."""
+        sender = FramedJSONProtocol()
+        frames = b"".join(sender.encode_message(sender.create_event_message({"n": i})) for i in range(3))
+        connection = FlowControlledConnection(io.BytesIO(frames), io.BytesIO(), credit_protocol(),
+                                              window_messages=2)
+        connection.start()
+        with pytest.raises(ValueError, match="credit window"):
+            connection.send(sender.create_event_message({"n": 0}))  # Reads ahead while waiting
+        assert len(connection._inbox) == 2
+        assert [connection.receive()["event"]["n"] for _ in range(2)] == [0, 1]
+        assert connection.receive() is None
+
+
+class TestAsyncFlowControlledConnection:
+    """Test asyncio flow controlled connection."""
+
+    def test_roundtrip_bounded(self):
+        """Test that an async sender is paced by receiver credits."""
+        protocol = FramedJSONProtocol()
+
+        async def scenario():
+            left, right = socket.socketpair()
+            left_streams = await asyncio.open_connection(sock=left)
+            right_streams = await asyncio.open_connection(sock=right)
+            sender = AsyncFlowControlledConnection(*left_streams, credit_protocol(), window_messages=8)
+            receiver = AsyncFlowControlledConnection(*right_streams, credit_protocol(), window_messages=2)
+            await sender.start()
+            await receiver.start()
+
+            produced = []
+
+            async def produce():
+                for i in range(10):
+                    await sender.send(protocol.create_event_message({"n": i}))
+                    produced.append(i)
+
+            task = asyncio.ensure_future(produce())
+            await asyncio.sleep(0.05)
+            paused_at = len(produced)
+
+            received = []
+            for _ in range(10):
+                received.append((await receiver.receive())["event"]["n"])
+            await asyncio.wait_for(task, 2)
+
+            await sender.close()
+            await receiver.close()
+            return paused_at, received
+
+        paused_at, received = asyncio.run(scenario())
+        assert paused_at == 2
+        assert received == list(range(10))
+
+    def test_peer_beyond_window_closes(self):
+        """Test that the connection is closed when the peer sends beyond its window."""
+        sender = FramedJSONProtocol()
+
+        async def scenario():
+            left, right = socket.socketpair()
+            _, peer_writer = await asyncio.open_connection(sock=left)
+            connection = AsyncFlowControlledConnection(*(await asyncio.open_connection(sock=right)),
+                                                       credit_protocol(), window_messages=2)
+            await connection.start()
+            for i in range(3):
+                peer_writer.write(sender.encode_message(sender.create_event_message({"n": i})))
+            await peer_writer.drain()
+            received = []
+            while True:
+                message = await asyncio.wait_for(connection.receive(), 2)
+                if message is None:
+                    break
+                received.append(message["event"]["n"])
+            closing = connection.writer.is_closing()
+            await connection.close()
+            peer_writer.close()
+            return received, closing
+
+        received, closing = asyncio.run(scenario())
+        assert received == [0, 1]
+        assert closing
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
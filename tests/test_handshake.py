@@ -0,0 +1,261 @@
+"""
+Tests for connection handshake and feature negotiation.
+"""
+
+import asyncio
+import socket
+import threading
+import pytest
+from io import BytesIO
+
+from sbox_common.protocols.socket import (
+    CompactHeartbeatSender, FlowControlledConnection, FramedJSONProtocol, PrioritySendScheduler, SelectorServer
+)
+from sbox_common.protocols.socket.handshake import (
+    FEATURE_CHUNKING,
+    FEATURE_SKIP_VALIDATION,
+    FEATURE_ZLIB,
+    Handshake
+)
+
+
+class TestNegotiation:
+    """Test parameter negotiation."""
+
+    def test_common_features_and_limits(self):
+        """Test that both sides agree on the common feature set."""
+        client = Handshake(FramedJSONProtocol(), features={FEATURE_ZLIB, FEATURE_CHUNKING},
+                           max_message_size=4 * 1024 * 1024)
+        server = Handshake(FramedJSONProtocol(), features={FEATURE_ZLIB}, max_message_size=2 * 1024 * 1024)
+
+        client_params = client.accept(server.hello())
+        server_params = server.accept(client.hello())
+
+        assert client_params == server_params
+        assert client_params.version == 1
+        assert client_params.features == frozenset({FEATURE_ZLIB})
+        assert client_params.max_message_size == 2 * 1024 * 1024
+        assert client.protocol.max_message_size == 2 * 1024 * 1024
+
+    def test_skip_validation_requires_both(self):
+        """Test that validation is only skipped when both peers opt in."""
+        trusting = Handshake(FramedJSONProtocol(), features={FEATURE_SKIP_VALIDATION})
+        strict = Handshake(FramedJSONProtocol(), features=set())
+
+        trusting.accept(strict.hello())
+        assert trusting.protocol.validation_enabled is True
+
+        trusting.accept(Handshake(FramedJSONProtocol(), features={FEATURE_SKIP_VALIDATION}).hello())
+        assert trusting.protocol.validation_enabled is False
+
+    def test_no_common_version(self):
+        """Test that disjoint versions fail the handshake."""
+        handshake = Handshake(FramedJSONProtocol())
+        remote = handshake.hello()
+        remote["hello"]["versions"] = [7]
+
+        with pytest.raises(ValueError, match="No common protocol version"):
+            handshake.accept(remote)
+
+    def test_hello_validates(self):
+        """Test that hello messages match the protocol schema."""
+        protocol = FramedJSONProtocol()
+        assert protocol.validate_message(Handshake(protocol, agent_id="a").hello()) is True
+
+
+class TestCompression:
+    """Test negotiated zlib framing."""
+
+    def test_large_payload_compressed(self):
+        """Test that payloads above the threshold are compressed and restored."""
+        sender = FramedJSONProtocol()
+        receiver = FramedJSONProtocol()
+        Handshake(sender).accept(Handshake(receiver).hello())
+        message = sender.create_event_message({"blob": "x" * 100_000})
+
+        frame = sender.encode_message(message)
+
+        assert len(frame) < 10_000
+        assert receiver.read_message(BytesIO(frame)) == message
+        assert receiver.decode_message(frame)[0] == message
+
+    def test_compressed_chunks(self):
+        """Test that chunked payloads are compressed before splitting."""
+        protocol = FramedJSONProtocol()
+        protocol.configure(compression_threshold=0)
+        message = protocol.create_event_message({"blob": "y" * 50_000})
+
+        frames = protocol.encode_chunks(protocol.encode_payload(message), 3, 64)
+
+        assert protocol.read_message(BytesIO(b"".join(frames))) == message
+
+    def test_decompression_bomb_rejected(self):
+        """Test that decompressed size is limited."""
+        sender = FramedJSONProtocol()
+        sender.configure(compression_threshold=0)
+        receiver = FramedJSONProtocol()
+        receiver.configure(max_message_size=1000)
+        frame = sender.frame_payload(b" " * 100_000)
+
+        with pytest.raises(ValueError, match="Message too large"):
+            receiver.decode_message(frame)
+
+
+class TestHandshakeIO:
+    """Test handshake over real connections."""
+
+    def test_blocking_handshake(self):
+        """Test initiate/respond over a socketpair."""
+        left, right = socket.socketpair()
+        client = Handshake(FramedJSONProtocol(), agent_id="client")
+        server = Handshake(FramedJSONProtocol(), agent_id="server")
+        result = {}
+
+        thread = threading.Thread(
+            target=lambda: result.update(server=server.respond(right.makefile('rb'), right.makefile('wb')))
+        )
+        thread.start()
+        client_params = client.initiate(left.makefile('rb'), left.makefile('wb'))
+        thread.join(2)
+
+        server_params, pending = result["server"]
+        assert client_params == server_params
+        assert pending is None
+        assert server.peer_agent_id == "client"
+        assert client.peer_agent_id == "server"
+        left.close()
+        right.close()
+
+    def test_legacy_client(self):
+        """Test that a responder falls back when the first message is not a hello."""
+        protocol = FramedJSONProtocol()
+        first = protocol.create_heartbeat_message("old-agent", "healthy")
+        server = Handshake(FramedJSONProtocol())
+
+        parameters, pending = server.respond(BytesIO(protocol.encode_message(first)), BytesIO())
+
+        assert parameters.features == frozenset()
+        assert pending == first
+
+    def test_async_handshake(self):
+        """Test initiate_async/respond_async over a socketpair."""
+
+        async def scenario():
+            left, right = socket.socketpair()
+            client_streams = await asyncio.open_connection(sock=left)
+            server_streams = await asyncio.open_connection(sock=right)
+            client = Handshake(FramedJSONProtocol())
+            server = Handshake(FramedJSONProtocol())
+            results = await asyncio.gather(
+                client.initiate_async(*client_streams),
+                server.respond_async(*server_streams)
+            )
+            client_streams[1].close()
+            server_streams[1].close()
+            return results
+
+        client_params, (server_params, pending) = asyncio.run(scenario())
+        assert client_params == server_params
+        assert pending is None
+
+
+class TestFeatureGating:
+    """Test that optional features are only used when negotiated."""
+
+    def _legacy_protocol(self):
+        protocol = FramedJSONProtocol()
+        Handshake(protocol).respond(BytesIO(protocol.encode_message(
+            protocol.create_heartbeat_message("old-agent", "healthy"))), BytesIO())
+        return protocol
+
+    def test_defaults_without_handshake(self):
+        """Test that a protocol without a handshake uses no optional feature."""
+        protocol = FramedJSONProtocol()
+        assert protocol.features == frozenset()
+        assert not protocol.has_feature(FEATURE_CHUNKING)
+        protocol.configure(features={FEATURE_CHUNKING})
+        assert protocol.has_feature(FEATURE_CHUNKING)
+
+    def test_plain_frames_without_handshake(self):
+        """Test that a scheduler and a flow-controlled connection send plain frames without credits."""
+        protocol = FramedJSONProtocol()
+        scheduler = PrioritySendScheduler(protocol, chunk_size=256)
+        scheduler.enqueue(protocol.create_event_message({"event_type": "config.updated", "data": "x" * 2000}))
+        frame = scheduler.next_frame()
+        assert scheduler.next_frame() is None
+        assert not int.from_bytes(frame[4:8], "big") & protocol.FRAME_FLAG_CHUNK
+
+        writer = BytesIO()
+        connection = FlowControlledConnection(BytesIO(), writer, FramedJSONProtocol(), window_messages=1)
+        connection.start()
+        for _ in range(3):
+            connection.send(connection.protocol.create_heartbeat_message("agent", "healthy"))
+        writer.seek(0)
+        types = [connection.protocol.read_message(writer)["type"] for _ in range(3)]
+        assert types == ["heartbeat"] * 3
+
+    def test_no_chunks_for_legacy_peer(self):
+        """Test that large payloads are sent whole to peers without chunking."""
+        protocol = self._legacy_protocol()
+        assert not protocol.has_feature(FEATURE_CHUNKING)
+        scheduler = PrioritySendScheduler(protocol, chunk_size=256)
+        scheduler.enqueue(protocol.create_event_message({"event_type": "config.updated", "data": "x" * 2000}))
+        frame = scheduler.next_frame()
+        assert scheduler.next_frame() is None
+        assert not int.from_bytes(frame[4:8], "big") & protocol.FRAME_FLAG_CHUNK
+
+    def test_full_heartbeats_for_legacy_peer(self):
+        """Test that delta heartbeats are not sent without the feature."""
+        sender = CompactHeartbeatSender(self._legacy_protocol(), "agent")
+        sender.build("healthy")
+        assert "delta" not in sender.build("healthy")["heartbeat"]
+
+    def test_no_credits_for_legacy_peer(self):
+        """Test that flow control neither grants nor waits for credits."""
+        writer = BytesIO()
+        connection = FlowControlledConnection(BytesIO(), writer, self._legacy_protocol(), window_messages=1)
+        connection.start()
+        for _ in range(3):
+            connection.send(connection.protocol.create_heartbeat_message("agent", "healthy"))
+        writer.seek(0)
+        types = [connection.protocol.read_message(writer)["type"] for _ in range(3)]
+        assert types == ["heartbeat"] * 3
+
+    def test_server_sessions_per_connection(self, tmp_path):
+        """Test that SelectorServer negotiates a session per connection."""
+        sessions = []
+
+        def handler(connection, message):
+            sessions.append(connection.session)
+            return connection.protocol.create_response_message(message["id"], "success")
+
+        server = SelectorServer(str(tmp_path / "server.sock"), handler, features={FEATURE_ZLIB})
+        server.start()
+        thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+        try:
+            clients = []
+            for negotiate in (True, False):
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(5)
+                sock.connect(server.path)
+                reader, writer = sock.makefile('rb'), sock.makefile('wb')
+                protocol = FramedJSONProtocol()
+                if negotiate:
+                    Handshake(protocol, features={FEATURE_ZLIB, FEATURE_CHUNKING}).initiate(reader, writer)
+                command = protocol.create_command_message("ping", {})
+                protocol.write_message(writer, command)
+                assert protocol.read_message(reader)["response"]["request_id"] == command["id"]
+                clients.append((sock, reader, writer))
+        finally:
+            for files in clients:
+                for f in files:
+                    f.close()
+            server.stop()
+            thread.join(5)
+        assert [session.features for session in sessions] == [frozenset({FEATURE_ZLIB}), frozenset()]
+        assert server.protocol.features == frozenset()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
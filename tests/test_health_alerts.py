@@ -0,0 +1,117 @@
+"""
+Tests for the incremental threshold alert engine.
+"""
+
+import pytest
+
+from sbox_common.health import AlertEngine, AlertRule
+from sbox_common.health.alerts import _RuleState
+
+
+def event_types(events):
+    return [event["event_type"] for event in events]
+
+
+class TestAlertRule:
+    """Test rule compilation."""
+
+    @pytest.mark.parametrize("kwargs,match", [
+        ({"comparator": "=~"}, "Unsupported comparator"),
+        ({"severity": "fatal"}, "Unsupported severity"),
+        ({"window": 0}, "window"),
+        ({"hysteresis": -1}, "hysteresis"),
+    ])
+    def test_invalid_rules(self, kwargs, match):
+        """Test that invalid rules are rejected at compile time."""
+        params = {"name": "cpu", "metric": "cpu_usage_percent", "comparator": ">", "threshold": 90}
+        params.update(kwargs)
+        with pytest.raises(ValueError, match=match):
+            AlertEngine([AlertRule(**params)])
+
+
+class TestAlertEngine:
+    """Test AlertEngine class."""
+
+    def test_trigger_and_resolve_with_hysteresis(self):
+        """Test that alerts fire above threshold and clear below hysteresis."""
+        engine = AlertEngine([
+            AlertRule("high-cpu", "cpu_usage_percent", ">", 80, severity="warning", hysteresis=10)
+        ])
+
+        assert engine.process("sing-box", {"cpu_usage_percent": 50}, timestamp=0) == []
+        assert engine.component_status("sing-box") == "healthy"
+
+        events = engine.process("sing-box", {"cpu_usage_percent": 90}, timestamp=1)
+        assert event_types(events) == ["health.alert_triggered", "health.status_changed"]
+        assert events[0]["data"]["severity"] == "warning"
+        assert events[0]["data"]["current_value"] == {"cpu_usage_percent": 90.0}
+        assert events[1]["data"]["current_status"] == "degraded"
+        assert engine.converter.validate_event(events[0], "health-events") is True
+
+        # Still above the clear level: no flapping
+        assert engine.process("sing-box", {"cpu_usage_percent": 75}, timestamp=2) == []
+
+        events = engine.process("sing-box", {"cpu_usage_percent": 60}, timestamp=3)
+        assert event_types(events) == ["health.alert_resolved", "health.status_changed"]
+        assert engine.converter.validate_event(events[0], "health-events") is True
+        assert engine.component_status("sing-box") == "healthy"
+
+    def test_rolling_window(self):
+        """Test that the rule evaluates the rolling mean over its window."""
+        engine = AlertEngine([
+            AlertRule("mem", "memory_usage_mb", ">=", 100, window=3)
+        ])
+
+        assert engine.process_value("agent", "memory_usage_mb", 200, timestamp=0) == []
+        assert engine.process_value("agent", "memory_usage_mb", 50, timestamp=1) == []
+        assert engine.process_value("agent", "memory_usage_mb", 20, timestamp=2) == []
+        events = engine.process_value("agent", "memory_usage_mb", 300, timestamp=3)
+        assert event_types(events)[0] == "health.alert_triggered"
+
+    def test_rolling_mean_does_not_drift(self):
+        """Test that a huge sample leaving the window does not skew later means."""
+        state = _RuleState(3)
+        state.push(1e17)
+        means = [state.push(1.0) for _ in range(5)]
+        assert means[-1] == 1.0
+
+    def test_cooldown(self):
+        """Test that alerts are not re-triggered within the cooldown."""
+        engine = AlertEngine([
+            AlertRule("disk", "disk_usage_percent", ">", 90, severity="critical", cooldown_seconds=60)
+        ])
+
+        assert "health.alert_triggered" in event_types(engine.process("host", {"disk_usage_percent": 95}, 0))
+        engine.process("host", {"disk_usage_percent": 50}, 10)
+        assert engine.process("host", {"disk_usage_percent": 95}, 20) == []
+        engine.process("host", {"disk_usage_percent": 50}, 30)
+        assert "health.alert_triggered" in event_types(engine.process("host", {"disk_usage_percent": 95}, 70))
+
+    def test_component_filter_and_independent_state(self):
+        """Test per-component state and component-scoped rules."""
+        engine = AlertEngine([
+            AlertRule("cpu", "cpu_usage_percent", ">", 80, severity="error", component="sing-box")
+        ])
+
+        assert engine.process("sboxmgr", {"cpu_usage_percent": 99}, 0) == []
+        events = engine.process("sing-box", {"cpu_usage_percent": 99}, 0)
+        assert events[-1]["data"]["current_status"] == "unhealthy"
+        assert engine.statuses == {"sboxmgr": "healthy", "sing-box": "unhealthy"}
+
+    def test_worst_active_severity_wins(self):
+        """Test that component status reflects the worst active alert."""
+        engine = AlertEngine([
+            AlertRule("cpu-warn", "cpu_usage_percent", ">", 70, severity="warning"),
+            AlertRule("cpu-crit", "cpu_usage_percent", ">", 95, severity="critical"),
+        ])
+
+        engine.process("sing-box", {"cpu_usage_percent": 80}, 0)
+        assert engine.component_status("sing-box") == "degraded"
+        engine.process("sing-box", {"cpu_usage_percent": 99}, 1)
+        assert engine.component_status("sing-box") == "unhealthy"
+        engine.process("sing-box", {"cpu_usage_percent": 80}, 2)
+        assert engine.component_status("sing-box") == "degraded"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,149 @@
+"""
+Tests for rolling-window health metrics aggregation.
+"""
+
+import pytest
+
+from sbox_common.health import HealthMetricsAggregator, MetricRingBuffer
+from sbox_common.health.metrics import summarize_values
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestMetricRingBuffer:
+    """Test MetricRingBuffer class."""
+
+    def test_append_and_window(self):
+        """Test appending samples and reading them oldest first."""
+        buffer = MetricRingBuffer(4)
+        for i in range(3):
+            buffer.append(float(i), float(i * 10))
+
+        assert len(buffer) == 3
+        assert list(buffer.window()) == [0.0, 10.0, 20.0]
+        assert buffer.last() == 20.0
+
+    def test_wraparound_keeps_capacity(self):
+        """Test that old samples are overwritten when full."""
+        buffer = MetricRingBuffer(3)
+        for i in range(10):
+            buffer.append(float(i), float(i))
+
+        assert len(buffer) == 3
+        assert list(buffer.window()) == [7.0, 8.0, 9.0]
+        assert list(buffer.window(since=8.5)) == [9.0]
+        assert buffer.last() == 9.0
+
+    def test_invalid_capacity(self):
+        """Test that capacity must be positive."""
+        with pytest.raises(ValueError):
+            MetricRingBuffer(0)
+
+
+class TestSummarizeValues:
+    """Test summary statistics."""
+
+    def test_summary(self):
+        """Test min/max/mean/percentiles."""
+        buffer = MetricRingBuffer(101)
+        for i in range(101):
+            buffer.append(float(i), float(i))
+
+        summary = summarize_values(buffer.window(), (50, 95))
+
+        assert summary.count == 101
+        assert summary.min == 0.0
+        assert summary.max == 100.0
+        assert summary.mean == 50.0
+        assert summary.percentiles == {"p50": 50.0, "p95": 95.0}
+
+    def test_empty(self):
+        """Test that empty windows have no summary."""
+        assert summarize_values(MetricRingBuffer(2).window()) is None
+
+    def test_numpy_matches_pure_python(self, monkeypatch):
+        """Test that the NumPy and pure Python summaries agree."""
+        pytest.importorskip("numpy")
+        buffer = MetricRingBuffer(50)
+        for i in range(80):
+            buffer.append(float(i), (i * 37 % 101) / 3.0)
+
+        vectorized = summarize_values(buffer.window())
+        monkeypatch.setattr("sbox_common.health.metrics._np", None)
+        pure = summarize_values(buffer.window())
+
+        assert vectorized.count == pure.count
+        for field in ("min", "max", "mean", "last"):
+            assert getattr(vectorized, field) == pytest.approx(getattr(pure, field))
+            assert type(getattr(vectorized, field)) is float
+        assert vectorized.percentiles == pytest.approx(pure.percentiles)
+
+
+class TestHealthMetricsAggregator:
+    """Test HealthMetricsAggregator class."""
+
+    def test_rolling_window_summary(self):
+        """Test summaries over a time window."""
+        clock = FakeClock()
+        aggregator = HealthMetricsAggregator(capacity=100, clock=clock)
+
+        for i in range(10):
+            aggregator.add_sample("sing-box", {"cpu_usage_percent": i * 10, "unknown": 1})
+            clock.now += 1
+
+        summary = aggregator.summarize("sing-box", "cpu_usage_percent", window_seconds=3)
+
+        assert summary.count == 3
+        assert summary.min == 70.0
+        assert summary.max == 90.0
+        assert aggregator.summarize("sing-box", "unknown") is None
+        assert aggregator.summarize("missing", "cpu_usage_percent") is None
+
+    def test_memory_is_bounded(self):
+        """Test that buffers never grow past capacity."""
+        aggregator = HealthMetricsAggregator(capacity=5, clock=FakeClock())
+        for i in range(1000):
+            aggregator.add_sample("sing-box", {"memory_usage_mb": i})
+
+        summary = aggregator.summarize("sing-box", "memory_usage_mb")
+        assert summary.count == 5
+        assert summary.min == 995.0
+
+    def test_create_check_completed(self):
+        """Test building a validated health.check_completed event."""
+        clock = FakeClock()
+        aggregator = HealthMetricsAggregator(clock=clock)
+        aggregator.add_sample("sing-box", {"cpu_usage_percent": 50, "memory_usage_mb": 128})
+        aggregator.add_sample("sboxmgr", {"cpu_usage_percent": 5})
+        clock.now += 120
+
+        event = aggregator.create_check_completed(
+            "check-1",
+            window_seconds=60,
+            statuses={"sboxmgr": "degraded"}
+        )
+
+        assert event["event_type"] == "health.check_completed"
+        assert event["data"]["check_id"] == "check-1"
+        assert event["data"]["overall_status"] == "degraded"
+        components = {c["component"]: c for c in event["data"]["components"]}
+        assert components["sing-box"]["status"] == "unknown"
+        assert components["sboxmgr"]["status"] == "degraded"
+        assert aggregator.converter.validate_event(event, "health-events") is True
+
+        event = aggregator.create_check_completed()
+        components = {c["component"]: c for c in event["data"]["components"]}
+        assert event["data"]["overall_status"] == "healthy"
+        assert components["sing-box"]["details"]["cpu_usage_percent"]["p50"] == 50.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,190 @@
+"""
+Tests for the asyncio HTTP API server and keep-alive client.
+"""
+
+import asyncio
+import json
+import pytest
+from pathlib import Path
+
+from jsonschema import ValidationError
+
+from sbox_common.protocols.http_api import (
+    ApiClient, ApiError, ApiServer, ApiValidators, create_request, create_response
+)
+
+EXAMPLES_DIR = Path(__file__).resolve().parents[1] / "examples"
+
+
+@pytest.fixture(scope="module")
+def validators():
+    return ApiValidators()
+
+
+def example_config():
+    with open(EXAMPLES_DIR / "api_request.json", 'r', encoding='utf-8') as f:
+        return json.load(f)["config"]
+
+
+def status_handler(request):
+    return {"agent_status": "running", "uptime": "5m", "version": "0.1.2"}
+
+
+async def with_server(validators, handlers, scenario, **kwargs):
+    server = ApiServer(handlers, validators, **kwargs)
+    await server.start(port=0)
+    try:
+        return await scenario(server)
+    finally:
+        await server.close()
+
+
+class TestApiValidators:
+    """Test precompiled per-action validators."""
+
+    def test_example_request_valid(self, validators):
+        """Test that the example update_config request validates."""
+        with open(EXAMPLES_DIR / "api_request.json", 'r', encoding='utf-8') as f:
+            request = json.load(f)
+        assert validators.validate_request(request) == "update_config"
+
+    def test_config_validated_against_agent_schema(self, validators):
+        """Test that the external agent_config $ref is resolved."""
+        config = example_config()
+        config["server"]["timeout"] = "30 seconds"
+        with pytest.raises(ApiError) as exc_info:
+            validators.validate_request(create_request("update_config", config=config))
+        assert exc_info.value.error_code == "INVALID_REQUEST"
+
+    def test_unknown_action(self, validators):
+        """Test that unknown actions are NOT_FOUND."""
+        with pytest.raises(ApiError) as exc_info:
+            validators.validate_request(create_request("reboot"))
+        assert exc_info.value.error_code == "NOT_FOUND"
+
+    def test_invalid_response(self, validators):
+        """Test response validation."""
+        response = create_response("b0f4d6a0-f309-44f4-900e-9df0bcb2a755", {"agent_status": "sleeping"})
+        with pytest.raises(ValidationError):
+            validators.validate_response("get_status", response)
+
+
+class TestApiServer:
+    """Test ApiServer and ApiClient over HTTP."""
+
+    def test_round_trip_reuses_connection(self, validators):
+        """Test that sequential calls share one keep-alive connection."""
+        async def scenario(server):
+            client = ApiClient(port=server.port, validators=validators)
+            try:
+                results = [await client.get_status() for _ in range(5)]
+                assert results[0]["agent_status"] == "running"
+                assert client.connections_opened == 1
+                assert server.requests_served == 5
+            finally:
+                await client.close()
+
+        asyncio.run(with_server(validators, {"get_status": status_handler}, scenario))
+
+    def test_async_handler_and_update_config(self, validators):
+        """Test async handlers receiving the validated request."""
+        received = []
+
+        async def update_handler(request):
+            received.append(request["config"])
+            return {"applied": True}
+
+        async def scenario(server):
+            client = ApiClient(port=server.port, validators=validators)
+            try:
+                await client.update_config(example_config())
+            finally:
+                await client.close()
+
+        asyncio.run(with_server(validators, {"update_config": update_handler}, scenario))
+        assert received == [example_config()]
+
+    def test_error_responses(self, validators):
+        """Test error codes and HTTP status mapping."""
+        def failing_handler(request):
+            raise RuntimeError("boom")
+
+        async def scenario(server):
+            client = ApiClient(port=server.port, validators=validators)
+            try:
+                with pytest.raises(ApiError) as exc_info:
+                    await client.health_check()
+                assert exc_info.value.error_code == "INTERNAL_ERROR"
+                with pytest.raises(ApiError) as exc_info:
+                    await client.update_config(example_config())
+                assert exc_info.value.error_code == "SERVICE_UNAVAILABLE"
+                status, response = await server.dispatch({"action": "get_status"})
+                assert status == 400 and response["error_code"] == "INVALID_REQUEST"
+            finally:
+                await client.close()
+
+        asyncio.run(with_server(validators, {"health_check": failing_handler}, scenario))
+
+    def test_token_required(self, validators):
+        """Test bearer token authentication."""
+        async def scenario(server):
+            client = ApiClient(port=server.port, validators=validators, token="wrong")
+            try:
+                with pytest.raises(ApiError) as exc_info:
+                    await client.get_status()
+                assert exc_info.value.error_code == "PERMISSION_DENIED"
+                client.token = "secret"
+                assert (await client.get_status())["version"] == "0.1.2"
+            finally:
+                await client.close()
+
+        asyncio.run(with_server(validators, {"get_status": status_handler}, scenario, token="secret"))
+
+    def test_missing_token_and_unknown_error_code(self, validators):
+        """Test a missing Authorization header and error codes without a status mapping."""
+        def limited_handler(request):
+            raise ApiError("RATE_LIMITED", "Slow down")
+
+        async def scenario(server):
+            status, response = await server.dispatch(create_request("get_status"))
+            assert status == 403 and response["error_code"] == "PERMISSION_DENIED"
+            status, response = await server.dispatch(create_request("get_status"), "Bearer secret")
+            assert status == 500 and response["error_code"] == "RATE_LIMITED"
+
+        asyncio.run(with_server(validators, {"get_status": limited_handler}, scenario,
+                                token="secret", validate_responses=False))
+
+    def test_connection_close_and_stale_connections(self, validators):
+        """Test non keep-alive clients and retry after the server drops a connection."""
+        async def scenario(server):
+            client = ApiClient(port=server.port, validators=validators, keep_alive=False)
+            await client.get_status()
+            await client.get_status()
+            assert client.connections_opened == 2
+
+            client = ApiClient(port=server.port, validators=validators)
+            await client.get_status()
+            client._idle[0][1].transport.abort()
+            await client.get_status()
+            assert client.connections_opened == 2
+            await client.close()
+
+        asyncio.run(with_server(validators, {"get_status": status_handler}, scenario))
+
+    def test_malformed_http(self, validators):
+        """Test that non-JSON bodies get an INVALID_REQUEST response."""
+        async def scenario(server):
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(b"POST /api HTTP/1.1\r\nContent-Length: 3\r\nConnection: close\r\n\r\n{{{")
+            data = await reader.read()
+            writer.close()
+            return data
+
+        data = asyncio.run(with_server(validators, {}, scenario))
+        head, _, body = data.partition(b"\r\n\r\n")
+        assert head.startswith(b"HTTP/1.1 400 ")
+        assert json.loads(body)["error_code"] == "INVALID_REQUEST"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
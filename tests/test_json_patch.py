@@ -0,0 +1,149 @@
+"""
+Tests for JSON patch utilities.
+"""
+
+import copy
+import pytest
+
+from sbox_common.protocols.json_patch import (
+    JsonPatchError,
+    apply_patch,
+    canonical_json,
+    config_hash,
+    make_patch
+)
+
+
+class TestCanonicalHashing:
+    """Test canonical JSON hashing."""
+
+    def test_canonical_json_is_key_order_independent(self):
+        """Test that key order does not affect canonical form."""
+        assert canonical_json({"b": 1, "a": [1, 2]}) == canonical_json({"a": [1, 2], "b": 1})
+        assert canonical_json({"a": 1}) == b'{"a":1}'
+
+    def test_config_hash_changes_with_content(self):
+        """Test that hash reflects content changes."""
+        assert config_hash({"a": 1}) == config_hash({"a": 1})
+        assert config_hash({"a": 1}) != config_hash({"a": 2})
+
+
+class TestMakePatch:
+    """Test patch computation."""
+
+    def test_identical_documents(self):
+        """Test that identical documents yield an empty patch."""
+        doc = {"outbounds": [{"tag": "a"}], "log": {"level": "info"}}
+        assert make_patch(doc, copy.deepcopy(doc)) == []
+
+    def test_single_outbound_change(self):
+        """Test that changing one outbound yields a targeted patch."""
+        source = {"outbounds": [{"tag": f"node-{i}", "port": i} for i in range(100)]}
+        target = copy.deepcopy(source)
+        target["outbounds"][42]["port"] = 9999
+
+        patch = make_patch(source, target)
+
+        assert patch == [{"op": "replace", "path": "/outbounds/42/port", "value": 9999}]
+
+    def test_list_insert_and_remove(self):
+        """Test that inserting or removing one element yields one operation."""
+        source = {"items": [1, 2, 3, 4]}
+
+        assert make_patch(source, {"items": [1, 2, 9, 3, 4]}) == [
+            {"op": "add", "path": "/items/2", "value": 9}
+        ]
+        assert make_patch(source, {"items": [1, 3, 4]}) == [
+            {"op": "remove", "path": "/items/1"}
+        ]
+
+    def test_key_escaping(self):
+        """Test that keys containing '/' and '~' are escaped."""
+        patch = make_patch({}, {"a/b": 1, "c~d": 2})
+        paths = sorted(operation["path"] for operation in patch)
+        assert paths == ["/a~1b", "/c~0d"]
+
+    @pytest.mark.parametrize("source,target", [
+        ({"a": 1, "b": {"c": [1, 2, 3]}}, {"b": {"c": [3], "d": None}, "e": "x"}),
+        ({"a": [1, 2, 3, 4, 5]}, {"a": [0, 2, 4]}),
+        ({"a": [{"x": 1}, {"y": 2}]}, {"a": [{"x": 1, "z": 3}, {"y": 2}, {"w": 4}]}),
+        ({"a": {"b": 1}}, {"a": [1, 2]}),
+        ({"a": 1}, {"a": 1.0}),
+    ])
+    def test_roundtrip(self, source, target):
+        """Test that applying the computed patch reproduces the target."""
+        patch = make_patch(source, target)
+        assert apply_patch(source, patch) == target
+
+
+    def test_nested_type_changes(self):
+        """Test that equal values of another JSON type are replaced."""
+        source = {"a": 1, "l": [1, {"b": 0}], "keep": [1, 2]}
+        target = {"a": True, "l": [1.0, {"b": False}], "keep": [1, 2]}
+        patch = make_patch(source, target)
+        assert sorted(operation["path"] for operation in patch) == ["/a", "/l/0", "/l/1/b"]
+        assert config_hash(apply_patch(source, patch)) == config_hash(target)
+
+class TestApplyPatch:
+    """Test patch application."""
+
+    def test_does_not_mutate_source(self):
+        """Test that applying a patch leaves the original untouched."""
+        source = {"a": {"b": [1, 2]}, "c": {"d": 1}}
+        snapshot = copy.deepcopy(source)
+
+        result = apply_patch(source, [{"op": "add", "path": "/a/b/-", "value": 3}])
+
+        assert source == snapshot
+        assert result["a"]["b"] == [1, 2, 3]
+        # Untouched subtrees are shared
+        assert result["c"] is source["c"]
+
+    def test_move_copy_and_test(self):
+        """Test move, copy and test operations."""
+        source = {"a": {"x": 1}, "b": {}}
+        patch = [
+            {"op": "test", "path": "/a/x", "value": 1},
+            {"op": "copy", "from": "/a", "path": "/b/copied"},
+            {"op": "move", "from": "/a/x", "path": "/b/moved"},
+            {"op": "add", "path": "/b/copied/y", "value": 2},
+        ]
+
+        result = apply_patch(source, patch)
+
+        assert result == {"a": {}, "b": {"copied": {"x": 1, "y": 2}, "moved": 1}}
+
+    def test_failed_test_operation(self):
+        """Test that a failing test operation raises."""
+        with pytest.raises(JsonPatchError, match="Test failed"):
+            apply_patch({"a": 1}, [{"op": "test", "path": "/a", "value": 2}])
+        with pytest.raises(JsonPatchError, match="Test failed"):
+            apply_patch({"a": 1}, [{"op": "test", "path": "/a", "value": True}])
+        with pytest.raises(JsonPatchError, match="Test failed"):
+            apply_patch({"a": [0]}, [{"op": "test", "path": "/a", "value": [False]}])
+
+    def test_missing_path(self):
+        """Test that removing a missing path raises."""
+        with pytest.raises(JsonPatchError, match="Path not found"):
+            apply_patch({"a": 1}, [{"op": "remove", "path": "/b"}])
+
+    def test_invalid_operation(self):
+        """Test that unknown operations raise."""
+        with pytest.raises(JsonPatchError, match="Unsupported patch operation"):
+            apply_patch({}, [{"op": "frobnicate", "path": "/a"}])
+
+    @pytest.mark.parametrize("operation", [
+        {"op": "add", "path": "/b"},
+        {"op": "replace", "path": "/a"},
+        {"op": "test", "path": "/a"},
+        {"op": "move", "path": "/b"},
+        {"op": "copy", "path": "/b", "from": 1},
+    ])
+    def test_missing_members(self, operation):
+        """Test that operations without value or from raise JsonPatchError."""
+        with pytest.raises(JsonPatchError, match="Operation missing"):
+            apply_patch({"a": 1}, [operation])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
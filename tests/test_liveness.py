@@ -0,0 +1,152 @@
+"""
+Tests for compact heartbeats and the liveness table.
+"""
+
+import pytest
+
+from sbox_common.health import LivenessTable, TimerWheel
+from sbox_common.protocols.socket import CompactHeartbeatSender, FramedJSONProtocol
+from sbox_common.protocols.socket.handshake import FEATURE_DELTA_HEARTBEAT
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def delta_protocol():
+    """Protocol that negotiated delta heartbeats."""
+    protocol = FramedJSONProtocol()
+    protocol.configure(features={FEATURE_DELTA_HEARTBEAT})
+    return protocol
+
+
+class TestCompactHeartbeatSender:
+    """Test CompactHeartbeatSender class."""
+
+    def test_full_then_delta(self):
+        """Test that only the first heartbeat is sent in full."""
+        protocol = delta_protocol()
+        clock = FakeClock()
+        sender = CompactHeartbeatSender(protocol, "agent-1", full_interval=10, clock=clock)
+
+        first = sender.build("healthy", uptime_seconds=100.0, version="1.0.0")
+        clock.now += 5
+        second = sender.build("healthy", uptime_seconds=105.0, version="1.0.0")
+        clock.now += 5
+        third = sender.build("degraded", uptime_seconds=110.2, version="1.0.0")
+
+        assert first["heartbeat"] == {
+            "agent_id": "agent-1", "status": "healthy",
+            "uptime_seconds": 100.0, "version": "1.0.0", "seq": 0
+        }
+        assert second["heartbeat"] == {"agent_id": "agent-1", "delta": True, "seq": 1}
+        assert third["heartbeat"] == {"agent_id": "agent-1", "status": "degraded", "delta": True, "seq": 2}
+        for message in (first, second, third):
+            assert protocol.validate_message(message) is True
+
+    def test_uptime_resent_after_restart(self):
+        """Test that uptime is resent when it no longer extrapolates."""
+        clock = FakeClock()
+        sender = CompactHeartbeatSender(FramedJSONProtocol(), "agent-1", clock=clock)
+
+        sender.build("healthy", uptime_seconds=100.0)
+        clock.now += 5
+        message = sender.build("healthy", uptime_seconds=2.0)
+
+        assert message["heartbeat"]["uptime_seconds"] == 2.0
+
+    def test_periodic_full_and_reset(self):
+        """Test periodic full heartbeats and reset."""
+        sender = CompactHeartbeatSender(delta_protocol(), "agent-1", full_interval=2)
+
+        assert "delta" not in sender.build("healthy")["heartbeat"]
+        assert sender.build("healthy")["heartbeat"]["delta"] is True
+        assert "delta" not in sender.build("healthy")["heartbeat"]
+        sender.reset()
+        assert "delta" not in sender.build("healthy")["heartbeat"]
+
+    def test_full_heartbeat_requires_status(self):
+        """Test that full heartbeats must carry a status."""
+        with pytest.raises(ValueError, match="status is required"):
+            FramedJSONProtocol().create_heartbeat_message("agent-1", None)
+
+
+class TestTimerWheel:
+    """Test TimerWheel class."""
+
+    def test_fires_after_deadline(self):
+        """Test that keys fire once their deadline tick has passed."""
+        wheel = TimerWheel(tick_seconds=1.0, size=8)
+        wheel.schedule("a", 2.5)
+        wheel.schedule("b", 20.0)
+
+        assert wheel.advance(2.0) == []
+        assert wheel.advance(3.0) == ["a"]
+        assert wheel.advance(15.0) == []
+        assert wheel.advance(100.0) == ["b"]
+
+
+class TestLivenessTable:
+    """Test LivenessTable class."""
+
+    def test_merge_full_and_delta(self):
+        """Test merging delta heartbeats into agent state."""
+        clock = FakeClock()
+        table = LivenessTable(timeout_seconds=30, clock=clock)
+
+        events = table.update({"agent_id": "a", "status": "healthy", "uptime_seconds": 10.0, "version": "1.0.0"})
+        assert events[0]["data"]["current_status"] == "healthy"
+
+        clock.now = 10
+        assert table.update({"agent_id": "a", "delta": True}) == []
+
+        state = table.agent("a")
+        assert state["status"] == "healthy"
+        assert state["uptime_seconds"] == 20.0
+        assert state["version"] == "1.0.0"
+
+    def test_missed_heartbeats_and_recovery(self):
+        """Test that silent agents become unhealthy and recover."""
+        clock = FakeClock()
+        table = LivenessTable(timeout_seconds=30, clock=clock)
+        table.update({"agent_id": "a", "status": "healthy"})
+        table.update({"agent_id": "b", "status": "degraded"})
+
+        clock.now = 20
+        table.update({"agent_id": "b", "delta": True})
+
+        clock.now = 35
+        events = table.expire()
+        assert [e["data"]["component"] for e in events] == ["a"]
+        assert events[0]["data"]["current_status"] == "unhealthy"
+        assert table.converter.validate_event(events[0], "health-events") is True
+        assert table.fleet_status() == {"healthy": 0, "degraded": 1, "unhealthy": 1, "unknown": 0}
+
+        clock.now = 60
+        assert [e["data"]["component"] for e in table.expire()] == ["b"]
+        assert table.count("unhealthy") == 2
+
+        events = table.update({"agent_id": "a", "delta": True})
+        assert events[0]["data"]["current_status"] == "healthy"
+        assert events[0]["data"]["message"] == "Heartbeats resumed"
+        assert table.status("a") == "healthy"
+
+        clock.now = 95
+        assert [e["data"]["component"] for e in table.expire()] == ["a"]
+
+    def test_unknown_agent(self):
+        """Test queries for agents never seen."""
+        table = LivenessTable()
+        assert table.status("missing") == "unknown"
+        assert table.agent("missing") is None
+        assert "missing" not in table
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,123 @@
+"""
+Tests for the synthetic agent load generator.
+"""
+
+import asyncio
+import pytest
+
+from sbox_common.protocols.socket import FramedJSONProtocol, SelectorServer
+from sbox_common.protocols.socket.server import ServerConnection
+from sbox_common.protocols.socket.loadgen import (
+    LatencyHistogram, LoadGenerator, LoadProfile, ack_handler
+)
+
+
+@pytest.fixture
+def server(tmp_path, serve):
+    """Validating SelectorServer acknowledging messages and sending commands."""
+    protocol = FramedJSONProtocol()
+    received = []
+
+    def handler(connection, message):
+        received.append(message)
+        return ack_handler(protocol, command_every=2)(connection, message)
+
+    server = serve(SelectorServer(str(tmp_path / "server.sock"), handler, protocol))
+    server.received = received
+    return server
+
+
+class TestLatencyHistogram:
+    """Test LatencyHistogram class."""
+
+    def test_percentiles(self):
+        """Test percentiles within bucket precision."""
+        histogram = LatencyHistogram()
+        for i in range(1, 1001):
+            histogram.record(i / 1000.0)  # 1 ms .. 1 s
+        assert histogram.count == 1000
+        assert histogram.percentile(50) == pytest.approx(0.5, rel=0.1)
+        assert histogram.percentile(99) == pytest.approx(0.99, rel=0.1)
+        assert histogram.percentile(100) == 1.0
+        assert sum(count for _, count in histogram.as_dict()["buckets"]) == 1000
+
+    def test_bounds_and_merge(self):
+        """Test out of range samples and merging."""
+        first, second = LatencyHistogram(), LatencyHistogram()
+        first.record(0.0)
+        second.record(1000.0)
+        first.merge(second)
+        assert first.count == 2
+        assert first.max == 1000.0
+        assert first.counts[0] == 1 and first.counts[-1] == 1
+        assert LatencyHistogram().percentile(50) is None
+
+
+class TestAckHandler:
+    """Test the stand-in server handler."""
+
+    def test_commands_need_loop_thread(self, tmp_path):
+        """Test that sending commands is refused on worker-pool servers."""
+        protocol = FramedJSONProtocol()
+        handler = ack_handler(protocol, command_every=1)
+        server = SelectorServer(str(tmp_path / "server.sock"), handler, protocol, workers=2)
+        connection = ServerConnection(server, None)
+        heartbeat = protocol.create_heartbeat_message("agent", "healthy")
+        with pytest.raises(RuntimeError, match="workers=0"):
+            handler(connection, heartbeat)
+        reply = ack_handler(protocol)(connection, heartbeat)
+        assert reply["response"]["request_id"] == heartbeat["id"]
+        server.close()
+
+
+class TestLoadGenerator:
+    """Test LoadGenerator class."""
+
+    def test_requires_one_target(self):
+        """Test that exactly one of socket_path and peer is accepted."""
+        with pytest.raises(ValueError):
+            LoadGenerator(1)
+        with pytest.raises(ValueError):
+            LoadGenerator(1, socket_path="/tmp/x.sock", peer=lambda sock: None)
+
+    @pytest.mark.parametrize("transport", ["socket", "socketpair"])
+    def test_run(self, server, transport):
+        """Test that agents emit valid messages at the profile rates and answer commands."""
+        profile = LoadProfile(heartbeat_interval=0.1, health_interval=0.2,
+                              health_components=3, subscription_interval=0.4)
+        if transport == "socket":
+            generator = LoadGenerator(20, profile, socket_path=server.path, seed=1)
+        else:
+            generator = LoadGenerator(20, profile, peer=server.adopt, seed=1)
+        report = asyncio.run(generator.run(0.8))
+
+        assert report.connected == 20
+        assert report.errors == 0
+        # Every agent fires each kind once per interval
+        assert report.sent["heartbeat"] == 20 * 8
+        assert report.sent["health"] == 20 * 4
+        assert report.sent["subscription"] == 2 * 20 * 2
+        assert report.commands > 0
+        assert report.ack_latency.count == sum(report.sent.values())
+        assert report.command_latency.count == report.commands
+        assert report.cpu_per_message > 0
+
+        types = {m["type"] for m in server.received}
+        assert types == {"heartbeat", "event", "response"}
+        events = {m["event"]["event_type"] for m in server.received if m["type"] == "event"}
+        assert events == {"health.check_completed", "subscription.update_started",
+                          "subscription.update_completed"}
+        health = next(m for m in server.received if m["type"] == "event"
+                      and m["event"]["event_type"] == "health.check_completed")
+        assert len(health["event"]["data"]["components"]) == 3
+
+    def test_disabled_kinds(self, server):
+        """Test that an interval of 0 disables a message kind."""
+        profile = LoadProfile(heartbeat_interval=0.1, health_interval=0, subscription_interval=0)
+        report = asyncio.run(LoadGenerator(5, profile, peer=server.adopt).run(0.3))
+        assert report.sent["health"] == report.sent["subscription"] == 0
+        assert report.sent["heartbeat"] == 15
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,201 @@
+"""
+Tests for bounded log capture and on-disk log segments.
+"""
+
+import asyncio
+import io
+import pytest
+
+from sbox_common.logs import (
+    LineSplitter, LogCapture, LogEntry, LogRingBuffer, LogSegmentStore, detect_level, iter_lines
+)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+def entry(seq, service="sboxmgr", timestamp=None, message="line"):
+    timestamp = float(seq) if timestamp is None else timestamp
+    return LogEntry(seq, timestamp, service, "stdout", None, message, 1, timestamp)
+
+
+class TestLineParsing:
+    """Test line splitting and level detection."""
+
+    def test_iter_lines(self):
+        """Test lines split across chunks, CRLF and a trailing partial line."""
+        chunks = [b"first\r\nsec", b"ond\n", b"", b"thi", b"rd"]
+        assert list(iter_lines(chunks)) == ["first", "second", "third"]
+
+    def test_long_line_cut(self):
+        """Test that lines without newline do not grow without bound."""
+        splitter = LineSplitter(max_line_length=10)
+        assert splitter.feed(b"x" * 25) == ["x" * 10]
+        assert splitter.feed(b"\n") == [""]
+
+    def test_invalid_utf8(self):
+        """Test that undecodable bytes are replaced."""
+        assert list(iter_lines([b"bad \xff\n"])) == ["bad �"]
+
+    def test_detect_level(self):
+        """Test level words mapped to agent_config log levels."""
+        assert detect_level("2025-01-01 12:00:00 WARNING disk almost full") == "warn"
+        assert detect_level('level=error msg="update failed"') == "error"
+        assert detect_level("[DEBUG] fetching subscription") == "debug"
+        assert detect_level("updated 3 outbounds") is None
+
+
+class TestLogRingBuffer:
+    """Test LogRingBuffer class."""
+
+    def test_bounded(self):
+        """Test that the oldest entries are evicted at max_entries."""
+        buffer = LogRingBuffer(max_entries=3)
+        for seq in range(1, 8):
+            buffer.append(entry(seq, "a" if seq % 2 else "b"))
+
+        assert len(buffer) == 3
+        assert [e.seq for e in buffer.tail()] == [5, 6, 7]
+        assert [e.seq for e in buffer.tail(service="b")] == [6]
+
+    def test_evicted_service_removed(self):
+        """Test that the per-service index drops services without entries."""
+        buffer = LogRingBuffer(max_entries=2)
+        buffer.append(entry(1, "old"))
+        buffer.append(entry(2, "new"))
+        buffer.append(entry(3, "new"))
+        assert buffer.services == ["new"]
+
+    def test_tail_service_since(self):
+        """Test last N lines of a service since a time."""
+        buffer = LogRingBuffer(max_entries=100)
+        for seq in range(1, 51):
+            buffer.append(entry(seq, "a" if seq % 2 else "b"))
+
+        result = buffer.tail(3, service="a", since=40)
+        assert [e.seq for e in result] == [45, 47, 49]
+        assert [e.seq for e in buffer.tail(service="b", since=45)] == [46, 48, 50]
+        assert [e.seq for e in buffer.tail(4)] == [47, 48, 49, 50]
+
+
+class TestLogCapture:
+    """Test LogCapture class."""
+
+    def test_feed_and_aggregation(self):
+        """Test chunked output capture and collapsing of repeated lines."""
+        capture = LogCapture(max_entries=10, clock=FakeClock())
+        capture.feed("sboxmgr", b"ERROR: retrying\nERROR: retry")
+        capture.feed("sboxmgr", b"ing\nERROR: retrying\ndone\n")
+
+        entries = capture.tail()
+        assert [(e.message, e.repeat, e.level) for e in entries] == [
+            ("ERROR: retrying", 3, "error"),
+            ("done", 1, None),
+        ]
+        assert entries[0].last_seen > entries[0].timestamp
+
+    def test_no_aggregation(self):
+        """Test that every line is kept without aggregation."""
+        capture = LogCapture(max_entries=10, aggregation=False)
+        capture.feed("sboxmgr", b"same\nsame\n")
+        assert len(capture.tail()) == 2
+
+    def test_services_filter(self):
+        """Test that only configured services are captured."""
+        capture = LogCapture(services=["sboxmgr"])
+        assert capture.feed("other", b"ignored\n") == []
+        assert capture.append("other", "ignored") is None
+        assert len(capture.feed("sboxmgr", b"kept\n")) == 1
+
+    def test_capture_file_and_stream(self):
+        """Test capturing a pipe-like file and an asyncio stream."""
+        capture = LogCapture()
+        assert capture.capture_file("sboxmgr", io.BytesIO(b"a\nb\nc")) == 3
+
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b"x\ny")
+            reader.feed_eof()
+            return await capture.capture_stream("sing-box", reader, "stderr")
+
+        assert asyncio.run(run()) == 2
+        assert [(e.message, e.stream) for e in capture.tail(service="sing-box")] == [("x", "stderr"), ("y", "stderr")]
+
+    def test_memory_constant(self):
+        """Test that a long run stays at max_entries."""
+        capture = LogCapture(max_entries=100, aggregation=False)
+        for i in range(10_000):
+            capture.append(f"service-{i % 7}", f"line {i}")
+        assert len(capture.buffer) == 100
+        assert sum(len(slots) for slots in capture.buffer._by_service.values()) == 100
+
+    def test_zero_limit_without_store(self):
+        """Test that a zero limit returns nothing when querying the ring."""
+        capture = LogCapture(clock=FakeClock())
+        for i in range(3):
+            capture.append("sboxmgr", f"line {i}")
+        assert capture.query(0) == []
+        assert [e.message for e in capture.query(2)] == ["line 1", "line 2"]
+        assert len(capture.query(10)) == 3
+        capture.close()
+
+
+class TestLogSegmentStore:
+    """Test LogSegmentStore class."""
+
+    def test_rotation_and_query(self, tmp_path):
+        """Test queries across rotated segments using the indexes."""
+        store = LogSegmentStore(tmp_path, segment_size=2000, retention_days=None)
+        for seq in range(1, 301):
+            store.append(entry(seq, "a" if seq % 3 else "b", message=f"message {seq}"))
+
+        assert len(store.segments) > 5
+        result = store.query(5, service="b", since=100)
+        assert [e.seq for e in result] == [285, 288, 291, 294, 297, 300][-5:]
+        assert [e.seq for e in store.query(service="a", since=290, until=295)] == [290, 292, 293, 295]
+        assert store.query(service="missing") == []
+        assert store.query(0) == []
+
+    def test_reopen(self, tmp_path):
+        """Test that indexes are reloaded (or rebuilt) and numbering continues."""
+        store = LogSegmentStore(tmp_path, segment_size=500, retention_days=None)
+        capture = LogCapture(store=store, clock=FakeClock())
+        for i in range(40):
+            capture.append("sboxmgr", f"line {i}")
+        capture.close()
+        next(tmp_path.glob("*.idx")).unlink()
+
+        store = LogSegmentStore(tmp_path, segment_size=500, retention_days=None)
+        capture = LogCapture(store=store, clock=FakeClock(5000.0))
+        capture.append("sboxmgr", "after restart")
+        entries = capture.query()
+        assert len(entries) == 41
+        assert entries[-1].message == "after restart"
+        assert entries[-1].seq == 41
+        capture.close()
+
+    def test_retention(self, tmp_path):
+        """Test that segments older than retention_days are deleted."""
+        clock = FakeClock(0.0)
+        store = LogSegmentStore(tmp_path, segment_size=100, retention_days=1, clock=clock)
+        for seq in range(1, 20):
+            store.append(entry(seq, timestamp=0.0))
+        clock.now = 2 * 86400
+        store.append(entry(20, timestamp=clock.now))
+        store.append(entry(21, timestamp=clock.now))
+        store.close()
+
+        # Old segments are gone; the one still receiving entries at 20 survives
+        seqs = [e.seq for e in store.query()]
+        assert seqs[-2:] == [20, 21] and seqs[0] >= 19
+        assert len(list(tmp_path.glob("*.jsonl"))) == len(store.segments) <= 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,122 @@
+"""
+Tests for worker pool offloading of large payloads.
+"""
+
+import asyncio
+import json
+import shutil
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from jsonschema import ValidationError
+
+from sbox_common.protocols.socket import FramedJSONProtocol
+from sbox_common.protocols.socket.offload import AsyncOffloader, estimate_size
+
+
+def large_message(protocol, size=200_000):
+    return protocol.create_event_message({"event_type": "config.updated", "blob": "x" * size})
+
+
+class TestEstimateSize:
+    """Test encoded size estimation."""
+
+    def test_close_to_encoded_size(self):
+        """Test that the estimate is in the range of the JSON size."""
+        protocol = FramedJSONProtocol()
+        message = large_message(protocol, 10_000)
+        encoded = len(protocol.encode_payload(message))
+
+        assert encoded * 0.8 < estimate_size(message, 10 ** 9) < encoded * 1.2
+
+    def test_stops_at_limit(self):
+        """Test that estimation stops early for large values."""
+        value = {"items": [{"key": "v" * 100} for _ in range(100)], "more": [{"key": "v" * 100}] * 100}
+        assert 1000 < estimate_size(value, 1000) < 2000
+
+
+class TestAsyncOffloader:
+    """Test AsyncOffloader class."""
+
+    def test_small_inline_large_offloaded(self):
+        """Test that only frames above the threshold are offloaded."""
+        offloader = AsyncOffloader(threshold=64 * 1024)
+        protocol = offloader.protocol
+        small = protocol.create_heartbeat_message("agent", "healthy")
+        large = large_message(protocol)
+
+        async def scenario():
+            frames = [await offloader.encode_message(m) for m in (small, large)]
+            return [await offloader.decode_payload(f[protocol.FRAME_HEADER_SIZE:]) for f in frames]
+
+        assert asyncio.run(scenario()) == [small, large]
+        stats = offloader.stats()
+        assert stats["encode"]["inline"] == 1
+        assert stats["encode"]["offloaded"] == 1
+        assert stats["decode"]["offload_ratio"] == 0.5
+        assert stats["decode"]["worker_ms"] > 0
+        assert stats["decode"]["saved_loop_ms"] == 0.0  # Threads hold the GIL
+        offloader.close()
+
+    def test_stream_roundtrip(self):
+        """Test read/write over asyncio streams with compression."""
+        protocol = FramedJSONProtocol()
+        protocol.configure(compression_threshold=1024)
+        offloader = AsyncOffloader(protocol, threshold=1024)
+        message = large_message(protocol)
+
+        async def scenario():
+            received = asyncio.get_running_loop().create_future()
+
+            async def handle(reader, writer):
+                received.set_result(await offloader.read_message(reader))
+                writer.close()
+
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            await offloader.write_message(writer, message)
+            result = await received
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return result
+
+        assert asyncio.run(scenario()) == message
+        offloader.close()
+
+    def test_process_pool(self):
+        """Test offloading to a process pool."""
+        with ProcessPoolExecutor(1) as executor:
+            offloader = AsyncOffloader(threshold=1024, executor=executor)
+            message = large_message(offloader.protocol, 5000)
+
+            async def scenario():
+                frame = await offloader.encode_message(message)
+                return await offloader.decode_payload(frame[offloader.protocol.FRAME_HEADER_SIZE:])
+
+            assert asyncio.run(scenario()) == message
+            stats = offloader.stats()["decode"]
+            assert stats["offloaded"] == 1
+            assert stats["saved_loop_ms"] == stats["worker_ms"] > 0
+
+    def test_process_pool_schema_reload(self, tmp_path):
+        """Test that process workers validate against reloaded schemas."""
+        schema = Path(FramedJSONProtocol().schema_dir) / "protocol_v1.schema.json"
+        shutil.copy(schema, tmp_path / schema.name)
+        with ProcessPoolExecutor(1) as executor:
+            offloader = AsyncOffloader(FramedJSONProtocol(tmp_path), threshold=0, executor=executor)
+            message = offloader.protocol.create_heartbeat_message("agent", "healthy")
+            message["type"] = "bogus"
+            payload = json.dumps(message).encode('utf-8')
+            with pytest.raises(ValidationError):
+                asyncio.run(offloader.decode_payload(payload))
+
+            (tmp_path / schema.name).write_text(json.dumps({"type": "object"}))
+            offloader.protocol.reload_schemas()
+            assert asyncio.run(offloader.decode_payload(payload)) == message
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,143 @@
+"""
+Tests for the priority-aware send scheduler and chunk framing.
+"""
+
+import pytest
+from io import BytesIO
+
+from sbox_common.protocols.converters import ConfigEventConverter, HealthEventConverter
+from sbox_common.protocols.socket import FramedJSONProtocol
+from sbox_common.protocols.socket.handshake import FEATURE_CHUNKING
+from sbox_common.protocols.socket.scheduler import PrioritySendScheduler, classify_message
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def big_config_message(protocol, size=200 * 1024):
+    event = ConfigEventConverter().create_config_created({
+        "config_id": "big",
+        "name": "Big",
+        "type": "sing-box",
+        "content": {"blob": "x" * size}
+    })
+    return protocol.create_event_message(event)
+
+
+class TestChunkFraming:
+    """Test chunk frame encoding and reassembly."""
+
+    def test_chunks_roundtrip_with_interleaving(self):
+        """Test that chunks reassemble around interleaved frames."""
+        sender = FramedJSONProtocol()
+        receiver = FramedJSONProtocol()
+        big = big_config_message(sender, 10_000)
+        heartbeat = sender.create_heartbeat_message("agent-1", "healthy")
+
+        chunks = sender.encode_chunks(sender.encode_payload(big), 7, 4096)
+        assert len(chunks) == 3
+
+        stream = BytesIO(chunks[0] + sender.encode_message(heartbeat) + chunks[1] + chunks[2])
+        assert receiver.read_message(stream) == heartbeat
+        assert receiver.read_message(stream) == big
+        assert receiver.read_message(stream) is None
+
+    def test_decode_message_partial_chunk(self):
+        """Test that decode_message returns None until the final chunk."""
+        protocol = FramedJSONProtocol()
+        message = protocol.create_event_message({"test": "value"})
+        chunks = protocol.encode_chunks(protocol.encode_payload(message), 1, 10)
+
+        results = [protocol.decode_message(chunk)[0] for chunk in chunks]
+
+        assert results[:-1] == [None] * (len(chunks) - 1)
+        assert results[-1] == message
+
+
+class TestClassifyMessage:
+    """Test default message classification."""
+
+    def test_classes(self):
+        """Test default priority classes."""
+        protocol = FramedJSONProtocol()
+        health = HealthEventConverter().create_health_status_changed("a", "healthy", "degraded")
+
+        assert classify_message(protocol.create_heartbeat_message("a", "healthy")) == "control"
+        assert classify_message(protocol.create_response_message("r", "success")) == "control"
+        assert classify_message(protocol.create_event_message(health)) == "alert"
+        assert classify_message(big_config_message(protocol, 10)) == "bulk"
+        assert classify_message(protocol.create_command_message("x", {})) == "normal"
+
+
+class TestPrioritySendScheduler:
+    """Test PrioritySendScheduler class."""
+
+    def test_heartbeat_bypasses_bulk(self):
+        """Test that a heartbeat is sent before the rest of a large config."""
+        protocol = FramedJSONProtocol()
+        protocol.configure(features={FEATURE_CHUNKING})
+        scheduler = PrioritySendScheduler(protocol, chunk_size=16 * 1024)
+
+        scheduler.enqueue(big_config_message(protocol))
+        first = scheduler.next_frame()
+        heartbeat = protocol.create_heartbeat_message("agent-1", "healthy")
+        scheduler.enqueue(heartbeat)
+
+        writer = BytesIO()
+        writer.write(first)
+        scheduler.write_pending(writer)
+
+        receiver = FramedJSONProtocol()
+        stream = BytesIO(writer.getvalue())
+        assert receiver.read_message(stream)["type"] == "heartbeat"
+        assert receiver.read_message(stream)["event"]["event_type"] == "config.created"
+        assert len(scheduler) == 0
+
+    def test_weighted_share(self):
+        """Test that classes share bandwidth by weight."""
+        protocol = FramedJSONProtocol()
+        scheduler = PrioritySendScheduler(protocol, weights={"high": 3, "low": 1}, chunk_size=1024)
+        message = protocol.create_event_message({"pad": "x" * 900})
+        for _ in range(8):
+            scheduler.enqueue(message, "high")
+            scheduler.enqueue(message, "low")
+
+        for _ in range(8):
+            scheduler.next_frame()
+
+        stats = scheduler.stats()
+        assert stats["high"]["messages"] == 6
+        assert stats["low"]["messages"] == 2
+
+    def test_delay_stats(self):
+        """Test queueing delay metrics per class."""
+        clock = FakeClock()
+        protocol = FramedJSONProtocol()
+        scheduler = PrioritySendScheduler(protocol, clock=clock)
+        scheduler.enqueue(protocol.create_heartbeat_message("agent-1", "healthy"))
+        clock.now = 0.25
+        scheduler.next_frame()
+
+        stats = scheduler.stats()["control"]
+        assert stats["messages"] == 1
+        assert stats["queued"] == 0
+        assert stats["mean_delay_ms"] == pytest.approx(250.0)
+        assert stats["max_delay_ms"] == pytest.approx(250.0)
+        assert scheduler.next_frame() is None
+
+    def test_unknown_priority(self):
+        """Test that unknown classes are rejected."""
+        scheduler = PrioritySendScheduler()
+        with pytest.raises(ValueError, match="Unknown priority class"):
+            scheduler.enqueue({}, "urgent")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,183 @@
+"""
+Tests for the selectors-based multi-connection server.
+"""
+
+import socket
+import threading
+import time
+import pytest
+
+from sbox_common.protocols.socket import FramedJSONProtocol
+from sbox_common.protocols.socket.server import FrameBuffer, SelectorServer
+
+
+def echo_handler(connection, message):
+    protocol = connection.server.protocol
+    return protocol.create_response_message(message["id"], "success", {"type": message["type"]})
+
+
+@pytest.fixture
+def protocol():
+    return FramedJSONProtocol()
+
+
+def run_server(server):
+    server.start()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    thread.start()
+    return thread
+
+
+def connect(path):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(path)
+    return client, client.makefile('rb')
+
+
+class TestFrameBuffer:
+    """Test incremental frame parsing."""
+
+    def test_byte_by_byte(self, protocol):
+        """Test that frames split at any byte boundary are reassembled."""
+        messages = [protocol.create_event_message({"n": i}) for i in range(3)]
+        data = b"".join(protocol.encode_message(m) for m in messages)
+        buffer = FrameBuffer(protocol)
+
+        payloads = []
+        for i in range(len(data)):
+            payloads.extend(buffer.feed(data[i:i + 1]))
+
+        assert [protocol.decode_payload(p) for p in payloads] == messages
+        assert len(buffer) == 0
+
+    def test_chunks(self, protocol):
+        """Test reassembly of chunk frames."""
+        message = protocol.create_event_message({"blob": "x" * 1000})
+        frames = protocol.encode_chunks(protocol.encode_payload(message), 1, 100)
+        buffer = FrameBuffer(protocol)
+
+        payloads = buffer.feed(b"".join(frames))
+
+        assert [protocol.decode_payload(p) for p in payloads] == [message]
+
+    def test_open_stream_cap(self, protocol):
+        """Test that too many interleaved partial messages are rejected."""
+        buffer = FrameBuffer(protocol)
+        buffer.chunks.max_streams = 2
+        payload = protocol.encode_payload(protocol.create_event_message({"blob": "x" * 300}))
+        first_chunks = [protocol.encode_chunks(payload, stream_id, 100)[0] for stream_id in (1, 2, 3)]
+
+        assert buffer.feed(b"".join(first_chunks[:2])) == []
+        assert len(buffer.chunks) == 2
+        with pytest.raises(ValueError, match="Too many interleaved"):
+            buffer.feed(first_chunks[2])
+
+    def test_sessions_reassemble_separately(self, protocol):
+        """Test that protocol sessions keep their own partial messages."""
+        payload = protocol.encode_payload(protocol.create_event_message({"blob": "x" * 300}))
+        first = protocol.encode_chunks(payload, 1, 100)[0]
+        session = protocol.session()
+        assert session.decode_message(first) == (None, len(first))
+        assert len(session.chunks) == 1 and len(protocol.chunks) == 0
+
+    def test_uses_session_reassembler(self, protocol):
+        """Test that a connection's frame buffer and protocol session share one reassembler."""
+        session = protocol.session()
+        buffer = FrameBuffer(session)
+        payload = session.encode_payload(session.create_event_message({"blob": "x" * 300}))
+        buffer.feed(session.encode_chunks(payload, 1, 100)[0])
+        assert buffer.chunks is session.chunks
+        assert len(session.chunks) == 1
+
+
+class TestSelectorServer:
+    """Test SelectorServer class."""
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_many_clients(self, tmp_path, protocol, workers):
+        """Test request/response with many concurrent clients."""
+        path = str(tmp_path / "server.sock")
+        server = SelectorServer(path, echo_handler, workers=workers)
+        thread = run_server(server)
+        try:
+            clients = [connect(path) for _ in range(50)]
+            requests = []
+            for client, _ in clients:
+                message = protocol.create_heartbeat_message("agent", "healthy")
+                requests.append(message)
+                client.sendall(protocol.encode_message(message))
+
+            for (client, reader), request in zip(clients, requests):
+                response = protocol.read_message(reader)
+                assert response["response"]["request_id"] == request["id"]
+                client.close()
+        finally:
+            server.stop()
+            thread.join(2)
+
+    def test_disconnect_callbacks(self, tmp_path, protocol):
+        """Test connect/disconnect callbacks and protocol error handling."""
+        path = str(tmp_path / "server.sock")
+        events = []
+        server = SelectorServer(path, echo_handler,
+                                on_connect=lambda c: events.append("connect"),
+                                on_disconnect=lambda c: events.append("disconnect"))
+        thread = run_server(server)
+        try:
+            client, reader = connect(path)
+            client.sendall(b"\x00\x00\x00\x02\x00\x00\x00\x09xx")  # Unsupported version
+            assert reader.read(1) == b""
+            deadline = time.monotonic() + 2
+            while len(events) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert events == ["connect", "disconnect"]
+            assert server.connections == {}
+        finally:
+            server.stop()
+            thread.join(2)
+
+    def test_invalid_worker_reply(self, tmp_path, protocol):
+        """Test that an invalid reply from a worker closes only its connection."""
+        def handler(connection, message):
+            if message["command"]["command"] == "bad":
+                return {"type": "bogus"}
+            return echo_handler(connection, message)
+
+        path = str(tmp_path / "server.sock")
+        server = SelectorServer(path, handler, workers=2)
+        thread = run_server(server)
+        try:
+            bad, bad_reader = connect(path)
+            bad.sendall(protocol.encode_message(protocol.create_command_message("bad", {})))
+            assert bad_reader.read(1) == b""
+            bad.close()
+
+            good, good_reader = connect(path)
+            message = protocol.create_command_message("ping", {})
+            good.sendall(protocol.encode_message(message))
+            assert protocol.read_message(good_reader)["response"]["request_id"] == message["id"]
+            good.close()
+        finally:
+            server.stop()
+            thread.join(2)
+        assert not thread.is_alive()
+
+    def test_adopt_socketpair(self, tmp_path, protocol):
+        """Test serving one end of a socketpair from another thread."""
+        server = SelectorServer(str(tmp_path / "server.sock"), echo_handler)
+        thread = run_server(server)
+        try:
+            client, peer = socket.socketpair()
+            server.adopt(peer)
+            message = protocol.create_heartbeat_message("agent", "healthy")
+            client.sendall(protocol.encode_message(message))
+            response = protocol.read_message(client.makefile('rb'))
+            assert response["response"]["request_id"] == message["id"]
+            client.close()
+        finally:
+            server.stop()
+            thread.join(2)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
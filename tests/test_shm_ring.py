@@ -0,0 +1,179 @@
+"""
+Tests for the shared-memory ring buffer transport.
+"""
+
+import socket
+import threading
+import pytest
+from unittest.mock import patch
+
+from sbox_common.protocols.socket import FramedJSONProtocol
+from sbox_common.protocols.socket.shm_ring import (
+    Doorbell,
+    SharedMemoryTransport,
+    ShmReader,
+    ShmRing,
+    ShmWriter
+)
+
+
+@pytest.fixture
+def ring():
+    ring = ShmRing.create(64)
+    yield ring
+    ring.close()
+
+
+class TestShmRing:
+    """Test ShmRing class."""
+
+    def test_put_take_wraparound(self, ring):
+        """Test that data wraps around the end of the ring."""
+        assert ring.put(memoryview(b"x" * 50)) == 50
+        assert ring.take(50) == b"x" * 50
+
+        data = bytes(range(60))
+        assert ring.put(memoryview(data)) == 60
+        assert ring.readable() == 60
+        assert ring.take(100) == data
+
+    def test_full_ring(self, ring):
+        """Test that put writes only what fits."""
+        assert ring.put(memoryview(b"a" * 100)) == 64
+        assert ring.writable() == 0
+        assert ring.put(memoryview(b"b")) == 0
+
+    def test_attach(self, ring):
+        """Test that an attached ring sees the same data."""
+        peer = ShmRing.attach(ring.name)
+        try:
+            ring.put(memoryview(b"hello"))
+            assert peer.take(5) == b"hello"
+            assert ring.readable() == 0
+        finally:
+            peer.close()
+
+
+class TestShmStreams:
+    """Test file-like ring endpoints."""
+
+    def test_messages_larger_than_ring(self):
+        """Test that frames larger than the ring stream through it."""
+        protocol = FramedJSONProtocol()
+        ring = ShmRing.create(256)
+        data_bell, space_bell = Doorbell.create(), Doorbell.create()
+        writer = ShmWriter(ring, data_bell, space_bell)
+        reader = ShmReader(ring, data_bell, space_bell)
+        messages = [protocol.create_event_message({"n": i, "pad": "x" * (i * 200)}) for i in range(10)]
+
+        thread = threading.Thread(target=lambda: [protocol.write_message(writer, m) for m in messages])
+        thread.start()
+        received = [protocol.read_message(reader) for _ in messages]
+        thread.join(2)
+        writer.close()
+
+        assert received == messages
+        assert protocol.read_message(reader) is None
+        ring.close()
+        data_bell.close()
+        space_bell.close()
+
+    def test_tail_written_right_before_close(self):
+        """Test that bytes put between an empty take and the close are still read."""
+        ring = ShmRing.create(256)
+        data_bell, space_bell = Doorbell.create(), Doorbell.create()
+        writer = ShmWriter(ring, data_bell, space_bell)
+        reader = ShmReader(ring, data_bell, space_bell)
+        take = ring.take
+
+        def racing_take(size):
+            # The writer finishes after the reader found the ring empty
+            if not writer.ring.closed:
+                writer.write(b"tail")
+                writer.close()
+                return b""
+            return take(size)
+
+        try:
+            with patch.object(ring, "take", racing_take):
+                assert reader.read(4) == b"tail"
+                assert reader.read(1) == b""
+        finally:
+            ring.close()
+            data_bell.close()
+            space_bell.close()
+
+
+class TestSharedMemoryTransport:
+    """Test transport setup over a Unix socket."""
+
+    def _connect(self):
+        left, right = socket.socketpair()
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(peer=SharedMemoryTransport.accept(right)))
+        thread.start()
+        transport = SharedMemoryTransport.offer(left, capacity=4096)
+        thread.join(2)
+        return transport, result["peer"]
+
+    def test_bidirectional(self):
+        """Test messages in both directions through shared memory."""
+        client, server = self._connect()
+        try:
+            assert client.shared_memory and server.shared_memory
+            heartbeat = client.protocol.create_heartbeat_message("agent", "healthy", 1.0)
+            client.write_message(heartbeat)
+            assert server.read_message() == heartbeat
+
+            response = server.protocol.create_response_message("r1", "success", {"ok": True})
+            server.write_message(response)
+            assert client.read_message() == response
+        finally:
+            client.close()
+        assert server.read_message() is None
+        server.close()
+
+    def test_socket_fallback(self):
+        """Test falling back to the socket when shared memory is unavailable."""
+        with patch.object(ShmRing, "create", side_effect=OSError("no shm")):
+            client, server = self._connect()
+        try:
+            assert not client.shared_memory and not server.shared_memory
+            message = client.protocol.create_event_message({"event_type": "test"})
+            client.write_message(message)
+            assert server.read_message() == message
+        finally:
+            client.close()
+            server.close()
+
+    def test_write_right_after_fallback(self):
+        """Test that a message written before the peer accepted is not lost."""
+        left, right = socket.socketpair()
+        right.settimeout(2)
+        with patch.object(ShmRing, "create", side_effect=OSError("no shm")):
+            client = SharedMemoryTransport.offer(left)
+        message = client.protocol.create_event_message({"event_type": "test"})
+        client.write_message(message)
+        server = SharedMemoryTransport.accept(right)
+        try:
+            assert server.read_message() == message
+        finally:
+            client.close()
+            server.close()
+
+    def test_peer_declines(self):
+        """Test falling back when the peer cannot attach."""
+        with patch.object(ShmRing, "attach", side_effect=OSError("denied")):
+            client, server = self._connect()
+        try:
+            assert not client.shared_memory and not server.shared_memory
+            message = server.protocol.create_event_message({"event_type": "test"})
+            server.write_message(message)
+            assert client.read_message() == message
+        finally:
+            client.close()
+            server.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
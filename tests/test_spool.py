@@ -0,0 +1,222 @@
+"""
+Tests for the durable outbound frame spool.
+"""
+
+import asyncio
+import socket
+import pytest
+
+from sbox_common.protocols.converters import ConfigEventConverter
+from sbox_common.protocols.socket import FramedJSONProtocol
+from sbox_common.protocols.socket.spool import FrameSpool, SpoolingSender, spool_group
+
+
+@pytest.fixture
+def protocol():
+    return FramedJSONProtocol()
+
+
+def config_event(protocol, config_id, name, event_type="config.updated"):
+    converter = ConfigEventConverter()
+    data = {"config_id": config_id, "name": name, "type": "sing-box", "content": {"name": name}}
+    if event_type == "config.updated":
+        event = converter.create_config_updated(data)
+    else:
+        event = converter.create_config_created(data)
+    return protocol.create_event_message(event)
+
+
+def read_all(protocol, sock):
+    sock.shutdown(socket.SHUT_WR)
+    reader = sock.makefile('rb')
+    messages = []
+    while True:
+        message = protocol.read_message(reader)
+        if message is None:
+            return messages
+        messages.append(message)
+
+
+def drain_to_pair(spool, protocol):
+    left, right = socket.socketpair()
+    try:
+        sent = spool.drain(left)
+        left.close()
+        reader = right.makefile('rb')
+        messages = []
+        while True:
+            message = protocol.read_message(reader)
+            if message is None:
+                return sent, messages
+            messages.append(message)
+    finally:
+        right.close()
+
+
+class TestSpoolGroup:
+    """Test coalescing group derivation."""
+
+    def test_groups(self, protocol):
+        """Test full-state config events, patches and other messages."""
+        assert spool_group(config_event(protocol, "c1", "a")) == ("config:c1", True)
+        patched = protocol.create_event_message({"event_type": "config.patched", "data": {"config_id": "c1"}})
+        assert spool_group(patched) == ("config:c1", False)
+        assert spool_group(protocol.create_heartbeat_message("agent", "healthy")) == (None, False)
+
+
+class TestFrameSpool:
+    """Test FrameSpool class."""
+
+    def test_fifo_drain(self, tmp_path, protocol):
+        """Test that frames are drained in order in vectored batches."""
+        spool = FrameSpool(tmp_path, protocol, segment_size=4096)
+        for i in range(50):
+            spool.enqueue_message(protocol.create_command_message("ping", {"n": i}))
+        assert len(spool) == 50
+        assert spool.stats()["segments"] > 1
+
+        sent, messages = drain_to_pair(spool, protocol)
+        assert sent == 50
+        assert [m["command"]["params"]["n"] for m in messages] == list(range(50))
+        assert len(spool) == 0
+        assert list(tmp_path.glob("*.seg")) == []
+
+    def test_coalescing(self, tmp_path, protocol):
+        """Test that superseded config events are skipped."""
+        spool = FrameSpool(tmp_path, protocol)
+        spool.enqueue_message(config_event(protocol, "c1", "v1", "config.created"))
+        spool.enqueue_message(protocol.create_event_message(
+            {"event_type": "config.patched", "data": {"config_id": "c1"}}))
+        spool.enqueue_message(config_event(protocol, "c2", "other"))
+        spool.enqueue_message(config_event(protocol, "c1", "v2"))
+        spool.enqueue_message(protocol.create_event_message(
+            {"event_type": "config.patched", "data": {"config_id": "c1", "after": True}}))
+
+        sent, messages = drain_to_pair(spool, protocol)
+        names = [(m["event"]["event_type"], m["event"]["data"].get("name")) for m in messages]
+        assert names == [("config.updated", "other"), ("config.updated", "v2"), ("config.patched", None)]
+        assert spool.coalesced == 2
+
+    def test_expiry(self, tmp_path, protocol):
+        """Test that expired frames are not sent."""
+        spool = FrameSpool(tmp_path, protocol, heartbeat_ttl=-1)
+        spool.enqueue_message(protocol.create_heartbeat_message("agent", "healthy"))
+        spool.enqueue_message(protocol.create_command_message("ping", {}))
+        sent, messages = drain_to_pair(spool, protocol)
+        assert [m["type"] for m in messages] == ["command"]
+        assert spool.expired == 1
+
+    def test_recovery(self, tmp_path, protocol):
+        """Test that spooled frames and the drain cursor survive a restart."""
+        spool = FrameSpool(tmp_path, protocol, segment_size=2048)
+        for i in range(20):
+            spool.enqueue_message(protocol.create_command_message("ping", {"n": i}))
+        left, right = socket.socketpair()
+        spool.drain(left, max_frames=5)  # Drains everything in batches of 5
+        for i in range(20, 30):
+            spool.enqueue_message(protocol.create_command_message("ping", {"n": i}))
+        spool.close()
+        left.close()
+        right.close()
+
+        spool = FrameSpool(tmp_path, protocol)
+        assert len(spool) == 10
+        sent, messages = drain_to_pair(spool, protocol)
+        assert [m["command"]["params"]["n"] for m in messages] == list(range(20, 30))
+
+    def test_torn_record(self, tmp_path, protocol):
+        """Test that a partially written record is discarded on recovery."""
+        spool = FrameSpool(tmp_path, protocol)
+        spool.enqueue_message(protocol.create_command_message("ping", {"n": 1}))
+        spool.enqueue_message(protocol.create_command_message("ping", {"n": 2}))
+        segment = spool._segments[-1]
+        end = segment.end
+        spool.close()
+
+        with open(segment.path, 'r+b') as f:
+            f.seek(end - 10)
+            f.write(b"\xff" * 10)
+        spool = FrameSpool(tmp_path, protocol)
+        sent, messages = drain_to_pair(spool, protocol)
+        assert [m["command"]["params"]["n"] for m in messages] == [1]
+
+    def test_disk_budget(self, tmp_path, protocol):
+        """Test that the oldest segments are dropped beyond max_bytes."""
+        spool = FrameSpool(tmp_path, protocol, segment_size=1024, max_bytes=3 * 1024)
+        for i in range(100):
+            spool.enqueue_message(protocol.create_command_message("ping", {"n": i}))
+        assert spool.stats()["segments"] == 3
+        assert spool.dropped > 0
+        sent, messages = drain_to_pair(spool, protocol)
+        assert sent == 100 - spool.dropped
+        assert messages[-1]["command"]["params"]["n"] == 99
+
+    def test_drain_async(self, tmp_path, protocol):
+        """Test draining to an asyncio stream."""
+        spool = FrameSpool(tmp_path, protocol)
+        for i in range(10):
+            spool.enqueue_message(protocol.create_command_message("ping", {"n": i}))
+
+        async def run():
+            left, right = socket.socketpair()
+            _, writer = await asyncio.open_unix_connection(sock=left)
+            reader, _ = await asyncio.open_unix_connection(sock=right)
+            sent = await spool.drain_async(writer)
+            messages = [await protocol.read_message_async(reader) for _ in range(sent)]
+            writer.close()
+            return messages
+
+        messages = asyncio.run(run())
+        assert [m["command"]["params"]["n"] for m in messages] == list(range(10))
+
+    def test_sync_if_due(self, tmp_path, protocol, monkeypatch):
+        """Test that unsynced frames are synced once fsync_interval passes without enqueues."""
+        synced = []
+        monkeypatch.setattr("os.fdatasync", synced.append)
+        spool = FrameSpool(tmp_path, protocol, fsync_batch=100, fsync_interval=60.0)
+        spool.enqueue_message(protocol.create_command_message("ping", {}))
+        assert not spool.sync_if_due()
+        assert synced == []
+
+        spool.fsync_interval = 0.0
+        assert spool.sync_if_due()
+        assert len(synced) == 1
+        assert not spool.sync_if_due()  # Nothing left unsynced
+        spool.close()
+
+
+class TestSpoolingSender:
+    """Test SpoolingSender class."""
+
+    def test_spools_until_socket_available(self, tmp_path, protocol):
+        """Test spooling while the agent is down and flushing on reconnect."""
+        path = str(tmp_path / "agent.sock")
+        sender = SpoolingSender(path, FrameSpool(tmp_path / "spool", protocol, fsync_interval=60.0),
+                                retry_interval=0)
+        assert not sender.send(config_event(protocol, "c1", "v1"))
+        assert not sender.send(config_event(protocol, "c1", "v2"))
+        assert len(sender.spool) == 2
+        # Due syncs also happen while the socket stays down
+        assert sender.spool._unsynced == 2
+        sender.spool.fsync_interval = 0.0
+        assert sender.flush() == 0
+        assert sender.spool._unsynced == 0
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(1)
+        try:
+            assert sender.flush() == 1
+            assert sender.send(protocol.create_command_message("ping", {}))
+            sender.close()
+            connection, _ = server.accept()
+            messages = read_all(protocol, connection)
+            connection.close()
+        finally:
+            server.close()
+        assert [m["type"] for m in messages] == ["event", "command"]
+        assert messages[0]["event"]["data"]["name"] == "v2"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
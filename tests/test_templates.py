@@ -0,0 +1,96 @@
+"""
+Tests for precompiled template encoding.
+"""
+
+import timeit
+import pytest
+from jsonschema import ValidationError
+
+from sbox_common.protocols.converters import SubscriptionEventConverter
+from sbox_common.protocols.socket import FramedJSONProtocol
+from sbox_common.protocols.socket.templates import TemplateEncoder
+
+
+@pytest.fixture
+def encoder():
+    return TemplateEncoder()
+
+
+def reencode(protocol, frame):
+    """Decode a frame and encode it again with the generic encoder."""
+    message, _ = protocol.decode_message(frame)
+    return message, protocol.encode_message(message)
+
+
+class TestTemplateEncoder:
+    """Test TemplateEncoder class."""
+
+    @pytest.mark.parametrize("uptime, version", [
+        (None, None),
+        (12.5, None),
+        (3600, "1.2.3"),
+        (None, "dev"),
+    ])
+    def test_heartbeat_identical(self, encoder, uptime, version):
+        """Test that heartbeats are byte-identical to encode_message."""
+        frame = encoder.heartbeat("agent-ü\"1", "degraded", uptime, version)
+        message, expected = reencode(encoder.protocol, frame)
+
+        assert frame == expected
+        assert message["heartbeat"]["agent_id"] == "agent-ü\"1"
+        assert list(message["heartbeat"]) == list(
+            encoder.protocol.create_heartbeat_message("a", "degraded", uptime, version)["heartbeat"]
+        )
+
+    @pytest.mark.parametrize("correlation_id", [None, "corr-1"])
+    def test_subscription_events_identical(self, encoder, correlation_id):
+        """Test that subscription events are byte-identical to encode_message."""
+        converter = SubscriptionEventConverter()
+        for build in (encoder.subscription_enabled, encoder.subscription_disabled):
+            frame = build("sub-1", correlation_id=correlation_id)
+            message, expected = reencode(encoder.protocol, frame)
+
+            assert frame == expected
+            assert converter.validate_event(message["event"], "subscription-events") is True
+            assert message["event"].get("correlation_id") == correlation_id
+
+    def test_field_checks(self, encoder):
+        """Test that varying fields are checked against the schema."""
+        with pytest.raises(ValidationError, match="is not one of"):
+            encoder.heartbeat("agent", "sleepy")
+        with pytest.raises(ValidationError, match="minimum"):
+            encoder.heartbeat("agent", "healthy", -1)
+        with pytest.raises(ValidationError, match="type"):
+            encoder.heartbeat(42, "healthy")
+        with pytest.raises(ValidationError, match="is not one of"):
+            encoder.subscription_enabled("sub-1", source="nobody")
+
+        encoder.protocol.configure(validation_enabled=False)
+        assert encoder.heartbeat("agent", "sleepy")
+
+    def test_compressed_frames(self):
+        """Test that compression settings are honoured."""
+        protocol = FramedJSONProtocol()
+        protocol.configure(compression_threshold=10)
+        encoder = TemplateEncoder(protocol)
+
+        frame = encoder.heartbeat("agent" * 50, "healthy", 1.0)
+
+        assert frame == reencode(protocol, frame)[1]
+        assert protocol.parse_header(frame[:8])[1] & protocol.FRAME_FLAG_ZLIB
+
+    def test_faster_than_encode_message(self, encoder):
+        """Test that template encoding beats building and encoding a dict."""
+        protocol = encoder.protocol
+
+        def generic():
+            protocol.encode_message(protocol.create_heartbeat_message("agent", "healthy", 10.0, "1.0"))
+
+        def template():
+            encoder.heartbeat("agent", "healthy", 10.0, "1.0")
+
+        assert timeit.timeit(template, number=200) * 2 < timeit.timeit(generic, number=200)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
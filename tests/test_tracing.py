@@ -0,0 +1,179 @@
+"""
+Tests for correlation_id tracing with per-hop timestamps.
+"""
+
+import io
+import socket
+import uuid
+import pytest
+
+from sbox_common.protocols.converters import ConfigEventConverter
+from sbox_common.protocols.socket import FramedJSONProtocol
+from sbox_common.protocols.socket.tracing import HOPS, Span, TraceCollector, Tracer, trace_id_of
+
+
+class StepClock:
+    """Shared clock advancing 1 ms per reading."""
+
+    def __init__(self):
+        self.now = 1_000_000_000
+
+    def __call__(self):
+        self.now += 1_000_000
+        return self.now
+
+
+def reload_roundtrip(manager, agent, correlation_id, reload_time_ms=120):
+    """Send a reload command from manager to agent and a reload_completed event back."""
+    left, right = socket.socketpair()
+    manager_file, agent_file = left.makefile('rwb'), right.makefile('rwb')
+    try:
+        command = manager.protocol.create_command_message("reload_config", {"config_id": "c1"},
+                                                          correlation_id=correlation_id)
+        manager.write_message(manager_file, command)
+
+        request = agent.read_message(agent_file)
+        with agent.handle(request):
+            event = ConfigEventConverter().create_config_reload_completed(
+                "c1", "success", correlation_id=request["correlation_id"], reload_time_ms=reload_time_ms)
+        reply = agent.protocol.create_event_message(event, correlation_id=request["correlation_id"])
+        agent.write_message(agent_file, reply)
+
+        return manager.read_message(manager_file)
+    finally:
+        for f in (manager_file, agent_file, left, right):
+            f.close()
+
+
+@pytest.fixture
+def tracers():
+    clock = StepClock()
+    collector = TraceCollector()
+    manager = Tracer("sboxmgr", collector=collector, clock=clock)
+    agent = Tracer("sboxagent", clock=clock)
+    return manager, agent, collector
+
+
+class TestTracer:
+    """Test Tracer class."""
+
+    def test_roundtrip_hops(self, tracers):
+        """Test that the manager collects every hop of command and reply."""
+        manager, agent, collector = tracers
+        correlation_id = str(uuid.uuid4())
+        reply = reload_roundtrip(manager, agent, correlation_id)
+        assert reply["event"]["event_type"] == "config.reload_completed"
+
+        spans = collector.spans(correlation_id)
+        assert [(span.service, span.hop) for span in spans] == [
+            ("sboxmgr", "encode"),
+            ("sboxmgr", "send"),
+            ("sboxagent", "receive"),
+            ("sboxagent", "validate"),
+            ("sboxagent", "handle"),
+            ("sboxagent", "respond"),
+            ("sboxagent", "send"),
+            ("sboxmgr", "receive"),
+            ("sboxmgr", "validate"),
+        ]
+        assert all(span.duration_ns > 0 for span in spans)
+        # Hops of one leg are contiguous
+        assert spans[0].end_ns == spans[1].start_ns and spans[1].end_ns == spans[2].start_ns
+        assert spans[4].end_ns == spans[5].start_ns
+        assert collector.attributes(correlation_id) == {
+            "event_type": "config.reload_completed", "reload_time_ms": 120}
+
+    def test_untraced_without_correlation_id(self, tracers):
+        """Test that messages without correlation_id carry no trace."""
+        manager, agent, collector = tracers
+        stream = io.BytesIO()
+        manager.write_message(stream, manager.protocol.create_heartbeat_message("agent", "healthy"))
+        stream.seek(0)
+        message = agent.read_message(stream)
+        assert "metadata" not in message
+        assert len(collector) == 0
+
+    def test_metadata_preserved_and_message_unchanged(self, tracers):
+        """Test that existing metadata is kept and the caller's message is not modified."""
+        manager, agent, _ = tracers
+        message = manager.protocol.create_command_message("ping", {}, correlation_id="trace-1")
+        message["metadata"] = {"origin": "test"}
+        frame = manager.encode_message(message)
+        assert message["metadata"] == {"origin": "test"}
+
+        decoded = agent.read_message(io.BytesIO(frame))
+        assert decoded["metadata"]["origin"] == "test"
+        assert decoded["metadata"]["trace"]["pending"]["hop"] == "encode"
+
+    def test_compressed_frames(self):
+        """Test that the patched stamp survives compression."""
+        protocol = FramedJSONProtocol()
+        protocol.configure(compression_threshold=0)
+        collector = TraceCollector()
+        sender = Tracer("sboxmgr", protocol)
+        receiver = Tracer("sboxagent", FramedJSONProtocol(), collector)
+        frame = sender.encode_message(protocol.create_command_message("ping", {"blob": "x" * 500},
+                                                                      correlation_id="trace-1"))
+        assert frame[4:8] != b"\x00\x00\x00\x01"  # Compression flag set
+        receiver.read_message(io.BytesIO(frame))
+        assert [span.hop for span in collector.spans("trace-1")] == ["encode", "send", "receive", "validate"]
+
+    def test_trace_id_of_event(self):
+        """Test that the correlation_id of an embedded event identifies the trace."""
+        assert trace_id_of({"event": {"correlation_id": "abc"}}) == "abc"
+        assert trace_id_of({"correlation_id": "outer", "event": {"correlation_id": "abc"}}) == "outer"
+        assert trace_id_of({"type": "heartbeat"}) is None
+
+
+class TestTraceCollector:
+    """Test TraceCollector class."""
+
+    def test_breakdown(self, tracers):
+        """Test per-hop percentiles across traces."""
+        manager, agent, collector = tracers
+        for i in range(10):
+            reload_roundtrip(manager, agent, str(uuid.uuid4()), reload_time_ms=100 + i)
+
+        breakdown = collector.breakdown()
+        assert list(breakdown) == list(HOPS) + ["reload_time_ms", "total"]
+        assert breakdown["encode"].count == 10
+        assert breakdown["send"].count == 20  # Both legs
+        assert breakdown["reload_time_ms"].percentiles["p50"] == pytest.approx(104.5)
+        assert breakdown["total"].min > breakdown["handle"].max
+
+        by_service = collector.breakdown(by_service=True)
+        assert "sboxagent/handle" in by_service and "sboxmgr/receive" in by_service
+
+    def test_merge_and_eviction(self):
+        """Test that forwarded spans are not duplicated and old traces are evicted."""
+        collector = TraceCollector(max_traces=2)
+        span = Span("encode", "sboxmgr", 1, 2)
+        collector.add("a", [span])
+        collector.add("a", [span, Span("send", "sboxmgr", 2, 3)])
+        assert len(collector.spans("a")) == 2
+        collector.add("b", [span])
+        collector.add("c", [span])
+        assert collector.trace_ids == ["b", "c"]
+
+    def test_export_otlp(self, tracers):
+        """Test OTLP/JSON export with a root span per trace."""
+        manager, agent, collector = tracers
+        correlation_id = str(uuid.uuid4())
+        reload_roundtrip(manager, agent, correlation_id)
+
+        exported = collector.export_otlp(clock_offset_ns=0)
+        resources = {resource["resource"]["attributes"][0]["value"]["stringValue"]: resource
+                     for resource in exported["resourceSpans"]}
+        assert set(resources) == {"sboxmgr", "sboxagent"}
+        spans = [span for resource in exported["resourceSpans"]
+                 for span in resource["scopeSpans"][0]["spans"]]
+        root = next(span for span in spans if span["name"] == "trace")
+        assert root["traceId"] == uuid.UUID(correlation_id).hex
+        assert {span["traceId"] for span in spans} == {root["traceId"]}
+        assert all(span["parentSpanId"] == root["spanId"] for span in spans if span is not root)
+        assert len({span["spanId"] for span in spans}) == len(spans) == 10
+        assert {"key": "reload_time_ms", "value": {"doubleValue": 120.0}} in root["attributes"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
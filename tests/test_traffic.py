@@ -0,0 +1,182 @@
+"""
+Tests for traffic capture and replay.
+"""
+
+import asyncio
+import io
+import pytest
+
+from sbox_common.protocols.socket import FramedJSONProtocol, SelectorServer
+from sbox_common.protocols.socket.traffic import (
+    CLIENT_TO_SERVER, SERVER_TO_CLIENT, CaptureProxy, CapturedFrame, CaptureWriter, FrameSplitter,
+    TappedStream, read_capture, replay, replay_capture
+)
+
+
+@pytest.fixture
+def protocol():
+    return FramedJSONProtocol()
+
+
+@pytest.fixture
+def server(tmp_path, serve):
+    """Local SelectorServer answering commands."""
+    protocol = FramedJSONProtocol()
+
+    def handler(connection, message):
+        if message["type"] == "command":
+            return protocol.create_response_message(message["id"], "success")
+        return None
+
+    return serve(SelectorServer(str(tmp_path / "server.sock"), handler, protocol)).path
+
+
+class TestCaptureFile:
+    """Test capture file writing and reading."""
+
+    def test_roundtrip(self, tmp_path, protocol):
+        """Test that frames are read back with offsets, connections and directions."""
+        path = tmp_path / "traffic.cap"
+        frames = [protocol.encode_message(protocol.create_command_message("ping", {"n": i})) for i in range(3)]
+        with CaptureWriter(path) as writer:
+            writer.record(frames[0], CLIENT_TO_SERVER, 1)
+            writer.record(frames[1], SERVER_TO_CLIENT, 1)
+            writer.record(frames[2], CLIENT_TO_SERVER, 2)
+
+        captured = list(read_capture(path))
+        assert [(c.connection, c.direction, c.frame) for c in captured] == [
+            (1, CLIENT_TO_SERVER, frames[0]),
+            (1, SERVER_TO_CLIENT, frames[1]),
+            (2, CLIENT_TO_SERVER, frames[2]),
+        ]
+        assert captured[0].offset <= captured[1].offset <= captured[2].offset
+
+    def test_truncated(self, tmp_path, protocol):
+        """Test that a record cut short ends the capture."""
+        path = tmp_path / "traffic.cap"
+        frame = protocol.encode_message(protocol.create_command_message("ping", {}))
+        with CaptureWriter(path) as writer:
+            writer.record(frame)
+            writer.record(frame)
+        data = path.read_bytes()
+        path.write_bytes(data[:-5])
+        assert len(list(read_capture(path))) == 1
+
+    def test_not_a_capture(self, tmp_path):
+        """Test that other files are rejected."""
+        path = tmp_path / "other.cap"
+        path.write_bytes(b"{}")
+        with pytest.raises(ValueError):
+            list(read_capture(path))
+
+
+class TestFrameSplitter:
+    """Test FrameSplitter class."""
+
+    def test_split_across_chunks(self, protocol):
+        """Test frames split at arbitrary byte boundaries."""
+        frames = [protocol.encode_message(protocol.create_command_message("ping", {"n": i})) for i in range(3)]
+        data = b"".join(frames)
+        splitter = FrameSplitter()
+        result = []
+        for i in range(0, len(data), 7):
+            result.extend(splitter.feed(data[i:i + 7]))
+        assert result == frames
+
+    def test_too_large(self):
+        """Test that an oversized frame length is rejected."""
+        with pytest.raises(ValueError):
+            FrameSplitter(max_message_size=10).feed(b"\x00\x00\x01\x00\x00\x00\x00\x01")
+
+
+class TestTappedStream:
+    """Test TappedStream class."""
+
+    def test_wraps_read_and_write_message(self, tmp_path, protocol):
+        """Test recording frames passing through write_message and read_message."""
+        path = tmp_path / "traffic.cap"
+        with CaptureWriter(path) as writer:
+            outbound = TappedStream(io.BytesIO(), writer)
+            message = protocol.create_command_message("ping", {})
+            protocol.write_message(outbound, message)
+
+            inbound = TappedStream(io.BytesIO(outbound.stream.getvalue()), writer)
+            assert protocol.read_message(inbound)["id"] == message["id"]
+
+        captured = list(read_capture(path))
+        assert [c.direction for c in captured] == [CLIENT_TO_SERVER, SERVER_TO_CLIENT]
+        assert captured[0].frame == captured[1].frame
+        assert captured[0].connection != captured[1].connection
+
+
+class TestCaptureProxy:
+    """Test CaptureProxy class."""
+
+    def test_records_both_directions(self, tmp_path, protocol, server):
+        """Test that requests and responses through the proxy are captured."""
+        path = tmp_path / "traffic.cap"
+        listen = str(tmp_path / "proxy.sock")
+
+        async def run():
+            with CaptureWriter(path) as writer:
+                proxy = CaptureProxy(listen, server, writer)
+                await proxy.start()
+                reader, stream = await asyncio.open_unix_connection(listen)
+                for i in range(3):
+                    await protocol.write_message_async(stream, protocol.create_command_message("ping", {"n": i}))
+                    await protocol.read_message_async(reader)
+                stream.close()
+                await proxy.close()
+                return proxy.connections
+
+        assert asyncio.run(run()) == 1
+        captured = list(read_capture(path))
+        assert [c.direction for c in captured] == [CLIENT_TO_SERVER, SERVER_TO_CLIENT] * 3
+
+
+class TestReplay:
+    """Test capture replay."""
+
+    def capture(self, protocol, count=20, connections=2, interval=0.01):
+        frames = []
+        for i in range(count):
+            message = protocol.create_command_message("ping", {"n": i})
+            frames.append(CapturedFrame(i * interval, i % connections + 1, CLIENT_TO_SERVER,
+                                        protocol.encode_message(message)))
+            response = protocol.create_response_message(message["id"], "success")
+            frames.append(CapturedFrame(i * interval, i % connections + 1, SERVER_TO_CLIENT,
+                                        protocol.encode_message(response)))
+        return frames
+
+    def test_as_fast_as_possible(self, protocol, server):
+        """Test replay without pacing reports throughput and latency."""
+        frames = self.capture(protocol)
+        report = asyncio.run(replay_capture(frames, server, speed=None))
+        assert report.frames == 20
+        assert report.connections == 2
+        assert report.responses == 20
+        assert report.latency.count == 20
+        assert report.as_dict()["latency_ms"]["p99"] >= report.as_dict()["latency_ms"]["p50"]
+
+    def test_original_rate_and_multiple(self, protocol, server):
+        """Test that pacing follows the capture offsets scaled by speed."""
+        frames = self.capture(protocol, count=11, interval=0.02)
+        report = asyncio.run(replay_capture(frames, server, speed=1.0))
+        assert report.elapsed >= 0.2
+        report = asyncio.run(replay_capture(frames, server, speed=4.0))
+        assert 0.05 <= report.elapsed < 0.2
+
+    def test_replay_file(self, tmp_path, protocol, server):
+        """Test replaying a capture file recorded with TappedStream."""
+        path = tmp_path / "traffic.cap"
+        with CaptureWriter(path) as writer:
+            stream = TappedStream(io.BytesIO(), writer)
+            for i in range(5):
+                protocol.write_message(stream, protocol.create_command_message("ping", {"n": i}))
+        report = replay(path, server, speed=None, timeout=1.0)
+        assert report.frames == 5
+        assert report.responses == 5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
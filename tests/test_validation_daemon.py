@@ -0,0 +1,104 @@
+"""
+Tests for the warm validation daemon and its client.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+from sbox_common.validation import ValidationClient, default_socket_path
+from sbox_common.validation.server import ValidationDaemon
+
+SCHEMA = {
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "type": "object",
+    "required": ["name"],
+    "properties": {"name": {"type": "string"}, "port": {"type": "integer"}},
+}
+
+
+@pytest.fixture
+def schemas_dir(tmp_path):
+    directory = tmp_path / "schemas"
+    directory.mkdir()
+    (directory / "sample.json").write_text(json.dumps(SCHEMA))
+    return directory
+
+
+@pytest.fixture
+def daemon(tmp_path, schemas_dir, serve):
+    return serve(ValidationDaemon(str(tmp_path / "validator.sock"), schemas_dir))
+
+
+class TestValidationDaemon:
+    """Test validation through the daemon."""
+
+    def test_valid_and_invalid(self, daemon, schemas_dir):
+        """Test results over one kept-alive connection."""
+        with ValidationClient(daemon.socket_path) as client:
+            assert client.validate("name: ok\nport: 1\n", "yaml", "sample", schemas_dir).valid
+            result = client.validate('{"port": "x"}', "json", "sample", schemas_dir)
+        assert not result.valid
+        assert result.error_code is None
+        assert sorted((e["message"], tuple(e["path"])) for e in result.errors) == [
+            ("'name' is a required property", ()),
+            ("'x' is not of type 'integer'", ("port",)),
+        ]
+        assert daemon.schemas.compiled == 1
+
+    def test_errors(self, daemon, schemas_dir):
+        """Test unknown schemas, unsupported formats and parse errors."""
+        with ValidationClient(daemon.socket_path) as client:
+            assert client.validate("{}", "json", "missing", schemas_dir).error_code == "schema_not_found"
+            assert client.validate("{}", "json", "../sample", schemas_dir).error_code == "schema_not_found"
+            assert client.validate("{}", "toml", "sample", schemas_dir).error_code == "unsupported_format"
+            result = client.validate("name: [", "yaml", "sample", schemas_dir)
+        assert result.error_code == "parse_error"
+        assert not result.valid
+
+    def test_schema_change_recompiled(self, daemon, schemas_dir):
+        """Test that an edited schema file is recompiled."""
+        with ValidationClient(daemon.socket_path) as client:
+            assert client.validate('{"name": "a", "extra": 1}', "json", "sample", schemas_dir).valid
+            strict = dict(SCHEMA, additionalProperties=False)
+            path = schemas_dir / "sample.json"
+            path.write_text(json.dumps(strict))
+            os.utime(path, ns=(0, 1))
+            assert not client.validate('{"name": "a", "extra": 1}', "json", "sample", schemas_dir).valid
+        assert daemon.schemas.compiled == 2
+
+
+class TestValidationClient:
+    """Test ValidationClient class."""
+
+    def test_unavailable(self, tmp_path):
+        """Test that a missing daemon is reported as unavailable."""
+        client = ValidationClient(str(tmp_path / "absent.sock"))
+        assert not client.available()
+        with pytest.raises(OSError):
+            client.validate("{}", "json")
+
+    def test_available(self, daemon):
+        """Test ping."""
+        assert ValidationClient(daemon.socket_path).available()
+
+    def test_default_socket_path(self, monkeypatch):
+        """Test socket path from the environment."""
+        monkeypatch.setenv("SBOX_VALIDATOR_SOCKET", "/run/custom.sock")
+        assert default_socket_path() == "/run/custom.sock"
+        monkeypatch.delenv("SBOX_VALIDATOR_SOCKET")
+        monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user/1000")
+        assert default_socket_path() == "/run/user/1000/sbox-common-validator.sock"
+
+    def test_client_import_is_light(self):
+        """Test that the client does not import jsonschema or yaml."""
+        code = ("import sys; from sbox_common.validation import ValidationClient; "
+                "print(any(m in sys.modules for m in ('jsonschema', 'yaml')))")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        assert output.stdout.strip() == "False"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])